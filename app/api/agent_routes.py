@@ -25,22 +25,28 @@ def _get_chats_dir() -> str:
     return _CHATS_DIR
 
 
+def _get_chat_store():
+    """Shared append-only session store (same one web/app.py SessionManager uses).
+
+    web/app.py imports the top-level ``chat_store`` module; import it under the
+    same name first so both share one module instance and one store per directory.
+    """
+    try:
+        from chat_store import get_chat_store
+    except ImportError:
+        from web.chat_store import get_chat_store
+    return get_chat_store(_get_chats_dir())
+
+
 def _load_history(session_id: str, max_turns: int = 20):
-    """Load recent history from chats/<session_id>.json, compatible with
-    SessionManager format {role, parts}. Converts to agent-compatible
-    {role, content} dicts."""
+    """Load recent history for a session, compatible with SessionManager
+    format {role, parts}. Only the tail of the session log is read.
+    Converts to agent-compatible {role, content} dicts."""
     if not session_id:
         return []
-    fname = session_id if session_id.endswith(".json") else f"{session_id}.json"
-    path = os.path.join(_get_chats_dir(), fname)
-    if not os.path.exists(path):
-        return []
     try:
-        with open(path, "r", encoding="utf-8", errors="ignore") as f:
-            raw = json.load(f)
-        # Convert {role, parts} → {role, content}
         history = []
-        for msg in raw[-max_turns:]:
+        for msg in _get_chat_store().tail(session_id, max_turns):
             role = msg.get("role", "user")
             parts = msg.get("parts", [])
             content = parts[0] if parts else msg.get("content", "")
@@ -52,22 +58,14 @@ def _load_history(session_id: str, max_turns: int = 20):
 
 
 def _save_history(session_id: str, user_msg: str, model_msg: str):
-    """Append a turn (user + model) to chats/<session_id>.json in
+    """Append a turn (user + model) to the session log in
     SessionManager-compatible format."""
     if not session_id:
         return
-    fname = session_id if session_id.endswith(".json") else f"{session_id}.json"
-    path = os.path.join(_get_chats_dir(), fname)
     try:
-        if os.path.exists(path):
-            with open(path, "r", encoding="utf-8", errors="ignore") as f:
-                history = json.load(f)
-        else:
-            history = []
-        history.append({"role": "user", "parts": [user_msg]})
-        history.append({"role": "model", "parts": [model_msg]})
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(history, f, indent=2, ensure_ascii=False)
+        _get_chat_store().append(session_id,
+                                 {"role": "user", "parts": [user_msg]},
+                                 {"role": "model", "parts": [model_msg]})
     except Exception as exc:
         logger.warning(f"Failed to save history for {session_id}: {exc}")
 
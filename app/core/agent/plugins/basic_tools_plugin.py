@@ -16,11 +16,13 @@ class BasicToolsPlugin(AgentPlugin):
             {
                 "name": "get_current_time",
                 "func": self.get_current_time,
+                "parallel_safe": True,
                 "description": "Returns the current date and time."
             },
             {
                 "name": "calculate",
                 "func": self.calculate,
+                "parallel_safe": True,
                 "description": "Performs basic arithmetic calculation.",
                 # Explicit parameters example
                 "parameters": {
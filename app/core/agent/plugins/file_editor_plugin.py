@@ -20,6 +20,7 @@ class FileEditorPlugin(AgentPlugin):
             {
                 "name": "read_file",
                 "func": self.read_file,
+                "parallel_safe": True,
                 "description": "Read the content of a file. Returns file content and metadata."
             },
             {
@@ -35,6 +36,7 @@ class FileEditorPlugin(AgentPlugin):
             {
                 "name": "list_files",
                 "func": self.list_files,
+                "parallel_safe": True,
                 "description": "List files in a directory."
             }
         ]
@@ -26,6 +26,7 @@ class NetworkPlugin(AgentPlugin):
             {
                 "name": "http_get",
                 "func": self.http_get,
+                "parallel_safe": True,
                 "description": "Perform an HTTP GET request and return status code plus "
                                "the first 2000 characters of the response body.",
                 "parameters": {
@@ -61,6 +62,7 @@ class NetworkPlugin(AgentPlugin):
             {
                 "name": "parse_html",
                 "func": self.parse_html,
+                "parallel_safe": True,
                 "description": "Fetch a web page and extract elements matching a CSS selector. "
                                "Returns up to 10 matched elements.",
                 "parameters": {
@@ -27,6 +27,7 @@ class SearchPlugin(AgentPlugin):
             {
                 "name": "web_search",
                 "func": self.web_search,
+                "parallel_safe": True,
                 "description": "Perform a Google search to find information about a topic."
             }
         ]
@@ -26,6 +26,7 @@ class SystemInfoPlugin(AgentPlugin):
             {
                 "name": "query_cpu_status",
                 "func": self.query_cpu_status,
+                "parallel_safe": True,
                 "description": "Query current CPU usage, core count, and frequency.",
                 "parameters": {
                     "type": "OBJECT",
@@ -35,6 +36,7 @@ class SystemInfoPlugin(AgentPlugin):
             {
                 "name": "query_memory_status",
                 "func": self.query_memory_status,
+                "parallel_safe": True,
                 "description": "Query current memory and swap usage.",
                 "parameters": {
                     "type": "OBJECT",
@@ -44,6 +46,7 @@ class SystemInfoPlugin(AgentPlugin):
             {
                 "name": "query_disk_usage",
                 "func": self.query_disk_usage,
+                "parallel_safe": True,
                 "description": "Query disk usage across mounted drives.",
                 "parameters": {
                     "type": "OBJECT",
@@ -53,6 +56,7 @@ class SystemInfoPlugin(AgentPlugin):
             {
                 "name": "query_network_status",
                 "func": self.query_network_status,
+                "parallel_safe": True,
                 "description": "Query current network interfaces and connection status.",
                 "parameters": {
                     "type": "OBJECT",
@@ -62,6 +66,7 @@ class SystemInfoPlugin(AgentPlugin):
             {
                 "name": "query_python_env",
                 "func": self.query_python_env,
+                "parallel_safe": True,
                 "description": "Query current Python runtime/environment details.",
                 "parameters": {
                     "type": "OBJECT",
@@ -71,6 +76,7 @@ class SystemInfoPlugin(AgentPlugin):
             {
                 "name": "list_running_apps",
                 "func": self.list_running_apps,
+                "parallel_safe": True,
                 "description": "List top running processes sorted by memory usage.",
                 "parameters": {
                     "type": "OBJECT",
@@ -85,6 +91,7 @@ class SystemInfoPlugin(AgentPlugin):
             {
                 "name": "get_system_warnings",
                 "func": self.get_system_warnings,
+                "parallel_safe": True,
                 "description": "Return system health warnings if resource usage is high.",
                 "parameters": {
                     "type": "OBJECT",
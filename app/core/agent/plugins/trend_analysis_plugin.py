@@ -91,10 +91,10 @@ class TrendAnalysisPlugin(AgentPlugin):
                         },
                         "historical_stats": {
                             "type": "STRING",
-                            "description": "JSON-encoded historical statistics"
+                            "description": "JSON-encoded historical statistics (default: averages over the last 10 minutes of sampled telemetry)"
                         }
                     },
-                    "required": ["current_metrics", "historical_stats"]
+                    "required": ["current_metrics"]
                 }
             },
             {
@@ -179,13 +179,16 @@ class TrendAnalysisPlugin(AgentPlugin):
     def compare_with_historical(
         self,
         current_metrics: str,
-        historical_stats: str
+        historical_stats: Optional[str] = None
     ) -> str:
         """Compare with historical data."""
         try:
             import json
             current = json.loads(current_metrics)
-            historical = json.loads(historical_stats)
+            if historical_stats:
+                historical = json.loads(historical_stats)
+            else:
+                historical = self.analyzer.get_telemetry_stats().get("historical_stats", {})
             
             result = self.analyzer.get_historical_comparison(current, historical)
             
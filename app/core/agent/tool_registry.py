@@ -10,13 +10,26 @@ class ToolRegistry:
     """
     Manages tools and plugins for the agent.
     Provides tool definitions for LLMs and executes tool calls.
+
+    Tools may be registered as ``parallel_safe`` (side-effect-free, so the
+    agent can run them concurrently with other such tools) and with a
+    per-tool ``timeout`` in seconds.
     """
     def __init__(self):
         self._tools: Dict[str, Callable] = {}
         self._tool_definitions: List[Dict[str, Any]] = []
+        self._tool_options: Dict[str, Dict[str, Any]] = {}
         self._plugins: Dict[str, AgentPlugin] = {}
 
-    def register_tool(self, name: str, func: Callable, description: Optional[str] = None, parameters: Optional[Dict] = None):
+    def register_tool(
+        self,
+        name: str,
+        func: Callable,
+        description: Optional[str] = None,
+        parameters: Optional[Dict] = None,
+        parallel_safe: bool = False,
+        timeout: Optional[float] = None
+    ):
         """
         Register a single tool function.
         """
@@ -36,9 +49,10 @@ class ToolRegistry:
         else:
             definition["parameters"] = self._generate_schema(func)
         
-        # Update definition in list
-        self._tool_definitions = [t for t in self._tool_definitions if t["name"] != name]
-        self._tool_definitions.append(definition)
+        # Rebuild the list instead of mutating it, so callers (e.g. providers
+        # caching formatted schemas) can rely on list identity for change detection.
+        self._tool_definitions = [t for t in self._tool_definitions if t["name"] != name] + [definition]
+        self._tool_options[name] = {"parallel_safe": parallel_safe, "timeout": timeout}
         logger.debug(f"Registered tool: {name}")
 
     def register_plugin(self, plugin: AgentPlugin):
@@ -60,16 +74,27 @@ class ToolRegistry:
                 name=name,
                 func=func,
                 description=tool_def.get("description"),
-                parameters=tool_def.get("parameters")
+                parameters=tool_def.get("parameters"),
+                parallel_safe=tool_def.get("parallel_safe", False),
+                timeout=tool_def.get("timeout")
             )
         logger.info(f"Registered plugin: {plugin.name} with {len(tools)} tools")
 
     def get_definitions(self) -> List[Dict[str, Any]]:
         """
         Returns JSON schemas for all registered tools, compatible with LLM function calling.
+        The same list object is returned until a tool is (re-)registered.
         """
         return self._tool_definitions
 
+    def is_parallel_safe(self, tool_name: str) -> bool:
+        """Whether a tool is side-effect-free and may run concurrently."""
+        return self._tool_options.get(tool_name, {}).get("parallel_safe", False)
+
+    def get_timeout(self, tool_name: str) -> Optional[float]:
+        """Per-tool timeout in seconds, or None to use the agent default."""
+        return self._tool_options.get(tool_name, {}).get("timeout")
+
     def execute(self, tool_name: str, tool_args: Dict[str, Any]) -> Any:
         """
         Execute a tool by name with provided arguments.
@@ -1,6 +1,8 @@
 import logging
+import threading
 import time
 import json
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from typing import Any, Dict, Generator, List, Optional, Union
 
 from app.core.agent.base import Agent
@@ -17,17 +19,21 @@ class UnifiedAgent(Agent):
     """
     
     MAX_STEPS = 15
+    MAX_TOOL_WORKERS = 4        # bounded pool for parallel-safe tools
     
     def __init__(
         self, 
         llm_provider: LLMProvider,
         tool_registry: Optional[ToolRegistry] = None,
         model_id: str = "gemini-3-flash-preview",
-        system_instruction: Optional[str] = None
+        system_instruction: Optional[str] = None,
+        parallel_tools: bool = True
     ):
         super().__init__(llm_provider)
         self.registry = tool_registry or ToolRegistry()
         self.model_id = model_id
+        self.parallel_tools = parallel_tools
+        self._tool_pool: Optional[ThreadPoolExecutor] = None
         self.base_system_instruction = system_instruction or (
             "You are Koto, an intelligent AI assistant. "
             "You can use tools to answer user questions. "
@@ -56,12 +62,13 @@ class UnifiedAgent(Agent):
         # LLMProvider implementations should handle conversion to specific API formats.
         # Here we use: {"role": "user"|"model"|"function", "content": str, "tool_calls": [...], "tool_id": ...}
         
+        # Tool definitions are cached by the registry; providers reuse their
+        # formatted schemas while the same list is passed.
+        tools_def = self.registry.get_definitions()
+        
         while steps_taken < self.MAX_STEPS:
             steps_taken += 1
             
-            # Get tool definitions
-            tools_def = self.registry.get_definitions()
-            
             try:
                 # Call LLM
                 response = self.llm.generate_content(
@@ -92,12 +99,16 @@ class UnifiedAgent(Agent):
                     )
                     break
                 
-                # Execute Tools
-                for tool_call in tool_calls:
+                # Execute Tools: consecutive parallel-safe calls run concurrently,
+                # steps are still yielded in call order.
+                futures = {}
+                for idx, tool_call in enumerate(tool_calls):
                     # tool_call format: {"name": str, "args": dict, "id": str (optional)}
                     tool_name = tool_call.get("name")
                     tool_args = tool_call.get("args", {})
-                    # tool_id = tool_call.get("id") # OpenAI specific usually
+                    
+                    if idx not in futures:
+                        futures.update(self._submit_tools(tool_calls, idx))
                     
                     # Yield Action
                     action_obj = AgentAction(
@@ -112,10 +123,6 @@ class UnifiedAgent(Agent):
                     )
                     
                     # Store tool call in history (for provider to format)
-                    # This is tricky without strict schema. We just append text for now to simulate conversation
-                    # if the provider doesn't support structured history fully.
-                    # But for Gemini, we rely on implicit handling or just state.
-                    # Actually, for multi-turn tool use, we MUST provide correct history.
                     # Assuming LLMProvider can handle a list of dicts with 'tool_calls' key.
                     current_history.append({
                         "role": "model",
@@ -123,12 +130,7 @@ class UnifiedAgent(Agent):
                         "tool_calls": [tool_call]
                     })
                     
-                    # Execute
-                    try:
-                        result = self.registry.execute(tool_name, tool_args)
-                        observation = str(result)
-                    except Exception as e:
-                        observation = f"Error: {e}"
+                    observation = self._collect_tool_result(tool_name, futures.pop(idx))
                         
                     # Yield Observation
                     yield AgentStep(
@@ -151,3 +153,83 @@ class UnifiedAgent(Agent):
                     content=f"An error occurred: {str(e)}"
                 )
                 break
+
+    def _get_tool_pool(self) -> ThreadPoolExecutor:
+        if self._tool_pool is None:
+            self._tool_pool = ThreadPoolExecutor(
+                max_workers=self.MAX_TOOL_WORKERS, thread_name_prefix="agent-tool"
+            )
+        return self._tool_pool
+
+    def _submit_tools(self, tool_calls: List[Dict[str, Any]], start: int) -> Dict[int, Any]:
+        """
+        Prepare the tool call at ``start``. A parallel-safe call is submitted
+        to the pool together with the run of parallel-safe calls that follows
+        it, so they execute concurrently. Tools with side effects are not
+        submitted: they run inline on the calling thread when collected.
+        """
+        if not (self.parallel_tools and self.registry.is_parallel_safe(tool_calls[start].get("name"))):
+            return {start: _InlineToolCall(tool_calls[start])}
+
+        end = start + 1
+        while end < len(tool_calls) and self.registry.is_parallel_safe(tool_calls[end].get("name")):
+            end += 1
+
+        pool = self._get_tool_pool()
+        submitted = {}
+        for idx in range(start, end):
+            run = _PooledToolCall(tool_calls[idx])
+            run.future = pool.submit(run.execute, self.registry)
+            submitted[idx] = run
+        return submitted
+
+    def _collect_tool_result(self, tool_name: str, run) -> str:
+        """
+        Run or wait for a tool call. Only a timeout the tool registered itself
+        applies, counted from when the tool started running; inline tools are
+        never abandoned, so their side effects cannot overlap a retry.
+        """
+        if not isinstance(run, _PooledToolCall):
+            try:
+                return str(run.execute(self.registry))
+            except Exception as e:
+                return f"Error: {e}"
+
+        timeout = self.registry.get_timeout(tool_name)
+        try:
+            if timeout is None:
+                return str(run.future.result())
+            run.started.wait()          # time queued behind other tools does not count
+            remaining = max(0.0, timeout - (time.monotonic() - run.started_at))
+            return str(run.future.result(timeout=remaining))
+        except FutureTimeoutError:
+            # The worker thread cannot be interrupted; its result is discarded.
+            logger.warning(f"Tool '{tool_name}' timed out after {timeout:.0f}s")
+            return f"Error: Tool '{tool_name}' timed out after {timeout:.0f}s"
+        except Exception as e:
+            return f"Error: {e}"
+
+
+class _InlineToolCall:
+    """A tool call executed on the agent's own thread."""
+
+    def __init__(self, call: Dict[str, Any]):
+        self.call = call
+
+    def execute(self, registry: ToolRegistry):
+        return registry.execute(self.call.get("name"), self.call.get("args", {}))
+
+
+class _PooledToolCall(_InlineToolCall):
+    """A parallel-safe tool call running in the tool pool; records when it starts."""
+
+    def __init__(self, call: Dict[str, Any]):
+        super().__init__(call)
+        self.started = threading.Event()
+        self.started_at = 0.0
+        self.future = None
+
+    def execute(self, registry: ToolRegistry):
+        self.started_at = time.monotonic()
+        self.started.set()
+        return super().execute(registry)
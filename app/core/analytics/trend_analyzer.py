@@ -8,6 +8,7 @@ import logging
 from typing import Dict, List, Optional, Any
 from collections import defaultdict
 from datetime import datetime, timedelta
+from statistics import mean
 
 logger = logging.getLogger(__name__)
 
@@ -190,6 +191,41 @@ class TrendAnalyzer:
             "timestamp": datetime.now().isoformat()
         }
     
+    def get_telemetry_stats(self, window_seconds: int = 600) -> Dict[str, Any]:
+        """
+        Summarize recent system metrics from the shared telemetry sampler.
+        
+        Reads the sampler's ring buffer instead of sampling psutil again.
+        
+        Args:
+            window_seconds: How far back to look
+            
+        Returns:
+            Dict with "current_metrics" and "historical_stats" shaped for
+            get_historical_comparison(); empty when no samples are available
+        """
+        try:
+            from web.system_info import get_telemetry_sampler
+        except ImportError:
+            return {}
+        
+        sampler = get_telemetry_sampler()
+        sampler.start()
+        series = {
+            'cpu': sampler.series('cpu.usage_percent', window_seconds),
+            'memory': sampler.series('memory.percent', window_seconds),
+            'disk': sampler.series('disk.percent_full', window_seconds),
+        }
+        if not any(series.values()):
+            return {}
+        
+        return {
+            "current_metrics": {f"{name}_usage": values[-1] for name, values in series.items() if values},
+            "historical_stats": {f"avg_{name}": round(mean(values), 2) for name, values in series.items() if values},
+            "samples": len(series['cpu']),
+            "window_seconds": window_seconds,
+        }
+    
     def get_anomaly_score(
         self,
         events: List[Dict[str, Any]],
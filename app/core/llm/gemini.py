@@ -29,6 +29,8 @@ class GeminiProvider(LLMProvider):
             or os.getenv("GOOGLE_API_KEY")
         )
         self.client = None
+        # (tools list, formatted tools): reused while the caller passes the same list
+        self._tools_cache = None
 
         if not genai or not types:
             logger.warning("google.genai package not installed")
@@ -128,6 +130,10 @@ class GeminiProvider(LLMProvider):
         if not tools or not types:
             return None
 
+        cache = self._tools_cache
+        if cache is not None and cache[0] is tools:
+            return cache[1]
+
         formatted_tools: List[Any] = []
         function_declarations: List[Any] = []
 
@@ -146,6 +152,7 @@ class GeminiProvider(LLMProvider):
         if function_declarations:
             formatted_tools.append(types.Tool(function_declarations=function_declarations))
 
+        self._tools_cache = (tools, formatted_tools or None)
         return formatted_tools or None
 
     def _normalize_schema(self, schema: Dict[str, Any]) -> Dict[str, Any]:
@@ -107,6 +107,22 @@ class SystemEventMonitor:
                 logger.error(f"Error in monitor loop: {e}", exc_info=True)
                 time.sleep(self.check_interval)
                 
+    @staticmethod
+    def _latest_snapshot() -> Dict[str, Any]:
+        """
+        Latest snapshot from the shared telemetry sampler.
+
+        Returns an empty dict when the sampler is unavailable or has no fresh
+        snapshot yet; callers then sample psutil directly.
+        """
+        try:
+            from web.system_info import get_telemetry_sampler
+        except ImportError:
+            return {}
+        sampler = get_telemetry_sampler()
+        sampler.start()
+        return sampler.latest() or {}
+
     def _check_system_metrics(self) -> None:
         """Collect system metrics and detect anomalies."""
         try:
@@ -116,8 +132,13 @@ class SystemEventMonitor:
             return
         
         try:
-            # CPU check
-            cpu_percent = psutil.cpu_percent(interval=1)
+            snapshot = self._latest_snapshot()
+
+            # CPU check (the sampler's reading averages over its own interval)
+            if "cpu" in snapshot:
+                cpu_percent = snapshot["cpu"]["usage_percent"]
+            else:
+                cpu_percent = psutil.cpu_percent(interval=1)
             if cpu_percent > self.THRESHOLDS["cpu_percent"]:
                 # Detect spike (>20% jump from last reading)
                 if cpu_percent - self._last_cpu > 20:
@@ -141,8 +162,15 @@ class SystemEventMonitor:
             self._last_cpu = cpu_percent
             
             # Memory check
-            memory = psutil.virtual_memory()
-            mem_percent = memory.percent
+            if "memory" in snapshot:
+                mem_percent = snapshot["memory"]["percent"]
+                mem_used_gb = int(snapshot["memory"]["used_gb"])
+                mem_total_gb = int(snapshot["memory"]["total_gb"])
+            else:
+                memory = psutil.virtual_memory()
+                mem_percent = memory.percent
+                mem_used_gb = memory.used // (1024**3)
+                mem_total_gb = memory.total // (1024**3)
             if mem_percent > self.THRESHOLDS["memory_percent"]:
                 self._record_event(
                     event_type="memory_high",
@@ -150,7 +178,7 @@ class SystemEventMonitor:
                     metric_name="memory_percent",
                     metric_value=mem_percent,
                     threshold=self.THRESHOLDS["memory_percent"],
-                    description=f"Memory usage high: {mem_percent:.1f}% ({memory.used // (1024**3)}GB/{memory.total // (1024**3)}GB)"
+                    description=f"Memory usage high: {mem_percent:.1f}% ({mem_used_gb}GB/{mem_total_gb}GB)"
                 )
             self._last_memory = mem_percent
             
@@ -168,22 +196,28 @@ class SystemEventMonitor:
                 )
             self._last_disk = disk_percent
             
-            # Check for high-memory processes
-            processes = psutil.process_iter(['pid', 'name', 'memory_info'])
-            for proc in processes:
-                try:
-                    mem_mb = proc.memory_info().rss / (1024**2)
-                    if mem_mb > self.THRESHOLDS["process_memory_mb"]:
-                        self._record_event(
-                            event_type="process_memory_high",
-                            severity="medium",
-                            metric_name="process_memory_mb",
-                            metric_value=mem_mb,
-                            threshold=self.THRESHOLDS["process_memory_mb"],
-                            description=f"Process {proc.name()} using {mem_mb:.0f}MB"
-                        )
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    pass
+            # Check for high-memory processes (the snapshot keeps the top
+            # processes by memory, so no second process scan is needed)
+            if "processes" in snapshot:
+                process_memory = [(p["name"], p.get("memory_mb", 0))
+                                  for p in snapshot["processes"]["top_processes"]]
+            else:
+                process_memory = []
+                for proc in psutil.process_iter(['pid', 'name', 'memory_info']):
+                    try:
+                        process_memory.append((proc.name(), proc.memory_info().rss / (1024**2)))
+                    except (psutil.NoSuchProcess, psutil.AccessDenied):
+                        pass
+            for name, mem_mb in process_memory:
+                if mem_mb > self.THRESHOLDS["process_memory_mb"]:
+                    self._record_event(
+                        event_type="process_memory_high",
+                        severity="medium",
+                        metric_name="process_memory_mb",
+                        metric_value=mem_mb,
+                        threshold=self.THRESHOLDS["process_memory_mb"],
+                        description=f"Process {name} using {mem_mb:.0f}MB"
+                    )
                     
         except Exception as e:
             logger.error(f"Error checking system metrics: {e}", exc_info=True)
@@ -0,0 +1,129 @@
+"""
+意图分类索引 - SmartDispatcher 语料相似度的预编译稀疏表示
+
+TASK_CORPUS 只在首次使用时编译一次：
+- vocab: 字符 n-gram -> 列号
+- centroids: (n-gram 数 × 任务数) 的 float32 矩阵，每列为 L2 归一化后的任务质心
+
+输入文本是二值稀疏向量，余弦相似度 = 命中行之和 / sqrt(命中数)，即一次稀疏点积。
+编译结果按 TASK_CORPUS 的哈希缓存为 .npz，语料不变时直接加载。
+"""
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+
+def extract_ngrams(text: str) -> set:
+    """提取字符级 1-gram 与 2-gram（忽略空白）"""
+    text = text.lower().strip()
+    ngrams = {char for char in text if char.strip()}
+    for i in range(len(text) - 1):
+        if text[i:i+2].strip():
+            ngrams.add(text[i:i+2])
+    return ngrams
+
+
+def corpus_hash(corpus: Dict[str, List[str]]) -> str:
+    payload = json.dumps(corpus, ensure_ascii=False, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+
+class IntentIndex:
+    """任务语料的稀疏 n-gram 索引"""
+
+    def __init__(self, tasks: List[str], vocab: Dict[str, int], centroids: np.ndarray):
+        self.tasks = tasks
+        self.vocab = vocab
+        self.centroids = centroids  # shape (len(vocab), len(tasks))
+
+    @classmethod
+    def compile(cls, corpus: Dict[str, List[str]]) -> "IntentIndex":
+        """把语料编译为 L2 归一化的任务质心矩阵"""
+        tasks = list(corpus)
+        vocab: Dict[str, int] = {}
+        examples = []
+        for texts in corpus.values():
+            rows = []
+            for text in texts:
+                rows.append([vocab.setdefault(g, len(vocab)) for g in extract_ngrams(text)])
+            examples.append(rows)
+
+        centroids = np.zeros((len(vocab), len(tasks)), dtype=np.float32)
+        for col, rows in enumerate(examples):
+            for cols in rows:
+                centroids[cols, col] += 1.0
+            if rows:
+                centroids[:, col] /= len(rows)
+        norms = np.linalg.norm(centroids, axis=0)
+        norms[norms == 0] = 1.0
+        centroids /= norms
+        return cls(tasks, vocab, centroids)
+
+    @classmethod
+    def load_or_compile(cls, corpus: Dict[str, List[str]], cache_dir: Optional[str] = None) -> "IntentIndex":
+        """按语料哈希读取缓存；缓存缺失或损坏时重新编译并写回"""
+        if cache_dir is None:
+            return cls.compile(corpus)
+        path = os.path.join(cache_dir, f"intent_index_{corpus_hash(corpus)}.npz")
+        if os.path.exists(path):
+            try:
+                with np.load(path, allow_pickle=False) as data:
+                    tasks = [str(t) for t in data['tasks']]
+                    ngrams = [str(g) for g in data['ngrams']]
+                    centroids = data['centroids'].astype(np.float32)
+                if tasks == list(corpus) and centroids.shape == (len(ngrams), len(tasks)):
+                    return cls(tasks, {g: i for i, g in enumerate(ngrams)}, centroids)
+            except Exception as e:
+                print(f"[IntentIndex] 缓存读取失败，重新编译: {e}")
+        index = cls.compile(corpus)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = path + '.tmp.npz'
+            ngrams = sorted(index.vocab, key=index.vocab.get)
+            np.savez(tmp, tasks=np.array(index.tasks), ngrams=np.array(ngrams), centroids=index.centroids)
+            os.replace(tmp, path)
+        except Exception as e:
+            print(f"[IntentIndex] 缓存写入失败: {e}")
+        return index
+
+    def _columns(self, text: str) -> List[int]:
+        vocab = self.vocab
+        return [vocab[g] for g in extract_ngrams(text) if g in vocab]
+
+    def score(self, text: str) -> Dict[str, float]:
+        """单条输入与各任务质心的余弦相似度"""
+        cols = self._columns(text)
+        if not cols:
+            return {task: 0.0 for task in self.tasks}
+        sims = self.centroids[cols].sum(axis=0) / np.sqrt(len(cols))
+        return dict(zip(self.tasks, sims.tolist()))
+
+    def score_batch(self, texts: Sequence[str]) -> np.ndarray:
+        """批量打分，返回 (len(texts), 任务数) 的相似度矩阵
+
+        输入按 CSR 形式拼接（indices + 每行偏移），一次 gather + reduceat 完成所有点积。
+        """
+        result = np.zeros((len(texts), len(self.tasks)), dtype=np.float32)
+        indices: List[int] = []
+        starts: List[int] = []
+        counts: List[int] = []
+        rows: List[int] = []
+        for i, text in enumerate(texts):
+            cols = self._columns(text)
+            if cols:
+                rows.append(i)
+                starts.append(len(indices))
+                counts.append(len(cols))
+                indices.extend(cols)
+        if rows:
+            sums = np.add.reduceat(self.centroids[indices], starts, axis=0)
+            result[rows] = sums / np.sqrt(np.array(counts, dtype=np.float32))[:, None]
+        return result
+
+    def classify_batch(self, texts: Iterable[str]) -> List[Dict[str, float]]:
+        """批量返回 {task: score}"""
+        texts = list(texts)
+        return [dict(zip(self.tasks, row.tolist())) for row in self.score_batch(texts)]
@@ -1,4 +1,5 @@
 from typing import Dict, Any, Tuple, List, Optional
+import os
 import time
 import re
 
@@ -171,40 +172,34 @@ class SmartDispatcher:
         ],
     }
 
-    # 预计算特征 (字符级 n-gram)
-    _features = None
-    _task_vectors = None
+    # 预编译的语料索引 (字符级 n-gram 稀疏向量 + 归一化任务质心)
+    _intent_index = None
+    # 编译结果缓存目录（按 TASK_CORPUS 哈希命名，语料变化时自动失效）
+    INTENT_CACHE_DIR = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))),
+        "config", "cache")
     
     @classmethod
     def _init_features(cls):
-        """初始化特征向量 (懒加载)"""
-        if cls._features is not None:
+        """初始化语料索引 (懒加载，优先读取缓存)"""
+        if cls._intent_index is not None:
             return
-        
-        all_ngrams = set()
-        for corpus in cls.TASK_CORPUS.values():
-            for text in corpus:
-                ngrams = cls._extract_ngrams(text)
-                all_ngrams.update(ngrams)
-        
-        cls._features = list(all_ngrams)
-        
-        cls._task_vectors = {}
-        for task, corpus in cls.TASK_CORPUS.items():
-            vectors = [cls._text_to_vector(text) for text in corpus]
-            avg_vector = [sum(v[i] for v in vectors) / len(vectors) for i in range(len(cls._features))]
-            cls._task_vectors[task] = avg_vector
+        from app.core.routing.intent_index import IntentIndex
+        cls._intent_index = IntentIndex.load_or_compile(cls.TASK_CORPUS, cls.INTENT_CACHE_DIR)
 
     @classmethod
     def _compute_similarity_scores(cls, user_input: str) -> dict:
-        """计算各任务的相似度分数"""
-        if cls._features is None or cls._task_vectors is None:
+        """计算各任务的相似度分数（一次稀疏点积）"""
+        if cls._intent_index is None:
             cls._init_features()
-        user_vector = cls._text_to_vector(user_input)
-        return {
-            task: cls._cosine_similarity(user_vector, task_vector)
-            for task, task_vector in cls._task_vectors.items()
-        }
+        return cls._intent_index.score(user_input)
+
+    @classmethod
+    def classify_batch(cls, user_inputs: List[str]) -> List[Dict[str, float]]:
+        """批量计算多条输入的任务相似度分数"""
+        if cls._intent_index is None:
+            cls._init_features()
+        return cls._intent_index.classify_batch(user_inputs)
 
     @classmethod
     def _build_routing_list(cls, scores: dict, boosts: dict = None, reasons: dict = None, top_k: int = 6) -> list:
@@ -225,19 +220,6 @@ class SmartDispatcher:
         routing.sort(key=lambda x: x["score"], reverse=True)
         return routing[:top_k]
     
-    @staticmethod
-    def _extract_ngrams(text, n=2):
-        """提取字符级 n-gram"""
-        text = text.lower().strip()
-        ngrams = set()
-        for char in text:
-            if char.strip():
-                ngrams.add(char)
-        for i in range(len(text) - 1):
-            if text[i:i+2].strip():
-                ngrams.add(text[i:i+2])
-        return ngrams
-    
     @classmethod
     def _quick_task_hint(cls, user_input: str) -> str:
         text_lower = user_input.lower()
@@ -253,23 +235,6 @@ class SmartDispatcher:
             return "RESEARCH"
         return "CHAT"
     
-    @classmethod
-    def _text_to_vector(cls, text):
-        if cls._features is None:
-            cls._init_features()
-        ngrams = cls._extract_ngrams(text)
-        vector = [1 if f in ngrams else 0 for f in cls._features]
-        return vector
-    
-    @staticmethod
-    def _cosine_similarity(v1, v2):
-        dot_product = sum(a * b for a, b in zip(v1, v2))
-        norm1 = sum(a * a for a in v1) ** 0.5
-        norm2 = sum(b * b for b in v2) ** 0.5
-        if norm1 == 0 or norm2 == 0:
-            return 0
-        return dot_product / (norm1 * norm2)
-    
     @classmethod
     def _get_dep(cls, name):
         """Helper to get dependency safely"""
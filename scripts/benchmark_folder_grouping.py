@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+相似文件夹分组基准：OrganizeCleanup._build_similarity_groups 的耗时随文件夹数的增长
+
+三类名称:
+  random   小字母表随机串（与 tests/test_organize_cleanup.py 的等价性测试相同）
+  entity   城市 + 字号 + 行业 + 公司后缀（共享“……科技有限公司”一类后缀，多数成组）
+  shuffled 同一批常用词乱序拼接（共享字符多、顺序不同，候选过滤最难排除的情况）
+
+--check N 时另取 N 个文件夹与逐对比较的结果核对。
+
+用法: python scripts/benchmark_folder_grouping.py [--sizes 1000 2000 4000] [--kind shuffled] [--check 500]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from web.organize_cleanup import OrganizeCleanup
+
+CITIES = ["北京", "上海", "广州", "深圳", "杭州", "南京", "成都", "武汉", "西安", "苏州",
+          "天津", "重庆", "长沙", "郑州", "青岛", "厦门", "合肥", "宁波", "无锡", "济南"]
+BRAND_CHARS = "华信达通安恒瑞丰泰盛宏远鑫源博创联科汇德诚嘉美润兴隆中天益新海峰"
+INDUSTRIES = ["科技", "贸易", "咨询", "信息技术", "网络科技", "商贸", "建筑工程", "文化传媒",
+              "电子商务", "生物医药", "教育科技", "物流"]
+COMPANY_SUFFIXES = ["有限公司", "股份有限公司", "有限责任公司", "集团有限公司"]
+WORDS = ["科技", "信息", "网络", "服务", "管理", "咨询", "贸易", "发展", "文化", "传媒",
+         "电子", "商务", "工程", "建设", "投资", "实业", "国际", "物流", "医疗", "教育",
+         "智能", "数据", "软件", "系统", "能源", "环保", "材料", "设备", "制造", "广告",
+         "研究", "开发", "销售", "市场", "财务", "人事", "行政", "法务", "采购", "生产",
+         "质量", "安全", "客户", "产品", "运营", "规划", "设计", "测试", "支持", "培训",
+         "北京", "上海", "华东", "华南", "西部", "总部", "分部", "中心", "部门", "小组"]
+
+
+def random_name(rng):
+    alphabet = rng.choice(["ab", "abcd", "合同协议书", "abcdefgh"])
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 12)))
+
+
+def entity_name(rng):
+    brand = "".join(rng.choice(BRAND_CHARS) for _ in range(rng.randint(2, 3)))
+    return rng.choice(CITIES) + brand + rng.choice(INDUSTRIES) + rng.choice(COMPANY_SUFFIXES)
+
+
+def shuffled_name(rng):
+    return "".join(rng.sample(WORDS, rng.randint(4, 6)))
+
+
+KINDS = {"random": random_name, "entity": entity_name, "shuffled": shuffled_name}
+
+
+def make_folders(kind, count, seed=0):
+    rng = random.Random(seed)
+    make = KINDS[kind]
+    folders = {}
+    attempts = 0
+    while len(folders) < count and attempts < count * 50:
+        attempts += 1
+        folders[rng.choice(["", "客户/", "供应商/"]) + make(rng)] = {}
+    return folders
+
+
+def pairwise_groups(cleanup, folders):
+    """逐对比较的参考实现（与索引前的算法相同）"""
+    names = {f: cleanup._clean_folder_name(f) for f in folders}
+    visited, groups = set(), []
+    for i, a in enumerate(folders):
+        if a in visited:
+            continue
+        group = {a}
+        for b in folders[i + 1:]:
+            if b not in visited and cleanup._are_similar(names[a], names[b]):
+                group.add(b)
+        if len(group) > 1:
+            groups.append(group)
+            visited.update(group)
+    return groups
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 2000, 4000, 8000], help="文件夹数量")
+    parser.add_argument("--kind", choices=sorted(KINDS) + ["all"], default="all", help="名称类型")
+    parser.add_argument("--check", type=int, default=0, metavar="N", help="用 N 个文件夹与逐对比较核对结果")
+    args = parser.parse_args()
+
+    cleanup = OrganizeCleanup(organize_root=tempfile.gettempdir())
+    kinds = sorted(KINDS) if args.kind == "all" else [args.kind]
+
+    print("=" * 72)
+    print(f"{'名称类型':<12}{'文件夹':>8}{'耗时s':>10}{'相似组':>8}{'成组文件夹':>10}{'倍数':>8}")
+    for kind in kinds:
+        previous = None
+        for size in args.sizes:
+            folders = make_folders(kind, size)
+            t0 = time.perf_counter()
+            groups = cleanup._build_similarity_groups(folders)
+            elapsed = time.perf_counter() - t0
+            growth = f"{elapsed / previous:.1f}x" if previous else "-"
+            previous = elapsed
+            print(f"{kind:<12}{len(folders):>8}{elapsed:>10.2f}{len(groups):>8}"
+                  f"{sum(len(g) for g in groups):>10}{growth:>8}")
+        if args.check:
+            folders = list(make_folders(kind, args.check, seed=1))
+            same = cleanup._build_similarity_groups({f: {} for f in folders}) == pairwise_groups(cleanup, folders)
+            print(f"{kind:<12}{len(folders):>8} 与逐对比较{'一致' if same else '不一致'}")
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+记忆检索基准：EnhancedMemoryManager.get_context_string 在大规模记忆库上的延迟
+
+用法: python scripts/benchmark_memory.py [--memories 100000] [--queries 500]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from web.enhanced_memory_manager import EnhancedMemoryManager
+
+WORDS = ("python flask 部署 数据库 前端 React 用户 喜欢 简洁 回答 代码 注释 项目 "
+         "服务器 Windows PowerShell 文档 会议 周报 模型 训练 图片 生成 搜索 笔记 "
+         "日程 提醒 邮件 翻译 英文 中文 表格 Excel 报告 分析 测试 接口 缓存").split()
+CATEGORIES = ["user_preference", "correction", "project_info", "fact", "fact", "fact"]
+
+
+def _vocabulary(size):
+    """常用词 + 长尾词（按 Zipf 分布抽样）"""
+    words = list(WORDS) + [f"term{i}" for i in range(size - len(WORDS))]
+    weights = [1.0 / (rank + 1) for rank in range(len(words))]
+    return words, weights
+
+
+def _sentence(rng, vocab, low, high):
+    words, weights = vocab
+    return " ".join(rng.choices(words, weights, k=rng.randint(low, high)))
+
+
+def _synthetic_memories(n, rng, vocab):
+    base = int(time.time() * 1000)
+    return [{
+        "id": base + i,
+        "content": _sentence(rng, vocab, 4, 14),
+        "category": rng.choice(CATEGORIES),
+        "source": "benchmark",
+        "created_at": f"2026-01-01T00:00:{i % 60:02d}.{i:06d}",
+        "use_count": 0,
+        "metadata": {},
+    } for i in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--memories", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    args = parser.parse_args()
+    rng = random.Random(0)
+    vocab = _vocabulary(args.vocabulary)
+
+    root = tempfile.mkdtemp(prefix="koto_memory_bench_")
+    try:
+        memory_path = os.path.join(root, "memory.json")
+        with open(memory_path, "w", encoding="utf-8") as f:
+            json.dump(_synthetic_memories(args.memories, rng, vocab), f, ensure_ascii=False)
+        profile_path = os.path.join(root, "profile.json")
+
+        t0 = time.perf_counter()
+        mgr = EnhancedMemoryManager(memory_path, profile_path)
+        cold = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        mgr = EnhancedMemoryManager(memory_path, profile_path)
+        warm = time.perf_counter() - t0
+
+        queries = [_sentence(rng, vocab, 2, 6) for _ in range(args.queries)]
+        passes = []
+        for _ in range(2):  # 第一轮包含词项倒排表首次转换为数组的开销
+            timings = []
+            for q in queries:
+                t0 = time.perf_counter()
+                mgr.get_context_string(q)
+                timings.append(time.perf_counter() - t0)
+            timings.sort()
+            passes.append(timings)
+        mgr.flush()
+
+        print("=" * 60)
+        print(f"记忆数: {args.memories}, 词表: {args.vocabulary}, 查询数: {args.queries}")
+        print(f"加载     首次(计算嵌入) {cold:6.2f} s   复用嵌入缓存 {warm:6.2f} s")
+        for label, timings in zip(("首轮", "热身后"), passes):
+            print(f"get_context_string {label}  p50 {timings[len(timings) // 2] * 1e3:6.3f} ms   "
+                  f"p95 {timings[int(len(timings) * 0.95)] * 1e3:6.3f} ms")
+        print("=" * 60)
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
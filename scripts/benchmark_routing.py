@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+路由相似度打分基准：旧版稠密列表余弦 vs 预编译稀疏索引（单条与批量）
+
+用法: python scripts/benchmark_routing.py [--iterations 200]
+"""
+import argparse
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from app.core.routing.intent_index import IntentIndex, extract_ngrams
+from app.core.routing.smart_dispatcher import SmartDispatcher
+
+QUERIES = [
+    "帮我画一张赛博朋克风格的城市夜景",
+    "写一个python函数，读取csv并统计每列平均值",
+    "今天上海天气怎么样，要带伞吗",
+    "把这份会议纪要整理成word文档",
+    "现在几点了",
+    "帮我分析一下这篇论文的研究方法",
+    "what time is it in tokyo",
+    "打开微信",
+]
+
+
+class LegacyScorer:
+    """重构前 SmartDispatcher 的实现（特征列表 + 纯 Python 余弦）"""
+
+    def __init__(self, corpus):
+        self.features = list({g for texts in corpus.values() for t in texts for g in extract_ngrams(t)})
+        self.task_vectors = {}
+        for task, texts in corpus.items():
+            vectors = [self.vector(t) for t in texts]
+            self.task_vectors[task] = [sum(v[i] for v in vectors) / len(vectors)
+                                       for i in range(len(self.features))]
+
+    def vector(self, text):
+        grams = extract_ngrams(text)
+        return [1 if f in grams else 0 for f in self.features]
+
+    def score(self, text):
+        user = self.vector(text)
+        scores = {}
+        for task, vec in self.task_vectors.items():
+            dot = sum(a * b for a, b in zip(user, vec))
+            n1 = sum(a * a for a in user) ** 0.5
+            n2 = sum(b * b for b in vec) ** 0.5
+            scores[task] = 0 if n1 == 0 or n2 == 0 else dot / (n1 * n2)
+        return scores
+
+
+def _per_call_us(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for q in QUERIES:
+            fn(q)
+    return (time.perf_counter() - start) / (iterations * len(QUERIES)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+    corpus = SmartDispatcher.TASK_CORPUS
+
+    t0 = time.perf_counter()
+    legacy = LegacyScorer(corpus)
+    legacy_init = (time.perf_counter() - t0) * 1e3
+    t0 = time.perf_counter()
+    index = IntentIndex.compile(corpus)
+    index_init = (time.perf_counter() - t0) * 1e3
+
+    legacy_us = _per_call_us(legacy.score, max(1, args.iterations // 20))
+    index_us = _per_call_us(index.score, args.iterations)
+
+    batch = QUERIES * 128
+    start = time.perf_counter()
+    for _ in range(10):
+        index.score_batch(batch)
+    batch_us = (time.perf_counter() - start) / (10 * len(batch)) * 1e6
+
+    print("=" * 60)
+    print(f"语料: {len(corpus)} 个任务, {len(index.vocab)} 个 n-gram 特征")
+    print(f"初始化   旧版 {legacy_init:8.2f} ms   稀疏索引 {index_init:8.2f} ms")
+    print(f"单条打分 旧版 {legacy_us:8.1f} µs   稀疏索引 {index_us:8.1f} µs   ({legacy_us / index_us:.0f}x)")
+    print(f"批量打分 稀疏索引 {batch_us:8.1f} µs/条 (batch={len(batch)})")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
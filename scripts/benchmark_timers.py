@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+定时器基准：每个提醒一个 threading.Timer（旧版） vs 共享定时服务（单线程最小堆 + SQLite 持久化）
+
+统计线程数峰值、调度/取消耗时与触发延迟（实际触发时间 - 预定时间）。
+
+用法: python scripts/benchmark_timers.py [--jobs 2000] [--spread 2.0]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from web.timer_service import TimerService
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000
+
+
+class Recorder:
+    def __init__(self, expected):
+        self.lateness = []
+        self.expected = expected
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+
+    def record(self, fire_at):
+        with self.lock:
+            self.lateness.append(time.time() - fire_at)
+            if len(self.lateness) == self.expected:
+                self.done.set()
+
+
+def run_legacy(jobs, spread):
+    start = time.time()
+    fire_times = [start + 0.5 + spread * i / jobs for i in range(jobs)]
+    recorder = Recorder(jobs - jobs // 4)
+    baseline = threading.active_count()
+
+    t0 = time.perf_counter()
+    timers = []
+    for fire_at in fire_times:
+        timer = threading.Timer(fire_at - time.time(), recorder.record, args=(fire_at,))
+        timer.daemon = True
+        timer.start()
+        timers.append(timer)
+    schedule_ms = (time.perf_counter() - t0) * 1000
+    peak_threads = threading.active_count() - baseline
+
+    t0 = time.perf_counter()
+    for timer in timers[::4]:
+        timer.cancel()
+    cancel_ms = (time.perf_counter() - t0) * 1000
+
+    recorder.done.wait(spread + 30)
+    return schedule_ms, cancel_ms, peak_threads, recorder.lateness
+
+
+def run_service(jobs, spread, db_path):
+    service = TimerService(db_path)
+    start = time.time()
+    fire_times = [start + 0.5 + spread * i / jobs for i in range(jobs)]
+    recorder = Recorder(jobs - jobs // 4)
+    baseline = threading.active_count()
+    service.register_handler("bench", lambda job: recorder.record(job.fire_at))
+
+    t0 = time.perf_counter()
+    for i, fire_at in enumerate(fire_times):
+        service.schedule(f"job{i}", "bench", fire_at, payload={"i": i})
+    schedule_ms = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    for i in range(0, jobs, 4):
+        service.cancel(f"job{i}")
+    cancel_ms = (time.perf_counter() - t0) * 1000
+
+    recorder.done.wait(spread + 30)
+    # 后台写线程（SQLite）、调度线程与处理线程池
+    peak_threads = threading.active_count() - baseline
+    service.stop()
+    return schedule_ms, cancel_ms, peak_threads, recorder.lateness
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=2000, help="提醒数量")
+    parser.add_argument("--spread", type=float, default=2.0, help="触发时间分布范围（秒）")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="koto_bench_timers_")
+    try:
+        results = {
+            "threading.Timer": run_legacy(args.jobs, args.spread),
+            "TimerService": run_service(args.jobs, args.spread, os.path.join(root, "timer_jobs.db")),
+        }
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print("=" * 72)
+    print(f"{args.jobs} 个作业，{args.spread:.1f}s 内陆续到期，取消其中 1/4")
+    print(f"{'实现':<16}{'调度ms':>9}{'取消ms':>9}{'线程数':>8}{'延迟p50':>10}{'p99':>9}{'max':>9}")
+    for name, (schedule_ms, cancel_ms, threads, lateness) in results.items():
+        print(f"{name:<16}{schedule_ms:>9.1f}{cancel_ms:>9.1f}{threads:>8}"
+              f"{percentile(lateness, 0.5):>9.2f}ms{percentile(lateness, 0.99):>7.2f}ms"
+              f"{max(lateness) * 1000:>7.2f}ms")
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
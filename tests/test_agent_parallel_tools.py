@@ -0,0 +1,104 @@
+"""测试 UnifiedAgent 并发工具执行：并行安全工具并发运行、步骤顺序确定、超时与副作用工具串行。"""
+import sys
+import os
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.agent.unified_agent import UnifiedAgent
+from app.core.agent.tool_registry import ToolRegistry
+from app.core.agent.types import AgentStepType
+from app.core.llm.base import LLMProvider
+
+
+class ScriptedLLM(LLMProvider):
+    """第一轮返回给定的工具调用，第二轮给出答案"""
+
+    def __init__(self, tool_calls):
+        self.tool_calls = tool_calls
+        self.calls = 0
+        self.seen_tools = []
+
+    def generate_content(self, prompt, model=None, system_instruction=None, tools=None, stream=False, **kwargs):
+        self.calls += 1
+        self.seen_tools.append(tools)
+        if self.calls == 1:
+            return {"content": "", "tool_calls": self.tool_calls}
+        return {"content": "done", "tool_calls": []}
+
+    def get_token_count(self, prompt, model):
+        return 0
+
+
+def _sleeper(label, delay, log):
+    def tool():
+        log.append(("start", label))
+        time.sleep(delay)
+        log.append(("end", label))
+        return label
+    return tool
+
+
+def _run(agent, text="go"):
+    return [s for s in agent.run(text) if s.step_type in (AgentStepType.ACTION, AgentStepType.OBSERVATION)]
+
+
+def test_parallel_safe_tools_run_concurrently_in_order():
+    log = []
+    registry = ToolRegistry()
+    for name, delay in (("slow", 0.3), ("medium", 0.2), ("fast", 0.1)):
+        registry.register_tool(name, _sleeper(name, delay, log), parameters={}, parallel_safe=True)
+    llm = ScriptedLLM([{"name": "slow", "args": {}}, {"name": "medium", "args": {}}, {"name": "fast", "args": {}}])
+    agent = UnifiedAgent(llm, tool_registry=registry)
+
+    start = time.monotonic()
+    steps = _run(agent)
+    elapsed = time.monotonic() - start
+
+    assert elapsed < 0.5, elapsed  # 串行需要 0.6s
+    assert [s.step_type for s in steps] == [AgentStepType.ACTION, AgentStepType.OBSERVATION] * 3
+    assert [s.observation for s in steps if s.observation] == ["slow", "medium", "fast"]
+    # 工具定义列表在各步之间复用
+    assert llm.seen_tools[0] is llm.seen_tools[1]
+
+
+def test_side_effect_tools_are_serialised_and_timeouts_reported():
+    log = []
+    registry = ToolRegistry()
+    registry.register_tool("read", _sleeper("read", 0.05, log), parameters={}, parallel_safe=True)
+    registry.register_tool("write", _sleeper("write", 0.05, log), parameters={})
+    registry.register_tool("hang", _sleeper("hang", 1.0, log), parameters={}, parallel_safe=True, timeout=0.1)
+    llm = ScriptedLLM([{"name": "read", "args": {}}, {"name": "write", "args": {}},
+                       {"name": "read", "args": {}}, {"name": "hang", "args": {}}])
+    agent = UnifiedAgent(llm, tool_registry=registry)
+
+    observations = [s.observation for s in _run(agent) if s.observation]
+    assert observations[:3] == ["read", "write", "read"]
+    assert "timed out" in observations[3]
+
+    # write 在前一个 read 结束后才开始，并在下一个 read 开始前结束
+    write_start = log.index(("start", "write"))
+    assert log.index(("end", "read")) < write_start
+    assert log.index(("end", "write")) < log.index(("start", "read"), write_start)
+
+
+def test_side_effect_tools_run_inline_and_queue_time_is_not_timed():
+    log = []
+    registry = ToolRegistry()
+    threads = []
+    registry.register_tool("install", lambda: threads.append(threading.current_thread()) or "installed",
+                           parameters={})
+    for i in range(UnifiedAgent.MAX_TOOL_WORKERS):
+        registry.register_tool(f"busy{i}", _sleeper(f"busy{i}", 0.3, log), parameters={}, parallel_safe=True)
+    # 排在已占满的线程池之后，排队时间不计入它自己的超时
+    registry.register_tool("quick", _sleeper("quick", 0.05, log), parameters={}, parallel_safe=True, timeout=0.2)
+    calls = [{"name": "install", "args": {}}]
+    calls += [{"name": f"busy{i}", "args": {}} for i in range(UnifiedAgent.MAX_TOOL_WORKERS)]
+    calls.append({"name": "quick", "args": {}})
+    agent = UnifiedAgent(ScriptedLLM(calls), tool_registry=registry)
+
+    observations = [s.observation for s in _run(agent) if s.observation]
+    assert threads == [threading.current_thread()]
+    assert observations[0] == "installed"
+    assert observations[-1] == "quick"
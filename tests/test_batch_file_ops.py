@@ -0,0 +1,98 @@
+"""测试批量文件任务引擎：工作池并行处理、进度事件合并、检查点续跑。"""
+import sys
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web.batch_file_ops import BatchFileOpsManager, JobEventChannel
+
+
+def _make_inputs(root, n):
+    input_dir = os.path.join(root, "in")
+    os.makedirs(os.path.join(input_dir, "sub"))
+    for i in range(n):
+        folder = input_dir if i % 2 else os.path.join(input_dir, "sub")
+        with open(os.path.join(folder, f"f{i:03d}.txt"), "w", encoding="utf-8") as f:
+            f.write(f"line {i}   \nsecond  \n")
+    return input_dir
+
+
+def _run(manager, job_id):
+    manager.start_job(job_id)
+    return list(manager.iter_job_events(job_id))
+
+
+def test_parallel_job_processes_every_file_and_coalesces_progress():
+    root = tempfile.mkdtemp(prefix="koto_batch_")
+    try:
+        input_dir = _make_inputs(root, 40)
+        manager = BatchFileOpsManager(checkpoint_dir=os.path.join(root, "jobs"))
+        job = manager.create_job("clean", "clean_normalize", input_dir, os.path.join(root, "out"),
+                                 {"parallelism": 4})
+        events = _run(manager, job.job_id)
+
+        final = events[-1]
+        assert final["type"] == "final"
+        assert final["job"]["processed_items"] == 40
+        assert final["job"]["status"] == "completed"
+        with open(os.path.join(root, "out", "sub", "f000.txt"), encoding="utf-8") as f:
+            assert f.read() == "line 0\nsecond"
+        assert len(events) < 40
+        assert [e for e in events if e.get("status") == "processing"][-1]["current"] == 40
+        # 完成后检查点被删除
+        assert os.listdir(os.path.join(root, "jobs")) == []
+
+        # CPU 密集操作走进程池（不支持的转换逐个返回错误）
+        job = manager.create_job("convert", "convert", input_dir, os.path.join(root, "out2"),
+                                 {"target_ext": ".pdf", "parallelism": 2})
+        final = _run(manager, job.job_id)[-1]
+        assert final["job"]["failed_items"] == 40
+        assert "不支持" in manager.jobs[job.job_id].results[0]["error"]
+    finally:
+        shutil.rmtree(root)
+
+
+def test_event_channel_keeps_only_latest_unread_progress():
+    channel = JobEventChannel()
+    channel.put({"type": "progress", "current": 0, "status": "start"})
+    for i in range(1, 100):
+        channel.put({"type": "progress", "current": i})
+    channel.put({"type": "final"})
+    assert channel.qsize() == 2
+    assert channel.get()["current"] == 99
+    assert channel.get()["type"] == "final"
+
+
+def test_interrupted_job_resumes_from_checkpoint():
+    root = tempfile.mkdtemp(prefix="koto_batch_")
+    try:
+        input_dir = _make_inputs(root, 10)
+        checkpoints = os.path.join(root, "jobs")
+        manager = BatchFileOpsManager(checkpoint_dir=checkpoints)
+        job = manager.create_job("rename", "rename", input_dir, os.path.join(root, "out"),
+                                 {"prefix": "p_", "replace": ("f", "g")})
+
+        # 模拟重启前已处理 3 个文件并写入检查点
+        files = manager._collect_files(Path(input_dir), None)
+        done = [str(p) for p in files[:3]]
+        job.status = "running"
+        job.processed_items = 3
+        job.results = [{"source": s, "success": True, "output": "x"} for s in done]
+        manager._checkpoint(job, force=True)
+
+        restarted = BatchFileOpsManager(checkpoint_dir=checkpoints)
+        assert restarted.get_job(job.job_id)["status"] == "interrupted"
+        assert restarted.jobs[job.job_id].options["replace"] == ("f", "g")
+        assert restarted.resume_job(job.job_id)
+        final = list(restarted.iter_job_events(job.job_id))[-1]
+
+        assert final["job"]["processed_items"] == 10
+        outputs = [os.path.basename(r["output"]) for r in restarted.jobs[job.job_id].results[3:]]
+        assert len(outputs) == 7 and all(name.startswith("p_g") for name in outputs)
+        assert not restarted.resume_job(job.job_id)
+        assert os.listdir(checkpoints) == []
+    finally:
+        shutil.rmtree(root)
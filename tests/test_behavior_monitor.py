@@ -0,0 +1,206 @@
+"""测试行为事件异步写入管道：批量写入与聚合统计、缓冲区满时不丢事件、多进程共享数据库时事件ID不冲突；按小时/天汇总表与原始事件统计一致。"""
+import sys
+import os
+import shutil
+import tempfile
+import random
+import sqlite3
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web.behavior_monitor import BehaviorMonitor, EventPipeline
+from web.sqlite_pool import get_database
+
+
+def test_concurrent_events_are_batched_with_aggregates():
+    root = tempfile.mkdtemp(prefix="koto_behavior_")
+    try:
+        monitor = BehaviorMonitor(os.path.join(root, "behavior.db"))
+        ids = []
+
+        def produce(k):
+            for i in range(250):
+                event_type = BehaviorMonitor.EVENT_FILE_OPEN if i % 2 else BehaviorMonitor.EVENT_FILE_EDIT
+                ids.append(monitor.log_event(event_type, file_path=f"f{i % 5}.txt", duration_ms=10))
+
+        threads = [threading.Thread(target=produce, args=(k,)) for k in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(set(ids)) == 1000
+        stats = monitor.get_statistics()         # 读取前写完缓冲区
+        assert stats["total_events"] == 1000
+        assert stats["total_files_tracked"] == 5
+        files = {f["file_path"]: f for f in monitor.get_frequently_used_files()}
+        assert sum(f["open_count"] for f in files.values()) == 500
+        assert sum(f["edit_count"] for f in files.values()) == 500
+        assert sum(f["total_time_spent_ms"] for f in files.values()) == 10000
+        assert all(f["last_opened"] for f in files.values())
+        operations = {p["operation"]: p["frequency"] for p in monitor.get_work_patterns()["operation_types"]}
+        assert operations == {"file_open": 500, "file_edit": 500}
+        assert monitor._pipeline.stats["batches"] < 1000
+    finally:
+        shutil.rmtree(root)
+
+
+def test_full_buffer_applies_backpressure_without_losing_events():
+    root = tempfile.mkdtemp(prefix="koto_behavior_")
+    try:
+        monitor = BehaviorMonitor(os.path.join(root, "behavior.db"))
+        pipeline = monitor._pipeline = EventPipeline(monitor, capacity=4)
+        pipeline.PUT_TIMEOUT = 0
+        for i in range(50):
+            monitor.log_event(BehaviorMonitor.EVENT_FILE_CREATE, file_path="new.txt")
+        assert pipeline.stats["inline_flushes"] > 0
+
+        assert monitor.flush()
+        conn = get_database(monitor.db_path).connect()
+        assert conn.execute("SELECT COUNT(*) FROM event_log").fetchone()[0] == 50
+        # 非打开/编辑事件只建立文件统计行
+        assert conn.execute("SELECT open_count, edit_count FROM file_usage_stats").fetchall() == [(0, 0)]
+        conn.close()
+    finally:
+        shutil.rmtree(root)
+
+
+def test_separate_pipelines_reserve_disjoint_ids():
+    root = tempfile.mkdtemp(prefix="koto_behavior_")
+    try:
+        monitor = BehaviorMonitor(os.path.join(root, "behavior.db"))
+        # 模拟旧版本已自增写入的事件
+        get_database(monitor.db_path).write(lambda conn: conn.execute(
+            "INSERT INTO event_log (event_type, timestamp) VALUES ('legacy', '2024-01-01T00:00:00')"), wait=True)
+
+        first, second = EventPipeline(monitor), EventPipeline(monitor)   # 相当于两个进程
+        ids = []
+        for i in range(EventPipeline.ID_BLOCK + 5):
+            for pipeline in (first, second):
+                ids.append(pipeline.put("file_open", None, None, "{}", "2026-01-01T09:00:00", None))
+        assert first.flush() and second.flush()
+
+        assert min(ids) == 2 and len(set(ids)) == len(ids)
+        conn = monitor._connect()
+        assert conn.execute("SELECT COUNT(*) FROM event_log").fetchone()[0] == len(ids) + 1
+        conn.close()
+    finally:
+        shutil.rmtree(root)
+
+
+def test_rollups_match_raw_event_scans():
+    root = tempfile.mkdtemp(prefix="koto_behavior_")
+    try:
+        db_path = os.path.join(root, "behavior.db")
+        rng = random.Random(3)
+        now = datetime.now()
+        timestamps = [(now - timedelta(minutes=rng.randrange(0, 60 * 24 * 12))).isoformat() for _ in range(600)]
+
+        # 已有历史事件（汇总表创建前写入）在首次打开时回填
+        conn = get_database(db_path).connect()
+        conn.execute("CREATE TABLE event_log (id INTEGER PRIMARY KEY AUTOINCREMENT, event_type TEXT NOT NULL, "
+                     "file_path TEXT, session_id TEXT, event_data TEXT, timestamp TEXT NOT NULL, duration_ms INTEGER)")
+        conn.executemany("INSERT INTO event_log (event_type, file_path, timestamp) VALUES ('file_open', 'a.txt', ?)",
+                         [(ts,) for ts in timestamps[:300]])
+        conn.commit()
+        conn.close()
+
+        monitor = BehaviorMonitor(db_path)
+        for ts in timestamps[300:]:
+            event_type = rng.choice([BehaviorMonitor.EVENT_FILE_OPEN, BehaviorMonitor.EVENT_FILE_EDIT])
+            monitor._pipeline.put(event_type, rng.choice(["a.txt", "b.txt"]), None, "{}", ts, None)
+
+        conn = monitor._connect()
+        cursor = conn.cursor()
+        for _ in range(30):
+            start = now - timedelta(minutes=rng.randrange(0, 60 * 24 * 14))
+            end = start + timedelta(minutes=rng.randrange(1, 60 * 24 * 5)) if rng.random() < 0.7 else None
+            expected = Counter(ts[:10] for ts in timestamps if ts >= start.isoformat()
+                               and (end is None or ts < end.isoformat()))
+            by_day = Counter()
+            for (day, _), count in monitor._count_events(cursor, start, end).items():
+                by_day[day] += count
+            assert by_day == expected
+        conn.close()
+
+        week_ago = (now - timedelta(days=7)).isoformat()
+        assert sum(d["event_count"] for d in monitor.get_daily_activity(7)) == \
+            sum(ts >= week_ago for ts in timestamps)
+        stats = monitor.get_statistics()
+        assert stats["total_events"] == 600
+        assert stats["last_7_days_events"] == sum(ts >= week_ago for ts in timestamps)
+        files = monitor.get_file_activity(now - timedelta(days=30))
+        assert sum(f["open_count"] + f["edit_count"] for f in files) == 600
+    finally:
+        shutil.rmtree(root)
+
+
+def test_failed_batches_are_requeued_and_spilled_not_dropped(monkeypatch):
+    root = tempfile.mkdtemp(prefix="koto_behavior_")
+    try:
+        monitor = BehaviorMonitor(os.path.join(root, "behavior.db"))
+        pipeline = monitor._pipeline
+        monkeypatch.setattr(EventPipeline, "MAX_RETRIES", 1)
+        original = monitor._update_rollups
+
+        def locked(*args):
+            raise sqlite3.OperationalError("database is locked")
+
+        monitor._update_rollups = locked
+        for i in range(20):
+            monitor.log_event(BehaviorMonitor.EVENT_FILE_OPEN, file_path=f"f{i}.txt")
+        assert not pipeline.flush(timeout=2)
+        assert pipeline.stats["requeued"] >= 20
+
+        # 退出时仍不可写：落盘，下次启动重新入队并写入
+        assert pipeline.spill() == 20
+        monitor._update_rollups = original
+        restored = EventPipeline(monitor)
+        assert restored.flush(timeout=5)
+        assert not os.path.exists(restored.spill_path)
+        conn = get_database(monitor.db_path).connect()
+        assert conn.execute("SELECT COUNT(*) FROM event_log").fetchone()[0] == 20
+        conn.close()
+    finally:
+        shutil.rmtree(root)
+
+
+def test_poison_event_is_dead_lettered_and_later_events_are_written(monkeypatch):
+    root = tempfile.mkdtemp(prefix="koto_behavior_")
+    try:
+        monitor = BehaviorMonitor(os.path.join(root, "behavior.db"))
+        pipeline = monitor._pipeline
+        monkeypatch.setattr(EventPipeline, "MAX_RETRIES", 1)
+        monkeypatch.setattr(EventPipeline, "DEAD_LETTER_AFTER", 3)
+        original = monitor._update_rollups
+
+        def rollups(cursor, rows):
+            if any(row[2] == "poison.txt" for row in rows):
+                raise ValueError("bad event")
+            original(cursor, rows)
+
+        monitor._update_rollups = rollups
+        monitor.log_event(BehaviorMonitor.EVENT_FILE_OPEN, file_path="poison.txt")
+        for i in range(9):
+            monitor.log_event(BehaviorMonitor.EVENT_FILE_OPEN, file_path=f"f{i}.txt")
+        attempts = 0
+        while not pipeline.flush(timeout=2):
+            attempts += 1
+            assert attempts < EventPipeline.DEAD_LETTER_AFTER
+        for i in range(5):
+            monitor.log_event(BehaviorMonitor.EVENT_FILE_OPEN, file_path=f"later{i}.txt")
+        assert pipeline.flush(timeout=5)
+
+        conn = get_database(monitor.db_path).connect()
+        paths = {row[0] for row in conn.execute("SELECT file_path FROM event_log")}
+        conn.close()
+        assert paths == {f"f{i}.txt" for i in range(9)} | {f"later{i}.txt" for i in range(5)}
+        with open(pipeline.dead_letter_path, encoding="utf-8") as f:
+            dead = [line for line in f if line.strip()]
+        assert len(dead) == 1 and "poison.txt" in dead[0]
+        assert pipeline.stats["dead_lettered"] == 1 and not pipeline._buffer
+    finally:
+        shutil.rmtree(root)
@@ -0,0 +1,63 @@
+"""测试 ChatStore：追加写入、尾部读取、替换最后一条、旧格式迁移与缓存一致性。"""
+import sys
+import os
+import json
+import tempfile
+import shutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web.chat_store import ChatStore, read_tail
+
+
+def test_append_tail_and_replace_last():
+    root = tempfile.mkdtemp(prefix="koto_chat_")
+    try:
+        store = ChatStore(root)
+        store.create("demo.json")
+        for i in range(10):
+            store.append("demo.json", {"role": "user", "parts": [f"q{i}"]},
+                         {"role": "model", "parts": ["⏳"]})
+            store.replace_last("demo.json", {"role": "model", "parts": [f"a{i}"]})
+
+        path = os.path.join(root, "demo.jsonl")
+        assert [m["parts"][0] for m in read_tail(path, 3)] == ["a8", "q9", "a9"]
+        assert [m["parts"][0] for m in store.tail("demo.json", 2)] == ["q9", "a9"]
+
+        full = store.load("demo.json")
+        assert len(full) == 20
+        assert full[1]["parts"] == ["a0"]
+
+        # 缓存命中后继续追加，缓存与磁盘保持一致
+        store.append("demo.json", {"role": "user", "parts": ["q10"]})
+        assert store.load("demo.json")[-1]["parts"] == ["q10"]
+        assert len(ChatStore(root).load("demo.json")) == 21
+
+        # 其他写入者修改文件后缓存失效
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"role": "model", "parts": ["external"]}) + "\n")
+        assert store.tail("demo.json", 1)[0]["parts"] == ["external"]
+
+        assert store.list_sessions() == ["demo.json"]
+        assert store.delete("demo.json")
+        assert store.load("demo.json") == []
+    finally:
+        shutil.rmtree(root)
+
+
+def test_legacy_json_is_migrated_once():
+    root = tempfile.mkdtemp(prefix="koto_chat_")
+    try:
+        with open(os.path.join(root, "old.json"), "w", encoding="utf-8") as f:
+            json.dump([{"role": "user", "parts": ["你好"]}, {"role": "model", "parts": ["您好"]}], f)
+        with open(os.path.join(root, "agent.state.json"), "w", encoding="utf-8") as f:
+            json.dump({"cpu": {}}, f)
+
+        store = ChatStore(root)
+        assert store.load("old.json")[0]["parts"] == ["你好"]
+        assert os.path.exists(os.path.join(root, "old.json.bak"))
+        assert os.path.exists(os.path.join(root, "agent.state.json"))
+        assert store.migrate_legacy() == 0
+        assert store.list_sessions() == ["old.json"]
+    finally:
+        shutil.rmtree(root)
@@ -0,0 +1,82 @@
+"""测试 ConceptExtractor：批量分析与逐个分析结果一致、IDF 缓存随写入增量更新、重复分析不虚增文档频率。"""
+import sys
+import os
+import sqlite3
+import tempfile
+import shutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web.concept_extractor import ConceptExtractor, ConceptStats
+
+TEXTS = [
+    "machine learning models need training data and careful evaluation",
+    "python scripts load training data with pandas and numpy",
+    "web frontend frameworks render components in the browser",
+    "deep learning models are machine learning models with many layers",
+]
+
+
+def _write_files(root):
+    paths = []
+    for i, text in enumerate(TEXTS):
+        path = os.path.join(root, f"doc{i}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        paths.append(path)
+    return paths
+
+
+def _db_stats(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = dict(conn.execute("SELECT concept, document_frequency FROM concept_stats"))
+    total = conn.execute("SELECT COUNT(*) FROM file_metadata").fetchone()[0]
+    conn.close()
+    return rows, total
+
+
+def test_batch_matches_sequential_and_cache_tracks_db():
+    root = tempfile.mkdtemp(prefix="koto_concepts_")
+    try:
+        paths = _write_files(root)
+        seq = ConceptExtractor(db_path=os.path.join(root, "seq.db"))
+        sequential = [seq.analyze_file(p) for p in paths]
+        batch = ConceptExtractor(db_path=os.path.join(root, "batch.db"))
+        batched = batch.analyze_files(paths + [paths[0]], workers=1)
+
+        assert len(batched) == len(paths) + 1
+        for a, b in zip(sequential, batched):
+            assert [(c["concept"], round(c["score"], 9)) for c in a["concepts"]] == \
+                   [(c["concept"], round(c["score"], 9)) for c in b["concepts"]]
+        assert _db_stats(seq.db_path) == _db_stats(batch.db_path)
+
+        # 内容未变时直接返回已存储的概念
+        assert all(r["cached"] for r in batch.analyze_files(paths, workers=1))
+
+        # 缓存与重新从数据库加载的结果一致
+        words = ["learning", "training", "browser", "unknown"]
+        cached = batch.stats.idf(words)
+        fresh = ConceptStats(batch.db_path).idf(words)
+        assert cached == fresh
+    finally:
+        shutil.rmtree(root)
+
+
+def test_reanalysis_does_not_inflate_document_frequency():
+    root = tempfile.mkdtemp(prefix="koto_concepts_")
+    try:
+        path = os.path.join(root, "a.txt")
+        extractor = ConceptExtractor(db_path=os.path.join(root, "c.db"))
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("alpha beta gamma")
+        extractor.analyze_file(path)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("alpha beta delta")
+        extractor.analyze_file(path)
+
+        df, total = _db_stats(extractor.db_path)
+        assert total == 1
+        assert df["alpha"] == 1 and df["delta"] == 1 and df["gamma"] == 0
+        assert extractor.stats.idf(["alpha"]) == ConceptStats(extractor.db_path).idf(["alpha"])
+    finally:
+        shutil.rmtree(root)
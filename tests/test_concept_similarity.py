@@ -0,0 +1,108 @@
+"""测试 ConceptSimilarityIndex 的分块近邻计算，以及 KnowledgeGraph 增量关联与全量重建一致。"""
+import sys
+import os
+import random
+import sqlite3
+import tempfile
+import shutil
+import math
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web.concept_similarity import ConceptSimilarityIndex
+from web.knowledge_graph import KnowledgeGraph
+
+
+def _random_rows(n_files=60, n_concepts=40, seed=7):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n_files):
+        for c in rng.sample(range(n_concepts), rng.randint(1, 8)):
+            rows.append((f"/docs/f{i}.md", f"c{c}", rng.uniform(0.05, 1.0)))
+    return rows
+
+
+def _brute_force(rows, k):
+    vecs = {}
+    for f, c, w in rows:
+        vecs.setdefault(f, {})[c] = w
+    def cos(a, b):
+        dot = sum(a[c] * b[c] for c in set(a) & set(b))
+        return dot / (math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values())))
+    result = {}
+    for f, a in vecs.items():
+        sims = sorted(((cos(a, b), g) for g, b in vecs.items() if g != f), reverse=True)
+        result[f] = [(g, s) for s, g in sims[:k] if s > 0]
+    return result
+
+
+def test_blocked_top_k_matches_brute_force():
+    rows = _random_rows()
+    index = ConceptSimilarityIndex.from_rows(rows)
+    # 强制切成很多小块
+    index.MAX_PAIRS_PER_BLOCK = 50
+    expected = _brute_force(rows, 5)
+    got = index.top_k(range(len(index.files)), k=5)
+    for r, neighbours in got.items():
+        exp = expected[index.files[r]]
+        assert [round(s, 5) for _, s in neighbours] == [round(s, 5) for _, s in exp]
+
+
+class _HybridIndex(ConceptSimilarityIndex):
+    DENSE_CONCEPTS = 8
+    DENSE_MIN_DF = 5
+
+
+def test_dense_frequent_concepts_match_sparse():
+    rows = _random_rows()
+    sparse = ConceptSimilarityIndex.from_rows(rows)
+    hybrid = _HybridIndex.from_rows(rows)
+    assert sparse.dense is None and hybrid.dense.shape == (len(hybrid.files), 8)
+    rows_all = range(len(sparse.files))
+    for (_, a), (_, b) in zip(sparse.similarities(rows_all), hybrid.similarities(rows_all)):
+        assert abs(a - b).max() < 1e-5
+
+
+def _setup(root, rows):
+    concepts_db = os.path.join(root, "concepts.db")
+    kg = KnowledgeGraph(db_path=os.path.join(root, "kg.db"), concepts_db_path=concepts_db)
+    conn = sqlite3.connect(concepts_db)
+    conn.execute("DELETE FROM file_concepts")
+    conn.executemany("INSERT INTO file_concepts (file_path, concept, tf_idf_score, extraction_time) "
+                     "VALUES (?, ?, ?, 'now')", rows)
+    conn.commit()
+    conn.close()
+    for f in sorted({r[0] for r in rows}):
+        kg.add_file_node(f)
+    return kg
+
+
+def _relations(kg):
+    conn = sqlite3.connect(kg.db_path)
+    edges = conn.execute("SELECT source_id, target_id, round(weight, 5) FROM edges "
+                         "WHERE edge_type = 'relates_to' ORDER BY 1, 2").fetchall()
+    conn.close()
+    return edges
+
+
+def test_incremental_relations_match_full_rebuild():
+    root = tempfile.mkdtemp(prefix="koto_kg_")
+    try:
+        rows = _random_rows()
+        kg = _setup(root, rows)
+        kg._build_file_relations()
+        assert _relations(kg)
+
+        # 修改两个文件的概念
+        changed = ["/docs/f3.md", "/docs/f10.md"]
+        new_rows = [r for r in rows if r[0] not in changed]
+        new_rows += [("/docs/f3.md", "c1", 0.9), ("/docs/f3.md", "c2", 0.8),
+                     ("/docs/f10.md", "c5", 1.0)]
+        kg = _setup(root, new_rows)
+        kg._build_file_relations(changed)
+        incremental = _relations(kg)
+
+        kg._build_file_relations()
+        assert incremental == _relations(kg)
+    finally:
+        shutil.rmtree(root)
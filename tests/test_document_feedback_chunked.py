@@ -0,0 +1,102 @@
+"""测试分段标注并发流水线：并发执行、失败段拆分重试、按段顺序合并、进度计数准确，以及 AIMD 限流器。"""
+import sys
+import os
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web.document_feedback import DocumentFeedbackSystem, AdaptiveConcurrencyLimiter
+
+PARAGRAPHS = [f"第{i}段" + "内容" * 220 for i in range(12)]
+
+
+class FakeReader:
+    def read_document(self, file_path):
+        return {"success": True, "type": "docx"}
+
+    def format_for_ai(self, doc_data):
+        return "\n\n".join(PARAGRAPHS)
+
+
+def _system(fail_once):
+    system = DocumentFeedbackSystem.__new__(DocumentFeedbackSystem)
+    system.reader = FakeReader()
+    system.default_model_id = "fake"
+    system._select_best_model = lambda preferred: (preferred, [])
+    system._format_model_table = lambda models: ""
+    state = {"active": 0, "peak": 0, "failed": set()}
+    lock = threading.Lock()
+
+    def analyze(chunk, limiter=None, **kwargs):
+        started = limiter.acquire()
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+        time.sleep(0.05)
+        with lock:
+            state["active"] -= 1
+        limiter.release(started)
+        head = chunk.split("内容")[0]
+        if head in fail_once and head not in state["failed"]:
+            state["failed"].add(head)
+            return None
+        return [{"原文片段": p.split("内容")[0], "修改建议": "x"} for p in chunk.split("\n\n")]
+
+    system._analyze_chunk_for_annotations = analyze
+    return system, state
+
+
+def test_chunks_run_concurrently_and_merge_in_order(monkeypatch):
+    monkeypatch.delenv("KOTO_DISABLE_AI", raising=False)
+    monkeypatch.setenv("KOTO_ANNOTATION_CONCURRENCY", "4")
+    system, state = _system(fail_once={"第2段"})
+    progress = []
+    result = system.analyze_for_annotation_chunked(
+        "doc.docx", chunk_size=1000, progress_callback=lambda c, t, m: progress.append((c, t)))
+
+    assert result["success"]
+    assert [a["原文片段"] for a in result["annotations"]] == [f"第{i}段" for i in range(12)]
+    assert state["peak"] > 1
+    # 6 个初始段，其中一段拆成 2 段重试
+    assert result["chunks_processed"] == 7
+    assert [c for c, _ in progress] == list(range(1, 8))
+    assert progress[-1] == (7, 7)
+
+
+class APIError(Exception):
+    def __init__(self, code):
+        super().__init__(f"{code} error")
+        self.code = code
+
+
+def test_limiter_halves_on_throttle_and_grows_on_success():
+    limiter = AdaptiveConcurrencyLimiter(maximum=8, initial=4, backoff_seconds=0)
+    starts = [limiter.acquire() for _ in range(3)]
+    limiter.release(starts[0], APIError(429))
+    assert limiter.limit == 2
+    # 同一批在途调用的后续限流不再重复减半
+    limiter.release(starts[1], TimeoutError("timeout"))
+    assert limiter.limit == 2
+    limiter.release(starts[2], ValueError("bad json"))
+    assert limiter.limit == 2
+
+    for _ in range(2):
+        limiter.release(limiter.acquire())
+    assert limiter.limit == 3
+    assert limiter.in_flight == 0
+
+
+def test_timed_out_call_keeps_its_slot_and_text_is_not_a_status():
+    limiter = AdaptiveConcurrencyLimiter(maximum=4, initial=2, backoff_seconds=0)
+    assert not limiter.is_throttle(ValueError("第503段解析失败"))
+    assert limiter.is_throttle(APIError(503))
+
+    started = limiter.acquire()
+    limiter.record(started, TimeoutError("chunk timeout"))     # 调用方放弃等待
+    assert limiter.limit == 1 and limiter.in_flight == 1
+    acquired = threading.Event()
+    threading.Thread(target=lambda: (limiter.acquire(), acquired.set()), daemon=True).start()
+    assert not acquired.wait(0.1)                               # 超时的调用仍在进行，名额未归还
+    limiter.release(started, record=False)
+    assert acquired.wait(1.0)
@@ -0,0 +1,70 @@
+"""测试文档文本索引：Aho-Corasick 多模式匹配、run 偏移定位、拆分后增量刷新，以及标注器的模糊预筛定位。"""
+import sys
+import os
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web.docx_text_index import AhoCorasick, DocumentTextIndex, TextIndex
+from web.document_annotator import DocumentAnnotator
+
+
+class FakeRun:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeParagraph:
+    def __init__(self, *texts):
+        self.runs = [FakeRun(t) for t in texts]
+
+
+def test_aho_corasick_matches_brute_force():
+    rng = random.Random(0)
+    text = "".join(rng.choice("abc") for _ in range(500))
+    patterns = ["a", "ab", "bab", "cabc", "abcab", "ccc", "zz"]
+    found = sorted(AhoCorasick(patterns).finditer(text))
+    expected = sorted((i, k) for k, p in enumerate(patterns)
+                      for i in range(len(text) - len(p) + 1) if text.startswith(p, i))
+    assert found == expected
+
+
+def test_locate_and_refresh_after_split():
+    paragraphs = [FakeParagraph("引言部分"), FakeParagraph("本文", "", "提出了", "一种方法"),
+                  FakeParagraph("表格里的方法")]
+    index = DocumentTextIndex(paragraphs, ["提出了一种", "方法", "不存在"], body_count=2)
+
+    assert index.find("提出了一种") == (1, 2)
+    assert index.locate(1, 2, 7) == (2, 3)
+    assert index.find("不存在") is None
+    assert index.find("方法") == (1, 7)
+    assert index.find("表格", stop=index.body_count) is None
+
+    # 模拟修订：第 1 段的“方法”被移入删除标记，可见文本变短
+    paragraphs[1].runs[3].text = "一种"
+    index.refresh(1)
+    assert index.text(1) == "本文提出了一种"
+    assert index.find("方法") == (2, 4)
+    assert index.find("方法", stop=index.body_count) is None
+
+    # 修改后新出现的目标也能被找到
+    paragraphs[0].runs.append(FakeRun("的方法"))
+    index.refresh(0)
+    assert index.find("方法") == (0, 5)
+
+
+def test_fuzzy_locate_uses_prefiltered_candidates():
+    texts = [f"第{i}段：" + "无关内容" * 5 for i in range(200)]
+    texts[137] = "深度学习模型在图像识别任务上取得了显著的进展"
+    paragraphs_info = [{"index": i, "text": t, "source": "body"} for i, t in enumerate(texts)]
+    annotator = DocumentAnnotator(min_similarity=0.8)
+    index = TextIndex(texts, ["深度学习模型在图像识别任务上取得显著进展"])
+
+    assert 137 in index.fuzzy_candidates("深度学习模型在图像识别任务上取得显著进展", 0.8)
+    location = annotator.locate_text_in_paragraphs(
+        paragraphs_info, "深度学习模型在图像识别任务上取得显著进展", index)
+    assert location["match_type"] == "fuzzy"
+    assert location["para_index"] == 137
+
+    exact = annotator.locate_text_in_paragraphs(paragraphs_info, "图像识别")
+    assert (exact["para_index"], exact["position"]) == (137, 7)
@@ -0,0 +1,69 @@
+"""测试 EnhancedMemoryManager 混合检索：相关记忆排序、use_count 延迟写盘、嵌入缓存复用、删除后不再命中。"""
+import sys
+import os
+import json
+import tempfile
+import shutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web.enhanced_memory_manager import EnhancedMemoryManager
+from web.memory_index import MemoryIndex
+
+
+def _manager(root):
+    return EnhancedMemoryManager(memory_path=os.path.join(root, "memory.json"),
+                                 profile_path=os.path.join(root, "profile.json"))
+
+
+def _seed(mgr):
+    mgr.add_memory("项目使用 Flask 作为后端框架", category="project_info")
+    mgr.add_memory("用户的电脑是 Windows 11，习惯用 PowerShell", category="fact")
+    mgr.add_memory("部署脚本放在 scripts/deploy.sh", category="project_info")
+    mgr.add_memory("回答时请尽量简洁", category="user_preference")
+
+
+def test_hybrid_search_and_deferred_use_count():
+    root = tempfile.mkdtemp(prefix="koto_memory_")
+    try:
+        mgr = _manager(root)
+        _seed(mgr)
+        mgr.flush()
+
+        results = mgr.search_memories("后端用的什么框架 flask", limit=2)
+        assert results[0]["content"].startswith("项目使用 Flask")
+        # 偏好类记忆即使没有词法命中也会被带上
+        assert any(m["category"] == "user_preference" for m in results)
+
+        # use_count 只在内存中更新，flush 后才写盘
+        with open(mgr.memory_path, encoding="utf-8") as f:
+            on_disk = {m["id"]: m["use_count"] for m in json.load(f)}
+        assert all(count == 0 for count in on_disk.values())
+        mgr.flush()
+        with open(mgr.memory_path, encoding="utf-8") as f:
+            on_disk = {m["id"]: m["use_count"] for m in json.load(f)}
+        assert on_disk[results[0]["id"]] == 1
+
+        assert "Flask" in mgr.get_context_string("flask 框架")
+    finally:
+        shutil.rmtree(root)
+
+
+def test_embedding_cache_reused_and_delete():
+    root = tempfile.mkdtemp(prefix="koto_memory_")
+    try:
+        mgr = _manager(root)
+        _seed(mgr)
+        mgr.flush()
+        assert os.path.exists(os.path.join(root, "memory.index.npz"))
+
+        index = MemoryIndex(os.path.join(root, "memory.index.npz"))
+        assert index.build(mgr.memories) == 0
+
+        target = mgr.search_memories("powershell", limit=1)[0]
+        assert "PowerShell" in target["content"]
+        assert mgr.delete_memory(target["id"])
+        assert all("PowerShell" not in m["content"] for m in mgr.search_memories("powershell"))
+        mgr.flush()
+    finally:
+        shutil.rmtree(root)
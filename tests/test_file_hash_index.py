@@ -0,0 +1,133 @@
+"""测试文件内容哈希索引：大小/头部/完整哈希逐级比对、持久化复用、移动与删除后的增量维护。"""
+import sys
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web.file_hash_index import FileHashIndex
+from web.organize_cleanup import OrganizeCleanup
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return Path(path)
+
+
+def test_staged_comparison_and_persistent_reuse():
+    root = tempfile.mkdtemp(prefix="koto_hash_")
+    try:
+        body = b"x" * 10000
+        a = _write(os.path.join(root, "a.bin"), body)
+        b = _write(os.path.join(root, "b.bin"), body)
+        c = _write(os.path.join(root, "c.bin"), body[:-1] + b"y")  # 头部相同、尾部不同
+        d = _write(os.path.join(root, "d.bin"), b"short")
+        db_path = os.path.join(root, FileHashIndex.DB_NAME)
+
+        index = FileHashIndex(db_path)
+        assert index.group_duplicates([a, b, c, d]) == [[a, b]]
+        # d 大小唯一不读；a/b/c 各读头部与全文
+        assert index.bytes_read == 3 * (FileHashIndex.HEAD_BYTES + 10000)
+        assert index.find_duplicate(d, [a, b, c]) is None
+        index.flush()
+
+        reloaded = FileHashIndex(db_path)
+        assert reloaded.group_duplicates([a, b, c, d]) == [[a, b]]
+        assert reloaded.same_content(a, b) and not reloaded.same_content(a, c)
+        assert reloaded.bytes_read == 0
+
+        # 移动后沿用哈希，内容修改后哈希失效
+        moved = Path(root) / "sub" / "a.bin"
+        os.makedirs(moved.parent)
+        shutil.move(str(a), str(moved))
+        reloaded.moved(a, moved)
+        assert reloaded.find_duplicate(b, [moved]) == moved
+        assert reloaded.bytes_read == 0
+        _write(str(b), body[:-1] + b"y")
+        os.utime(b, ns=(0, 0))
+        assert reloaded.find_duplicate(b, [moved, c]) == c
+        assert reloaded.bytes_read > 0
+
+        reloaded.removed(c)
+        reloaded.prune(root, [moved, b])
+        reloaded.flush()
+        assert len(FileHashIndex(db_path)) == 2
+    finally:
+        shutil.rmtree(root)
+
+
+def test_cleanup_rerun_reads_nothing_and_drops_deleted_files():
+    root = tempfile.mkdtemp(prefix="koto_hash_")
+    try:
+        organize = os.path.join(root, "_organize")
+        for name in ["合同", "合同_1"]:
+            _write(os.path.join(organize, "legal", name, "协议.pdf"), b"same" * 3000)
+        _write(os.path.join(organize, "legal", "合同", "附件.pdf"), b"other" * 3000)
+
+        OrganizeCleanup(organize_root=organize).run(dry_run=False)
+        index = FileHashIndex.for_root(organize)
+        assert sorted(os.path.basename(p) for p in index._table()) == ["协议.pdf", "附件.pdf"]
+
+        index.bytes_read = 0
+        report = OrganizeCleanup(organize_root=organize).run(dry_run=False)
+        assert report["deduped_files"] == 0
+        assert index.bytes_read == 0
+    finally:
+        FileHashIndex._instances.pop(os.path.abspath(os.path.join(organize, FileHashIndex.DB_NAME)), None)
+        shutil.rmtree(root)
+
+
+def test_copy_and_move_do_not_pass_on_stale_hashes():
+    root = tempfile.mkdtemp(prefix="koto_hash_")
+    try:
+        body = b"x" * 10000
+        src = _write(os.path.join(root, "src.bin"), body)
+        index = FileHashIndex(os.path.join(root, FileHashIndex.DB_NAME))
+        old_hash = index.full_hash(src)
+
+        # 源文件同大小改写后复制：不能把旧哈希带给目标
+        _write(str(src), body[:-1] + b"y")
+        os.utime(src, ns=(0, 0))
+        dst = Path(root) / "dst.bin"
+        shutil.copy(str(src), str(dst))
+        index.copied(src, dst)
+        assert index.full_hash(dst) != old_hash
+        assert index.full_hash(dst) == index.full_hash(src)
+
+        # 移动后 mtime 与旧条目不一致时同样重新计算
+        stale = index.full_hash(dst)
+        _write(str(dst), body)
+        moved = Path(root) / "moved.bin"
+        os.rename(dst, moved)
+        index.moved(dst, moved)
+        assert index.full_hash(moved) != stale
+    finally:
+        shutil.rmtree(root)
+
+
+def test_prune_drops_missing_sources_outside_the_root():
+    root = tempfile.mkdtemp(prefix="koto_hash_")
+    try:
+        organize_root = os.path.join(root, "organized")
+        os.makedirs(organize_root)
+        index = FileHashIndex(os.path.join(organize_root, FileHashIndex.DB_NAME))
+        kept = _write(os.path.join(root, "downloads", "kept.bin"), b"k" * 100)
+        gone = _write(os.path.join(root, "downloads", "gone.bin"), b"g" * 100)
+        dst = Path(organize_root) / "docs" / "gone.bin"
+        os.makedirs(dst.parent)
+        shutil.copy(str(gone), str(dst))
+        index.full_hash(kept)
+        index.full_hash(gone)
+        index.copied(gone, dst)
+        os.remove(gone)                    # 源文件在归纳后被用户删除
+
+        index.prune(organize_root, [dst])
+        index.flush()
+        assert sorted(FileHashIndex(index.db_path)._table()) == sorted(
+            [os.path.abspath(kept), os.path.abspath(dst)])
+    finally:
+        shutil.rmtree(root)
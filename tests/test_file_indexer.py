@@ -0,0 +1,104 @@
+"""测试 FileIndexer：增量目录索引（变更检测、删除清理、进度回调）与中文全文检索。"""
+import sys
+import os
+import time
+import tempfile
+import shutil
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web.file_indexer import FileIndexer
+
+
+def test_incremental_index_directory():
+    root = tempfile.mkdtemp(prefix="koto_idx_")
+    try:
+        docs = os.path.join(root, "docs")
+        os.makedirs(os.path.join(docs, "sub"))
+        for i in range(5):
+            with open(os.path.join(docs, f"note_{i}.txt"), "w", encoding="utf-8") as f:
+                f.write(f"alpha document number {i}")
+        with open(os.path.join(docs, "sub", "deep.md"), "w", encoding="utf-8") as f:
+            f.write("beta deep file")
+        with open(os.path.join(docs, "image.png"), "wb") as f:
+            f.write(b"\x89PNG")
+
+        indexer = FileIndexer(workspace_dir=root, db_path=os.path.join(root, "idx.db"))
+        events = []
+        r1 = indexer.index_directory(docs, progress_callback=events.append, workers=1)
+        assert r1["success"], r1
+        assert (r1["total"], r1["indexed"], r1["skipped"]) == (6, 6, 0), r1
+        assert events and events[-1]["stage"] == "done"
+        assert events[-1]["processed"] == 6
+
+        # 未变化时不重新读取
+        r2 = indexer.index_directory(docs, workers=1)
+        assert (r2["indexed"], r2["skipped"]) == (0, 6), r2
+
+        # 修改一个、删除一个
+        changed = os.path.join(docs, "note_0.txt")
+        with open(changed, "w", encoding="utf-8") as f:
+            f.write("gamma rewritten content")
+        later = time.time() + 5
+        os.utime(changed, (later, later))
+        os.remove(os.path.join(docs, "sub", "deep.md"))
+
+        r3 = indexer.index_directory(docs, workers=1)
+        assert (r3["total"], r3["indexed"], r3["skipped"], r3["removed"]) == (5, 1, 4, 1), r3
+        assert [r["file_name"] for r in indexer.search("gamma")] == ["note_0.txt"]
+        assert indexer.search("beta") == []
+        assert len(indexer.search("alpha")) == 4
+    finally:
+        shutil.rmtree(root)
+
+
+def test_cjk_search_modes():
+    root = tempfile.mkdtemp(prefix="koto_idx_")
+    try:
+        path = os.path.join(root, "合同说明.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("本合同由甲方与乙方在北京大学签订，违约责任由乙方承担。")
+
+        for mode in ("jieba", "trigram"):
+            indexer = FileIndexer(workspace_dir=root, db_path=os.path.join(root, f"{mode}.db"),
+                                  tokenize_mode=mode)
+            assert indexer.index_file(path)["indexed"]
+
+            results = indexer.search("违约责任")
+            assert len(results) == 1, (mode, results)
+            assert "**" in results[0]["match_snippet"]
+            assert "\u200b" not in results[0]["match_snippet"]
+            assert indexer.search("北京") and indexer.search("乙方")
+            assert indexer.search("不存在的词") == []
+
+            # 正文只存一份：FTS 为外部内容表
+            import sqlite3
+            conn = sqlite3.connect(indexer.db_path)
+            assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'file_content_fts_content'").fetchone()[0] == 0
+            conn.close()
+
+            assert indexer.remove_file(str(Path(path).resolve()))["success"]
+            assert indexer.search("违约责任") == []
+    finally:
+        shutil.rmtree(root)
+
+
+def test_legacy_fts_table_is_migrated():
+    import sqlite3
+    root = tempfile.mkdtemp(prefix="koto_idx_")
+    try:
+        db = os.path.join(root, "legacy.db")
+        conn = sqlite3.connect(db)
+        conn.execute("""CREATE TABLE file_index (id INTEGER PRIMARY KEY AUTOINCREMENT, file_path TEXT UNIQUE NOT NULL,
+                        file_name TEXT NOT NULL, file_ext TEXT, content TEXT, content_hash TEXT, file_size INTEGER,
+                        indexed_at DATETIME DEFAULT CURRENT_TIMESTAMP, modified_at DATETIME, tags TEXT, metadata TEXT)""")
+        conn.execute("CREATE VIRTUAL TABLE file_content_fts USING fts5(file_path, file_name, content, tokenize='unicode61')")
+        conn.execute("INSERT INTO file_index (file_path, file_name, file_ext, content) VALUES ('/x/a.txt', 'a.txt', '.txt', '旧数据中的人工智能报告')")
+        conn.commit()
+        conn.close()
+
+        indexer = FileIndexer(workspace_dir=root, db_path=db, tokenize_mode="jieba")
+        assert [r["file_name"] for r in indexer.search("人工智能")] == ["a.txt"]
+    finally:
+        shutil.rmtree(root)
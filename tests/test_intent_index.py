@@ -0,0 +1,67 @@
+"""测试 IntentIndex：与原纯 Python 余弦实现结果一致、批量打分、按语料哈希缓存。"""
+import sys
+import os
+import tempfile
+import shutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.routing.intent_index import IntentIndex, extract_ngrams, corpus_hash
+from app.core.routing.smart_dispatcher import SmartDispatcher
+
+
+QUERIES = ["帮我画一张猫的图片", "写个python函数排序", "今天北京天气怎么样",
+           "what time is it", "把这份文档做成PPT", "", "   "]
+
+
+def _reference_scores(corpus, text):
+    """旧版 SmartDispatcher 的稠密列表实现"""
+    features = sorted({g for texts in corpus.values() for t in texts for g in extract_ngrams(t)})
+    def vec(s):
+        grams = extract_ngrams(s)
+        return [1 if f in grams else 0 for f in features]
+    scores = {}
+    user = vec(text)
+    for task, texts in corpus.items():
+        vectors = [vec(t) for t in texts]
+        avg = [sum(v[i] for v in vectors) / len(vectors) for i in range(len(features))]
+        dot = sum(a * b for a, b in zip(user, avg))
+        n1 = sum(a * a for a in user) ** 0.5
+        n2 = sum(b * b for b in avg) ** 0.5
+        scores[task] = 0 if n1 == 0 or n2 == 0 else dot / (n1 * n2)
+    return scores
+
+
+def test_scores_match_reference_and_batch():
+    corpus = SmartDispatcher.TASK_CORPUS
+    index = IntentIndex.compile(corpus)
+    for text in QUERIES[:3]:
+        expected = _reference_scores(corpus, text)
+        got = index.score(text)
+        assert set(got) == set(expected)
+        for task in expected:
+            assert abs(got[task] - expected[task]) < 1e-5, (text, task)
+
+    batch = index.classify_batch(QUERIES)
+    for text, row in zip(QUERIES, batch):
+        single = index.score(text)
+        assert all(abs(row[t] - single[t]) < 1e-5 for t in single)
+    assert all(v == 0 for v in batch[-1].values())
+
+
+def test_compiled_index_is_cached_by_corpus_hash():
+    cache = tempfile.mkdtemp(prefix="koto_intent_")
+    try:
+        corpus = {"A": ["画一张图", "画个图"], "B": ["查询天气"]}
+        first = IntentIndex.load_or_compile(corpus, cache)
+        path = os.path.join(cache, f"intent_index_{corpus_hash(corpus)}.npz")
+        assert os.path.exists(path)
+        second = IntentIndex.load_or_compile(corpus, cache)
+        assert second.vocab == first.vocab
+        assert second.score("画图") == first.score("画图")
+
+        changed = dict(corpus, C=["写代码"])
+        assert corpus_hash(changed) != corpus_hash(corpus)
+        assert IntentIndex.load_or_compile(changed, cache).tasks == ["A", "B", "C"]
+    finally:
+        shutil.rmtree(cache)
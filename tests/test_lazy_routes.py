@@ -0,0 +1,179 @@
+"""测试按 URL 前缀懒加载功能区：首个命中请求才导入注册、加载失败只尝试一次；启动分析统计模块导入耗时。"""
+import io
+import sys
+import os
+import shutil
+import tempfile
+import textwrap
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Blueprint, jsonify
+
+from web import startup_profiler
+from web.lazy_routes import LazyFlask, LazyRouteRegistry, RouteGate
+
+
+def _voice_feature(loads):
+    def loader(app):
+        loads.append("voice")
+        bp = Blueprint("voice_test", __name__, url_prefix="/api/voice")
+
+        @bp.route("/stats")
+        def stats():
+            return jsonify({"ok": True})
+
+        app.register_blueprint(bp)
+    return loader
+
+
+def test_feature_is_registered_on_first_matching_request():
+    app = LazyFlask(__name__)
+    features = LazyRouteRegistry(app, lazy=True)
+
+    @app.route("/api/health")
+    def health():
+        return jsonify(features.status())
+
+    loads = []
+    features.add("voice", "/api/voice", _voice_feature(loads))
+    features.add("broken", ("/api/broken",), lambda app: loads.append("broken") or 1 / 0)
+    client = app.test_client()
+
+    assert client.get("/api/health").json["voice"]["loaded"] is False
+    assert client.get("/api/voicemail").status_code == 404      # 前缀按路径段匹配
+    assert loads == []
+
+    # 首个请求之后仍可注册（Flask 默认会拒绝）
+    assert client.get("/api/voice/stats").json == {"ok": True}
+    assert client.get("/api/voice/stats").status_code == 200
+    assert loads == ["voice"] and features.is_loaded("voice")
+
+    assert client.get("/api/broken/x").status_code == 404
+    assert client.get("/api/broken/x").status_code == 404
+    assert loads == ["voice", "broken"]
+    assert "division by zero" in features.status()["broken"]["error"]
+
+    # 加载之外的注册仍受 Flask 保护
+    with pytest.raises(AssertionError, match="add_url_rule"):
+        app.add_url_rule("/late", "late", lambda: "")
+
+
+def test_eager_mode_loads_on_registration():
+    app = LazyFlask(__name__)
+    features = LazyRouteRegistry(app, lazy=False)
+    loads = []
+    features.add("voice", "/api/voice", _voice_feature(loads))
+    assert loads == ["voice"]
+    assert app.test_client().get("/api/voice/stats").status_code == 200
+
+
+def test_route_gate_pauses_matching_while_rules_are_registered():
+    gate = RouteGate()
+    events = []
+    matching = threading.Event()
+    release = threading.Event()
+
+    def request():
+        with gate.shared():
+            matching.set()
+            release.wait(5)
+            events.append("match")
+
+    def register():
+        with gate.exclusive():
+            events.append("register")
+
+    def late_request():
+        with gate.shared():
+            events.append("late match")
+
+    threads = [threading.Thread(target=request)]
+    threads[0].start()
+    assert matching.wait(5)
+    threads.append(threading.Thread(target=register))
+    threads[1].start()
+    while not gate._waiting:                     # 注册等待进行中的匹配结束
+        time.sleep(0.01)
+    threads.append(threading.Thread(target=late_request))
+    threads[2].start()
+    time.sleep(0.05)
+    assert events == []                          # 等待中的注册挡住新的匹配
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert events == ["match", "register", "late match"]
+
+    # 并发请求与加载时逐条注册路由
+    app = LazyFlask(__name__)
+    features = LazyRouteRegistry(app, lazy=True)
+
+    @app.route("/api/ping")
+    def ping():
+        return "pong"
+
+    def loader(app):
+        for i in range(200):
+            app.add_url_rule(f"/api/bulk/r{i}", f"bulk_{i}", lambda: "ok")
+
+    features.add("bulk", "/api/bulk", loader)
+    statuses = []
+
+    def hammer():
+        client = app.test_client()
+        statuses.extend(client.get("/api/ping").status_code for _ in range(50))
+
+    workers = [threading.Thread(target=hammer) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    assert app.test_client().get("/api/bulk/r199").data == b"ok"
+    for worker in workers:
+        worker.join(30)
+    assert statuses == [200] * 200
+
+
+def test_startup_profiler_reports_self_and_cumulative_import_time():
+    root = tempfile.mkdtemp(prefix="koto_profile_")
+    package = os.path.join(root, "koto_profile_pkg")
+    os.makedirs(package)
+    with open(os.path.join(package, "__init__.py"), "w") as f:
+        f.write("import time\ntime.sleep(0.02)\nfrom . import heavy\n")
+    with open(os.path.join(package, "heavy.py"), "w") as f:
+        f.write(textwrap.dedent("""
+            import time
+            time.sleep(0.1)
+        """))
+    with open(os.path.join(package, "later.py"), "w") as f:
+        f.write("")
+    sys.path.insert(0, root)
+    try:
+        startup_profiler.enable()
+        import koto_profile_pkg  # noqa: F401
+        startup_profiler.disable()
+        assert not startup_profiler.is_enabled()
+
+        records = {r.name: r for r in startup_profiler.records()}
+        heavy, pkg = records["koto_profile_pkg.heavy"], records["koto_profile_pkg"]
+        assert heavy.self_time >= 0.1 and heavy.depth == pkg.depth + 1
+        assert pkg.cumulative >= 0.12 and 0.02 <= pkg.self_time < 0.1
+        assert koto_profile_pkg.__spec__.loader.get_filename().endswith("__init__.py")
+
+        text = startup_profiler.report(top=5, stream=io.StringIO())
+        assert "koto_profile_pkg.heavy" in text
+        assert startup_profiler.summarize_packages(startup_profiler.records())["koto_profile_pkg"] >= 0.12
+
+        # disable 之后再次 enable 继续记录到同一份数据
+        startup_profiler.enable()
+        import koto_profile_pkg.later  # noqa: F401
+        names = [r.name for r in startup_profiler.records()]
+        assert "koto_profile_pkg.later" in names and "koto_profile_pkg.heavy" in names
+    finally:
+        sys.path.remove(root)
+        startup_profiler.reset()
+        for name in [name for name in sys.modules if name.split(".")[0] == "koto_profile_pkg"]:
+            del sys.modules[name]
+        shutil.rmtree(root)
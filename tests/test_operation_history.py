@@ -0,0 +1,91 @@
+"""测试操作历史：分块去重备份、任意版本回滚、追加日志与按路径索引、保留策略回收。"""
+import sys
+import os
+import json
+import random
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web.operation_history import OperationHistory, BackupStore
+
+
+def _write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_repeated_edits_share_chunks_and_any_version_restores():
+    root = tempfile.mkdtemp(prefix="koto_history_")
+    try:
+        history = OperationHistory(os.path.join(root, "history"))
+        target = os.path.join(root, "book.xlsx")
+        rng = random.Random(0)
+        data = bytearray(rng.getrandbits(8) for _ in range(8 * BackupStore.CHUNK_SIZE))
+        _write(target, bytes(data))
+
+        versions = {}
+        for i in range(20):
+            versions[history.record_operation("edit", target)] = bytes(data)
+            data[rng.randrange(len(data))] ^= 0xFF  # 每次只改动一个块
+            _write(target, bytes(data))
+        history.record_operation("copy", os.path.join(root, "other.txt"))
+
+        stats = history.get_statistics()
+        assert stats["backup_logical_size"] == 20 * len(data)
+        assert stats["backup_size"] < 4 * len(data)
+
+        op_id = list(versions)[7]
+        assert history.rollback(op_id)["success"]
+        assert _read(target) == versions[op_id]
+
+        # 日志为追加写入，重新加载后索引与回滚标记一致
+        with open(history.log_file, encoding="utf-8") as f:
+            assert len(f.readlines()) == 22
+        reloaded = OperationHistory(os.path.join(root, "history"))
+        ops = reloaded.get_history(limit=5, file_path=target)
+        assert len(ops) == 5 and ops[0]["id"] == list(versions)[-1]
+        assert reloaded.get_operation(op_id)["rolled_back"]
+        assert len(reloaded.get_history(limit=100)) == 21
+    finally:
+        shutil.rmtree(root)
+
+
+def test_retention_gc_and_legacy_migration():
+    root = tempfile.mkdtemp(prefix="koto_history_")
+    try:
+        history_dir = os.path.join(root, "history")
+        os.makedirs(os.path.join(history_dir, "backups"))
+        target = os.path.join(root, "a.txt")
+        legacy_backup = os.path.join(history_dir, "backups", "old_a.txt")
+        _write(legacy_backup, b"legacy")
+        with open(os.path.join(history_dir, "operations.json"), "w", encoding="utf-8") as f:
+            json.dump([{"id": "old", "type": "edit", "file_path": target, "backup_path": legacy_backup,
+                        "timestamp": "2020-01-01T00:00:00", "details": {}, "can_rollback": True}], f)
+
+        history = OperationHistory(history_dir)
+        assert not os.path.exists(os.path.join(history_dir, "operations.json"))
+        assert history.rollback("old")["success"] and _read(target) == b"legacy"
+
+        ids = []
+        for i in range(4):
+            _write(target, f"version {i}".encode())
+            ids.append(history.record_operation("edit", target))
+
+        result = history.collect_garbage(max_age_days=0, keep_last=2)
+        assert result["removed_count"] == 3
+        assert result["removed_chunks"] == 2
+        assert not os.path.exists(legacy_backup)
+        assert [history.get_operation(i)["can_rollback"] for i in ids] == [False, False, True, True]
+
+        reloaded = OperationHistory(history_dir)
+        assert not reloaded.rollback(ids[0])["success"]
+        assert reloaded.rollback(ids[2])["success"] and _read(target) == b"version 2"
+    finally:
+        shutil.rmtree(root)
@@ -4,6 +4,7 @@ import os
 import tempfile
 import shutil
 import json
+import random
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -93,5 +94,49 @@ def test_cleanup_merges_duplicates():
         shutil.rmtree(test_root)
 
 
+def _pairwise_groups(cleanup, folders):
+    """逐对比较的参考实现（索引分组前的原始算法）。"""
+    visited, groups = set(), []
+    for i, a in enumerate(folders):
+        if a in visited:
+            continue
+        group = {a}
+        for b in folders[i + 1:]:
+            if b not in visited and cleanup._are_similar(
+                    cleanup._clean_folder_name(a), cleanup._clean_folder_name(b)):
+                group.add(b)
+        if len(group) > 1:
+            groups.append(group)
+            visited.update(group)
+    return groups
+
+
+def test_indexed_grouping_matches_pairwise_comparison():
+    cleanup = OrganizeCleanup(organize_root=tempfile.gettempdir())
+    for seed in range(100):
+        rng = random.Random(seed)
+        alphabet = rng.choice(["ab", "abcd", "合同协议书", "abcdefgh"])
+        folders = list(dict.fromkeys(
+            rng.choice(["", "legal/", "finance/"])
+            + "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 9)))
+            + rng.choice(["", "_1", "(2)", "_revised", " "])
+            for _ in range(rng.randint(1, 60))))
+        folder_info = {f: {} for f in folders}
+        assert cleanup._build_similarity_groups(folder_info) == _pairwise_groups(cleanup, folders), seed
+
+
+
+def test_indexed_grouping_matches_pairwise_on_shared_vocabulary():
+    """同一批词语乱序拼接、共享公司后缀的名称（候选过滤最难排除的情况）"""
+    cleanup = OrganizeCleanup(organize_root=tempfile.gettempdir())
+    words = ["科技", "信息", "网络", "服务", "管理", "咨询", "贸易", "发展", "文化", "传媒", "北京", "上海"]
+    for seed in range(10):
+        rng = random.Random(seed)
+        folders = list(dict.fromkeys(
+            "".join(rng.sample(words, rng.randint(2, 5))) + rng.choice(["", "有限公司", "中心"])
+            for _ in range(150)))
+        folder_info = {f: {} for f in folders}
+        assert cleanup._build_similarity_groups(folder_info) == _pairwise_groups(cleanup, folders), seed
+
 if __name__ == "__main__":
     test_cleanup_merges_duplicates()
@@ -0,0 +1,111 @@
+"""测试并行执行系统：出队后任务仍可查询、状态表 TTL 淘汰、耗时直方图，以及工作线程池的并发执行、重试与取消。"""
+import sys
+import os
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import web.parallel_executor as pe
+from web.parallel_executor import (
+    Task, TaskType, Priority, TaskStatus, TaskQueueManager, ResourceManager,
+    TaskMonitor, LatencyHistogram, RetryPolicy
+)
+from web.task_dispatcher import TaskScheduler
+
+
+def _task(i, priority=Priority.NORMAL, session="s1"):
+    return Task(id=f"t{i}", session_id=session, type=TaskType.CHAT, priority=priority,
+                estimated_api_calls=0)
+
+
+def test_dequeued_tasks_stay_queryable_until_ttl():
+    mgr = TaskQueueManager(status_ttl=3600)
+    for i in range(3):
+        mgr.submit(_task(i))
+    mgr.submit(_task(9, Priority.CRITICAL, session="s2"))
+
+    first = mgr.get_next(timeout=0)
+    assert first.id == "t9"
+    first.status = TaskStatus.RUNNING
+    assert mgr.get_task("t9") is first
+    stats = mgr.get_stats()
+    assert stats["running"] == 1 and stats["queued"] == 3
+    assert stats["queue_wait"]["CRITICAL"]["count"] == 1
+
+    # 排队中的任务取消后不会再出队，但仍可查询
+    assert mgr.cancel("t1")
+    assert [mgr.get_next(timeout=0).id for _ in range(2)] == ["t0", "t2"]
+    assert mgr.get_next(timeout=0) is None
+    assert mgr.get_task("t1").status == TaskStatus.CANCELLED
+
+    first.started_at = first.completed_at = pe.datetime.now()
+    first.status = TaskStatus.COMPLETED
+    mgr.task_done(first)
+    assert mgr.get_stats()["run_time"]["CRITICAL"]["count"] == 1
+    assert [t.id for t in mgr.get_session_tasks("s2")] == ["t9"]
+
+    mgr.store.ttl = 0
+    mgr.get_stats()
+    assert mgr.get_task("t9") is None and mgr.get_task("t1") is None
+    assert mgr.get_session_tasks("s2") == []
+    assert mgr.get_task("t0") is not None  # 未结束的任务不淘汰
+
+
+def test_histogram_quantiles():
+    hist = LatencyHistogram()
+    for v in [0.001] * 90 + [2.0] * 10:
+        hist.observe(v)
+    snap = hist.snapshot()
+    assert snap["count"] == 100
+    assert snap["p50"] == 0.005  # 桶上界
+    assert snap["p99"] == 2.0
+    assert snap["buckets"]["le_0.005"] == 90
+
+
+def test_worker_pool_runs_concurrently_with_retry_and_cancel(monkeypatch):
+    queue_mgr, resource_mgr = TaskQueueManager(), ResourceManager()
+    monkeypatch.setattr(pe, "_queue_manager", queue_mgr)
+    monkeypatch.setattr(pe, "_resource_manager", resource_mgr)
+    monkeypatch.setattr(pe, "_task_monitor", TaskMonitor(queue_mgr, resource_mgr))
+    monkeypatch.setattr(RetryPolicy, "get_retry_delay", lambda self, count: 0.01)
+
+    state = {"active": 0, "peak": 0, "attempts": {}}
+    lock = threading.Lock()
+
+    def run(task):
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+            state["attempts"][task.id] = state["attempts"].get(task.id, 0) + 1
+            attempt = state["attempts"][task.id]
+        time.sleep(0.05)
+        with lock:
+            state["active"] -= 1
+        if task.id == "t3" and attempt == 1:
+            raise RuntimeError("transient")
+        return task.id
+
+    scheduler = TaskScheduler(max_workers=4)
+    scheduler.register_executor(TaskType.CHAT, run)
+    for i in range(8):
+        queue_mgr.submit(_task(i))
+    queue_mgr.submit(_task(99))
+    queue_mgr.cancel("t99")
+    scheduler.start()
+    try:
+        deadline = time.time() + 10
+        while queue_mgr.get_stats()["completed"] < 8 and time.time() < deadline:
+            time.sleep(0.02)
+    finally:
+        scheduler.stop()
+
+    stats = queue_mgr.get_stats()
+    assert stats["completed"] == 8
+    assert stats["cancelled"] == 1
+    assert state["peak"] > 1
+    assert queue_mgr.get_task("t3").retry_count == 1
+    assert queue_mgr.get_task("t3").result == "t3"
+    assert "t99" not in state["attempts"]
+    assert stats["run_time"]["NORMAL"]["count"] == 8
+    assert resource_mgr.current_concurrent == 0
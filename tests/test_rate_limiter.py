@@ -0,0 +1,108 @@
+"""测试限流器：GCRA 突发与恢复、分片内存后端淘汰空闲键、多进程共用 SQLite 后端执行同一配额、每日配额。"""
+import sys
+import os
+import shutil
+import tempfile
+import multiprocessing
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web import rate_limiter
+from web.rate_limiter import (
+    DailyQuota, MemoryBackend, RateLimit, RateLimiter, SQLiteBackend, gcra,
+)
+
+
+def test_gcra_burst_refill_and_refund():
+    limiter = RateLimiter(RateLimit(10, 10, burst_size=5))
+    clock = [1000.0]
+    with mock.patch("web.rate_limiter.time.time", lambda: clock[0]):
+        results = [limiter.check_rate_limit("alice", "/chat") for _ in range(7)]
+        assert [r.allowed for r in results] == [True] * 5 + [False] * 2
+        assert [r.requests_remaining for r in results[:5]] == [4, 3, 2, 1, 0]
+        assert abs(results[5].retry_after_seconds - 1.0) < 1e-6
+        assert limiter.check_rate_limit("bob", "/chat").allowed
+
+        clock[0] += 1.0                   # 每秒恢复一个请求
+        assert limiter.check_rate_limit("alice", "/chat").allowed
+        assert not limiter.check_rate_limit("alice", "/chat").allowed
+
+        # 被用户+接口配额拒绝的请求不消耗用户额度
+        limiter.set_quota("carol", "/upload", RateLimit(1, 60))
+        assert limiter.check_rate_limit("carol", "/upload").allowed
+        assert not limiter.check_rate_limit("carol", "/upload").allowed
+        assert limiter.get_user_usage("carol", "/upload")["overall"].requests_made == 1
+        assert limiter.get_user_usage("carol", "/upload")["/upload"].requests_made == 1
+
+
+def test_memory_backend_evicts_idle_keys_and_stays_bounded():
+    backend = MemoryBackend(shards=8, max_keys=800)
+    limiter = RateLimiter(RateLimit(100, 1), backend=backend)
+    clock = [1000.0]
+    with mock.patch("web.rate_limiter.time.time", lambda: clock[0]):
+        for i in range(5000):
+            limiter.check_rate_limit(f"user{i}", "/chat")
+        assert len(backend) <= 800
+
+        clock[0] += 5                     # 所有键都已过期，下一次清理全部移除
+        for shard in backend._shards:
+            backend._sweep(shard, clock[0])
+        assert len(backend) == 0
+        assert limiter.check_rate_limit("user1", "/chat").requests_remaining == 99
+
+
+def _worker(db_path, attempts, queue):
+    backend = SQLiteBackend(db_path)
+    limiter = RateLimiter(RateLimit(50, 3600), backend=backend)
+    quota = DailyQuota(30, backend=backend)
+    allowed = sum(limiter.check_rate_limit("shared", "/chat").allowed for _ in range(attempts))
+    consumed = sum(quota.consume("shared")[0] for _ in range(attempts))
+    queue.put((allowed, consumed))
+
+
+def test_sqlite_backend_enforces_one_quota_across_processes():
+    root = tempfile.mkdtemp(prefix="koto_rate_")
+    try:
+        db_path = os.path.join(root, "rate_limits.db")
+        ctx = multiprocessing.get_context("spawn")
+        queue = ctx.Queue()
+        workers = [ctx.Process(target=_worker, args=(db_path, 40, queue)) for _ in range(3)]
+        for worker in workers:
+            worker.start()
+        results = [queue.get(timeout=60) for _ in workers]
+        for worker in workers:
+            worker.join(10)
+        assert sum(allowed for allowed, _ in results) == 50
+        assert sum(consumed for _, consumed in results) == 30
+        assert DailyQuota(30, backend=SQLiteBackend(db_path)).used("shared") == 30
+    finally:
+        shutil.rmtree(root)
+
+
+def test_daily_quota_resets_next_day():
+    quota = DailyQuota(2, backend=MemoryBackend())
+    assert quota.consume("u") == (True, 1)
+    assert quota.consume("u") == (True, 2)
+    assert quota.consume("u") == (False, 2)
+    assert quota.used("u") == 2 and quota.used("v") == 0
+
+    with mock.patch.object(DailyQuota, "_today", return_value=(float(10 ** 6), 1e12)):
+        assert quota.used("u") == 0
+        assert quota.consume("u") == (True, 1)
+    assert gcra(RateLimit(1, 1))(None, 0.0)[2][0]
+
+
+def test_sqlite_backend_env_applies_to_the_limiter():
+    root = tempfile.mkdtemp(prefix="koto_rate_")
+    try:
+        env = {"KOTO_RATE_LIMIT_BACKEND": "sqlite", "KOTO_RATE_LIMIT_DB": os.path.join(root, "rate_limits.db")}
+        with mock.patch.dict(os.environ, env), mock.patch.object(rate_limiter, "_backend_instance", None):
+            limiter = RateLimiter(RateLimit(2, 60))
+            assert isinstance(limiter.backend, SQLiteBackend)
+            assert limiter.backend is DailyQuota(10).backend
+            assert [limiter.check_rate_limit("u", "/chat").allowed for _ in range(3)] == [True, True, False]
+            assert not RateLimiter(RateLimit(2, 60)).check_rate_limit("u", "/chat").allowed
+        assert isinstance(RateLimiter().backend, MemoryBackend)
+    finally:
+        shutil.rmtree(root)
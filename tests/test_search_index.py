@@ -0,0 +1,81 @@
+"""测试 SearchIndex：四类数据源的增量索引与 SearchEngine 的合并查询。"""
+import sys
+import os
+import json
+import time
+import tempfile
+import shutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web.search_index import SearchIndex
+from web.search_engine import SearchEngine
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+def _touch_later(path):
+    later = time.time() + 5
+    os.utime(path, (later, later))
+
+
+def test_incremental_refresh_and_search():
+    root = tempfile.mkdtemp(prefix="koto_search_")
+    try:
+        workspace = os.path.join(root, "workspace")
+        chats = os.path.join(root, "chats")
+        with_docs = os.path.join(workspace, "docs")
+        os.makedirs(with_docs)
+        with open(os.path.join(with_docs, "plan.md"), "w", encoding="utf-8") as f:
+            f.write("quarterly roadmap for the zephyr project")
+        with open(os.path.join(with_docs, "zephyr_logo.png"), "wb") as f:
+            f.write(b"\x89PNG")
+        _write_json(os.path.join(chats, "a.json"), [
+            {"role": "user", "parts": ["tell me about zephyr"], "timestamp": "2026-01-01T10:00:00"},
+            {"role": "model", "parts": ["zephyr is a light wind"], "timestamp": "2026-01-01T10:00:05"},
+        ])
+        _write_json(os.path.join(workspace, "notes", "_index.json"), [
+            {"id": "n1", "content": "buy milk", "tags": ["errand"], "category": "life",
+             "created_at": "2026-01-02T08:00:00"},
+        ])
+        _write_json(os.path.join(workspace, "clipboard", "history.json"), [
+            {"content": "zephyr api key rotation", "type": "text", "timestamp": "2026-01-03T09:00:00"},
+        ])
+
+        index = SearchIndex(workspace, chats, db_path=os.path.join(root, "search.db"),
+                            tokenize_mode="unicode61")
+        first = index.refresh(workers=1)
+        assert first["chats"] == 1 and first["notes"] == 1 and first["clipboard"] == 1, first
+        assert index.refresh(workers=1) == {"files": 0, "chats": 0, "notes": 0, "clipboard": 0}
+
+        engine = SearchEngine(index=index)
+        results = engine.search_all("zephyr", max_results=10)
+        assert {r["type"] for r in results["files"]} == {"filename", "content"}
+        assert len(results["chats"]) == 2
+        assert results["notes"] == []
+        assert len(results["clipboard"]) == 1
+        assert len(results["ranked"]) == len(results["files"]) + 3
+        scores = [r["score"] for r in results["ranked"]]
+        assert scores == sorted(scores, reverse=True)
+        assert engine.search_notes("errand")[0]["tags"] == ["errand"]
+
+        # 修改聊天、删除剪贴板后只重新解析变化的源
+        chat_path = os.path.join(chats, "a.json")
+        _write_json(chat_path, [{"role": "user", "parts": ["nothing here"], "timestamp": "2026-01-04"}])
+        _touch_later(chat_path)
+        os.remove(os.path.join(workspace, "clipboard", "history.json"))
+        stats = index.refresh(workers=1)
+        assert (stats["chats"], stats["notes"], stats["clipboard"]) == (1, 0, 1), stats
+        assert engine.search_chats("zephyr") == []
+        assert engine.search_clipboard("zephyr") == []
+
+        # 空查询按时间列出，供日期范围搜索使用
+        assert len(engine.search_chats("", max_results=10)) == 1
+        ranged = engine.search_by_date_range("2026-01-01", "2026-12-31", types=["notes"])
+        assert [n["id"] for n in ranged["notes"]] == ["n1"]
+    finally:
+        shutil.rmtree(root)
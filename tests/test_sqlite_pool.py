@@ -0,0 +1,120 @@
+"""测试共享 SQLite 存储层：线程内连接复用、WAL、批量写合并与出错隔离、数据库文件被删除后的重建。"""
+import sys
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web.sqlite_pool import get_database
+
+
+def test_pooled_connections_are_reused_and_isolated():
+    root = tempfile.mkdtemp(prefix="koto_sqlite_")
+    try:
+        db = get_database(os.path.join(root, "a.db"))
+        assert get_database(os.path.join(root, "a.db")) is db
+
+        conn = db.connect()
+        conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, v TEXT)")
+        conn.execute("INSERT INTO t (v) VALUES ('x')")
+        conn.commit()
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        conn.row_factory = sqlite3.Row
+        assert conn.execute("SELECT v FROM t").fetchone()["v"] == "x"
+        conn.execute("INSERT INTO t (v) VALUES ('uncommitted')")
+        conn.close()
+
+        # 同线程再次借出复用同一连接：row_factory 不串用，未提交的修改已回滚
+        again = db.connect()
+        assert again.execute("SELECT v FROM t").fetchall() == [("x",)]
+        nested = db.connect()
+        assert nested._raw is not again._raw
+        nested.close()
+        again.close()
+        assert db.stats["connections"] == 2
+    finally:
+        shutil.rmtree(root)
+
+
+def test_write_behind_batches_and_isolates_failures():
+    root = tempfile.mkdtemp(prefix="koto_sqlite_")
+    try:
+        db = get_database(os.path.join(root, "b.db"))
+        conn = db.connect()
+        conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, v INTEGER UNIQUE)")
+        conn.commit()
+        conn.close()
+
+        def insert(v):
+            return lambda c: c.execute("INSERT INTO t (v) VALUES (?)", (v,)).lastrowid
+
+        threads = [threading.Thread(target=lambda k=k: [db.write(insert(k * 100 + i)) for i in range(100)])
+                   for k in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        failed = db.write(insert(0))          # 违反唯一约束，只影响自己
+        row_id = db.write(insert(1000), wait=True)
+
+        conn = db.connect()                   # 读取前等待排队的写提交
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 401
+        conn.close()
+        assert row_id == 401
+        assert isinstance(failed.exception(), sqlite3.IntegrityError)
+        assert db.stats["writes"] == 402
+        assert db.stats["batches"] < 402
+    finally:
+        shutil.rmtree(root)
+
+
+def test_deleted_database_file_is_recreated():
+    root = tempfile.mkdtemp(prefix="koto_sqlite_")
+    try:
+        path = os.path.join(root, "c.db")
+        db = get_database(path)
+        conn = db.connect()
+        conn.execute("CREATE TABLE t (v TEXT)")
+        conn.commit()
+        conn.close()
+        db.write(lambda c: c.execute("INSERT INTO t VALUES ('old')"), wait=True)
+
+        db.close_idle()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+        conn = db.connect()
+        assert conn.execute("SELECT name FROM sqlite_master").fetchall() == []
+        conn.close()
+    finally:
+        shutil.rmtree(root)
+
+
+def test_writer_survives_errors_outside_the_transaction():
+    root = tempfile.mkdtemp(prefix="koto_sqlite_")
+    try:
+        db = get_database(os.path.join(root, "d.db"))
+        db.write(lambda conn: conn.execute("CREATE TABLE t (v INTEGER)"), wait=True)
+
+        original = db._check_file
+
+        def broken_check():
+            db._check_file = original
+            raise OSError("stat failed")
+
+        db._check_file = broken_check
+        failed = db.write(lambda conn: conn.execute("INSERT INTO t VALUES (1)"))
+        assert db.flush(timeout=5)
+        assert isinstance(failed.exception(timeout=1), OSError)
+
+        # 写线程仍在工作，连接可以正常借出
+        db.write(lambda conn: conn.execute("INSERT INTO t VALUES (2)"), wait=True)
+        conn = db.connect()
+        assert conn.execute("SELECT v FROM t").fetchall() == [(2,)]
+        conn.close()
+    finally:
+        shutil.rmtree(root)
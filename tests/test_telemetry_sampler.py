@@ -0,0 +1,91 @@
+"""测试后台遥测采样器：环形缓冲区与历史窗口、收集器直接读取快照、系统事件监控复用快照。"""
+import sys
+import os
+import time
+
+import psutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import web.system_info as system_info
+from web.system_info import SystemInfoCollector, TelemetrySampler
+from app.core.analytics.trend_analyzer import TrendAnalyzer
+from app.core.monitoring.system_event_monitor import SystemEventMonitor
+
+
+def _install_sampler(monkeypatch, history=4):
+    collector = SystemInfoCollector()
+    sampler = TelemetrySampler(collector, interval=60, history=history)
+    monkeypatch.setattr(system_info, "_sampler_instance", sampler)
+    monkeypatch.setattr(sampler, "start", lambda: None)   # 由测试手动采样
+    return collector, sampler
+
+
+def test_ring_buffer_windows_and_slow_metrics(monkeypatch):
+    collector, sampler = _install_sampler(monkeypatch)
+    assert sampler.latest() is None
+
+    disk_reads = []
+    read_disk = collector._read_disk_info
+    monkeypatch.setattr(collector, "_read_disk_info", lambda: disk_reads.append(1) or read_disk())
+    for _ in range(TelemetrySampler.SLOW_EVERY + 1):
+        sampler.sample()
+
+    # 磁盘信息只在第 1 次和第 SLOW_EVERY + 1 次采样时读取，其余快照沿用
+    assert len(disk_reads) == 2
+    assert len(sampler._buffer) == 4
+    latest = sampler.latest()
+    assert {"cpu", "memory", "disk", "network", "net_io", "processes"} <= set(latest)
+    assert len(sampler.series("memory.percent", 60)) == 4
+
+    # 超出窗口或过期的快照不返回
+    sampler._buffer[0]["timestamp"] -= 120
+    assert len(sampler.window(60)) == 3
+    sampler._buffer[-1]["timestamp"] -= 1000
+    assert sampler.latest() is None
+
+
+def test_collector_reads_latest_snapshot_without_sampling(monkeypatch):
+    collector, sampler = _install_sampler(monkeypatch)
+    sampler.sample()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("请求线程不应再直接采样")
+
+    for name in ("_read_cpu_info", "_read_memory_info", "_read_disk_info",
+                 "_read_network_info", "_read_processes"):
+        monkeypatch.setattr(collector, name, fail)
+    snapshot = sampler.latest()
+    assert collector.get_cpu_info() is snapshot["cpu"]
+    assert collector.get_memory_info() is snapshot["memory"]
+    assert collector.get_disk_info() is snapshot["disk"]
+    assert len(collector.get_running_processes(top_n=2)["top_processes"]) <= 2
+    assert collector.get_top_processes(limit=3) == snapshot["processes"]["top_processes"][:3]
+
+    # 快照过期后退回直接读取
+    sampler._buffer[-1]["timestamp"] -= 1000
+    monkeypatch.setattr(collector, "_read_memory_info", lambda: {"percent": 1})
+    assert collector.get_memory_info() == {"percent": 1}
+
+
+def test_monitor_and_trends_reuse_sampled_history(monkeypatch):
+    _, sampler = _install_sampler(monkeypatch)
+    for percent in (40.0, 60.0, 95.0):
+        snapshot = sampler.sample()
+        snapshot["memory"]["percent"] = percent
+        snapshot["processes"]["top_processes"] = [{"name": "big", "memory_mb": 2048.0}]
+
+    def fail(*args, **kwargs):
+        raise AssertionError("监控不应再次采样")
+
+    monkeypatch.setattr(psutil, "cpu_percent", fail)
+    monkeypatch.setattr(psutil, "process_iter", fail)
+    monitor = SystemEventMonitor(check_interval=1)
+    monitor._check_system_metrics()
+    types = {e["event_type"] for e in monitor.get_events()}
+    assert {"memory_high", "process_memory_high"} <= types
+
+    stats = TrendAnalyzer().get_telemetry_stats(window_seconds=60)
+    assert stats["samples"] == 3
+    assert stats["current_metrics"]["memory_usage"] == 95.0
+    assert stats["historical_stats"]["avg_memory"] == round((40 + 60 + 95) / 3, 2)
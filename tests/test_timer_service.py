@@ -0,0 +1,166 @@
+"""测试共享定时服务：单线程按时触发与取消、作业持久化与重启恢复、重复作业；提醒管理器迁移到定时服务。"""
+import sys
+import os
+import json
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import web.reminder_manager as reminder_manager
+from web.reminder_manager import ReminderManager
+from web.sqlite_pool import get_database
+from web.timer_service import TimerService, next_fire_time
+
+
+def _wait_for(predicate, timeout=3.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_jobs_fire_in_order_on_one_thread_and_cancel():
+    service = TimerService()
+    fired = []
+    lock = threading.Lock()
+
+    def on_job(job):
+        with lock:
+            fired.append((job.job_id, time.time() - job.fire_at))
+
+    threads_before = threading.active_count()
+    service.register_handler("test", on_job)
+    now = time.time()
+    for i in range(400):
+        service.schedule(f"job{i}", "test", now + 0.05 + (i % 40) * 0.005)
+    for i in range(0, 400, 2):
+        assert service.cancel(f"job{i}")
+    assert not service.cancel("job0")
+    try:
+        assert _wait_for(lambda: len(fired) == 200)
+        time.sleep(0.1)
+        assert sorted(job_id for job_id, _ in fired) == sorted(f"job{i}" for i in range(1, 400, 2))
+        assert max(lateness for _, lateness in fired) < 0.5
+        # 调度线程 1 个 + 处理线程池，与作业数量无关
+        assert threading.active_count() - threads_before <= 1 + TimerService.WORKERS
+        assert service.list_jobs() == []
+    finally:
+        service.stop()
+
+
+def test_persisted_jobs_survive_restart_and_repeat():
+    root = tempfile.mkdtemp(prefix="koto_timer_")
+    try:
+        db_path = os.path.join(root, "timer_jobs.db")
+        first = TimerService(db_path)
+        first.schedule("once", "report", datetime.now() + timedelta(seconds=0.2), payload={"n": 1})
+        first.schedule("memo", "report", time.time() + 3600, persist=False)
+        first.schedule("tick", "report", time.time() + 0.2, repeat={"type": "interval", "seconds": 3600})
+        first.schedule("gone", "report", time.time() + 0.2)
+        first.cancel("gone")
+        first.stop()                      # 进程退出，作业尚未触发
+
+        time.sleep(0.3)
+        second = TimerService(db_path)    # 重启：内存作业丢失，持久化作业恢复
+        assert [job.job_id for job in second.list_jobs()] == ["once", "tick"]
+
+        fired = []
+        time.sleep(0.05)                  # 到期时尚无处理函数，注册后补执行
+        second.register_handler("report", lambda job: fired.append((job.job_id, job.payload)))
+        assert _wait_for(lambda: len(fired) == 2)
+        assert sorted(fired, key=lambda item: item[0]) == [("once", {"n": 1}), ("tick", {})]
+
+        second.flush()
+        conn = get_database(db_path).connect()
+        rows = conn.execute("SELECT job_id, fire_at FROM timer_jobs").fetchall()
+        conn.close()
+        assert [job_id for job_id, _ in rows] == ["tick"]
+        assert rows[0][1] > time.time() + 3500
+        second.stop()
+    finally:
+        shutil.rmtree(root)
+
+
+def test_bad_repeat_rule_and_persist_errors_do_not_stop_the_thread():
+    root = tempfile.mkdtemp(prefix="koto_timer_")
+    try:
+        db_path = os.path.join(root, "timer_jobs.db")
+        service = TimerService(db_path)
+        fired = []
+        service.register_handler("report", lambda job: fired.append(job.job_id))
+        service.schedule("bad", "report", time.time() + 0.05, repeat={"type": "bogus"})
+        service.schedule("tick", "report", time.time() + 0.1, repeat={"type": "interval", "seconds": 3600})
+
+        def failing_persist(job):
+            raise RuntimeError("database is locked")
+
+        service._persist = failing_persist          # 排下一次 tick 时写库失败
+        service.schedule("later", "report", time.time() + 0.2, persist=False)
+
+        assert _wait_for(lambda: len(fired) == 3)
+        assert fired == ["bad", "tick", "later"]
+        assert service.is_running()
+        assert [job.job_id for job in service.list_jobs()] == ["tick"]
+
+        service.flush()
+        conn = get_database(db_path).connect()
+        rows = conn.execute("SELECT job_id FROM timer_jobs").fetchall()
+        conn.close()
+        assert "bad" not in [job_id for job_id, in rows]
+        service.stop()
+    finally:
+        shutil.rmtree(root)
+
+
+def test_next_fire_time_for_daily_and_weekly():
+    base = datetime(2026, 3, 4, 10, 30)           # 周三
+    assert next_fire_time({"type": "daily", "time": "09:00"}, base) == datetime(2026, 3, 5, 9, 0)
+    assert next_fire_time({"type": "daily", "time": "11:15"}, base) == datetime(2026, 3, 4, 11, 15)
+    assert next_fire_time({"type": "weekly", "time": "09:00"}, base) == datetime(2026, 3, 11, 9, 0)
+    assert next_fire_time({"type": "weekly", "time": "09:00", "weekday": 4}, base) == datetime(2026, 3, 6, 9, 0)
+    assert next_fire_time({"type": "hourly"}, base) == base + timedelta(hours=1)
+
+
+def test_reminders_fire_through_timer_service_and_migrate_json(monkeypatch):
+    root = tempfile.mkdtemp(prefix="koto_reminder_")
+    service = TimerService(os.path.join(root, "timer_jobs.db"))
+    toasts = []
+    monkeypatch.setattr(reminder_manager, "show_toast", lambda title, message, **kwargs: toasts.append(title))
+    try:
+        now = datetime.now()
+        legacy = {
+            "old": {"id": "old", "title": "过期", "message": "", "time": (now - timedelta(hours=1)).isoformat(),
+                    "status": "scheduled", "icon": None},
+            "soon": {"id": "soon", "title": "迁移", "message": "", "time": (now + timedelta(seconds=0.2)).isoformat(),
+                     "status": "scheduled", "icon": None},
+        }
+        with open(os.path.join(root, "reminders.json"), "w", encoding="utf-8") as f:
+            json.dump(legacy, f)
+
+        manager = ReminderManager(reminders_dir=root, timer_service=service)
+        assert not os.path.exists(os.path.join(root, "reminders.json"))
+        rid = manager.add_reminder_in("新建", "", 0.2)
+        cancelled = manager.add_reminder_in("取消", "", 0.2)
+        assert manager.cancel_reminder(cancelled)
+
+        assert _wait_for(lambda: manager.reminders[rid]["status"] == "sent"
+                         and manager.reminders["soon"]["status"] == "sent"
+                         and manager.reminders["old"]["status"] == "expired")
+        time.sleep(0.1)
+        assert sorted(toasts) == ["新建", "迁移"]
+
+        # 状态逐条写入数据库，重新加载后一致
+        service.flush()
+        reloaded = ReminderManager(reminders_dir=root, timer_service=TimerService())
+        assert {r: v["status"] for r, v in reloaded.reminders.items()} == {
+            "old": "expired", "soon": "sent", rid: "sent", cancelled: "cancelled"}
+        assert reloaded.clear_expired() == 3
+    finally:
+        service.stop()
+        shutil.rmtree(root)
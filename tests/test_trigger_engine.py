@@ -0,0 +1,121 @@
+"""测试主动交互触发系统的事件驱动评估：只评估输入信号变化过的触发器、冷却结束后再评估、每用户触发计数保存在内存并可从历史恢复。"""
+import sys
+import os
+import shutil
+import tempfile
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web.proactive_trigger import ProactiveTriggerSystem, SIGNAL_BEHAVIOR, SIGNAL_SUGGESTIONS
+from web.sqlite_pool import get_database
+
+
+def _system_with_fake_conditions(root, results=None):
+    """所有触发条件替换为计数函数，results 中的触发器返回固定评分"""
+    system = ProactiveTriggerSystem(db_path=os.path.join(root, "triggers.db"))
+    calls = Counter()
+    results = results or {}
+
+    def make_condition(trigger_id):
+        def condition(user_id):
+            calls[(user_id, trigger_id)] += 1
+            return results.get(trigger_id)
+        return condition
+
+    for trigger_id, trigger in system.triggers.items():
+        trigger.condition_func = make_condition(trigger_id)
+    return system, calls
+
+
+def test_only_triggers_with_changed_signals_are_reevaluated():
+    root = tempfile.mkdtemp(prefix="koto_triggers_")
+    try:
+        system, calls = _system_with_fake_conditions(root)
+        users = [f"user{i}" for i in range(500)]
+        for user_id in users:
+            system.evaluate_changed(user_id)          # 首次评估全部触发器
+        assert sum(calls.values()) == 500 * len(system.triggers)
+
+        calls.clear()
+        assert system.evaluate_all_changed() == {}
+        assert sum(calls.values()) == 0               # 没有信号变化，不做任何评估
+
+        system.notify_signal(SIGNAL_BEHAVIOR, "user7", detail="file_edit")
+        system.notify_signal(SIGNAL_SUGGESTIONS)      # 广播给所有已知用户
+        system.evaluate_all_changed()
+        assert {t for (u, t) in calls if u == "user7"} == {
+            "threshold_work_too_long", "pattern_efficiency_drop", "event_return_after_break",
+            "threshold_edit_count", "periodic_check_suggestions", "threshold_unorganized_files"}
+        assert {t for (u, t) in calls if u == "user8"} == {
+            "periodic_check_suggestions", "threshold_unorganized_files"}
+        assert sum(calls.values()) == 4 + 2 * 500
+
+        # 修改参数后该触发器对所有用户失效
+        calls.clear()
+        system.update_trigger_params("pattern_repeated_search", {"search_threshold": 5})
+        system.evaluate_all_changed()
+        assert set(calls) == {(u, "pattern_repeated_search") for u in users}
+    finally:
+        shutil.rmtree(root)
+
+
+def test_ready_triggers_are_kept_until_cooldown_ends():
+    root = tempfile.mkdtemp(prefix="koto_triggers_")
+    try:
+        strong = (0.9, 0.9, {"title": "strong"})
+        weak = (0.7, 0.7, {"title": "weak"})
+        system, calls = _system_with_fake_conditions(
+            root, {"threshold_edit_count": strong, "pattern_repeated_search": weak})
+
+        first = system.evaluate_changed("u")
+        assert first.content["trigger_id"] == "threshold_edit_count"
+        system.execute_interaction(first, "u")
+
+        # 条件成立但未被选中的触发器无需新信号也会在下次评估
+        calls.clear()
+        second = system.evaluate_changed("u")
+        assert second.content["trigger_id"] == "pattern_repeated_search"
+        assert set(calls) == {("u", "pattern_repeated_search")}
+        system.execute_interaction(second, "u")
+        assert system.evaluate_changed("u") is None
+
+        # 冷却期内的信号不会触发，冷却结束后恢复评估
+        system.notify_signal(SIGNAL_BEHAVIOR, "u", detail="file_edit")
+        assert system.evaluate_changed("u") is None
+        deferred = len(system._deferred)
+        for _ in range(1000):                       # 冷却期内持续的行为事件不让唤醒堆增长
+            system.notify_signal(SIGNAL_BEHAVIOR, "u", detail="file_edit")
+            assert system.evaluate_changed("u") is None
+        assert len(system._deferred) == deferred <= len(system.triggers)
+        for trigger_id in system.last_trigger_times:
+            system.last_trigger_times[trigger_id] = system.last_trigger_times[trigger_id].replace(year=2000)
+        system._deferred = [(0, user_id, trigger_id) for _, user_id, trigger_id in system._deferred]
+        system._deferred_at = dict.fromkeys(system._deferred_at, 0)
+        assert system.evaluate_changed("u").content["trigger_id"] == "threshold_edit_count"
+    finally:
+        shutil.rmtree(root)
+
+
+def test_recent_trigger_counts_are_per_user_and_restored():
+    root = tempfile.mkdtemp(prefix="koto_triggers_")
+    try:
+        system, _ = _system_with_fake_conditions(root, {"threshold_edit_count": (0.9, 0.9, {})})
+        for _ in range(3):
+            system.last_trigger_times.clear()
+            assert system.evaluate_interaction_need("alice") is not None
+        assert system.evaluate_interaction_need("bob") is not None
+        assert system._get_recent_trigger_count("alice") == 3
+        assert system._get_recent_trigger_count("bob") == 1
+        assert system._get_recent_trigger_count("carol") == 0
+
+        system.record_user_feedback("threshold_edit_count", "accepted", 5)
+        assert system._get_trigger_effectiveness("threshold_edit_count")["accepted_count"] == 1
+
+        get_database(system.db_path).flush()
+        restored = ProactiveTriggerSystem(db_path=system.db_path)
+        assert restored._get_recent_trigger_count("alice") == 3
+        assert restored._get_recent_trigger_count("bob") == 1
+        assert restored._get_trigger_effectiveness("threshold_edit_count")["accepted_count"] == 1
+    finally:
+        shutil.rmtree(root)
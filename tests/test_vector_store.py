@@ -0,0 +1,102 @@
+"""测试 VectorStore 的追加写入、IVF 检索与 KnowledgeBase 旧数据迁移。"""
+import sys
+import os
+import json
+import tempfile
+import shutil
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web.vector_store import VectorStore
+from web.knowledge_base import KnowledgeBase
+
+
+def _items(prefix, n, doc_id="doc"):
+    return [{"chunk_id": f"{prefix}_{i}", "doc_id": doc_id, "chunk_index": i, "text": f"{prefix} text {i}"}
+            for i in range(n)]
+
+
+def test_append_search_and_reload():
+    root = tempfile.mkdtemp(prefix="koto_vs_")
+    try:
+        rng = np.random.default_rng(1)
+        vecs = rng.normal(size=(50, 16)).astype(np.float32)
+        store = VectorStore(root)
+        store.add(_items("a", 50), vecs)
+        size_after_first = os.path.getsize(store.vectors_path)
+        assert size_after_first == 50 * 16 * 4
+
+        store.add(_items("b", 1, doc_id="other"), vecs[:1] * 2)
+        assert os.path.getsize(store.vectors_path) == 51 * 16 * 4, "only the new row should be appended"
+
+        hits = store.search(vecs[7], top_k=1)
+        assert hits[0]["chunk_id"] == "a_7"
+        assert abs(hits[0]["similarity"] - 1.0) < 1e-5
+
+        # 新实例（冷启动）读取同一份数据
+        reopened = VectorStore(root)
+        assert len(reopened) == 51
+        assert reopened.search(vecs[3], top_k=1)[0]["chunk_id"] == "a_3"
+
+        # 另一实例的写入会被感知
+        store.remove_document("other")
+        assert len(reopened.search(vecs[0], top_k=5)) == 5
+        assert all(h["doc_id"] == "doc" for h in reopened.search(vecs[0], top_k=51))
+        assert len(reopened) == 50
+
+        reopened.compact()
+        assert os.path.getsize(reopened.vectors_path) == 50 * 16 * 4
+        assert reopened.search(vecs[9], top_k=1)[0]["chunk_id"] == "a_9"
+    finally:
+        shutil.rmtree(root)
+
+
+def test_ivf_index_recall():
+    root = tempfile.mkdtemp(prefix="koto_vs_")
+    try:
+        rng = np.random.default_rng(2)
+        centers = rng.normal(size=(20, 32))
+        vecs = (centers[rng.integers(0, 20, 3000)] + rng.normal(scale=0.1, size=(3000, 32))).astype(np.float32)
+        store = VectorStore(root)
+        store.ANN_MIN_ROWS = 1000
+        store.add(_items("x", 2000), vecs[:2000])
+        assert store._centroids is not None, "IVF should be trained once the store is large enough"
+
+        # 训练后的增量写入直接归入已有簇
+        store.add(_items("y", 1000), vecs[2000:])
+        found = 0
+        for i in range(0, 3000, 100):
+            exact = store.search(vecs[i], top_k=1, exact=True)[0]["chunk_id"]
+            approx = store.search(vecs[i], top_k=1)[0]["chunk_id"]
+            found += exact == approx
+        assert found >= 27, f"IVF recall too low: {found}/30"
+    finally:
+        shutil.rmtree(root)
+
+
+def test_knowledge_base_migrates_legacy_json():
+    root = tempfile.mkdtemp(prefix="koto_kb_")
+    try:
+        kb_dir = os.path.join(root, "knowledge_base")
+        os.makedirs(kb_dir)
+        with open(os.path.join(kb_dir, "chunks.json"), "w", encoding="utf-8") as f:
+            json.dump({"chunks": {
+                "d1_0": {"doc_id": "d1", "chunk_index": 0, "text": "hello", "embedding": [1.0, 0.0, 0.0]},
+                "d1_1": {"doc_id": "d1", "chunk_index": 1, "text": "world", "embedding": [0.0, 1.0, 0.0]},
+            }}, f)
+        with open(os.path.join(kb_dir, "index.json"), "w", encoding="utf-8") as f:
+            json.dump({"documents": {"d1": {"file_name": "a.txt", "size": 10, "file_type": ".txt"}}}, f)
+
+        kb = KnowledgeBase(workspace_dir=root, api_key="")
+        assert not os.path.exists(os.path.join(kb_dir, "chunks.json"))
+        stats = kb.get_stats()
+        assert stats["total_documents"] == 1
+        assert stats["total_chunks"] == 2
+        assert kb.store.search([0.0, 1.0, 0.0], top_k=1)[0]["text"] == "world"
+
+        assert kb.remove_document("d1")["success"]
+        assert KnowledgeBase(workspace_dir=root, api_key="").get_stats()["total_chunks"] == 0
+    finally:
+        shutil.rmtree(root)
@@ -17,6 +17,13 @@ _web_dir = os.path.dirname(os.path.abspath(__file__))
 if _web_dir not in sys.path:
     sys.path.append(_web_dir)
 
+# 启动分析（KOTO_PROFILE_STARTUP=1）：须在其余导入之前启用
+try:
+    import startup_profiler
+except ImportError:
+    from web import startup_profiler
+_PROFILE_STARTUP = startup_profiler.enable_from_env()
+
 from flask import Flask, render_template, request, jsonify, send_from_directory, Response, stream_with_context, send_file
 from flask_cors import CORS
 from dotenv import load_dotenv
@@ -27,22 +34,11 @@ from app.core.routing import SmartDispatcher
 # 延迟导入 - 这些路由类仅在运行时首次访问时通过 __getattr__ 加载
 # LocalModelRouter, AIRouter, TaskDecomposer, LocalPlanner 通过 app.core.routing.__getattr__ 延迟加载
 
-# Import unified agent API blueprint — 延迟到蓝图注册时加载
-agent_bp = None  # 延迟加载，见下方蓝图注册区
-
-# ================= 并行执行系统导入 =================
+# 功能区（Agent、语音、PPT、并行执行、记忆）按 URL 前缀懒加载，见下方功能区登记
 try:
-    from parallel_executor import (
-        Task, TaskType, Priority, TaskStatus,
-        get_queue_manager, get_resource_manager, get_task_monitor,
-        submit_task, get_next_task, cancel_task
-    )
-    from task_dispatcher import get_scheduler, start_dispatcher, stop_dispatcher
-    from parallel_api import register_parallel_api
-    PARALLEL_SYSTEM_ENABLED = True
-except ImportError as e:
-    print(f"[WARNING] Failed to import parallel execution system: {e}")
-    PARALLEL_SYSTEM_ENABLED = False
+    from lazy_routes import LazyFlask, LazyRouteRegistry
+except ImportError:
+    from web.lazy_routes import LazyFlask, LazyRouteRegistry
 
 try:
     from flask_sock import Sock
@@ -727,7 +723,10 @@ def stream_with_keepalive(response_stream, start_time, keepalive_interval=5, max
                     raise stream_error['error']
                 return
 
-app = Flask(__name__)
+app = LazyFlask(__name__)
+features = LazyRouteRegistry(app)
+if _PROFILE_STARTUP:
+    startup_profiler.install_first_request_hook(app)
 # 静态资源缓存，减少重复加载
 app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 3600
 
@@ -745,17 +744,6 @@ try:
 except Exception as e:
     print(f"[Auth] ⚠️ 认证模块加载失败: {e}")
 
-# ================= 并行执行系统初始化 =================
-if PARALLEL_SYSTEM_ENABLED:
-    print("[PARALLEL] 🚀 Initializing parallel execution system...")
-    try:
-        register_parallel_api(app)
-        start_dispatcher()
-        print("[PARALLEL] ✅ Parallel execution system initialized successfully")
-    except Exception as e:
-        print(f"[PARALLEL] ❌ Failed to initialize parallel execution system: {e}")
-        PARALLEL_SYSTEM_ENABLED = False
-
 # ================= WebSocket 支持（可选） =================
 sock = None
 if Sock:
@@ -779,61 +767,26 @@ if sock:
         finally:
             manager.unregister_connection(user_id, ws)
 
-# ================= 延迟注册蓝图（在后台线程中加载，避免阻塞启动） =================
-_blueprints_registered = False
-_blueprints_lock = threading.Lock()
+# ================= 功能区登记（首个命中前缀的请求到达时才导入） =================
 
-def _register_blueprints_deferred():
-    """在后台线程中注册所有蓝图，避免阻塞主线程启动."""
-    global _blueprints_registered, agent_bp
-    with _blueprints_lock:
-        if _blueprints_registered:
-            return
-        _blueprints_registered = True
-    
-    # 注册统一 Agent API
-    try:
-        from app.api import agent_bp as _agent_bp
-        agent_bp = _agent_bp
-        app.register_blueprint(agent_bp, url_prefix='/api/agent')
-        print("[UnifiedAgent] ✅ 统一 Agent API 已注册: /api/agent")
-    except ImportError as e:
-        print(f"[UnifiedAgent] ⚠️ 未能导入统一 Agent API 蓝图: {e}")
-    except Exception as e:
-        print(f"[UnifiedAgent] ❌ 注册失败: {e}")
-    
-    # 注册增强语音 API
-    try:
-        from voice_api_enhanced import voice_bp
-        app.register_blueprint(voice_bp)
-        print("[VOICE_API] 已注册增强语音 API 蓝图")
-    except ImportError as e:
-        print(f"[VOICE_API] ⚠️ 未能导入增强语音模块: {e}")
+def _load_agent_api(app):
+    """统一 Agent API（导入时加载插件与 google.genai）"""
+    from app.api import agent_bp
+    app.register_blueprint(agent_bp, url_prefix='/api/agent')
 
-    # 注册 PPT 编辑 API（P1 功能）
-    try:
-        from web.ppt_api_routes import ppt_api_bp
-        app.register_blueprint(ppt_api_bp)
-        print("[PPT_API] ✅ PPT 编辑 API 已注册: /api/ppt")
-    except ImportError as e:
-        print(f"[PPT_API] ⚠️ 未能导入 PPT 编辑 API: {e}")
-    except Exception as e:
-        print(f"[PPT_API] ⚠️ PPT 编辑 API 注册失败: {e}")
 
-    # 注册自适应 Agent API（已迁移到 UnifiedAgent，但保留兼容导入）
-    try:
-        from adaptive_agent_api import init_adaptive_agent_api
-        init_adaptive_agent_api(app, gemini_client=None)
-        print("[AdaptiveAgent] ✅ 自适应 Agent API 已注册 (延迟加载客户端)")
-    except ImportError:
-        print("[AdaptiveAgent] ℹ️ 旧 Agent 模块已退役，使用 UnifiedAgent")
-    except Exception as e:
-        print(f"[AdaptiveAgent] ⚠️ 旧 Agent 初始化失败 (非致命): {e}")
-    
-    print("[INIT] ✅ 所有蓝图注册完成")
+def _load_parallel_system(app):
+    """并行执行系统：注册队列/监控 API 并启动调度线程"""
+    from parallel_api import register_parallel_api
+    from task_dispatcher import start_dispatcher
+    register_parallel_api(app)
+    start_dispatcher()
 
-# 在后台线程中注册蓝图，不阻塞主线程
-threading.Thread(target=_register_blueprints_deferred, name="BlueprintLoader", daemon=True).start()
+
+features.add("agent", "/api/agent", _load_agent_api)
+features.blueprint("voice", "/api/voice", "voice_api_enhanced", "voice_bp")
+features.blueprint("ppt", "/api/ppt", "web.ppt_api_routes", "ppt_api_bp")
+features.add("parallel", ("/api/queue", "/api/monitor", "/api/resource"), _load_parallel_system)
 
 CHAT_DIR = os.path.join(PROJECT_ROOT, "chats")
 WORKSPACE_DIR = get_workspace_root()
@@ -4130,114 +4083,75 @@ class Utils:
 # ================= Session Manager =================
 
 class SessionManager:
+    """会话历史读写，底层为追加写入的 ChatStore（chats/<name>.jsonl）"""
+    
     def __init__(self):
-        self.sessions = {}
+        from chat_store import get_chat_store
+        self.store = get_chat_store(CHAT_DIR)
     
     def list_sessions(self):
         """列出所有会话，按修改时间排序（最新在前）"""
-        files = [f for f in os.listdir(CHAT_DIR) if f.endswith(".json")]
-        # 按修改时间排序，最新的在前
-        files_with_time = []
-        for f in files:
-            path = os.path.join(CHAT_DIR, f)
-            mtime = os.path.getmtime(path)
-            files_with_time.append((f, mtime))
-        files_with_time.sort(key=lambda x: x[1], reverse=True)
-        return [f[0] for f in files_with_time]
-    
-    def load(self, filename):
-        """加载会话历史 - 返回用于模型上下文的截断版本"""
-        path = os.path.join(CHAT_DIR, filename)
-        if os.path.exists(path):
-            try:
-                with open(path, "r", encoding="utf-8", errors="ignore") as f:
-                    full_history = json.load(f)
-                    # 仅截断用于模型上下文的部分，不影响持久化存储
-                    return self._trim_history(full_history)
-            except:
-                return []
-        return []
+        return self.store.list_sessions()
+    
+    def load(self, filename, max_turns=20):
+        """加载会话历史 - 返回用于模型上下文的截断版本（只从文件末尾读取）"""
+        try:
+            return self.store.tail(filename, max_turns)
+        except Exception:
+            return []
     
     def load_full(self, filename):
-        """加载完整会话历史 - 用于追加保存，不做截断"""
-        path = os.path.join(CHAT_DIR, filename)
-        if os.path.exists(path):
-            try:
-                with open(path, "r", encoding="utf-8", errors="ignore") as f:
-                    return json.load(f)
-            except:
-                return []
-        return []
-    
-    def _trim_history(self, history, max_turns=20):
-        """保留最多 20 轮对话（约 12000+ tokens），确保上下文足够但不过长"""
-        if len(history) <= max_turns:
-            return history
-        # 只保留最后 N 轮对话
-        trimmed = history[-max_turns:]
-        print(f"[HISTORY] Trimmed to last {max_turns} turns (was {len(history)})")
-        return trimmed
+        """加载完整会话历史 - 用于前端渲染，不做截断"""
+        try:
+            return self.store.load(filename)
+        except Exception:
+            return []
     
     def create(self, name):
         safe = "".join([c if c.isalnum() else "_" for c in name])
         filename = f"{safe}.json"
-        path = os.path.join(CHAT_DIR, filename)
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump([], f)
+        self.store.create(filename)
         return filename
     
     def save(self, filename, history):
-        path = os.path.join(CHAT_DIR, filename)
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(history, f, indent=2, ensure_ascii=False)
+        self.store.save(filename, history)
     
     def append_and_save(self, filename, user_msg, model_msg, **extra_fields):
-        """追加消息并保存 - 基于磁盘完整历史，避免截断导致数据丢失"""
-        full_history = self.load_full(filename)
+        """追加一轮对话（只写入新增的两条消息），返回追加的消息"""
         user_timestamp = extra_fields.pop("user_timestamp", datetime.now().isoformat())
         model_timestamp = extra_fields.pop("model_timestamp", datetime.now().isoformat())
 
-        full_history.append({"role": "user", "parts": [user_msg], "timestamp": user_timestamp})
+        user_entry = {"role": "user", "parts": [user_msg], "timestamp": user_timestamp}
         model_entry = {"role": "model", "parts": [model_msg]}
         if "timestamp" not in extra_fields:
             model_entry["timestamp"] = model_timestamp
         model_entry.update(extra_fields)
-        full_history.append(model_entry)
-        self.save(filename, full_history)
-        return full_history
+        self.store.append(filename, user_entry, model_entry)
+        return [user_entry, model_entry]
     
     def append_user_early(self, filename, user_msg):
-        """在请求到达时立即保存用户消息，防止断连导致丢失
-        返回history长度，后续用update_last_model_response更新模型回复"""
-        full_history = self.load_full(filename)
+        """在请求到达时立即保存用户消息和占位回复，防止断连导致丢失
+        后续用update_last_model_response替换占位回复"""
         now_iso = datetime.now().isoformat()
-        full_history.append({"role": "user", "parts": [user_msg], "timestamp": now_iso})
-        full_history.append({"role": "model", "parts": ["⏳ 处理中..."], "timestamp": now_iso})
-        self.save(filename, full_history)
-        return len(full_history)
+        self.store.append(filename,
+                          {"role": "user", "parts": [user_msg], "timestamp": now_iso},
+                          {"role": "model", "parts": ["⏳ 处理中..."], "timestamp": now_iso})
     
     def update_last_model_response(self, filename, model_msg, **extra_fields):
         """更新最后一条模型回复（配合append_user_early使用）"""
-        full_history = self.load_full(filename)
-        if full_history and full_history[-1].get("role") == "model":
-            model_entry = {"role": "model", "parts": [model_msg]}
-            if "timestamp" not in extra_fields:
-                model_entry["timestamp"] = datetime.now().isoformat()
-            model_entry.update(extra_fields)
-            full_history[-1] = model_entry
-            self.save(filename, full_history)
+        model_entry = {"role": "model", "parts": [model_msg]}
+        if "timestamp" not in extra_fields:
+            model_entry["timestamp"] = datetime.now().isoformat()
+        model_entry.update(extra_fields)
+        last = self.store.tail(filename, 1)
+        if last and last[-1].get("role") == "model":
+            self.store.replace_last(filename, model_entry)
         else:
             # fallback: 直接追加
-            model_entry = {"role": "model", "parts": [model_msg]}
-            if "timestamp" not in extra_fields:
-                model_entry["timestamp"] = datetime.now().isoformat()
-            model_entry.update(extra_fields)
-            full_history.append(model_entry)
-            self.save(filename, full_history)
+            self.store.append(filename, model_entry)
 
     def add_message(self, filename, role, content, task="CHAT", model_name="Auto", **extra_fields):
         """追加单条消息（兼容旧调用），默认附带时间戳"""
-        full_history = self.load_full(filename)
         entry = {
             "role": role,
             "parts": [content],
@@ -4246,19 +4160,11 @@ class SessionManager:
             "timestamp": extra_fields.pop("timestamp", datetime.now().isoformat())
         }
         entry.update(extra_fields)
-        full_history.append(entry)
-        self.save(filename, full_history)
+        self.store.append(filename, entry)
         return entry
     
     def delete(self, filename):
-        path = os.path.join(CHAT_DIR, filename)
-        if os.path.exists(path):
-            try:
-                os.remove(path)
-                return True
-            except:
-                return False
-        return False
+        return self.store.delete(filename)
 
 session_manager = SessionManager()
 
@@ -9341,34 +9247,6 @@ def download_ppt():
         return jsonify({"error": f"Download failed: {str(e)}"}), 500
 
 
-@app.route('/api/ppt/session/<session_id>', methods=['GET'])
-def get_ppt_session(session_id):
-    """获取 PPT 会话信息"""
-    try:
-        from web.ppt_session_manager import PPTSessionManager
-        ppt_session_dir = os.path.join(WORKSPACE_DIR, 'workspace', 'ppt_sessions')
-        manager = PPTSessionManager(ppt_session_dir)
-        
-        session_data = manager.load_session(session_id)
-        if not session_data:
-            return jsonify({"error": "Session not found"}), 404
-        
-        return jsonify({
-            "success": True,
-            "session": {
-                "id": session_data.get('session_id'),
-                "title": session_data.get('title'),
-                "status": session_data.get('status'),
-                "ppt_file_path": session_data.get('ppt_file_path'),
-                "created_at": session_data.get('created_at'),
-                "updated_at": session_data.get('updated_at')
-            }
-        })
-    
-    except Exception as e:
-        print(f"[PPT SESSION] 错误: {e}")
-        return jsonify({"error": str(e)}), 500
-
 @app.route('/api/ping', methods=['GET'])
 def ping():
     start = time.time()
@@ -9391,7 +9269,8 @@ def health():
     """轻量健康检查（不触发模型调用）"""
     return jsonify({
         "status": "ok",
-        "time": time.time()
+        "time": time.time(),
+        "features": features.status()
     })
 
 @app.route('/api/analyze', methods=['POST'])
@@ -12125,6 +12004,10 @@ if __name__ == '__main__':
             task_scheduler.start()
             print("⏰ 任务调度器已启动")
             
+            # 恢复未触发的提醒（提醒作业持久化在共享定时服务中）
+            from reminder_manager import get_reminder_manager
+            get_reminder_manager()
+            
             # 初始化自动归纳调度器（如果已启用）
             auto_catalog = get_auto_catalog_scheduler()
             if auto_catalog.is_auto_catalog_enabled():
@@ -12141,8 +12024,9 @@ if __name__ == '__main__':
         port = int(os.environ.get('KOTO_PORT', '5000'))
         app.run(debug=debug_mode, host='0.0.0.0', port=port, threaded=True)
     finally:
-        # 应用关闭时清理并行执行系统
-        if PARALLEL_SYSTEM_ENABLED:
+        # 应用关闭时清理并行执行系统（仅在已被请求加载时）
+        if features.is_loaded("parallel"):
+            from task_dispatcher import stop_dispatcher
             print("[PARALLEL] 🛑 Shutting down parallel execution system...")
             stop_dispatcher()
             print("[PARALLEL] ✅ Parallel execution system shut down")
@@ -12187,7 +12071,9 @@ def get_batch_ops_manager():
             from web.batch_file_ops import BatchFileOpsManager
         except ImportError:
             from batch_file_ops import BatchFileOpsManager
-        _batch_ops_cache['batch_ops'] = BatchFileOpsManager()
+        _batch_ops_cache['batch_ops'] = BatchFileOpsManager(
+            checkpoint_dir=os.path.join(get_workspace_root(), "batch_jobs")
+        )
     return _batch_ops_cache['batch_ops']
 
 _file_editor_cache = {}
@@ -12356,6 +12242,12 @@ def get_trigger_system():
         )
     return _trigger_system_cache['system']
 
+def notify_trigger_signal(signal, user_id=None, detail=None):
+    """通知触发系统某类输入已变化（系统尚未加载时忽略：首次评估本就会检查全部触发器）"""
+    system = _trigger_system_cache.get('system')
+    if system is not None:
+        system.notify_signal(signal, user_id=user_id, detail=detail)
+
 
 @app.route('/api/batch/submit', methods=['POST'])
 def batch_submit():
@@ -12412,6 +12304,15 @@ def batch_get_job(job_id):
     return jsonify({"success": True, "job": job})
 
 
+@app.route('/api/batch/jobs/<job_id>/resume', methods=['POST'])
+def batch_resume_job(job_id):
+    """从检查点继续因重启中断的任务"""
+    manager = get_batch_ops_manager()
+    if not manager.resume_job(job_id):
+        return jsonify({"success": False, "error": "任务不存在或未中断"}), 400
+    return jsonify({"success": True, "job": manager.get_job(job_id)})
+
+
 @app.route('/api/batch/stream/<job_id>', methods=['GET'])
 def batch_stream_job(job_id):
     """批量任务进度流"""
@@ -12479,6 +12380,7 @@ def organize_auto_organize():
         )
         
         if org_result.get('success'):
+            notify_trigger_signal("files")
             return jsonify({
                 "success": True,
                 "file": os.path.basename(file_path),
@@ -12696,6 +12598,26 @@ def file_search_index():
         
         indexer = get_file_indexer()
         
+        if is_directory and data.get('stream'):
+            # 以 SSE 推送增量索引进度
+            import queue as _queue
+            events = _queue.Queue()
+            
+            def _worker():
+                result = indexer.index_directory(path, recursive=True, progress_callback=events.put)
+                events.put({"stage": "result", **result})
+            
+            threading.Thread(target=_worker, daemon=True).start()
+            
+            def generate_index_progress():
+                while True:
+                    event = events.get()
+                    yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+                    if event.get("stage") == "result":
+                        break
+            
+            return Response(generate_index_progress(), mimetype='text/event-stream')
+        
         if is_directory:
             result = indexer.index_directory(path, recursive=True)
         else:
@@ -12977,7 +12899,9 @@ def behavior_log_event():
         triggered = False
         if auto_trigger:
             trigger_system = get_trigger_system()
-            decision = trigger_system.evaluate_interaction_need(user_id)
+            # 只重新评估依赖该类行为事件的触发器
+            trigger_system.notify_signal("behavior", user_id=user_id, detail=event_type)
+            decision = trigger_system.evaluate_changed(user_id)
             if decision and decision.should_interact:
                 trigger_system.execute_interaction(decision, user_id)
                 triggered = True
@@ -13077,6 +13001,7 @@ def suggestions_generate():
         
         engine = get_suggestion_engine()
         suggestions = engine.generate_suggestions(force_regenerate=force_regenerate)
+        notify_trigger_signal("suggestions")
         
         return jsonify({
             "success": True,
@@ -13118,6 +13043,7 @@ def suggestions_dismiss():
         
         engine = get_suggestion_engine()
         engine.dismiss_suggestion(suggestion_id, feedback=feedback)
+        notify_trigger_signal("suggestions")
         
         return jsonify({
             "success": True,
@@ -13140,6 +13066,7 @@ def suggestions_apply():
         
         engine = get_suggestion_engine()
         engine.apply_suggestion(suggestion_id, feedback=feedback)
+        notify_trigger_signal("suggestions")
         
         return jsonify({
             "success": True,
@@ -13431,6 +13358,7 @@ def detect_context():
         
         system = get_context_awareness()
         context = system.detect_context(user_id)
+        notify_trigger_signal("context", user_id=user_id)
         
         return jsonify({
             "success": True,
@@ -13890,16 +13818,16 @@ def triggers_feedback():
         return jsonify({"error": str(e)}), 500
 
 
-# ═══ 注册增强记忆系统API（模块级别，确保始终执行） ═══
-try:
-    from memory_api_routes import register_memory_routes
-    register_memory_routes(app, get_memory_manager)
-except ImportError:
+# ═══ 增强记忆系统API（首次访问 /api/memories、/api/memory 时注册） ═══
+def _load_memory_api(app):
     try:
-        from web.memory_api_routes import register_memory_routes
-        register_memory_routes(app, get_memory_manager)
+        from memory_api_routes import register_memory_routes
     except ImportError:
-        print("⚠️  增强记忆系统API未找到，使用基础功能")
+        from web.memory_api_routes import register_memory_routes
+    register_memory_routes(app, get_memory_manager)
+
+
+features.add("memory", ("/api/memories", "/api/memory"), _load_memory_api)
 
 
 # ═══ 自动归纳调度器 API ═══
@@ -13996,3 +13924,6 @@ def get_backup_manifest(filename):
         return jsonify({"error": str(e)}), 404
 
 
+if _PROFILE_STARTUP:
+    startup_profiler.mark("web.app 导入完成")
+    startup_profiler.report()
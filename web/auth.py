@@ -99,23 +99,25 @@ def _verify_token(token: str) -> dict:
 
 
 # ── 请求频率限制 ──
-_rate_limits = {}  # { user_id: { "date": "2026-02-23", "count": 42 } }
+# 计数保存在限流后端：KOTO_RATE_LIMIT_BACKEND=sqlite 时多个 worker 进程共用同一份每日配额
+_daily_quota = None
 
 
-def _check_rate_limit(user_id: str) -> bool:
-    """检查用户今日请求是否超限"""
-    today = datetime.now().strftime("%Y-%m-%d")
-    if user_id not in _rate_limits or _rate_limits[user_id]["date"] != today:
-        _rate_limits[user_id] = {"date": today, "count": 0}
-    return _rate_limits[user_id]["count"] < MAX_DAILY_REQUESTS
+def _get_daily_quota():
+    global _daily_quota
+    if _daily_quota is None:
+        try:
+            from web.rate_limiter import DailyQuota
+        except ImportError:
+            from rate_limiter import DailyQuota
+        _daily_quota = DailyQuota(MAX_DAILY_REQUESTS, namespace="auth_daily")
+    return _daily_quota
 
 
-def _increment_request(user_id: str):
-    """增加请求计数"""
-    today = datetime.now().strftime("%Y-%m-%d")
-    if user_id not in _rate_limits or _rate_limits[user_id]["date"] != today:
-        _rate_limits[user_id] = {"date": today, "count": 0}
-    _rate_limits[user_id]["count"] += 1
+def _consume_request(user_id: str) -> bool:
+    """检查并原子地增加用户今日请求计数，超限返回 False"""
+    allowed, _ = _get_daily_quota().consume(user_id)
+    return allowed
 
 
 # ── Flask 中间件 ──
@@ -144,13 +146,12 @@ def require_auth(f):
         user_id = payload.get("user_id", "")
         
         # 频率限制
-        if not _check_rate_limit(user_id):
+        if not _consume_request(user_id):
             return jsonify({
                 "error": f"今日请求已达上限 ({MAX_DAILY_REQUESTS}次)",
                 "code": "RATE_LIMIT"
             }), 429
 
-        _increment_request(user_id)
         g.user_id = user_id
         g.user_email = payload.get("email", "")
         return f(*args, **kwargs)
@@ -248,8 +249,7 @@ def register_auth_routes(app):
         users = _load_users()
         for email, user in users.items():
             if user["user_id"] == g.user_id:
-                today = datetime.now().strftime("%Y-%m-%d")
-                used = _rate_limits.get(g.user_id, {}).get("count", 0) if _rate_limits.get(g.user_id, {}).get("date") == today else 0
+                used = _get_daily_quota().used(g.user_id)
                 return jsonify({
                     "user_id": g.user_id,
                     "email": email,
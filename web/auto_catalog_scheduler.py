@@ -13,6 +13,9 @@ from typing import Dict, Any, Optional
 class AutoCatalogScheduler:
     """自动归纳调度器，负责定时执行文件夹归纳并验证备份"""
 
+    TIMER_KIND = "auto_catalog"
+    TIMER_JOB_ID = "auto_catalog_daily"
+
     def __init__(self, settings_file: str = None):
         """
         Args:
@@ -28,9 +31,13 @@ class AutoCatalogScheduler:
 
         # 引用核心模块（延迟加载）
         self.folder_organizer = None
-        self.task_scheduler = None
+        self.timer_service = None
         self.catalog_task_id = None
 
+        # 已持久化的每日作业在重启后到期时需要处理函数
+        if self.is_auto_catalog_enabled():
+            self._get_timer_service()
+
     def _load_config(self) -> Dict:
         """加载用户设置"""
         if os.path.exists(self.settings_file):
@@ -110,36 +117,51 @@ class AutoCatalogScheduler:
         # 取消定时任务
         self._cancel_scheduled_task()
 
+    def _get_timer_service(self):
+        """获取共享定时服务并注册归纳作业的处理函数（延迟加载）"""
+        if self.timer_service is None:
+            try:
+                from web.timer_service import get_timer_service
+            except ImportError:
+                from timer_service import get_timer_service
+
+            self.timer_service = get_timer_service()
+            self.timer_service.register_handler(self.TIMER_KIND, self._on_timer)
+        return self.timer_service
+
+    def _on_timer(self, job):
+        """定时服务回调：到点执行归纳（作业持久化，重启后仍会触发，执行前再确认开关）"""
+        if self.is_auto_catalog_enabled():
+            self.execute_auto_catalog()
+
     def _register_scheduled_task(self):
-        """向任务调度器注册定时任务"""
+        """向共享定时服务注册每日归纳作业（持久化，重复注册无副作用）"""
         try:
-            from web.task_scheduler import get_task_scheduler
+            from web.timer_service import next_fire_time
         except ImportError:
-            from task_scheduler import get_task_scheduler
-
-        self.task_scheduler = get_task_scheduler()
-
-        # 如果已有任务，先取消
-        if self.catalog_task_id is not None:
-            self.task_scheduler.cancel_task(self.catalog_task_id)
+            from timer_service import next_fire_time
 
+        timer_service = self._get_timer_service()
         schedule_time = self.get_catalog_schedule()
-
-        self.catalog_task_id = self.task_scheduler.schedule_task(
-            name="自动文件归纳",
-            action=self.execute_auto_catalog,
-            schedule_type="daily",
-            time_str=schedule_time
-        )
+        repeat = {"type": "daily", "time": schedule_time}
+
+        # 已有相同时间的作业（含重启前持久化的）保留原触发时间，停机期间错过的一次仍会补执行
+        existing = timer_service.get_job(self.TIMER_JOB_ID)
+        if existing is None or existing.repeat != repeat:
+            timer_service.schedule(
+                self.TIMER_JOB_ID, self.TIMER_KIND,
+                next_fire_time(repeat, datetime.now()),
+                repeat=repeat
+            )
+        self.catalog_task_id = self.TIMER_JOB_ID
 
         print(f"[自动归纳] 任务已注册，ID: {self.catalog_task_id}")
 
     def _cancel_scheduled_task(self):
-        """取消定时任务"""
-        if self.task_scheduler and self.catalog_task_id:
-            self.task_scheduler.cancel_task(self.catalog_task_id)
-            print(f"[自动归纳] 任务已取消，ID: {self.catalog_task_id}")
-            self.catalog_task_id = None
+        """取消定时任务（包括上次运行时持久化的作业）"""
+        if self._get_timer_service().cancel(self.TIMER_JOB_ID):
+            print(f"[自动归纳] 任务已取消，ID: {self.TIMER_JOB_ID}")
+        self.catalog_task_id = None
 
     def execute_auto_catalog(self) -> Dict[str, Any]:
         """
@@ -1,18 +1,42 @@
 """
 Batch file operations with progress tracking.
+
+Files are processed by a per-job worker pool: CPU-bound operations
+(convert, compress_images, extract_text) run in a process pool, I/O-bound
+ones in a thread pool. Progress events are throttled and coalesced, and
+running jobs are checkpointed so they can be resumed after a restart.
 """
 import os
 import re
 import json
 import csv
+import time
 import uuid
 import shutil
-import queue
 import threading
-from dataclasses import dataclass, field
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
 from datetime import datetime
+from functools import partial
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Operations that are CPU-bound and run in a process pool; the rest use threads.
+PROCESS_POOL_OPERATIONS = {"convert", "compress_images", "extract_text"}
+# Operations that must run one file at a time (organize updates a shared index).
+SERIAL_OPERATIONS = {"organize"}
+
+_worker_manager = None
+
+
+def _process_file_worker(operation: str, options: Dict[str, Any], input_root: Path, output_root: Path,
+                         item: Tuple[int, Path]) -> Tuple[int, Path, Dict[str, Any], Optional[str]]:
+    """Process pool entry point: reuses one manager per worker process."""
+    global _worker_manager
+    if _worker_manager is None:
+        _worker_manager = BatchFileOpsManager(checkpoint_dir=None)
+    return _worker_manager._run_file(operation, options, input_root, output_root, item)
 
 
 @dataclass
@@ -34,11 +58,48 @@ class BatchJobRecord:
     errors: List[str] = field(default_factory=list)
 
 
-class BatchFileOpsManager:
+class JobEventChannel:
+    """Single-consumer event queue; an unread progress event is replaced by a newer one."""
+
     def __init__(self):
+        self._events: deque = deque()
+        self._cond = threading.Condition()
+
+    def put(self, event: Dict[str, Any]):
+        with self._cond:
+            if event.get("type") == "progress" and self._events and self._events[-1].get("type") == "progress":
+                self._events[-1] = event
+            else:
+                self._events.append(event)
+            self._cond.notify()
+
+    def get(self) -> Dict[str, Any]:
+        with self._cond:
+            while not self._events:
+                self._cond.wait()
+            return self._events.popleft()
+
+    def qsize(self) -> int:
+        with self._cond:
+            return len(self._events)
+
+
+class BatchFileOpsManager:
+    PROCESS_MIN_FILES = 16       # smaller jobs use threads even for CPU-bound operations
+    IN_FLIGHT_PER_WORKER = 4     # submitted-but-unfinished files per worker
+    PROGRESS_INTERVAL = 0.2      # seconds between progress events
+    CHECKPOINT_INTERVAL = 2.0    # seconds between checkpoint writes
+
+    def __init__(self, checkpoint_dir: Optional[str] = "workspace/batch_jobs",
+                 default_parallelism: Optional[int] = None):
         self.jobs: Dict[str, BatchJobRecord] = {}
-        self.job_events: Dict[str, queue.Queue] = {}
+        self.job_events: Dict[str, JobEventChannel] = {}
         self.lock = threading.Lock()
+        self.checkpoint_dir = checkpoint_dir
+        self.default_parallelism = default_parallelism or os.cpu_count() or 1
+        self._progress_at: Dict[str, float] = {}
+        self._checkpoint_at: Dict[str, float] = {}
+        self._load_checkpoints()
 
     def list_jobs(self) -> List[Dict[str, Any]]:
         with self.lock:
@@ -61,13 +122,25 @@ class BatchFileOpsManager:
         )
         with self.lock:
             self.jobs[job_id] = job
-            self.job_events[job_id] = queue.Queue()
+            self.job_events[job_id] = JobEventChannel()
         return job
 
     def start_job(self, job_id: str):
         thread = threading.Thread(target=self._run_job, args=(job_id,), daemon=True)
         thread.start()
 
+    def resume_job(self, job_id: str) -> bool:
+        """Resume a job interrupted by a restart; files already in its checkpoint are skipped."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if not job or job.status != "interrupted":
+                return False
+            job.status = "queued"
+            self.job_events[job_id] = JobEventChannel()
+        thread = threading.Thread(target=self._run_job, args=(job_id,), daemon=True)
+        thread.start()
+        return True
+
     def stream_job(self, job_id: str) -> Iterable[str]:
         for event in self.iter_job_events(job_id):
             yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
@@ -124,6 +197,10 @@ class BatchFileOpsManager:
         if op == "extract_text":
             options["target_ext"] = ".txt"
 
+        parallelism = self._extract_kv(text, "并发")
+        if parallelism and parallelism.isdigit():
+            options["parallelism"] = int(parallelism)
+
         return {
             "success": True,
             "operation": op,
@@ -248,14 +325,15 @@ class BatchFileOpsManager:
         if not job:
             return
 
+        resumed = len(job.results)
         job.status = "running"
-        job.started_at = datetime.now().isoformat()
+        job.started_at = job.started_at or datetime.now().isoformat()
         self._emit(job_id, {
             "type": "progress",
             "current": 0,
             "total": 0,
             "status": "start",
-            "detail": f"开始处理: {job.name}"
+            "detail": f"开始处理: {job.name}" if not resumed else f"继续处理: {job.name}"
         })
 
         input_dir = Path(job.input_dir)
@@ -264,39 +342,33 @@ class BatchFileOpsManager:
 
         files = self._collect_files(input_dir, job.options.get("include_exts"))
         job.total_items = len(files)
+        done = {item.get("source") for item in job.results}
+        pending = [(idx, path) for idx, path in enumerate(files, start=1) if str(path) not in done]
 
         self._emit(job_id, {
             "type": "progress",
-            "current": 0,
+            "current": job.total_items - len(pending),
             "total": job.total_items,
             "status": "scan",
-            "detail": f"发现 {job.total_items} 个文件"
+            "detail": f"发现 {job.total_items} 个文件" + (f"，已完成 {job.total_items - len(pending)} 个" if resumed else "")
         })
+        self._checkpoint(job, force=True)
 
-        for idx, path in enumerate(files, start=1):
-            try:
-                result = self._process_file(job, path, input_dir, output_dir, idx)
-                job.results.append(result)
-                if result.get("success"):
-                    job.processed_items += 1
-                else:
-                    job.failed_items += 1
-            except Exception as e:
+        for idx, path, result, error in self._execute_files(job, pending, input_dir, output_dir):
+            job.results.append(result)
+            if result.get("success"):
+                job.processed_items += 1
+            else:
                 job.failed_items += 1
-                job.errors.append(str(e))
-                result = {"source": str(path), "success": False, "error": str(e)}
-                job.results.append(result)
-
-            self._emit(job_id, {
-                "type": "progress",
-                "current": idx,
-                "total": job.total_items,
-                "status": "processing",
-                "detail": f"{path.name}"
-            })
+            if error:
+                job.errors.append(error)
+
+            self._emit_progress(job, path.name)
+            self._checkpoint(job)
 
         job.status = "completed" if job.failed_items == 0 else "failed"
         job.completed_at = datetime.now().isoformat()
+        self._remove_checkpoint(job_id)
 
         summary = self._build_summary(job)
         self._emit(job_id, {
@@ -305,11 +377,137 @@ class BatchFileOpsManager:
             "job": self._job_to_dict(job)
         })
 
+    def _job_parallelism(self, job: BatchJobRecord, pending: int) -> int:
+        if job.operation in SERIAL_OPERATIONS:
+            return 1
+        try:
+            limit = int(job.options.get("parallelism") or self.default_parallelism)
+        except (TypeError, ValueError):
+            limit = self.default_parallelism
+        return max(1, min(limit, pending))
+
+    def _execute_files(self, job: BatchJobRecord, items: List[Tuple[int, Path]], input_root: Path,
+                       output_root: Path) -> Iterator[Tuple[int, Path, Dict[str, Any], Optional[str]]]:
+        """Process files in the job's worker pool, yielding results in completion order."""
+        workers = self._job_parallelism(job, len(items))
+        run = partial(self._run_file, job.operation, job.options, input_root, output_root)
+        if workers <= 1:
+            for item in items:
+                yield run(item)
+            return
+
+        use_processes = job.operation in PROCESS_POOL_OPERATIONS and len(items) >= self.PROCESS_MIN_FILES
+        done = set()
+        try:
+            if use_processes:
+                pool = ProcessPoolExecutor(max_workers=workers)
+                fn = partial(_process_file_worker, job.operation, job.options, input_root, output_root)
+            else:
+                pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"batch-{job.job_id}")
+                fn = run
+            with pool:
+                remaining = iter(items)
+                in_flight = set()
+                while True:
+                    for item in remaining:
+                        in_flight.add(pool.submit(fn, item))
+                        if len(in_flight) >= workers * self.IN_FLIGHT_PER_WORKER:
+                            break
+                    if not in_flight:
+                        break
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        result = future.result()
+                        done.add(result[0])
+                        yield result
+        except Exception as e:
+            # Worker pool unavailable (e.g. restricted environment): finish serially
+            print(f"[BatchFileOps] 工作池不可用，改为串行处理: {e}")
+            for item in items:
+                if item[0] not in done:
+                    yield run(item)
+
+    def _run_file(self, operation: str, options: Dict[str, Any], input_root: Path, output_root: Path,
+                  item: Tuple[int, Path]) -> Tuple[int, Path, Dict[str, Any], Optional[str]]:
+        index, path = item
+        try:
+            return index, path, self._process_op(operation, options, path, input_root, output_root, index), None
+        except Exception as e:
+            return index, path, {"source": str(path), "success": False, "error": str(e)}, str(e)
+
     def _emit(self, job_id: str, event: Dict[str, Any]):
         q = self.job_events.get(job_id)
         if q:
             q.put(event)
 
+    def _emit_progress(self, job: BatchJobRecord, detail: str):
+        """Throttled progress event; the last file always reports."""
+        current = len(job.results)
+        now = time.time()
+        if current < job.total_items and now - self._progress_at.get(job.job_id, 0.0) < self.PROGRESS_INTERVAL:
+            return
+        self._progress_at[job.job_id] = now
+        self._emit(job.job_id, {
+            "type": "progress",
+            "current": current,
+            "total": job.total_items,
+            "status": "processing",
+            "detail": detail
+        })
+
+    # ---- checkpoints ----
+
+    def _checkpoint_path(self, job_id: str) -> str:
+        return os.path.join(self.checkpoint_dir, f"{job_id}.json")
+
+    def _checkpoint(self, job: BatchJobRecord, force: bool = False):
+        if not self.checkpoint_dir:
+            return
+        now = time.time()
+        if not force and now - self._checkpoint_at.get(job.job_id, 0.0) < self.CHECKPOINT_INTERVAL:
+            return
+        self._checkpoint_at[job.job_id] = now
+        try:
+            os.makedirs(self.checkpoint_dir, exist_ok=True)
+            path = self._checkpoint_path(job.job_id)
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(asdict(job), f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except Exception as e:
+            print(f"[BatchFileOps] 保存任务检查点失败: {e}")
+
+    def _remove_checkpoint(self, job_id: str):
+        self._checkpoint_at.pop(job_id, None)
+        self._progress_at.pop(job_id, None)
+        if not self.checkpoint_dir:
+            return
+        try:
+            os.remove(self._checkpoint_path(job_id))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"[BatchFileOps] 删除任务检查点失败: {e}")
+
+    def _load_checkpoints(self):
+        """Register jobs left unfinished by a previous run as 'interrupted'."""
+        if not self.checkpoint_dir or not os.path.isdir(self.checkpoint_dir):
+            return
+        for name in os.listdir(self.checkpoint_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.checkpoint_dir, name), "r", encoding="utf-8") as f:
+                    job = BatchJobRecord(**json.load(f))
+            except Exception as e:
+                print(f"[BatchFileOps] 任务检查点无法读取 {name}: {e}")
+                continue
+            if isinstance(job.options.get("replace"), list):
+                job.options["replace"] = tuple(job.options["replace"])
+            job.status = "interrupted"
+            self.jobs[job.job_id] = job
+            self.job_events[job.job_id] = JobEventChannel()
+
     def _collect_files(self, input_dir: Path, include_exts: Optional[List[str]]) -> List[Path]:
         if not input_dir.exists():
             return []
@@ -320,15 +518,17 @@ class BatchFileOpsManager:
         return files
 
     def _process_file(self, job: BatchJobRecord, path: Path, input_root: Path, output_root: Path, index: int) -> Dict[str, Any]:
-        op = job.operation
+        return self._process_op(job.operation, job.options, path, input_root, output_root, index)
+
+    def _process_op(self, op: str, options: Dict[str, Any], path: Path, input_root: Path, output_root: Path, index: int) -> Dict[str, Any]:
         if op == "convert":
-            return self._convert_file(path, input_root, output_root, job.options)
+            return self._convert_file(path, input_root, output_root, options)
         if op == "rename":
-            return self._rename_file(path, input_root, output_root, job.options, index)
+            return self._rename_file(path, input_root, output_root, options, index)
         if op == "organize":
             return self._organize_file(path, output_root)
         if op == "compress_images":
-            return self._compress_image(path, input_root, output_root, job.options)
+            return self._compress_image(path, input_root, output_root, options)
         if op == "extract_text":
             return self._extract_text(path, input_root, output_root)
         if op == "clean_normalize":
@@ -3,14 +3,25 @@
 """
 行为监控模块 - 追踪用户文件操作行为
 为智能建议和洞察报告提供数据基础
+
+事件经 EventPipeline 异步批量写入，log_event() 不等待数据库。
 """
 
+import atexit
+import os
 import sqlite3
 import json
+import threading
+import time
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 from pathlib import Path
-from collections import Counter, defaultdict
+from collections import Counter, defaultdict, deque
+
+try:
+    from sqlite_pool import get_database
+except ImportError:
+    from web.sqlite_pool import get_database
 
 
 class BehaviorMonitor:
@@ -37,12 +48,13 @@ class BehaviorMonitor:
         """
         self.db_path = db_path
         self._ensure_db()
+        self._pipeline = EventPipeline.for_monitor(self)
     
     def _ensure_db(self):
         """确保数据库和表结构存在"""
         Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
         
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         # 事件日志表 - 存储所有用户操作事件
@@ -110,15 +122,77 @@ class BehaviorMonitor:
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_event_timestamp ON event_log(timestamp DESC)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_event_file ON event_log(file_path)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_search_query ON search_history(query)")
+
+        # 事件ID分配表 - 各进程按块预留 event_log 的ID，事件入缓冲时即可返回ID
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS id_allocator (
+                name TEXT PRIMARY KEY,
+                next_id INTEGER NOT NULL
+            )
+        """)
         
         conn.commit()
         conn.close()
+
+        get_database(self.db_path).write(self._ensure_rollups, wait=True)
+
+    def _ensure_rollups(self, conn):
+        """
+        创建汇总表：按小时/按天的事件类型计数、按天的文件事件计数
+
+        汇总表与 event_log 在同一事务中更新；首次创建时从已有事件一次性回填。
+        """
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'file_rollup_daily'").fetchone()
+        if exists:
+            return
+        conn.execute("""
+            CREATE TABLE event_rollup_hourly (
+                hour TEXT NOT NULL,       -- 'YYYY-MM-DDTHH'
+                event_type TEXT NOT NULL,
+                event_count INTEGER NOT NULL,
+                PRIMARY KEY (hour, event_type)
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE event_rollup_daily (
+                day TEXT NOT NULL,        -- 'YYYY-MM-DD'
+                event_type TEXT NOT NULL,
+                event_count INTEGER NOT NULL,
+                PRIMARY KEY (day, event_type)
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE file_rollup_daily (
+                day TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                event_type TEXT NOT NULL,
+                event_count INTEGER NOT NULL,
+                PRIMARY KEY (day, file_path, event_type)
+            )
+        """)
+        conn.execute("""
+            INSERT INTO event_rollup_hourly (hour, event_type, event_count)
+            SELECT substr(timestamp, 1, 13), event_type, COUNT(*) FROM event_log GROUP BY 1, 2
+        """)
+        conn.execute("""
+            INSERT INTO event_rollup_daily (day, event_type, event_count)
+            SELECT substr(hour, 1, 10), event_type, SUM(event_count) FROM event_rollup_hourly GROUP BY 1, 2
+        """)
+        conn.execute("""
+            INSERT INTO file_rollup_daily (day, file_path, event_type, event_count)
+            SELECT substr(timestamp, 1, 10), file_path, event_type, COUNT(*)
+            FROM event_log WHERE file_path IS NOT NULL AND file_path != '' GROUP BY 1, 2, 3
+        """)
     
     def log_event(self, event_type: str, file_path: Optional[str] = None,
                   session_id: Optional[str] = None, event_data: Optional[Dict] = None,
                   duration_ms: Optional[int] = None) -> int:
         """
         记录用户操作事件
+
+        事件先进入内存缓冲区立即返回，由后台线程批量写入并更新聚合统计；
+        读取类方法会先等待缓冲区写完，因此记录后立即查询也能看到该事件。
         
         Args:
             event_type: 事件类型
@@ -130,96 +204,168 @@ class BehaviorMonitor:
         Returns:
             事件ID
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         timestamp = datetime.now().isoformat()
         event_data_json = json.dumps(event_data or {})
-        
-        cursor.execute("""
-            INSERT INTO event_log (event_type, file_path, session_id, event_data, timestamp, duration_ms)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (event_type, file_path, session_id, event_data_json, timestamp, duration_ms))
-        
-        event_id = cursor.lastrowid
-        
-        # 更新文件使用统计
-        if file_path:
-            self._update_file_stats(cursor, event_type, file_path, timestamp, duration_ms or 0)
-        
-        # 更新工作模式
-        self._update_work_pattern(cursor, event_type, timestamp)
-        
-        conn.commit()
-        conn.close()
-        
-        return event_id
-    
-    def _update_file_stats(self, cursor, event_type: str, file_path: str, 
-                           timestamp: str, duration_ms: int):
-        """更新文件使用统计"""
-        # 获取当前统计
-        cursor.execute("SELECT * FROM file_usage_stats WHERE file_path = ?", (file_path,))
-        stats = cursor.fetchone()
-        
-        if stats is None:
-            # 创建新记录
-            cursor.execute("""
-                INSERT INTO file_usage_stats 
-                (file_path, open_count, edit_count, last_opened, last_edited, total_time_spent_ms)
-                VALUES (?, 0, 0, NULL, NULL, 0)
-            """, (file_path,))
-        
-        # 更新统计
-        if event_type == self.EVENT_FILE_OPEN:
-            cursor.execute("""
-                UPDATE file_usage_stats
-                SET open_count = open_count + 1,
-                    last_opened = ?,
-                    total_time_spent_ms = total_time_spent_ms + ?
-                WHERE file_path = ?
-            """, (timestamp, duration_ms, file_path))
-        
-        elif event_type == self.EVENT_FILE_EDIT:
-            cursor.execute("""
-                UPDATE file_usage_stats
-                SET edit_count = edit_count + 1,
-                    last_edited = ?,
-                    total_time_spent_ms = total_time_spent_ms + ?
-                WHERE file_path = ?
-            """, (timestamp, duration_ms, file_path))
-    
-    def _update_work_pattern(self, cursor, event_type: str, timestamp: str):
-        """更新工作模式统计"""
-        dt = datetime.fromisoformat(timestamp)
-        
-        # 记录时间模式（早晨/下午/晚上）
-        hour = dt.hour
+        return self._pipeline.put(event_type, file_path, session_id, event_data_json,
+                                  timestamp, duration_ms)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待已记录的事件全部写入数据库"""
+        return self._pipeline.flush(timeout)
+
+    def _connect(self):
+        """读取前先写完缓冲中的事件"""
+        self._pipeline.flush()
+        return get_database(self.db_path).connect()
+
+    @staticmethod
+    def _time_of_day(timestamp: str) -> str:
+        """时间模式（早晨/下午/晚上/深夜）"""
+        hour = datetime.fromisoformat(timestamp).hour
         if 6 <= hour < 12:
-            time_pattern = "morning"
+            return "morning"
         elif 12 <= hour < 18:
-            time_pattern = "afternoon"
+            return "afternoon"
         elif 18 <= hour < 24:
-            time_pattern = "evening"
-        else:
-            time_pattern = "night"
-        
-        cursor.execute("""
-            INSERT INTO work_patterns (pattern_type, pattern_value, frequency, last_observed)
-            VALUES ('time_of_day', ?, 1, ?)
-            ON CONFLICT(pattern_type, pattern_value) DO UPDATE SET
-                frequency = frequency + 1,
-                last_observed = ?
-        """, (time_pattern, timestamp, timestamp))
-        
-        # 记录操作类型模式
-        cursor.execute("""
+            return "evening"
+        return "night"
+
+    def _update_file_stats(self, cursor, events: List[tuple]):
+        """按文件合并一批事件，批量更新文件使用统计"""
+        stats: Dict[str, list] = {}
+        for _, event_type, file_path, _, _, timestamp, duration_ms in events:
+            if not file_path:
+                continue
+            # [open_count, edit_count, last_opened, last_edited, total_time_spent_ms]
+            entry = stats.setdefault(file_path, [0, 0, None, None, 0])
+            if event_type == self.EVENT_FILE_OPEN:
+                entry[0] += 1
+                entry[2] = max(entry[2] or "", timestamp)
+                entry[4] += duration_ms or 0
+            elif event_type == self.EVENT_FILE_EDIT:
+                entry[1] += 1
+                entry[3] = max(entry[3] or "", timestamp)
+                entry[4] += duration_ms or 0
+
+        # 多个批次可能乱序提交，时间字段只取较新的值
+        cursor.executemany("""
+            INSERT INTO file_usage_stats
+            (file_path, open_count, edit_count, last_opened, last_edited, total_time_spent_ms)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(file_path) DO UPDATE SET
+                open_count = open_count + excluded.open_count,
+                edit_count = edit_count + excluded.edit_count,
+                last_opened = CASE WHEN excluded.last_opened > COALESCE(last_opened, '')
+                                   THEN excluded.last_opened ELSE last_opened END,
+                last_edited = CASE WHEN excluded.last_edited > COALESCE(last_edited, '')
+                                   THEN excluded.last_edited ELSE last_edited END,
+                total_time_spent_ms = total_time_spent_ms + excluded.total_time_spent_ms
+        """, [(path, *entry) for path, entry in stats.items()])
+
+    def _update_work_patterns(self, cursor, events: List[tuple]):
+        """按模式合并一批事件，批量更新工作模式统计"""
+        patterns: Dict[tuple, list] = {}
+        for _, event_type, _, _, _, timestamp, _ in events:
+            for key in (("time_of_day", self._time_of_day(timestamp)),
+                        ("operation_type", event_type)):
+                entry = patterns.setdefault(key, [0, timestamp])
+                entry[0] += 1
+                entry[1] = max(entry[1], timestamp)
+
+        cursor.executemany("""
             INSERT INTO work_patterns (pattern_type, pattern_value, frequency, last_observed)
-            VALUES ('operation_type', ?, 1, ?)
+            VALUES (?, ?, ?, ?)
             ON CONFLICT(pattern_type, pattern_value) DO UPDATE SET
-                frequency = frequency + 1,
-                last_observed = ?
-        """, (event_type, timestamp, timestamp))
+                frequency = frequency + excluded.frequency,
+                last_observed = MAX(last_observed, excluded.last_observed)
+        """, [(*key, *entry) for key, entry in patterns.items()])
+
+    def _update_rollups(self, cursor, events: List[tuple]):
+        """按小时/天合并一批事件，批量更新汇总表"""
+        hourly, daily, files = Counter(), Counter(), Counter()
+        for _, event_type, file_path, _, _, timestamp, _ in events:
+            hourly[(timestamp[:13], event_type)] += 1
+            daily[(timestamp[:10], event_type)] += 1
+            if file_path:
+                files[(timestamp[:10], file_path, event_type)] += 1
+
+        cursor.executemany("""
+            INSERT INTO event_rollup_hourly (hour, event_type, event_count) VALUES (?, ?, ?)
+            ON CONFLICT(hour, event_type) DO UPDATE SET event_count = event_count + excluded.event_count
+        """, [(*key, count) for key, count in hourly.items()])
+        cursor.executemany("""
+            INSERT INTO event_rollup_daily (day, event_type, event_count) VALUES (?, ?, ?)
+            ON CONFLICT(day, event_type) DO UPDATE SET event_count = event_count + excluded.event_count
+        """, [(*key, count) for key, count in daily.items()])
+        cursor.executemany("""
+            INSERT INTO file_rollup_daily (day, file_path, event_type, event_count) VALUES (?, ?, ?, ?)
+            ON CONFLICT(day, file_path, event_type) DO UPDATE SET
+                event_count = event_count + excluded.event_count
+        """, [(*key, count) for key, count in files.items()])
+
+    def _count_events(self, cursor, start: datetime, end: Optional[datetime] = None) -> Counter:
+        """
+        统计 [start, end) 内的事件数，返回 {(日期, 事件类型): 次数}
+
+        整天的部分读按天汇总，首尾不足一天的部分读按小时汇总，
+        只有首尾不足一小时的部分才扫描 event_log（按时间索引，至多各一小时的数据）。
+        """
+        counts = Counter()
+
+        def raw(lo: datetime, hi: Optional[datetime]):
+            sql = "SELECT substr(timestamp, 1, 10), event_type, COUNT(*) FROM event_log WHERE timestamp >= ?"
+            params = [lo.isoformat()]
+            if hi is not None:
+                sql += " AND timestamp < ?"
+                params.append(hi.isoformat())
+            for day, event_type, count in cursor.execute(sql + " GROUP BY 1, 2", params):
+                counts[(day, event_type)] += count
+
+        def hourly(lo: datetime, hi: datetime):
+            for day, event_type, count in cursor.execute("""
+                SELECT substr(hour, 1, 10), event_type, SUM(event_count) FROM event_rollup_hourly
+                WHERE hour >= ? AND hour < ? GROUP BY 1, 2
+            """, (lo.isoformat()[:13], hi.isoformat()[:13])):
+                counts[(day, event_type)] += count
+
+        def daily(lo: datetime, hi: Optional[datetime]):
+            sql = "SELECT day, event_type, event_count FROM event_rollup_daily WHERE day >= ?"
+            params = [lo.date().isoformat()]
+            if hi is not None:
+                sql += " AND day < ?"
+                params.append(hi.date().isoformat())
+            for day, event_type, count in cursor.execute(sql, params):
+                counts[(day, event_type)] += count
+
+        hour_start = start.replace(minute=0, second=0, microsecond=0)
+        first_hour = hour_start if hour_start == start else hour_start + timedelta(hours=1)
+        day_start = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        first_day = day_start if day_start == start else day_start + timedelta(days=1)
+        if end is None:
+            last_day = last_hour = None
+        else:
+            last_hour = end.replace(minute=0, second=0, microsecond=0)
+            last_day = end.replace(hour=0, minute=0, second=0, microsecond=0)
+
+        if end is not None and end <= start:
+            return counts
+        if last_day is None or first_day <= last_day:
+            # 首部不足一天
+            raw(start, first_hour)
+            if first_hour < first_day:
+                hourly(first_hour, first_day)
+            daily(first_day, last_day)
+            if last_day is not None:
+                # 尾部不足一天
+                hourly(last_day, last_hour)
+                raw(last_hour, end)
+        elif first_hour <= last_hour:
+            raw(start, first_hour)
+            hourly(first_hour, last_hour)
+            raw(last_hour, end)
+        else:
+            raw(start, end)
+        return counts
     
     def log_search(self, query: str, result_count: int, clicked_result: Optional[str] = None) -> int:
         """
@@ -233,7 +379,7 @@ class BehaviorMonitor:
         Returns:
             搜索记录ID
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         timestamp = datetime.now().isoformat()
@@ -261,7 +407,7 @@ class BehaviorMonitor:
         Returns:
             事件列表
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         if event_type:
@@ -310,7 +456,7 @@ class BehaviorMonitor:
         Returns:
             文件列表
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -346,7 +492,7 @@ class BehaviorMonitor:
         Returns:
             搜索历史列表
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -377,7 +523,7 @@ class BehaviorMonitor:
         Returns:
             工作模式字典
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         patterns = {}
@@ -421,38 +567,94 @@ class BehaviorMonitor:
         Returns:
             每日统计列表
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
-        start_date = (datetime.now() - timedelta(days=days)).isoformat()
-        
-        cursor.execute("""
-            SELECT DATE(timestamp) as date, COUNT(*) as count
-            FROM event_log
-            WHERE timestamp >= ?
-            GROUP BY DATE(timestamp)
-            ORDER BY date DESC
-        """, (start_date,))
+        start_date = datetime.now() - timedelta(days=days)
+        by_date = Counter()
+        for (date, _), count in self._count_events(cursor, start_date).items():
+            by_date[date] += count
         
         activity = []
-        for row in cursor.fetchall():
-            date, count = row
+        for date in sorted(by_date, reverse=True):
             activity.append({
                 "date": date,
-                "event_count": count
+                "event_count": by_date[date]
             })
         
         conn.close()
         return activity
+
+    def get_event_counts(self, start_date: datetime, end_date: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        获取时间段内各事件类型的次数
+        
+        Args:
+            start_date: 开始时间（含）
+            end_date: 结束时间（不含），默认不限
+            
+        Returns:
+            {事件类型: 次数}
+        """
+        conn = self._connect()
+        counts = Counter()
+        for (_, event_type), count in self._count_events(conn.cursor(), start_date, end_date).items():
+            counts[event_type] += count
+        conn.close()
+        return dict(counts)
+
+    def get_file_activity(self, start_date: datetime, end_date: Optional[datetime] = None,
+                          limit: int = 50) -> List[Dict]:
+        """
+        获取时间段内各文件的打开/编辑次数（按天汇总，起止日期均包含在内）
+        
+        Args:
+            start_date: 开始日期
+            end_date: 结束日期，默认不限
+            limit: 返回数量限制
+            
+        Returns:
+            文件列表，按 打开 + 编辑 * 2 降序
+        """
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT file_path,
+                   SUM(CASE WHEN event_type = ? THEN event_count ELSE 0 END) AS opens,
+                   SUM(CASE WHEN event_type = ? THEN event_count ELSE 0 END) AS edits
+            FROM file_rollup_daily
+            WHERE day >= ? AND day <= ?
+            GROUP BY file_path
+            ORDER BY (opens + edits * 2) DESC
+            LIMIT ?
+        """, (self.EVENT_FILE_OPEN, self.EVENT_FILE_EDIT, start_date.date().isoformat(),
+              end_date.date().isoformat() if end_date else "9999-12-31", limit))
+        
+        files = [
+            {"file_path": row[0], "open_count": row[1], "edit_count": row[2],
+             "usage_score": row[1] + row[2] * 2}
+            for row in cursor.fetchall()
+        ]
+        
+        conn.close()
+        return files
     
     def get_statistics(self) -> Dict:
         """获取总体统计信息"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
-        # 总事件数
-        cursor.execute("SELECT COUNT(*) FROM event_log")
-        total_events = cursor.fetchone()[0]
+        # 总事件数与最活跃的操作类型（读按天汇总）
+        cursor.execute("""
+            SELECT event_type, SUM(event_count) as count
+            FROM event_rollup_daily
+            GROUP BY event_type
+            ORDER BY count DESC
+        """)
+        type_counts = cursor.fetchall()
+        total_events = sum(count for _, count in type_counts)
+        most_common_operation = type_counts[0][0] if type_counts else None
         
         # 总文件数
         cursor.execute("SELECT COUNT(*) FROM file_usage_stats")
@@ -462,23 +664,9 @@ class BehaviorMonitor:
         cursor.execute("SELECT COUNT(*) FROM search_history")
         total_searches = cursor.fetchone()[0]
         
-        # 最活跃的操作类型
-        cursor.execute("""
-            SELECT event_type, COUNT(*) as count
-            FROM event_log
-            GROUP BY event_type
-            ORDER BY count DESC
-            LIMIT 1
-        """)
-        result = cursor.fetchone()
-        most_common_operation = result[0] if result else None
-        
         # 最近7天活动
-        seven_days_ago = (datetime.now() - timedelta(days=7)).isoformat()
-        cursor.execute("""
-            SELECT COUNT(*) FROM event_log WHERE timestamp >= ?
-        """, (seven_days_ago,))
-        recent_activity = cursor.fetchone()[0]
+        seven_days_ago = datetime.now() - timedelta(days=7)
+        recent_activity = sum(self._count_events(cursor, seven_days_ago).values())
         
         conn.close()
         
@@ -499,21 +687,20 @@ class BehaviorMonitor:
         """
         anomalies = []
         
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         # 检测1: 最近24小时内操作突然增多
-        yesterday = (datetime.now() - timedelta(hours=24)).isoformat()
-        cursor.execute("""
-            SELECT COUNT(*) FROM event_log WHERE timestamp >= ?
-        """, (yesterday,))
-        recent_count = cursor.fetchone()[0]
+        yesterday = datetime.now() - timedelta(hours=24)
+        recent_count = sum(self._count_events(cursor, yesterday).values())
         
-        # 获取平均每日操作数
+        # 获取平均每日操作数（总数读汇总表，MIN(timestamp) 走时间索引）
+        cursor.execute("SELECT COALESCE(SUM(event_count), 0) FROM event_rollup_daily")
+        total_events = cursor.fetchone()[0]
         cursor.execute("""
-            SELECT COUNT(*) / MAX(1, (JULIANDAY('now') - JULIANDAY(MIN(timestamp))))
+            SELECT ? / MAX(1, (JULIANDAY('now') - JULIANDAY(MIN(timestamp))))
             FROM event_log
-        """)
+        """, (total_events,))
         avg_daily = cursor.fetchone()[0] or 0
         
         if recent_count > avg_daily * 3:  # 超过平均3倍
@@ -548,6 +735,271 @@ class BehaviorMonitor:
         return anomalies
 
 
+class EventPipeline:
+    """
+    事件异步写入管道（同一数据库在进程内共享一个）
+
+    1. put() 只分配事件ID并放入内存缓冲区，不等待数据库
+    2. 后台线程攒够一批（或等待 FLUSH_INTERVAL）后，在一个事务中批量插入事件，
+       并把文件统计、工作模式按键合并为批量 upsert
+    3. 缓冲区满时生产者先短暂等待，仍然满则由调用线程直接写出一批（背压），
+       事件不会被丢弃；进程退出时自动写完剩余事件
+    4. 一批事件重试 MAX_RETRIES 次仍失败时放回缓冲区队首，按指数退避稍后再写；
+       退出时仍未写入的事件保存到 <db>.pending.jsonl，下次启动时重新入队
+    5. 队首一批连续失败 DEAD_LETTER_AFTER 次后改为逐条写入，仍失败的事件（如主键冲突、
+       统计更新异常）移入 <db>.failed.jsonl 待人工处理，不再阻塞后续事件
+
+    事件ID从 id_allocator 表按块预留，多个进程写同一数据库时ID也不会冲突。
+    """
+
+    CAPACITY = 10000          # 缓冲区最多容纳的事件数
+    BATCH_SIZE = 1000         # 一个写事务最多包含的事件数
+    FLUSH_INTERVAL = 0.1      # 未攒满一批时最长等待（秒）
+    PUT_TIMEOUT = 0.05        # 缓冲区满时生产者等待后台线程腾出空间的时间（秒）
+    ID_BLOCK = 1000           # 每次预留的事件ID数量
+    MAX_RETRIES = 3
+    MAX_BACKOFF = 30.0        # 整批写入失败后重新尝试的最长间隔（秒）
+    DEAD_LETTER_AFTER = 5     # 连续整批失败达到此次数后逐条写入并隔离失败事件
+
+    _instances: Dict[str, "EventPipeline"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, monitor: BehaviorMonitor, capacity: Optional[int] = None):
+        self.monitor = monitor
+        self.db_path = monitor.db_path
+        self.capacity = capacity or self.CAPACITY
+        self._buffer: deque = deque()
+        self._cond = threading.Condition()
+        self._in_flight: set = set()   # 已取出但尚未提交的批次（id(batch)）
+        self._flusher: Optional[threading.Thread] = None
+        self._failures = 0             # 连续整批写入失败次数
+        self._retry_at = 0.0           # 退避结束时间（monotonic）
+        self.spill_path = self.db_path + ".pending.jsonl"
+        self.dead_letter_path = self.db_path + ".failed.jsonl"
+
+        self._id_lock = threading.Lock()
+        self._next_id = 0
+        self._id_limit = 0
+
+        self.stats = {"events": 0, "batches": 0, "inline_flushes": 0, "failed": 0, "requeued": 0,
+                      "dead_lettered": 0}
+        self._load_spilled()
+
+    @classmethod
+    def for_monitor(cls, monitor: BehaviorMonitor) -> "EventPipeline":
+        """获取监控器数据库对应的共享管道"""
+        key = os.path.abspath(monitor.db_path)
+        with cls._instances_lock:
+            pipeline = cls._instances.get(key)
+            if pipeline is None:
+                pipeline = cls._instances[key] = cls(monitor)
+            return pipeline
+
+    # ── 事件ID ──
+
+    def _reserve_ids(self) -> int:
+        """预留 ID_BLOCK 个事件ID，返回起始值"""
+        def reserve(conn):
+            row = conn.execute("SELECT next_id FROM id_allocator WHERE name = 'event_log'").fetchone()
+            max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM event_log").fetchone()[0]
+            # 兼容旧版本直接自增写入的事件
+            start = max(row[0] if row else 1, max_id + 1)
+            conn.execute("""
+                INSERT INTO id_allocator (name, next_id) VALUES ('event_log', ?)
+                ON CONFLICT(name) DO UPDATE SET next_id = excluded.next_id
+            """, (start + self.ID_BLOCK,))
+            return start
+
+        return get_database(self.db_path).write(reserve, wait=True)
+
+    def _allocate_id(self) -> int:
+        with self._id_lock:
+            if self._next_id >= self._id_limit:
+                self._next_id = self._reserve_ids()
+                self._id_limit = self._next_id + self.ID_BLOCK
+            event_id = self._next_id
+            self._next_id += 1
+            return event_id
+
+    # ── 写入 ──
+
+    def put(self, event_type: str, file_path: Optional[str], session_id: Optional[str],
+            event_data_json: str, timestamp: str, duration_ms: Optional[int]) -> int:
+        """事件放入缓冲区，返回事件ID"""
+        event_id = self._allocate_id()
+        row = (event_id, event_type, file_path, session_id, event_data_json, timestamp, duration_ms)
+        overflow = None
+        with self._cond:
+            if len(self._buffer) >= self.capacity and not self._backing_off():
+                self._cond.wait_for(lambda: len(self._buffer) < self.capacity, self.PUT_TIMEOUT)
+                if len(self._buffer) >= self.capacity:
+                    overflow = self._take()
+                    self.stats["inline_flushes"] += 1
+            self._buffer.append(row)
+            self.stats["events"] += 1
+            # 只在缓冲区由空变非空或攒满一批时唤醒后台线程
+            if len(self._buffer) == 1 or len(self._buffer) >= self.BATCH_SIZE:
+                self._cond.notify_all()
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._flusher_loop, daemon=True,
+                                                 name=f"behavior-events:{os.path.basename(self.db_path)}")
+                self._flusher.start()
+        if overflow:
+            self._write(overflow)
+        return event_id
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """写完缓冲区中的事件并等待正在写入的批次提交"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        # 由调用线程直接写出，不等待攒批；只处理调用时已在缓冲区中的事件
+        with self._cond:
+            remaining_events = len(self._buffer)
+        while remaining_events > 0:
+            with self._cond:
+                batch = self._take()
+            if not batch:
+                break
+            remaining_events -= len(batch)
+            if not self._write(batch):
+                return False           # 数据库不可写：事件已放回缓冲区，稍后重试
+        # 等待此前已被其他线程取走的批次提交
+        with self._cond:
+            pending = set(self._in_flight)
+            while pending & self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _take(self) -> List[tuple]:
+        """取出一批事件（调用方持有 self._cond）"""
+        count = min(len(self._buffer), self.BATCH_SIZE)
+        batch = [self._buffer.popleft() for _ in range(count)]
+        if count:
+            self._in_flight.add(id(batch))
+            self._cond.notify_all()
+        return batch
+
+    def _backing_off(self) -> bool:
+        return self._retry_at > time.monotonic()
+
+    def _flusher_loop(self):
+        while True:
+            with self._cond:
+                while not self._buffer or self._backing_off():
+                    self._cond.wait(max(0.0, self._retry_at - time.monotonic()) if self._buffer else None)
+                if len(self._buffer) < self.BATCH_SIZE:
+                    self._cond.wait(self.FLUSH_INTERVAL)  # 攒批
+                batch = self._take()
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch: List[tuple]) -> bool:
+        """写入一批事件；失败时放回缓冲区队首并返回 False"""
+        written = isolated = False
+        try:
+            error = self._commit(batch, self.MAX_RETRIES)
+            written = error is None
+            if not written:
+                self.stats["failed"] += len(batch)
+                with self._cond:
+                    isolate = self._failures + 1 >= self.DEAD_LETTER_AFTER
+                if isolate:
+                    self._isolate(batch, error)
+                    isolated = True
+                else:
+                    print(f"行为事件写入失败（{len(batch)} 条），稍后重试: {error}")
+        finally:
+            with self._cond:
+                if written or isolated:
+                    self._failures = 0
+                    self._retry_at = 0.0
+                else:
+                    # 事务已整体回滚，原样放回队首保持事件顺序
+                    self._buffer.extendleft(reversed(batch))
+                    self._failures += 1
+                    self._retry_at = time.monotonic() + min(self.MAX_BACKOFF, 0.5 * 2 ** self._failures)
+                    self.stats["requeued"] += len(batch)
+                self._in_flight.discard(id(batch))
+                self.stats["batches"] += 1
+                self._cond.notify_all()
+        return written or isolated
+
+    def _commit(self, rows: List[tuple], attempts: int) -> Optional[Exception]:
+        """在一个事务中插入事件并更新统计，返回最后一次的异常（成功时为 None）"""
+        def apply(conn):
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT INTO event_log
+                (id, event_type, file_path, session_id, event_data, timestamp, duration_ms)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            self.monitor._update_file_stats(cursor, rows)
+            self.monitor._update_work_patterns(cursor, rows)
+            self.monitor._update_rollups(cursor, rows)
+
+        for attempt in range(attempts):
+            try:
+                get_database(self.db_path).write(apply, wait=True)
+                return None
+            except Exception as e:
+                # 只有数据库错误（锁、磁盘）值得立即重试，其余异常重试也不会成功
+                if not isinstance(e, sqlite3.Error) or attempt == attempts - 1:
+                    return e
+                time.sleep(0.1 * (attempt + 1))
+
+    def _isolate(self, batch: List[tuple], error: Exception):
+        """逐条写入反复失败的一批，仍失败的事件追加到 dead_letter_path"""
+        failed = [row for row in batch if self._commit([row], 1) is not None]
+        if failed:
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                for row in failed:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            self.stats["dead_lettered"] += len(failed)
+        print(f"行为事件连续 {self.DEAD_LETTER_AFTER} 次写入失败（{error}），"
+              f"逐条写入后 {len(failed)} 条移入 {self.dead_letter_path}")
+
+    # ── 退出时落盘 ──
+
+    def spill(self) -> int:
+        """把缓冲区中仍未写入的事件追加到 spill_path，返回条数"""
+        with self._cond:
+            rows = list(self._buffer)
+            self._buffer.clear()
+        if rows:
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        return len(rows)
+
+    def _load_spilled(self):
+        """上次退出时未写入的事件重新入队"""
+        if not os.path.exists(self.spill_path):
+            return
+        with open(self.spill_path, encoding="utf-8") as f:
+            rows = [tuple(json.loads(line)) for line in f if line.strip()]
+        os.remove(self.spill_path)
+        self._buffer.extend(rows)
+        if rows:
+            self._flusher = threading.Thread(target=self._flusher_loop, daemon=True,
+                                             name=f"behavior-events:{os.path.basename(self.db_path)}")
+            self._flusher.start()
+
+
+def flush_all_pipelines(timeout: Optional[float] = 5.0):
+    """写完所有管道中尚未写入的事件（进程退出时自动调用）"""
+    with EventPipeline._instances_lock:
+        pipelines = list(EventPipeline._instances.values())
+    for pipeline in pipelines:
+        if not pipeline.flush(timeout):
+            pipeline.spill()
+
+
+# 在 sqlite_pool 的退出处理之前执行（atexit 后注册先执行）
+atexit.register(flush_all_pipelines)
+
+
 if __name__ == "__main__":
     # 测试代码
     monitor = BehaviorMonitor()
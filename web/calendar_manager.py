@@ -4,7 +4,7 @@
 本地日程管理器
 - 持久化到 workspace/calendar/events.json
 - 支持新增/删除/查询
-- 创建事件时自动触发本地提醒（使用 reminder_manager + win10toast）
+- 创建事件时自动触发本地提醒（使用 reminder_manager + win10toast），删除事件时一并取消
 """
 import json
 import os
@@ -72,24 +72,32 @@ class CalendarManager:
                 remind_at = start - timedelta(minutes=remind_before_minutes)
             if remind_at > datetime.now():
                 mgr = get_reminder_manager()
-                mgr.add_reminder(
+                event['reminder_id'] = mgr.add_reminder(
                     title=f"日程提醒: {title}",
                     message=description or '开始时间到',
                     remind_at=remind_at,
                     icon=os.path.join(self.project_root, 'assets', 'koto_icon.ico')
                 )
+                self._save()
         except Exception as e:
             print(f"⚠️ 创建日程提醒失败: {e}")
 
         return event_id
 
     def delete_event(self, event_id: str) -> bool:
-        before = len(self.events)
+        removed = [ev for ev in self.events if ev.get('id') == event_id]
+        if not removed:
+            return False
         self.events = [ev for ev in self.events if ev.get('id') != event_id]
-        if len(self.events) != before:
-            self._save()
-            return True
-        return False
+        self._save()
+        # 事件删除后不再提醒
+        for ev in removed:
+            if ev.get('reminder_id'):
+                try:
+                    get_reminder_manager().cancel_reminder(ev['reminder_id'])
+                except Exception as e:
+                    print(f"⚠️ 取消日程提醒失败: {e}")
+        return True
 
 
 _calendar_manager: Optional[CalendarManager] = None
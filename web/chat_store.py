@@ -0,0 +1,333 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+聊天记录存储 - 追加写入的 JSONL 会话日志
+
+每个会话对应 chats/<name>.jsonl，每行一条消息；"替换最后一条消息"同样以追加
+一行操作记录（{"_op": "replace_last", "message": {...}}）的方式完成，写入永远是
+O(本次消息大小)，不会重写整个文件。
+
+- tail(): 从文件末尾反向读取最近 N 条，无需解析全部历史
+- 热会话缓存在内存 LRU 中，用文件 (size, mtime) 校验是否被其他进程修改
+- 旧版 chats/<name>.json（整段 JSON 数组）在首次启动时一次性迁移，原文件保留为 .json.bak
+
+对外仍使用 "<name>.json" 作为会话文件名，与旧接口保持兼容。
+"""
+
+import os
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+LOG_SUFFIX = '.jsonl'
+LEGACY_SUFFIX = '.json'
+REPLACE_LAST = 'replace_last'
+
+
+def session_name(filename: str) -> str:
+    """'foo.json' / 'foo.jsonl' / 'foo' -> 'foo'"""
+    for suffix in (LOG_SUFFIX, LEGACY_SUFFIX):
+        if filename.endswith(suffix):
+            return filename[:-len(suffix)]
+    return filename
+
+
+def _iter_records(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # 写入中断留下的半行
+            if isinstance(record, dict):
+                yield record
+
+
+def _iter_records_reversed(path: str, block_size: int = 65536) -> Iterator[Dict[str, Any]]:
+    """从文件末尾按块反向产出记录"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        buf = b''
+        while pos > 0:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            lines = (f.read(step) + buf).split(b'\n')
+            buf = lines[0]
+            for line in reversed(lines[1:]):
+                record = _decode(line)
+                if record is not None:
+                    yield record
+        record = _decode(buf)
+        if record is not None:
+            yield record
+
+
+def _decode(line: bytes) -> Optional[Dict[str, Any]]:
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        record = json.loads(line.decode('utf-8', errors='ignore'))
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) else None
+
+
+def read_messages(path: str) -> Tuple[List[Dict[str, Any]], int]:
+    """解析整个会话日志
+
+    Returns:
+        (messages, op_count)；op_count 为替换操作记录数，用于判断是否需要压缩
+    """
+    messages: List[Dict[str, Any]] = []
+    ops = 0
+    for record in _iter_records(path):
+        if record.get('_op') == REPLACE_LAST:
+            ops += 1
+            if messages:
+                messages.pop()
+            messages.append(record.get('message') or {})
+        else:
+            messages.append(record)
+    return messages, ops
+
+
+def read_tail(path: str, n: int) -> List[Dict[str, Any]]:
+    """反向读取最后 n 条有效消息"""
+    tail: List[Dict[str, Any]] = []
+    skip = 0  # 被后续 replace_last 覆盖、需要跳过的消息数
+    for record in _iter_records_reversed(path):
+        if record.get('_op') == REPLACE_LAST:
+            if skip == 0:
+                tail.append(record.get('message') or {})
+                skip = 1
+            # 已被覆盖的替换记录：它本身覆盖的那条也要跳过，skip 不变
+        elif skip:
+            skip -= 1
+        else:
+            tail.append(record)
+        if len(tail) >= n:
+            break
+    tail.reverse()
+    return tail
+
+
+class ChatStore:
+    """追加写入的会话存储"""
+
+    CACHE_SIZE = 32              # 内存中缓存的热会话数
+    COMPACT_MIN_OPS = 64         # 替换记录达到该数量时在完整加载后压缩日志
+
+    def __init__(self, chats_dir: str):
+        self.chats_dir = chats_dir
+        os.makedirs(self.chats_dir, exist_ok=True)
+        self._cache: "OrderedDict[str, Tuple[List[Dict], Tuple[int, int]]]" = OrderedDict()
+        self._locks: Dict[str, threading.RLock] = {}
+        self._guard = threading.Lock()
+        self.migrate_legacy()
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.chats_dir, session_name(filename) + LOG_SUFFIX)
+
+    def _lock(self, name: str) -> threading.RLock:
+        with self._guard:
+            lock = self._locks.get(name)
+            if lock is None:
+                lock = self._locks[name] = threading.RLock()
+            return lock
+
+    @staticmethod
+    def _stat(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def _cached(self, name: str, path: str) -> Optional[List[Dict]]:
+        """返回仍与磁盘一致的缓存条目"""
+        with self._guard:
+            entry = self._cache.get(name)
+            if entry is None:
+                return None
+            if entry[1] != self._stat(path):
+                del self._cache[name]
+                return None
+            self._cache.move_to_end(name)
+            return entry[0]
+
+    def _remember(self, name: str, messages: List[Dict], stat: Optional[Tuple[int, int]]):
+        with self._guard:
+            if stat is None:
+                self._cache.pop(name, None)
+                return
+            self._cache[name] = (messages, stat)
+            self._cache.move_to_end(name)
+            while len(self._cache) > self.CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+    def _forget(self, name: str):
+        with self._guard:
+            self._cache.pop(name, None)
+
+    # ==================== 迁移 ====================
+
+    def migrate_legacy(self) -> int:
+        """把旧版整段 JSON 数组会话转换为 JSONL（每个文件只迁移一次）"""
+        migrated = 0
+        try:
+            names = os.listdir(self.chats_dir)
+        except OSError:
+            return 0
+        for fname in names:
+            if not fname.endswith(LEGACY_SUFFIX) or fname.endswith('.state.json'):
+                continue
+            legacy = os.path.join(self.chats_dir, fname)
+            target = self._path(fname)
+            if os.path.exists(target):
+                continue
+            try:
+                with open(legacy, 'r', encoding='utf-8', errors='ignore') as f:
+                    history = json.load(f)
+            except Exception:
+                continue
+            if not isinstance(history, list):
+                continue
+            self._write_all(target, [m for m in history if isinstance(m, dict)])
+            os.replace(legacy, legacy + '.bak')
+            migrated += 1
+        if migrated:
+            print(f"[ChatStore] 已迁移 {migrated} 个旧版会话到 JSONL")
+        return migrated
+
+    # ==================== 会话 ====================
+
+    def list_sessions(self) -> List[str]:
+        """列出所有会话文件名（'<name>.json'），按修改时间倒序"""
+        entries = []
+        with os.scandir(self.chats_dir) as it:
+            for entry in it:
+                if entry.name.endswith(LOG_SUFFIX) and entry.is_file():
+                    entries.append((session_name(entry.name) + LEGACY_SUFFIX, entry.stat().st_mtime))
+        entries.sort(key=lambda x: x[1], reverse=True)
+        return [name for name, _ in entries]
+
+    def exists(self, filename: str) -> bool:
+        return os.path.exists(self._path(filename))
+
+    def create(self, filename: str):
+        """创建（或清空）会话"""
+        self.save(filename, [])
+
+    def delete(self, filename: str) -> bool:
+        name = session_name(filename)
+        with self._lock(name):
+            self._forget(name)
+            try:
+                os.remove(self._path(filename))
+                return True
+            except OSError:
+                return False
+
+    # ==================== 读取 ====================
+
+    def load(self, filename: str) -> List[Dict[str, Any]]:
+        """完整历史（返回副本）"""
+        name = session_name(filename)
+        path = self._path(filename)
+        with self._lock(name):
+            cached = self._cached(name, path)
+            if cached is not None:
+                return list(cached)
+            if not os.path.exists(path):
+                return []
+            messages, ops = read_messages(path)
+            if ops >= self.COMPACT_MIN_OPS:
+                self._write_all(path, messages)
+            self._remember(name, messages, self._stat(path))
+            return list(messages)
+
+    def tail(self, filename: str, n: int) -> List[Dict[str, Any]]:
+        """最近 n 条消息；未缓存时只反向读取文件末尾"""
+        name = session_name(filename)
+        path = self._path(filename)
+        with self._lock(name):
+            cached = self._cached(name, path)
+            if cached is not None:
+                return cached[-n:] if n > 0 else []
+            if n <= 0 or not os.path.exists(path):
+                return []
+            return read_tail(path, n)
+
+    # ==================== 写入 ====================
+
+    def append(self, filename: str, *messages: Dict[str, Any]):
+        """追加消息（一次 write 调用）"""
+        self._append_records(filename, list(messages), lambda cached: cached.extend(messages))
+
+    def replace_last(self, filename: str, message: Dict[str, Any]):
+        """替换最后一条消息（追加一条操作记录）"""
+        def apply(cached: List[Dict]):
+            if cached:
+                cached.pop()
+            cached.append(message)
+        self._append_records(filename, [{'_op': REPLACE_LAST, 'message': message}], apply)
+
+    def save(self, filename: str, history: List[Dict[str, Any]]):
+        """整体覆盖会话（原子替换），同时起到压缩日志的作用"""
+        name = session_name(filename)
+        path = self._path(filename)
+        with self._lock(name):
+            self._write_all(path, history)
+            self._remember(name, list(history), self._stat(path))
+
+    def _append_records(self, filename: str, records: List[Dict], apply_to_cache):
+        name = session_name(filename)
+        path = self._path(filename)
+        data = ''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records).encode('utf-8')
+        with self._lock(name):
+            cached = self._cached(name, path)
+            before = self._stat(path)
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+            after = self._stat(path)
+            if cached is not None and before and after and after[0] == before[0] + len(data):
+                apply_to_cache(cached)
+                self._remember(name, cached, after)
+            else:
+                # 期间有其他进程写入，缓存作废
+                self._forget(name)
+
+    @staticmethod
+    def _write_all(path: str, messages: List[Dict[str, Any]]):
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            for msg in messages:
+                f.write(json.dumps(msg, ensure_ascii=False) + '\n')
+        os.replace(tmp, path)
+
+
+_stores: Dict[str, ChatStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_chat_store(chats_dir: str = None) -> ChatStore:
+    """获取某个聊天目录的共享 ChatStore（默认项目根目录下的 chats/）"""
+    if chats_dir is None:
+        chats_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'chats')
+    key = os.path.abspath(chats_dir)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = ChatStore(key)
+        return store
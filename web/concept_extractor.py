@@ -5,15 +5,24 @@
 使用TF-IDF算法从文件内容中提取关键概念和主题
 """
 
+import os
 import re
 import math
 import sqlite3
-from typing import List, Dict, Tuple, Set
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Tuple, Set, Iterable, Iterator, Optional
 from collections import Counter, defaultdict
 from pathlib import Path
 import json
 from datetime import datetime
 
+try:
+    from sqlite_pool import get_database
+except ImportError:
+    from web.sqlite_pool import get_database
+
 # 简化的中文停用词表
 CHINESE_STOPWORDS = {
     '的', '了', '在', '是', '我', '有', '和', '就', '不', '人', '都', '一', '一个',
@@ -24,9 +33,127 @@ CHINESE_STOPWORDS = {
     'with', 'to', 'for', 'of', 'as', 'by', 'from', 'that', 'this', 'it', 'be', 'are'
 }
 
+
+def tokenize_text(text: str) -> List[str]:
+    """分词 - 支持中英文混合（模块级函数，可在子进程中调用）"""
+    # 尝试导入jieba进行中文分词
+    try:
+        import jieba
+        # 使用jieba分词
+        words = list(jieba.cut(text))
+    except ImportError:
+        # 如果没有jieba，使用简单的正则分词
+        # 提取中文字符（2-3个字的词）和英文单词
+        chinese_pattern = r'[\u4e00-\u9fff]{2,3}'
+        english_pattern = r'\b[a-zA-Z]{3,}\b'
+        
+        chinese_words = re.findall(chinese_pattern, text)
+        english_words = re.findall(english_pattern, text.lower())
+        
+        words = chinese_words + english_words
+    
+    # 过滤停用词和短词
+    filtered_words = [
+        w.strip().lower() for w in words 
+        if len(w.strip()) >= 2 and w.strip().lower() not in CHINESE_STOPWORDS
+    ]
+    
+    return filtered_words
+
+
+def _read_file_text(file_path: str) -> str:
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except Exception:
+        with open(file_path, 'r', encoding='gbk') as f:
+            return f.read()
+
+
+def _read_and_tokenize(file_path: str) -> Tuple[str, Optional[str], Optional[List[str]], Optional[str]]:
+    """读取、哈希并分词单个文件，返回 (path, content_hash, words, error)"""
+    try:
+        content = _read_file_text(file_path)
+    except Exception as e:
+        return file_path, None, None, f"无法读取文件: {str(e)}"
+    content_hash = hashlib.md5(content.encode('utf-8')).hexdigest()
+    return file_path, content_hash, tokenize_text(content), None
+
+
+class ConceptStats:
+    """
+    concept_stats 与总文档数的进程级内存缓存
+    
+    首次使用时一次性读入，之后由 ConceptExtractor 写入概念时增量维护，
+    IDF 查询不再访问数据库。同一数据库路径在进程内共享一个实例。
+    """
+    
+    _instances: Dict[str, "ConceptStats"] = {}
+    _instances_lock = threading.Lock()
+    
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._doc_freq: Optional[Dict[str, int]] = None
+        self._total_docs = 0
+    
+    @classmethod
+    def for_db(cls, db_path: str) -> "ConceptStats":
+        key = os.path.abspath(db_path)
+        with cls._instances_lock:
+            stats = cls._instances.get(key)
+            if stats is None:
+                stats = cls._instances[key] = cls(db_path)
+            return stats
+    
+    def _load(self):
+        conn = get_database(self.db_path).connect()
+        try:
+            self._doc_freq = dict(conn.execute("SELECT concept, document_frequency FROM concept_stats"))
+            self._total_docs = conn.execute("SELECT COUNT(*) FROM file_metadata").fetchone()[0]
+        finally:
+            conn.close()
+    
+    def invalidate(self):
+        """数据库被外部修改后丢弃缓存，下次查询时重新加载"""
+        with self._lock:
+            self._doc_freq = None
+    
+    @property
+    def total_docs(self) -> int:
+        with self._lock:
+            if self._doc_freq is None:
+                self._load()
+            return self._total_docs
+    
+    def idf(self, concepts: Iterable[str]) -> Dict[str, float]:
+        """批量计算 IDF = log((总文档数 + 1) / (文档频率 + 1)) + 1，新概念按出现在1个文档计"""
+        with self._lock:
+            if self._doc_freq is None:
+                self._load()
+            doc_freq = self._doc_freq
+            total = (self._total_docs or 1) + 1
+        return {c: math.log(total / (doc_freq.get(c, 1) + 1)) + 1 for c in concepts}
+    
+    def apply(self, added: Iterable[str], removed: Iterable[str], new_document: bool):
+        """同步一次 _save_concepts 对 concept_stats / file_metadata 的修改"""
+        with self._lock:
+            if self._doc_freq is None:
+                return  # 尚未加载，下次加载时会读到最新数据
+            for c in added:
+                self._doc_freq[c] = self._doc_freq.get(c, 0) + 1
+            for c in removed:
+                if c in self._doc_freq:
+                    self._doc_freq[c] = max(self._doc_freq[c] - 1, 0)
+            if new_document:
+                self._total_docs += 1
+
+
 class ConceptExtractor:
     """概念提取器 - 使用TF-IDF算法提取文件关键概念"""
     
+    PARALLEL_MIN_FILES = 32      # 批量分析的文件少于该数量时不启动进程池
+    
     def __init__(self, db_path: str = "config/concepts.db"):
         """
         初始化概念提取器
@@ -36,12 +163,17 @@ class ConceptExtractor:
         """
         self.db_path = db_path
         self._ensure_db()
+    
+    @property
+    def stats(self) -> ConceptStats:
+        """当前数据库的共享概念统计缓存"""
+        return ConceptStats.for_db(self.db_path)
         
     def _ensure_db(self):
         """确保数据库和表结构存在"""
         Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
         
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         # 文件概念表 - 存储每个文件提取的概念
@@ -95,29 +227,7 @@ class ConceptExtractor:
         Returns:
             词语列表
         """
-        # 尝试导入jieba进行中文分词
-        try:
-            import jieba
-            # 使用jieba分词
-            words = list(jieba.cut(text))
-        except ImportError:
-            # 如果没有jieba，使用简单的正则分词
-            # 提取中文字符（2-3个字的词）和英文单词
-            chinese_pattern = r'[\u4e00-\u9fff]{2,3}'
-            english_pattern = r'\b[a-zA-Z]{3,}\b'
-            
-            chinese_words = re.findall(chinese_pattern, text)
-            english_words = re.findall(english_pattern, text.lower())
-            
-            words = chinese_words + english_words
-        
-        # 过滤停用词和短词
-        filtered_words = [
-            w.strip().lower() for w in words 
-            if len(w.strip()) >= 2 and w.strip().lower() not in CHINESE_STOPWORDS
-        ]
-        
-        return filtered_words
+        return tokenize_text(text)
     
     def calculate_tf(self, words: List[str]) -> Dict[str, float]:
         """
@@ -150,28 +260,7 @@ class ConceptExtractor:
         Returns:
             IDF值
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # 获取包含该概念的文档数
-        cursor.execute("SELECT document_frequency FROM concept_stats WHERE concept = ?", (concept,))
-        result = cursor.fetchone()
-        
-        # 获取总文档数
-        cursor.execute("SELECT COUNT(DISTINCT file_path) FROM file_metadata")
-        total_docs = cursor.fetchone()[0] or 1
-        
-        conn.close()
-        
-        if result:
-            doc_freq = result[0]
-        else:
-            doc_freq = 1  # 新概念，假设出现在1个文档中
-        
-        # IDF = log(总文档数 / (包含该词的文档数 + 1))
-        idf = math.log((total_docs + 1) / (doc_freq + 1)) + 1
-        
-        return idf
+        return self.stats.idf((concept,))[concept]
     
     def extract_concepts(self, text: str, top_n: int = 10) -> List[Tuple[str, float]]:
         """
@@ -184,9 +273,10 @@ class ConceptExtractor:
         Returns:
             [(概念, TF-IDF分数), ...] 按分数降序排列
         """
-        # 分词
-        words = self.tokenize(text)
-        
+        return self._score_words(self.tokenize(text), top_n)
+    
+    def _score_words(self, words: List[str], top_n: int) -> List[Tuple[str, float]]:
+        """由分词结果计算 TF-IDF 并取前 top_n（整篇文档一次批量查 IDF）"""
         if not words:
             return []
         
@@ -194,10 +284,8 @@ class ConceptExtractor:
         tf_dict = self.calculate_tf(words)
         
         # 计算TF-IDF
-        tfidf_scores = {}
-        for word, tf in tf_dict.items():
-            idf = self.get_idf(word)
-            tfidf_scores[word] = tf * idf
+        idf = self.stats.idf(tf_dict)
+        tfidf_scores = {word: tf * idf[word] for word, tf in tf_dict.items()}
         
         # 按分数排序，返回topN
         sorted_concepts = sorted(tfidf_scores.items(), key=lambda x: x[1], reverse=True)
@@ -218,52 +306,28 @@ class ConceptExtractor:
         # 如果没有提供内容，尝试读取文件
         if content is None:
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-            except:
-                try:
-                    with open(file_path, 'r', encoding='gbk') as f:
-                        content = f.read()
-                except Exception as e:
-                    return {"error": f"无法读取文件: {str(e)}"}
+                content = _read_file_text(file_path)
+            except Exception as e:
+                return {"error": f"无法读取文件: {str(e)}"}
         
         # 计算内容hash
-        import hashlib
         content_hash = hashlib.md5(content.encode('utf-8')).hexdigest()
         
         # 检查是否已分析过且内容未变
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "SELECT content_hash, last_analyzed FROM file_metadata WHERE file_path = ?",
-            (file_path,)
-        )
-        result = cursor.fetchone()
-        
-        if result and result[0] == content_hash:
-            # 内容未变，返回缓存的概念
-            cursor.execute(
-                "SELECT concept, tf_idf_score FROM file_concepts WHERE file_path = ? ORDER BY tf_idf_score DESC",
-                (file_path,)
-            )
-            concepts = cursor.fetchall()
+        conn = get_database(self.db_path).connect()
+        try:
+            cached = self._cached_results(conn.cursor(), {file_path: content_hash})
+        finally:
             conn.close()
-            
-            return {
-                "file_path": file_path,
-                "concepts": [{"concept": c[0], "score": c[1]} for c in concepts],
-                "cached": True,
-                "analyzed_at": result[1]
-            }
-        
-        conn.close()
+        if file_path in cached:
+            return cached[file_path]
         
         # 提取新概念
-        concepts = self.extract_concepts(content, top_n=20)
+        words = self.tokenize(content)
+        concepts = self._score_words(words, top_n=20)
         
         # 保存到数据库
-        self._save_concepts(file_path, concepts, content_hash, len(self.tokenize(content)))
+        self._save_concepts(file_path, concepts, content_hash, len(words))
         
         return {
             "file_path": file_path,
@@ -272,33 +336,153 @@ class ConceptExtractor:
             "analyzed_at": datetime.now().isoformat()
         }
     
-    def _save_concepts(self, file_path: str, concepts: List[Tuple[str, float]], 
-                       content_hash: str, total_words: int):
-        """保存提取的概念到数据库"""
-        conn = sqlite3.connect(self.db_path)
+    def _cached_results(self, cursor: sqlite3.Cursor, hashes: Dict[str, str]) -> Dict[str, Dict]:
+        """返回内容哈希未变的文件的已存储概念 {file_path: 分析结果}"""
+        paths = list(hashes)
+        unchanged = {}
+        for k in range(0, len(paths), 500):
+            chunk = paths[k:k + 500]
+            marks = ','.join('?' * len(chunk))
+            cursor.execute(
+                f"SELECT file_path, content_hash, last_analyzed FROM file_metadata WHERE file_path IN ({marks})",
+                chunk
+            )
+            for fp, stored_hash, analyzed_at in cursor.fetchall():
+                if stored_hash == hashes[fp]:
+                    unchanged[fp] = analyzed_at
+        
+        results = {fp: {"file_path": fp, "concepts": [], "cached": True, "analyzed_at": at}
+                   for fp, at in unchanged.items()}
+        paths = list(unchanged)
+        for k in range(0, len(paths), 500):
+            chunk = paths[k:k + 500]
+            marks = ','.join('?' * len(chunk))
+            cursor.execute(
+                f"SELECT file_path, concept, tf_idf_score FROM file_concepts WHERE file_path IN ({marks}) "
+                f"ORDER BY file_path, tf_idf_score DESC",
+                chunk
+            )
+            for fp, concept, score in cursor.fetchall():
+                results[fp]["concepts"].append({"concept": concept, "score": score})
+        return results
+    
+    def _tokenize_many(self, paths: List[str], workers: Optional[int]) -> Iterator[Tuple[str, Optional[str], Optional[List[str]], Optional[str]]]:
+        """读取、哈希并分词一批文件；数量较多时使用进程池"""
+        if workers == 1 or len(paths) < self.PARALLEL_MIN_FILES:
+            for fp in paths:
+                yield _read_and_tokenize(fp)
+            return
+        
+        done = set()
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                chunksize = max(1, len(paths) // ((workers or os.cpu_count() or 1) * 8))
+                for result in pool.map(_read_and_tokenize, paths, chunksize=chunksize):
+                    done.add(result[0])
+                    yield result
+        except Exception as e:
+            # 进程池不可用（如受限环境）时退回串行
+            print(f"[ConceptExtractor] 进程池不可用，改为串行分词: {e}")
+            for fp in paths:
+                if fp not in done:
+                    yield _read_and_tokenize(fp)
+    
+    def analyze_files(self, file_paths: List[str], top_n: int = 20,
+                      workers: Optional[int] = None) -> List[Dict]:
+        """
+        批量分析文件并提取概念
+        
+        读取与分词在进程池中并行；TF-IDF 按输入顺序逐个计算（与逐个调用
+        analyze_file 的结果一致），所有写入在同一个事务中完成。
+        
+        Args:
+            file_paths: 文件路径列表
+            top_n: 每个文件保留的概念数
+            workers: 进程池大小（None 为 CPU 数，1 为串行）
+            
+        Returns:
+            与 file_paths 一一对应的分析结果字典列表
+        """
+        paths = list(dict.fromkeys(file_paths))
+        tokenized = {fp: (content_hash, words, error)
+                     for fp, content_hash, words, error in self._tokenize_many(paths, workers)}
+        
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
+        pending = []
+        try:
+            hashes = {fp: t[0] for fp, t in tokenized.items() if t[2] is None}
+            results = self._cached_results(cursor, hashes)
+            
+            current_time = datetime.now().isoformat()
+            for fp in paths:
+                content_hash, words, error = tokenized[fp]
+                if error is not None:
+                    results[fp] = {"error": error}
+                    continue
+                if fp in results:
+                    continue
+                concepts = self._score_words(words, top_n)
+                change = self._write_concepts(cursor, fp, concepts, content_hash, len(words), current_time)
+                # 后续文件的 IDF 需要看到本文件的贡献
+                self.stats.apply(*change)
+                pending.append(change)
+                results[fp] = {
+                    "file_path": fp,
+                    "concepts": [{"concept": c[0], "score": c[1]} for c in concepts],
+                    "cached": False,
+                    "analyzed_at": current_time
+                }
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            if pending:
+                self.stats.invalidate()
+            raise
+        finally:
+            conn.close()
         
-        current_time = datetime.now().isoformat()
+        return [results[fp] for fp in file_paths]
+    
+    def _write_concepts(self, cursor: sqlite3.Cursor, file_path: str,
+                        concepts: List[Tuple[str, float]], content_hash: str,
+                        total_words: int, current_time: str) -> Tuple[Set[str], Set[str], bool]:
+        """
+        写入一个文件的概念并维护 concept_stats（不提交）
+        
+        Returns:
+            (新增概念, 移除概念, 是否新文件)，供 ConceptStats.apply 同步缓存
+        """
+        cursor.execute("SELECT 1 FROM file_metadata WHERE file_path = ?", (file_path,))
+        new_document = cursor.fetchone() is None
+        cursor.execute("SELECT concept FROM file_concepts WHERE file_path = ?", (file_path,))
+        old_concepts = {row[0] for row in cursor.fetchall()}
+        new_concepts = {concept for concept, _ in concepts}
+        added = new_concepts - old_concepts
+        removed = old_concepts - new_concepts
         
         # 删除旧概念
         cursor.execute("DELETE FROM file_concepts WHERE file_path = ?", (file_path,))
         
         # 插入新概念
-        for concept, score in concepts:
-            cursor.execute("""
-                INSERT OR REPLACE INTO file_concepts (file_path, concept, tf_idf_score, extraction_time)
-                VALUES (?, ?, ?, ?)
-            """, (file_path, concept, score, current_time))
-            
-            # 更新全局概念统计
-            cursor.execute("""
-                INSERT INTO concept_stats (concept, document_frequency, total_occurrences, last_updated)
-                VALUES (?, 1, 1, ?)
-                ON CONFLICT(concept) DO UPDATE SET
-                    document_frequency = document_frequency + 1,
-                    total_occurrences = total_occurrences + 1,
-                    last_updated = ?
-            """, (concept, current_time, current_time))
+        cursor.executemany("""
+            INSERT OR REPLACE INTO file_concepts (file_path, concept, tf_idf_score, extraction_time)
+            VALUES (?, ?, ?, ?)
+        """, [(file_path, concept, score, current_time) for concept, score in concepts])
+        
+        # 更新全局概念统计：文档频率只随文件概念集合的变化增减
+        cursor.executemany("""
+            INSERT INTO concept_stats (concept, document_frequency, total_occurrences, last_updated)
+            VALUES (?, ?, 1, ?)
+            ON CONFLICT(concept) DO UPDATE SET
+                document_frequency = document_frequency + excluded.document_frequency,
+                total_occurrences = total_occurrences + 1,
+                last_updated = excluded.last_updated
+        """, [(concept, 1 if concept in added else 0, current_time) for concept in new_concepts])
+        cursor.executemany("""
+            UPDATE concept_stats SET document_frequency = MAX(document_frequency - 1, 0), last_updated = ?
+            WHERE concept = ?
+        """, [(current_time, concept) for concept in removed])
         
         # 更新文件元数据
         cursor.execute("""
@@ -307,8 +491,19 @@ class ConceptExtractor:
             VALUES (?, ?, ?, ?, ?)
         """, (file_path, total_words, len(concepts), current_time, content_hash))
         
-        conn.commit()
-        conn.close()
+        return added, removed, new_document
+    
+    def _save_concepts(self, file_path: str, concepts: List[Tuple[str, float]], 
+                       content_hash: str, total_words: int):
+        """保存提取的概念到数据库"""
+        conn = get_database(self.db_path).connect()
+        try:
+            change = self._write_concepts(conn.cursor(), file_path, concepts, content_hash,
+                                          total_words, datetime.now().isoformat())
+            conn.commit()
+        finally:
+            conn.close()
+        self.stats.apply(*change)
     
     def get_file_concepts(self, file_path: str, limit: int = 10) -> List[Dict]:
         """
@@ -321,7 +516,7 @@ class ConceptExtractor:
         Returns:
             概念列表
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -354,7 +549,7 @@ class ConceptExtractor:
         Returns:
             相关文件列表，按相似度排序
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         # 获取该文件的概念
@@ -383,6 +578,7 @@ class ConceptExtractor:
             file_vectors[other_file][concept] = score
         
         # 计算相似度分数
+        norm1 = math.sqrt(sum(v**2 for v in file_concepts.values()))
         similarities = []
         for other_file, other_concepts in file_vectors.items():
             # 计算共享概念的加权得分
@@ -392,7 +588,6 @@ class ConceptExtractor:
             )
             
             # 归一化
-            norm1 = math.sqrt(sum(v**2 for v in file_concepts.values()))
             norm2 = math.sqrt(sum(v**2 for v in other_concepts.values()))
             
             if norm1 > 0 and norm2 > 0:
@@ -424,7 +619,7 @@ class ConceptExtractor:
         Returns:
             概念列表
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -448,7 +643,7 @@ class ConceptExtractor:
     
     def get_statistics(self) -> Dict:
         """获取概念提取器的统计信息"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         cursor.execute("SELECT COUNT(*) FROM file_metadata")
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+概念相似度引擎 - 批量计算文件间的 TF-IDF 余弦近邻
+
+file_concepts 一次性读入内存，组织为稀疏矩阵：
+- 行（文件）：CSR 形式 (row_ptr, row_concepts, row_weights)，每行 L2 归一化
+- 列（概念）：倒排表 CSC 形式 (col_ptr, col_files, col_weights)
+
+近邻计算是分块的稀疏矩阵乘法 A[block] · Aᵀ：块内每个 (文件, 概念) 与该概念
+倒排表展开为 (行, 目标文件, 权重积) 三元组，用 np.bincount 累加到稠密块中，
+再用 argpartition 取 top-k。块大小按三元组数量与稠密块大小自适应，内存有上限。
+
+出现在大量文件中的高频概念会让倒排表展开爆炸，这部分列单独存为稠密矩阵，
+用 BLAS 矩阵乘法计算后与稀疏部分相加。
+"""
+
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class ConceptSimilarityIndex:
+    """文件 × 概念的稀疏 TF-IDF 矩阵"""
+
+    MAX_PAIRS_PER_BLOCK = 4_000_000   # 每块展开的 (行, 目标) 三元组上限
+    MAX_DENSE_PER_BLOCK = 8_000_000   # 每块稠密累加矩阵的元素上限
+    DENSE_CONCEPTS = 128              # 最多这么多高频概念走稠密矩阵乘法
+    DENSE_MIN_DF = 256                # 文档频率低于该值的概念始终走倒排表
+
+    def __init__(self, files: List[str], row_ptr: np.ndarray, row_concepts: np.ndarray,
+                 row_weights: np.ndarray, concepts: List[str]):
+        self.files = files
+        self.file_index = {f: i for i, f in enumerate(files)}
+        self.concepts = concepts
+        self.row_ptr = row_ptr
+        self.row_concepts = row_concepts
+        self.row_weights = row_weights
+        self._build_columns()
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[str, str, float]]) -> "ConceptSimilarityIndex":
+        """由 (file_path, concept, tf_idf_score) 行构建，各行 L2 归一化"""
+        per_file: Dict[str, Dict[str, float]] = {}
+        for file_path, concept, score in rows:
+            if score:
+                per_file.setdefault(file_path, {})[concept] = float(score)
+
+        files = sorted(per_file)
+        concept_ids: Dict[str, int] = {}
+        row_ptr = np.zeros(len(files) + 1, dtype=np.int64)
+        cols: List[int] = []
+        weights: List[float] = []
+        for i, f in enumerate(files):
+            for concept, score in per_file[f].items():
+                cols.append(concept_ids.setdefault(concept, len(concept_ids)))
+                weights.append(score)
+            row_ptr[i + 1] = len(cols)
+
+        row_concepts = np.array(cols, dtype=np.int64)
+        row_weights = np.array(weights, dtype=np.float32)
+        if len(files):
+            norms = np.sqrt(np.add.reduceat(row_weights ** 2, row_ptr[:-1]))
+            norms[norms == 0] = 1.0
+            row_weights /= np.repeat(norms, np.diff(row_ptr))
+        concepts = sorted(concept_ids, key=concept_ids.get)
+        return cls(files, row_ptr, row_concepts, row_weights, concepts)
+
+    @classmethod
+    def load(cls, concepts_db: str) -> "ConceptSimilarityIndex":
+        """从概念数据库一次性读取 file_concepts"""
+        conn = sqlite3.connect(concepts_db)
+        try:
+            rows = conn.execute("SELECT file_path, concept, tf_idf_score FROM file_concepts").fetchall()
+        finally:
+            conn.close()
+        return cls.from_rows(rows)
+
+    def _build_columns(self):
+        """由 CSR 构建按概念的倒排表（CSC）"""
+        n_concepts = len(self.concepts)
+        row_of_entry = np.repeat(np.arange(len(self.files), dtype=np.int64), np.diff(self.row_ptr))
+        order = np.argsort(self.row_concepts, kind='stable')
+        self.col_files = row_of_entry[order]
+        self.col_weights = self.row_weights[order]
+        counts = np.bincount(self.row_concepts, minlength=n_concepts)
+        self.col_ptr = np.zeros(n_concepts + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.col_ptr[1:])
+        self.doc_freq = counts
+
+        # 高频概念 -> 稠密列
+        frequent = np.argsort(-counts, kind='stable')[:self.DENSE_CONCEPTS]
+        frequent = frequent[counts[frequent] >= self.DENSE_MIN_DF]
+        self.dense_col = np.full(n_concepts, -1, dtype=np.int64)
+        self.dense_col[frequent] = np.arange(len(frequent))
+        self.sparse_df = counts.copy()
+        self.sparse_df[frequent] = 0
+        self.dense = None
+        if len(frequent):
+            self.dense = np.zeros((len(self.files), len(frequent)), dtype=np.float32)
+            mask = self.dense_col[self.row_concepts] >= 0
+            self.dense[row_of_entry[mask], self.dense_col[self.row_concepts[mask]]] = self.row_weights[mask]
+
+    def row(self, i: int) -> Dict[str, float]:
+        s, e = self.row_ptr[i], self.row_ptr[i + 1]
+        return {self.concepts[c]: float(w) for c, w in zip(self.row_concepts[s:e], self.row_weights[s:e])}
+
+    def _blocks(self, rows: np.ndarray) -> Iterable[np.ndarray]:
+        """按展开三元组数与稠密块大小切分查询行"""
+        pairs_per_row = np.zeros(len(rows), dtype=np.int64)
+        for k, r in enumerate(rows):
+            cs = self.row_concepts[self.row_ptr[r]:self.row_ptr[r + 1]]
+            pairs_per_row[k] = self.sparse_df[cs].sum()
+        max_rows = max(1, self.MAX_DENSE_PER_BLOCK // max(1, len(self.files)))
+        start = 0
+        while start < len(rows):
+            end = start + 1
+            total = pairs_per_row[start]
+            while end < len(rows) and end - start < max_rows and total + pairs_per_row[end] <= self.MAX_PAIRS_PER_BLOCK:
+                total += pairs_per_row[end]
+                end += 1
+            yield rows[start:end]
+            start = end
+
+    def similarities(self, rows: Sequence[int]) -> Iterable[Tuple[np.ndarray, np.ndarray]]:
+        """逐块产出 (块内行号, 稠密相似度块[len(块), n_files])"""
+        rows = np.asarray(rows, dtype=np.int64)
+        n = len(self.files)
+        for block in self._blocks(rows):
+            starts = self.row_ptr[block]
+            lengths = self.row_ptr[block + 1] - starts
+            # 块内所有 (行, 概念, 权重) 条目
+            entry_idx = np.repeat(starts - np.cumsum(np.r_[0, lengths[:-1]]), lengths) + np.arange(lengths.sum())
+            entry_row = np.repeat(np.arange(len(block)), lengths)
+            entry_col = self.row_concepts[entry_idx]
+            entry_w = self.row_weights[entry_idx]
+            sparse = self.dense_col[entry_col] < 0
+            entry_row, entry_col, entry_w = entry_row[sparse], entry_col[sparse], entry_w[sparse]
+            # 按概念倒排表展开
+            post_start = self.col_ptr[entry_col]
+            post_len = self.col_ptr[entry_col + 1] - post_start
+            total = int(post_len.sum())
+            if self.dense is not None:
+                dense = self.dense[block] @ self.dense.T
+            else:
+                dense = np.zeros((len(block), n), dtype=np.float32)
+            if total:
+                offsets = np.repeat(post_start - np.cumsum(np.r_[0, post_len[:-1]]), post_len) + np.arange(total)
+                targets = self.col_files[offsets]
+                values = np.repeat(entry_w, post_len) * self.col_weights[offsets]
+                flat = np.repeat(entry_row, post_len) * n + targets
+                dense += np.bincount(flat, weights=values, minlength=len(block) * n).reshape(len(block), n)
+            dense[np.arange(len(block)), block] = 0.0  # 排除自身
+            yield block, dense
+
+    def top_k(self, rows: Sequence[int], k: int = 5,
+              min_similarity: float = 0.0) -> Dict[int, List[Tuple[int, float]]]:
+        """计算指定行的 top-k 余弦近邻 {row: [(col, sim), ...]}（按相似度降序）"""
+        result: Dict[int, List[Tuple[int, float]]] = {}
+        for block, dense in self.similarities(rows):
+            kk = min(k, dense.shape[1])
+            if kk <= 0:
+                for r in block:
+                    result[int(r)] = []
+                continue
+            top = np.argpartition(dense, dense.shape[1] - kk, axis=1)[:, -kk:]
+            for b, r in enumerate(block):
+                cand = top[b]
+                sims = dense[b, cand]
+                order = np.argsort(-sims, kind='stable')
+                result[int(r)] = [(int(cand[o]), float(sims[o])) for o in order if sims[o] > min_similarity]
+        return result
+
+    def shared_concepts(self, i: int, j: int, limit: int = 5) -> List[str]:
+        """两文件共享的概念，按权重积降序"""
+        a, b = self.row(i), self.row(j)
+        shared = sorted(set(a) & set(b), key=lambda c: a[c] * b[c], reverse=True)
+        return shared[:limit]
@@ -16,6 +16,11 @@ from typing import Dict, List, Optional, Set
 from collections import Counter
 import re
 
+try:
+    from sqlite_pool import get_database
+except ImportError:
+    from web.sqlite_pool import get_database
+
 
 class ContextAwarenessSystem:
     """情境感知系统"""
@@ -98,7 +103,7 @@ class ContextAwarenessSystem:
     
     def _init_database(self):
         """初始化数据库"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         # 场景历史表
@@ -316,7 +321,7 @@ class ContextAwarenessSystem:
         self, user_id: str, context_type: str, confidence: float, indicators: Dict
     ):
         """更新当前场景"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         # 如果场景发生变化，结束旧场景
@@ -372,7 +377,7 @@ class ContextAwarenessSystem:
         self, user_id: str, days: int = 7
     ) -> List[Dict]:
         """获取场景历史"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -404,7 +409,7 @@ class ContextAwarenessSystem:
     
     def get_context_statistics(self, user_id: str, days: int = 30) -> Dict:
         """获取场景统计"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         start_date = (datetime.now() - timedelta(days=days)).date()
@@ -479,7 +484,7 @@ class ContextAwarenessSystem:
         if not self.current_context:
             return None
         
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         # 查询从当前场景最常转换到的场景
@@ -510,7 +515,7 @@ class ContextAwarenessSystem:
         self, user_id: str, context_type: str, preference_key: str, preference_value: str
     ):
         """设置用户场景偏好"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -524,7 +529,7 @@ class ContextAwarenessSystem:
     
     def get_user_preferences(self, user_id: str, context_type: str) -> Dict:
         """获取用户场景偏好"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         cursor.execute("""
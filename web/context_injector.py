@@ -421,6 +421,13 @@ class ContextInjector:
         self.builder = ContextBuilder()
         self.cache = {}
         self.cache_timeout = 5  # 5 秒缓存
+        
+        # 提前启动后台遥测采样，系统类问题直接读取最新快照
+        try:
+            from web.system_info import get_telemetry_sampler
+            get_telemetry_sampler().start()
+        except Exception as e:
+            print(f"[Debug] telemetry sampler start error: {type(e).__name__}: {e}")
     
     def get_injected_instruction(self, question: str = None) -> str:
         """
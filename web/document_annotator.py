@@ -19,6 +19,11 @@ from datetime import datetime
 from difflib import SequenceMatcher
 from pathlib import Path
 
+try:
+    from docx_text_index import TextIndex
+except ImportError:
+    from web.docx_text_index import TextIndex
+
 
 class DocumentAnnotator:
     """文档自动标注系统"""
@@ -373,7 +378,8 @@ class DocumentAnnotator:
     def locate_text_in_paragraphs(
         self,
         paragraphs_info: List[Dict],
-        target_text: str
+        target_text: str,
+        text_index: Optional[TextIndex] = None
     ) -> Optional[Dict[str, Any]]:
         """
         Step 3: 锚点定位（The Locator）
@@ -382,7 +388,10 @@ class DocumentAnnotator:
         
         策略：
         1. 先尝试精确匹配（快速）
-        2. 如果失败，启用模糊匹配（容错）
+        2. 如果失败，启用模糊匹配（容错），只对字二元组预筛出的候选段落计算相似度
+
+        Args:
+            text_index: 由 paragraphs_info 文本构建的索引（批量定位时复用）
 
         Returns:
             {
@@ -396,21 +405,22 @@ class DocumentAnnotator:
         if not target_text or len(target_text.strip()) == 0:
             return None
         
+        if text_index is None:
+            text_index = TextIndex(p["text"] for p in paragraphs_info)
+        
         # 第1步：精确匹配
-        for para_info in paragraphs_info:
-            para_text = para_info["text"]
-            
-            if target_text in para_text:
-                position = para_text.find(target_text)
-                return {
-                    "found": True,
-                    "para_index": para_info["index"],
-                    "position": position,
-                    "matched_text": target_text,
-                    "para_obj": para_info.get("para_obj"),
-                    "full_para_text": para_text,
-                    "match_type": "exact"
-                }
+        hit = text_index.find(target_text)
+        if hit is not None:
+            para_info = paragraphs_info[hit[0]]
+            return {
+                "found": True,
+                "para_index": para_info["index"],
+                "position": hit[1],
+                "matched_text": target_text,
+                "para_obj": para_info.get("para_obj"),
+                "full_para_text": para_info["text"],
+                "match_type": "exact"
+            }
         
         # 第2步：模糊匹配（容错处理）
         print(f"[Annotator] ⚠️ 精确匹配失败，启用模糊匹配: {target_text[:20]}...")
@@ -418,11 +428,14 @@ class DocumentAnnotator:
         best_match = None
         best_ratio = 0
         
-        for para_info in paragraphs_info:
-            para_text = para_info["text"]
+        for i in text_index.fuzzy_candidates(target_text, self.min_similarity):
+            para_info = paragraphs_info[i]
             
-            # 计算相似度
-            ratio = SequenceMatcher(None, target_text, para_text).ratio()
+            # 计算相似度（先用廉价上界排除不可能达标的候选）
+            matcher = SequenceMatcher(None, target_text, para_info["text"])
+            if matcher.quick_ratio() < max(best_ratio, self.min_similarity):
+                continue
+            ratio = matcher.ratio()
             
             if ratio > best_ratio:
                 best_ratio = ratio
@@ -704,6 +717,11 @@ class DocumentAnnotator:
             }
         
         paragraphs_info = text_data["paragraphs"]
+        # 所有原文片段一次性建索引（Aho-Corasick 一遍扫描全文）
+        text_index = TextIndex(
+            (p["text"] for p in paragraphs_info),
+            (anno.get("原文片段", "").strip() for anno in annotations)
+        )
         applied_count = 0
         failed_count = 0
         details = []
@@ -725,7 +743,7 @@ class DocumentAnnotator:
                 continue
             
             # 第3步：定位文本
-            location = self.locate_text_in_paragraphs(paragraphs_info, original_text)
+            location = self.locate_text_in_paragraphs(paragraphs_info, original_text, text_index)
             
             if not location or not location.get("found"):
                 failed_count += 1
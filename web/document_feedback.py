@@ -8,13 +8,92 @@
 import os
 import json
 import time
-from typing import Dict, Any, Optional, List, Callable
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, Optional, List, Callable, Tuple
 from datetime import datetime
 
 
+class AdaptiveConcurrencyLimiter:
+    """
+    在途 LLM 调用数的自适应上限（AIMD）
+    
+    - 连续成功达到当前上限次数后上限 +1（加性增）
+    - 遇到 429/503 或超时时上限减半（乘性减），并全局暂停一小段时间；
+      同一批已在途调用的限流只计一次（按调用开始时间判断）
+    - 名额在调用真正结束时才归还：超时放弃等待的调用仍占用名额
+    """
+    
+    THROTTLE_CODES = (429, 503)
+    THROTTLE_STATUSES = ("RESOURCE_EXHAUSTED", "UNAVAILABLE")
+    
+    def __init__(self, maximum: int, initial: Optional[int] = None, minimum: int = 1,
+                 backoff_seconds: float = 2.0):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.limit = max(self.minimum, min(initial or self.maximum, self.maximum))
+        self.backoff_seconds = backoff_seconds
+        self.in_flight = 0
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._pause_until = 0.0
+        self._cond = threading.Condition()
+    
+    @classmethod
+    def is_throttle(cls, error: BaseException) -> bool:
+        """超时，或带 429/503 状态码的 API 错误（google.genai 的 APIError 提供 code/status）"""
+        if isinstance(error, TimeoutError):
+            return True
+        code = getattr(error, "status_code", None) or getattr(error, "code", None)
+        return code in cls.THROTTLE_CODES or getattr(error, "status", None) in cls.THROTTLE_STATUSES
+    
+    def acquire(self) -> float:
+        """阻塞直到有空闲名额，返回调用开始时间"""
+        with self._cond:
+            while True:
+                wait_for = self._pause_until - time.monotonic()
+                if wait_for <= 0 and self.in_flight < self.limit:
+                    break
+                self._cond.wait(timeout=wait_for if wait_for > 0 else None)
+            self.in_flight += 1
+            return time.monotonic()
+    
+    def release(self, started_at: float, error: Optional[BaseException] = None, record: bool = True):
+        """调用结束时归还名额；record=False 时结果已由 record() 单独反馈"""
+        with self._cond:
+            self.in_flight -= 1
+            if record:
+                self._record(started_at, error)
+            self._cond.notify_all()
+    
+    def record(self, started_at: float, error: Optional[BaseException] = None):
+        """反馈调用结果（不归还名额），用于调用方先于调用结束得知结果的情况，如等待超时"""
+        with self._cond:
+            self._record(started_at, error)
+            self._cond.notify_all()
+    
+    def _record(self, started_at: float, error: Optional[BaseException]):
+        """按调用结果调整上限（调用方持有 self._cond）"""
+        if error is not None and self.is_throttle(error):
+            self._successes = 0
+            if started_at >= self._last_decrease:
+                self.limit = max(self.minimum, self.limit // 2)
+                self._last_decrease = time.monotonic()
+                self._pause_until = self._last_decrease + self.backoff_seconds
+                print(f"[DocumentFeedback] 🚦 触发限流/超时，并发上限降为 {self.limit}")
+        elif error is None:
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self._successes = 0
+
+
 class DocumentFeedbackSystem:
     """文档智能反馈系统"""
     
+    # 分段标注的最大在途 LLM 调用数，可用环境变量 KOTO_ANNOTATION_CONCURRENCY 覆盖
+    ANNOTATION_MAX_CONCURRENCY = 4
+    
     def __init__(self, gemini_client=None, default_model_id: str = "gemini-3-pro-preview"):
         """
         Args:
@@ -451,10 +530,14 @@ class DocumentFeedbackSystem:
         chunk_index: int,
         total_chunks: int,
         full_doc_context: str = "",
-        max_retries: int = 3
+        max_retries: int = 3,
+        limiter: Optional[AdaptiveConcurrencyLimiter] = None
     ) -> Optional[List[Dict[str, str]]]:
         """
-        分析单个分段并返回标注列表（严格顺序执行，上一段完成后再处理下一段）
+        分析单个分段并返回标注列表
+        
+        传入 limiter 时每次模型调用都先占用一个在途名额，调用结果（成功/限流/超时）
+        反馈给 limiter 以调整并发上限。
         """
         base_context = user_requirement + f"\n(注：这是文档的第{chunk_index}部分，共{total_chunks}部分)"
         def _call_model(contents: str):
@@ -480,15 +563,24 @@ class DocumentFeedbackSystem:
                 except Exception as e:
                     print(f"[DocumentFeedback] ❌ AI调用异常: {e}")
                     result_holder["error"] = e
+                finally:
+                    # 超时后调用仍在进行，名额到真正结束时才归还
+                    if limiter:
+                        limiter.release(started_at, record=False)
 
+            started_at = limiter.acquire() if limiter else 0.0
             t = threading.Thread(target=_runner, daemon=True)
             t.start()
             t.join(timeout_seconds)
             if t.is_alive():
                 print(f"[DocumentFeedback] ⏱️ AI调用超时 ({timeout_seconds}s)")
-                return None, TimeoutError(f"Chunk timeout after {timeout_seconds}s")
-            if result_holder["error"]:
-                return None, result_holder["error"]
+                error = TimeoutError(f"Chunk timeout after {timeout_seconds}s")
+            else:
+                error = result_holder["error"]
+            if limiter:
+                limiter.record(started_at, error)
+            if error:
+                return None, error
             return result_holder["response"], None
 
         all_annotations: List[Dict[str, str]] = []
@@ -1273,72 +1365,95 @@ class DocumentFeedbackSystem:
         print(f"[DocumentFeedback] � 文档较大({total_length}字符)，分{len(chunks)}段处理")
         print(f"[DocumentFeedback] 🎯 目标标注数: 约{total_length//1000*10}条（每1000字10条）\n")
 
-        # 处理每一段（严格顺序执行，失败自动拆分重试）
-        from collections import deque
-        all_annotations = []
+        # 并发处理各段：在途 LLM 调用数由自适应限流器约束，失败的段拆分后重新提交；
+        # 结果按段的位置键（原段序号, 子段序号, ...）合并，保证与顺序处理一致
+        max_concurrency = int(os.getenv("KOTO_ANNOTATION_CONCURRENCY", self.ANNOTATION_MAX_CONCURRENCY))
+        limiter = AdaptiveConcurrencyLimiter(maximum=max_concurrency, initial=max(1, max_concurrency // 2))
+        results: Dict[Tuple[int, ...], List[Dict[str, str]]] = {}
         seen_texts = set()
         processed = 0
         min_chunk_size = 800
         start_time = time.time()
-        queue = deque(chunks)
         total_chunks_initial = len(chunks)
 
-        while queue:
-            chunk = queue.popleft()
-            processed += 1
-            current_total = processed + len(queue)
-
-            elapsed = time.time() - start_time
-            progress_pct = (processed / max(1, current_total)) * 100
-            bar_length = 20
-            bar_filled = int(bar_length * processed / max(1, current_total))
-            progress_bar = '█' * bar_filled + '░' * (bar_length - bar_filled)
-
-            print(f"\n[DocumentFeedback] 📊 [{progress_bar}] {processed}/{current_total} ({progress_pct:.0f}%)")
-            print(f"[DocumentFeedback] ⏱️ 已用时: {elapsed:.1f}s | 累计{len(all_annotations)}条标注 | 剩余{len(queue)}段")
-
-            annotations = self._analyze_chunk_for_annotations(
+        def run_chunk(key: Tuple[int, ...], chunk: str):
+            return self._analyze_chunk_for_annotations(
                 chunk=chunk,
                 doc_type=doc_data.get("type"),
                 user_requirement=user_requirement,
                 model_id=selected_model,
-                chunk_index=processed,
-                total_chunks=current_total,
+                chunk_index=key[0] + 1,
+                total_chunks=total_chunks_initial,
                 full_doc_context=formatted_content,
-                max_retries=2
+                max_retries=2,
+                limiter=limiter
             )
 
-            if annotations is None:
-                if len(chunk) <= min_chunk_size:
-                    return {
-                        "success": False,
-                        "error": f"分段内容过小仍失败（{len(chunk)}字符），请检查网络或API配置后重试",
-                        "file_path": file_path
-                    }
-                sub_chunks = self._split_into_chunks_by_paragraphs(chunk, max(min_chunk_size, len(chunk) // 2))
-                if len(sub_chunks) <= 1:
-                    return {
-                        "success": False,
-                        "error": f"分段拆分失败，无法继续处理（{len(chunk)}字符）",
-                        "file_path": file_path
-                    }
-                for sc in reversed(sub_chunks):
-                    queue.appendleft(sc)
-                print(f"[DocumentFeedback] 🔁 分段失败，已拆分为{len(sub_chunks)}段重试")
-                continue
+        # 每段内部会发起多轮模型调用，工作线程数多于在途上限以便及时补位
+        pool = ThreadPoolExecutor(max_workers=max(1, max_concurrency) * 2, thread_name_prefix="annotate")
+        failure = None
+        try:
+            pending = {pool.submit(run_chunk, (i,), chunk): ((i,), chunk) for i, chunk in enumerate(chunks)}
+            while pending and failure is None:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in sorted(done, key=lambda f: pending[f][0]):
+                    key, chunk = pending.pop(future)
+                    try:
+                        annotations = future.result()
+                    except Exception as e:
+                        print(f"[DocumentFeedback] ❌ 第{key[0] + 1}段处理异常: {e}")
+                        annotations = None
+
+                    if annotations is None:
+                        if len(chunk) <= min_chunk_size:
+                            failure = f"分段内容过小仍失败（{len(chunk)}字符），请检查网络或API配置后重试"
+                            break
+                        sub_chunks = self._split_into_chunks_by_paragraphs(chunk, max(min_chunk_size, len(chunk) // 2))
+                        if len(sub_chunks) <= 1:
+                            failure = f"分段拆分失败，无法继续处理（{len(chunk)}字符）"
+                            break
+                        for j, sc in enumerate(sub_chunks):
+                            pending[pool.submit(run_chunk, key + (j,), sc)] = (key + (j,), sc)
+                        print(f"[DocumentFeedback] 🔁 分段失败，已拆分为{len(sub_chunks)}段重试")
+                        continue
 
-            new_count = 0
-            for item in annotations:
+                    results[key] = annotations
+                    processed += 1
+                    current_total = processed + len(pending)
+                    new_count = 0
+                    for item in annotations:
+                        text = (item.get("原文片段") or "").strip()
+                        if text and text not in seen_texts:
+                            seen_texts.add(text)
+                            new_count += 1
+
+                    elapsed = time.time() - start_time
+                    bar_length = 20
+                    bar_filled = int(bar_length * processed / max(1, current_total))
+                    progress_bar = '█' * bar_filled + '░' * (bar_length - bar_filled)
+                    print(f"\n[DocumentFeedback] 📊 [{progress_bar}] {processed}/{current_total} "
+                          f"({processed / max(1, current_total) * 100:.0f}%) | 并发上限 {limiter.limit}")
+                    print(f"[DocumentFeedback] ⏱️ 已用时: {elapsed:.1f}s | 累计{len(seen_texts)}条标注 | 剩余{len(pending)}段")
+
+                    msg = f"已完成 {processed}/{current_total} 段 (本段+{new_count}条，累计{len(seen_texts)}条)"
+                    if progress_callback:
+                        progress_callback(processed, current_total, msg)
+
+        finally:
+            # 失败时不等待仍在途的段，直接取消排队中的任务
+            pool.shutdown(wait=failure is None, cancel_futures=True)
+        if failure is not None:
+            return {"success": False, "error": failure, "file_path": file_path}
+
+        # 按段位置顺序合并并去重
+        all_annotations = []
+        seen_texts = set()
+        for key in sorted(results):
+            for item in results[key]:
                 text = (item.get("原文片段") or "").strip()
                 if text and text not in seen_texts:
                     seen_texts.add(text)
                     all_annotations.append(item)
-                    new_count += 1
-
-            msg = f"已完成 {processed}/{current_total} 段 (本段+{new_count}条，累计{len(all_annotations)}条)"
-            print(f"[DocumentFeedback] ✅ 第 {processed} 段完成: 新增 {new_count} 条标注")
-            if progress_callback:
-                progress_callback(processed, current_total, msg)
 
         elapsed_total = time.time() - start_time
 
@@ -1351,7 +1466,8 @@ class DocumentFeedbackSystem:
             "file_path": file_path,
             "annotations": all_annotations,
             "summary": (
-                f"分段顺序处理（初始{total_chunks_initial}段），共生成{len(all_annotations)}条标注（耗时{elapsed_total:.1f}s）。"
+                f"分段并发处理（初始{total_chunks_initial}段，最大并发{max_concurrency}），"
+                f"共生成{len(all_annotations)}条标注（耗时{elapsed_total:.1f}s）。"
                 f"{model_note}\n\n可用模型：\n{model_table}"
             ),
             "annotation_count": len(all_annotations),
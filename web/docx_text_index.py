@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+文档文本索引 - 供 TrackChangesEditor / DocumentAnnotator 批量定位修改目标
+
+每个文档只构建一次：
+- TextIndex：各段落文本 + 拼接全文与段落起始偏移表；对全部建议原文构建
+  Aho-Corasick 自动机，一次扫描全文得到每条原文出现在哪些段落；
+  模糊匹配只对字二元组倒排表预筛出的少量候选段落计算相似度
+- DocumentTextIndex：在 TextIndex 基础上维护每段的 run 列表与 run 起始偏移表，
+  定位 (段落, 偏移) -> (run, run 内偏移) 为二分查找；应用修改、拆分 run 后
+  只重建该段落的表，并用自动机重扫该段，保证后续定位与逐条重扫的结果一致
+
+本模块不依赖 python-docx：段落对象只需有 .runs，run 只需有 .text。
+"""
+
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+_SEPARATOR = '\x00'  # 拼接全文时的段落分隔符，不会出现在 Word 文本中
+
+
+def char_ngrams(text: str, n: int = 2) -> set:
+    """字 n 元组集合（短于 n 的文本整体作为一个元组）"""
+    if len(text) < n:
+        return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class AhoCorasick:
+    """多模式串精确匹配自动机（纯 Python）"""
+
+    def __init__(self, patterns: Sequence[str]):
+        self.patterns = list(patterns)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        for k, pattern in enumerate(self.patterns):
+            if pattern:
+                self._insert(pattern, k)
+        self._link()
+
+    def _insert(self, pattern: str, k: int):
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append(k)
+
+    def _link(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, int]]:
+        """逐个产出 (起始位置, 模式串序号)，包括重叠匹配"""
+        goto, fail, out, patterns = self._goto, self._fail, self._out, self.patterns
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for k in out[node]:
+                yield i + 1 - len(patterns[k]), k
+
+
+class TextIndex:
+    """段落文本索引：精确定位走 Aho-Corasick 候选表，模糊定位走二元组预筛"""
+
+    FUZZY_CANDIDATES = 32  # 进入相似度计算的候选段落上限
+
+    def __init__(self, texts: Iterable[str], targets: Iterable[str] = ()):
+        self._texts = [t or "" for t in texts]
+        self._full: Optional[str] = None
+        self._starts: List[int] = []
+        self._grams: Optional[Dict[str, List[int]]] = None
+
+        patterns = sorted({t for t in targets if t and _SEPARATOR not in t})
+        self._matcher = AhoCorasick(patterns)
+        self._candidates: Dict[str, List[int]] = {p: [] for p in patterns}
+        for start, k in self._matcher.finditer(self.full_text):
+            para = self.paragraph_at(start)
+            hits = self._candidates[patterns[k]]
+            if not hits or hits[-1] != para:
+                hits.append(para)
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def text(self, i: int) -> str:
+        return self._texts[i]
+
+    @property
+    def full_text(self) -> str:
+        """所有段落以分隔符拼接的全文（修改后按需重建）"""
+        if self._full is None:
+            self._starts, pos = [], 0
+            for t in self._texts:
+                self._starts.append(pos)
+                pos += len(t) + 1
+            self._full = _SEPARATOR.join(self._texts)
+        return self._full
+
+    def paragraph_at(self, offset: int) -> int:
+        """全文偏移 -> 段落序号"""
+        self.full_text
+        return bisect_right(self._starts, offset) - 1
+
+    def find(self, target: str, stop: Optional[int] = None) -> Optional[Tuple[int, int]]:
+        """
+        返回 target 首次出现的 (段落序号, 段内偏移)，只查 [0, stop) 段落
+
+        构建时登记过的原文只检查候选段落，其余原文退化为逐段查找。
+        """
+        stop = len(self._texts) if stop is None else stop
+        hits = self._candidates.get(target)
+        if hits is None:
+            for i in range(stop):
+                pos = self._texts[i].find(target)
+                if pos != -1:
+                    return i, pos
+            return None
+        k = 0
+        while k < len(hits) and hits[k] < stop:
+            pos = self._texts[hits[k]].find(target)
+            if pos != -1:
+                return hits[k], pos
+            del hits[k]  # 该段落已被修改，不再包含此原文
+        return None
+
+    def set_text(self, i: int, text: str):
+        """段落 i 的文本已改变：更新全文、并重扫该段补充候选"""
+        self._texts[i] = text or ""
+        self._full = None
+        self._grams = None
+        seen = set()
+        for _, k in self._matcher.finditer(self._texts[i]):
+            if k in seen:
+                continue
+            seen.add(k)
+            hits = self._candidates[self._matcher.patterns[k]]
+            j = bisect_left(hits, i)
+            if j == len(hits) or hits[j] != i:
+                insort(hits, i)
+
+    # ==================== 模糊匹配预筛 ====================
+
+    def fuzzy_candidates(self, target: str, min_ratio: float = 0.0,
+                         limit: Optional[int] = None) -> List[int]:
+        """
+        与 target 共享字二元组最多的段落（按段落序号返回）
+
+        先按长度上界过滤：SequenceMatcher.ratio() <= 2·min(la, lb) / (la + lb)，
+        上界低于 min_ratio 的段落不可能达到阈值。
+        """
+        if self._grams is None:
+            self._grams = {}
+            for i, t in enumerate(self._texts):
+                for g in char_ngrams(t):
+                    self._grams.setdefault(g, []).append(i)
+        shared: Dict[int, int] = {}
+        for g in char_ngrams(target):
+            for i in self._grams.get(g, ()):
+                shared[i] = shared.get(i, 0) + 1
+        la = len(target)
+        ranked = [(-count, i) for i, count in shared.items()
+                  if 2.0 * min(la, len(self._texts[i])) / (la + len(self._texts[i])) >= min_ratio]
+        ranked.sort()
+        limit = self.FUZZY_CANDIDATES if limit is None else limit
+        return sorted(i for _, i in ranked[:limit])
+
+
+class DocumentTextIndex(TextIndex):
+    """Word 段落索引：文本按 run 拼接，附 run 偏移表"""
+
+    def __init__(self, paragraphs: Iterable, targets: Iterable[str] = (), body_count: Optional[int] = None):
+        self.paragraphs = list(paragraphs)
+        self.body_count = len(self.paragraphs) if body_count is None else body_count
+        scanned = [self._scan(p) for p in self.paragraphs]
+        self._runs: List[list] = [runs for _, runs, _ in scanned]
+        self._run_starts: List[List[int]] = [starts for _, _, starts in scanned]
+        super().__init__([text for text, _, _ in scanned], targets)
+
+    @classmethod
+    def for_document(cls, doc, targets: Iterable[str] = (), include_tables: bool = True) -> "DocumentTextIndex":
+        """正文段落在前（前 body_count 个），其后为各表格单元格中的段落"""
+        paragraphs = list(doc.paragraphs)
+        body_count = len(paragraphs)
+        if include_tables:
+            for table in doc.tables:
+                for row in table.rows:
+                    for cell in row.cells:
+                        paragraphs.extend(cell.paragraphs)
+        return cls(paragraphs, targets, body_count=body_count)
+
+    @staticmethod
+    def _scan(para) -> Tuple[str, list, List[int]]:
+        """(段落文本, run 列表, 各 run 起始偏移)"""
+        runs = list(para.runs)
+        parts, starts, pos = [], [], 0
+        for run in runs:
+            text = run.text or ""
+            starts.append(pos)
+            parts.append(text)
+            pos += len(text)
+        return "".join(parts), runs, starts
+
+    def runs(self, i: int) -> list:
+        return self._runs[i]
+
+    def run_start(self, i: int, run_index: int) -> int:
+        return self._run_starts[i][run_index]
+
+    def locate(self, i: int, start: int, end: int) -> Tuple[int, int]:
+        """
+        段内区间 [start, end) -> (起始 run, 结束 run)
+
+        起始 run 为包含 start 的非空 run，结束 run 为满足 run 起点 < end <= run 终点 的 run。
+        """
+        starts = self._run_starts[i]
+        return bisect_right(starts, start) - 1, bisect_left(starts, end) - 1
+
+    def refresh(self, i: int):
+        """段落 i 的 run 已被拆分/移动：重建该段的 run 表与文本"""
+        text, self._runs[i], self._run_starts[i] = self._scan(self.paragraphs[i])
+        self.set_text(i, text)
@@ -8,10 +8,17 @@
 import json
 import os
 import time
+import atexit
+import threading
 from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 from pathlib import Path
 
+try:
+    from memory_index import MemoryIndex
+except ImportError:
+    from web.memory_index import MemoryIndex
+
 
 class UserProfile:
     """用户画像：综合理解用户特征"""
@@ -165,13 +172,29 @@ class UserProfile:
 class EnhancedMemoryManager:
     """增强的记忆管理器"""
     
+    CATEGORY_BOOST = {"user_preference": 3, "correction": 2}
+    RELEVANCE_WEIGHT = 5         # 混合检索相关度（0~1）折算的分数
+    USE_COUNT_FLUSH_DELAY = 5.0  # use_count 变更合并后延迟写盘的秒数
+    
     def __init__(self, memory_path: str = "config/memory.json", 
                  profile_path: str = "config/user_profile.json"):
         self.memory_path = memory_path
         self.memories: List[Dict] = []
         self.user_profile = UserProfile(profile_path)
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._index_dirty = False
+        self._flush_timer: Optional[threading.Timer] = None
         self._load()
         
+        self._by_id: Dict[int, Dict] = {m["id"]: m for m in self.memories}
+        self._boosted: Optional[List[Dict]] = None
+        self._index = MemoryIndex(os.path.splitext(memory_path)[0] + ".index.npz")
+        if self._index.build(self.memories):
+            self._index.save_cache()
+        atexit.register(self.flush)
+        
         print(f"[EnhancedMemory] ✅ 记忆系统已启动")
         print(f"[EnhancedMemory] 📊 当前记忆数：{len(self.memories)}")
         print(f"[EnhancedMemory] 👤 用户画像：{self.user_profile.get_brief_summary()}")
@@ -187,29 +210,67 @@ class EnhancedMemoryManager:
                 self.memories = []
     
     def _save(self):
-        """保存记忆"""
-        try:
-            os.makedirs(os.path.dirname(self.memory_path), exist_ok=True)
-            with open(self.memory_path, 'w', encoding='utf-8') as f:
-                json.dump(self.memories, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"[EnhancedMemory] 保存失败: {e}")
+        """保存记忆（写临时文件后原子替换）"""
+        with self._lock:
+            snapshot = list(self.memories)
+            self._dirty = False
+        with self._save_lock:
+            try:
+                os.makedirs(os.path.dirname(self.memory_path), exist_ok=True)
+                tmp_path = self.memory_path + ".tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(snapshot, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, self.memory_path)
+            except Exception as e:
+                print(f"[EnhancedMemory] 保存失败: {e}")
+    
+    def _schedule_flush(self):
+        """合并一段时间内的 use_count / 索引变更，由后台定时器统一写盘"""
+        with self._lock:
+            if self._flush_timer is not None:
+                return
+            self._flush_timer = threading.Timer(self.USE_COUNT_FLUSH_DELAY, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+    
+    def flush(self):
+        """立即写出待保存的 use_count 与嵌入缓存"""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            dirty, index_dirty = self._dirty, self._index_dirty
+            self._index_dirty = False
+        if dirty:
+            self._save()
+        if index_dirty:
+            self._index.save_cache()
     
     def add_memory(self, content: str, category: str = "user_preference", 
                    source: str = "user", metadata: Optional[Dict] = None) -> Dict:
         """添加记忆"""
-        item = {
-            "id": int(time.time() * 1000),
-            "content": content.strip(),
-            "category": category,
-            "source": source,
-            "created_at": datetime.now().isoformat(),
-            "use_count": 0,
-            "metadata": metadata or {}
-        }
-        
-        self.memories.append(item)
+        with self._lock:
+            # 毫秒时间戳作为 id，同一毫秒内连续添加时顺延，保证唯一
+            memory_id = int(time.time() * 1000)
+            while memory_id in self._by_id:
+                memory_id += 1
+            item = {
+                "id": memory_id,
+                "content": content.strip(),
+                "category": category,
+                "source": source,
+                "created_at": datetime.now().isoformat(),
+                "use_count": 0,
+                "metadata": metadata or {}
+            }
+            
+            self.memories.append(item)
+            self._by_id[item["id"]] = item
+            self._boosted = None
+            self._index.add(item)
+            self._index_dirty = True
         self._save()
+        self._schedule_flush()
         
         print(f"[EnhancedMemory] ➕ 新记忆: {content[:50]}...")
         return item
@@ -262,47 +323,46 @@ class EnhancedMemoryManager:
         
         return extracted
     
+    def _boosted_memories(self, limit: int) -> List[Dict]:
+        """分类加权最高、最新的记忆（无词法命中时也可能入选）"""
+        if self._boosted is None:
+            self._boosted = sorted(
+                (m for m in self.memories if m.get("category") in self.CATEGORY_BOOST),
+                key=lambda m: (self.CATEGORY_BOOST[m["category"]], m["created_at"]),
+                reverse=True
+            )
+        return self._boosted[:limit]
+    
     def search_memories(self, query: str, limit: int = 5) -> List[Dict]:
-        """搜索相关记忆（关键词版本）"""
+        """
+        搜索相关记忆（BM25 + 嵌入混合检索）
+        
+        得分 = 分类加权 + 相关度 × RELEVANCE_WEIGHT；use_count 的更新在后台合并写盘
+        """
         if not query:
             return []
         
-        query_lower = query.lower()
-        scored = []
-        keywords = [k for k in query_lower.split() if len(k) > 1]
-        
-        for m in self.memories:
-            content_lower = m["content"].lower()
-            score = 0
-            
-            # 分类加权
-            if m["category"] == "user_preference":
-                score += 3
-            elif m["category"] == "correction":
-                score += 2
+        with self._lock:
+            scored = {}
+            for m in self._boosted_memories(limit):
+                scored[m["id"]] = self.CATEGORY_BOOST[m["category"]]
+            for memory_id, relevance in self._index.search(query, limit=limit * 4):
+                m = self._by_id.get(memory_id)
+                if m is not None:
+                    scored[memory_id] = self.CATEGORY_BOOST.get(m["category"], 0) + relevance * self.RELEVANCE_WEIGHT
             
-            # 完全匹配
-            if query_lower in content_lower:
-                score += 5
+            # 排序
+            ranked = sorted(scored.items(), key=lambda x: (x[1], self._by_id[x[0]]["created_at"]), reverse=True)
+            results = [self._by_id[memory_id] for memory_id, _ in ranked[:limit]]
             
-            # 关键词匹配
-            for kw in keywords:
-                if kw in content_lower:
-                    score += 1
-            
-            if score > 0:
-                scored.append((score, m))
-        
-        # 排序
-        scored.sort(key=lambda x: (x[0], x[1]["created_at"]), reverse=True)
-        
-        # 增加使用计数
-        results = [item[1] for item in scored[:limit]]
-        for m in results:
-            m["use_count"] = m.get("use_count", 0) + 1
+            # 增加使用计数
+            for m in results:
+                m["use_count"] = m.get("use_count", 0) + 1
+            if results:
+                self._dirty = True
         
         if results:
-            self._save()
+            self._schedule_flush()
         
         return results
     
@@ -329,13 +389,22 @@ class EnhancedMemoryManager:
     
     def delete_memory(self, memory_id: int) -> bool:
         """删除记忆"""
-        initial_len = len(self.memories)
-        self.memories = [m for m in self.memories if m["id"] != memory_id]
+        with self._lock:
+            initial_len = len(self.memories)
+            self.memories = [m for m in self.memories if m["id"] != memory_id]
+            if len(self.memories) == initial_len:
+                return False
+            
+            self._by_id.pop(memory_id, None)
+            self._boosted = None
+            self._index.remove(memory_id)
+            if self._index.needs_compaction():
+                self._index.build(self.memories)
+            self._index_dirty = True
         
-        if len(self.memories) < initial_len:
-            self._save()
-            return True
-        return False
+        self._save()
+        self._schedule_flush()
+        return True
     
     def get_profile(self) -> Dict:
         """获取用户画像"""
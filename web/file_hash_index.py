@@ -0,0 +1,340 @@
+"""
+文件内容哈希索引 - 归纳/整合清理时的去重比对缓存
+
+以 (路径, 大小, mtime) 为键持久化记录文件的头部哈希与完整哈希：
+1. 候选重复文件先按大小分桶，大小不同的文件无需读取
+2. 同大小的文件再比较前 HEAD_BYTES 字节的哈希
+3. 头部也相同时才计算完整 SHA-256
+
+文件被移动、复制、删除时由调用方增量更新索引，文件未变化（大小与 mtime 一致）
+时直接复用缓存的哈希，重复整理大量文件几乎不再产生读盘。
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+PathLike = Union[str, Path]
+
+
+class FileHashIndex:
+    """
+    持久化的文件内容哈希索引
+
+    数据保存在 SQLite（默认 <organize_root>/_hash_index.db，以 _ 开头的文件
+    会被归纳/清理流程忽略），首次使用时整表读入内存，修改在 flush() 时批量写回。
+    同一数据库路径在进程内共享一个实例。
+    """
+
+    HEAD_BYTES = 4096           # 头部哈希读取的字节数
+    CHUNK_SIZE = 65536
+    DB_NAME = "_hash_index.db"
+
+    _instances: Dict[str, "FileHashIndex"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        # 绝对路径 -> [size, mtime_ns, head_hash, full_hash]
+        self._entries: Optional[Dict[str, list]] = None
+        self._dirty: set = set()
+        self._deleted: set = set()
+        self.bytes_read = 0
+
+    @classmethod
+    def for_db(cls, db_path: str) -> "FileHashIndex":
+        key = os.path.abspath(db_path)
+        with cls._instances_lock:
+            index = cls._instances.get(key)
+            if index is None:
+                index = cls._instances[key] = cls(key)
+            return index
+
+    @classmethod
+    def for_root(cls, organize_root: PathLike) -> "FileHashIndex":
+        """获取某个归纳根目录对应的共享索引"""
+        return cls.for_db(os.path.join(str(organize_root), cls.DB_NAME))
+
+    # ── 持久化 ──
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS file_hashes (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                head_hash TEXT,
+                full_hash TEXT
+            )
+        """)
+        return conn
+
+    def _load(self):
+        self._entries = {}
+        if not os.path.exists(self.db_path):
+            return
+        try:
+            conn = self._connect()
+            try:
+                for path, size, mtime_ns, head, full in conn.execute(
+                        "SELECT path, size, mtime_ns, head_hash, full_hash FROM file_hashes"):
+                    self._entries[path] = [size, mtime_ns, head, full]
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            self._entries = {}
+
+    def _table(self) -> Dict[str, list]:
+        if self._entries is None:
+            self._load()
+        return self._entries
+
+    def flush(self):
+        """把内存中的修改写回数据库"""
+        with self._lock:
+            if not self._dirty and not self._deleted:
+                return
+            entries = self._table()
+            rows = [(p, *entries[p]) for p in self._dirty if p in entries]
+            deleted = [(p,) for p in self._deleted]
+            try:
+                os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+                conn = self._connect()
+                try:
+                    with conn:
+                        conn.executemany("DELETE FROM file_hashes WHERE path = ?", deleted)
+                        conn.executemany(
+                            "INSERT OR REPLACE INTO file_hashes "
+                            "(path, size, mtime_ns, head_hash, full_hash) VALUES (?, ?, ?, ?, ?)",
+                            rows)
+                finally:
+                    conn.close()
+            except (OSError, sqlite3.Error):
+                return  # 索引只是缓存，写入失败下次重新计算即可
+            self._dirty.clear()
+            self._deleted.clear()
+
+    # ── 查询 ──
+
+    @staticmethod
+    def _key(path: PathLike) -> str:
+        return os.path.abspath(str(path))
+
+    def _entry(self, path: PathLike) -> Optional[Tuple[str, list]]:
+        """返回与磁盘状态一致的条目（大小或 mtime 变化时旧哈希作废）"""
+        key = self._key(path)
+        try:
+            st = os.stat(key)
+        except OSError:
+            return None
+        with self._lock:
+            entries = self._table()
+            entry = entries.get(key)
+            if entry is None or entry[0] != st.st_size or entry[1] != st.st_mtime_ns:
+                entry = entries[key] = [st.st_size, st.st_mtime_ns, None, None]
+                self._dirty.add(key)
+                self._deleted.discard(key)
+            return key, entry
+
+    def size(self, path: PathLike) -> Optional[int]:
+        found = self._entry(path)
+        return found[1][0] if found else None
+
+    def _hash_file(self, key: str, limit: Optional[int] = None) -> str:
+        h = hashlib.sha256()
+        read = 0
+        try:
+            with open(key, "rb") as f:
+                while limit is None or read < limit:
+                    size = self.CHUNK_SIZE if limit is None else min(self.CHUNK_SIZE, limit - read)
+                    chunk = f.read(size)
+                    if not chunk:
+                        break
+                    h.update(chunk)
+                    read += len(chunk)
+        except OSError:
+            return ""
+        finally:
+            with self._lock:
+                self.bytes_read += read
+        return h.hexdigest()
+
+    def _store(self, key: str, entry: list, slot: int, value: str):
+        if not value:
+            return
+        with self._lock:
+            entry[slot] = value
+            if entry[0] <= self.HEAD_BYTES:
+                # 小文件的头部即全文
+                entry[2] = entry[3] = value
+            self._dirty.add(key)
+
+    def head_hash(self, path: PathLike) -> str:
+        """前 HEAD_BYTES 字节的 SHA-256，读取失败返回空串"""
+        found = self._entry(path)
+        if not found:
+            return ""
+        key, entry = found
+        if entry[2] is None:
+            self._store(key, entry, 2, self._hash_file(key, self.HEAD_BYTES))
+        return entry[2] or ""
+
+    def full_hash(self, path: PathLike) -> str:
+        """完整内容的 SHA-256，读取失败返回空串"""
+        found = self._entry(path)
+        if not found:
+            return ""
+        key, entry = found
+        if entry[3] is None:
+            self._store(key, entry, 3, self._hash_file(key))
+        return entry[3] or ""
+
+    def same_content(self, a: PathLike, b: PathLike) -> bool:
+        """依次比较大小、头部哈希、完整哈希"""
+        size_a = self.size(a)
+        if size_a is None or size_a != self.size(b):
+            return False
+        head = self.head_hash(a)
+        if not head or head != self.head_hash(b):
+            return False
+        full = self.full_hash(a)
+        return bool(full) and full == self.full_hash(b)
+
+    def buckets(self, paths: Iterable[PathLike] = ()) -> "ContentBuckets":
+        return ContentBuckets(self, paths)
+
+    def find_duplicate(self, path: PathLike, candidates: Iterable[PathLike]) -> Optional[Path]:
+        """在 candidates 中查找与 path 内容相同的文件"""
+        return self.buckets(candidates).find(path)
+
+    def group_duplicates(self, paths: Iterable[PathLike]) -> List[List[Path]]:
+        """把内容相同的文件分组，只返回成员数大于 1 的组（组内保持输入顺序）"""
+        by_size: Dict[int, List[Path]] = defaultdict(list)
+        for p in paths:
+            size = self.size(p)
+            if size is not None:
+                by_size[size].append(Path(p))
+
+        groups = []
+        for same_size in by_size.values():
+            if len(same_size) < 2:
+                continue
+            by_head: Dict[str, List[Path]] = defaultdict(list)
+            for p in same_size:
+                head = self.head_hash(p)
+                if head:
+                    by_head[head].append(p)
+            for same_head in by_head.values():
+                if len(same_head) < 2:
+                    continue
+                by_full: Dict[str, List[Path]] = defaultdict(list)
+                for p in same_head:
+                    full = self.full_hash(p)
+                    if full:
+                        by_full[full].append(p)
+                groups.extend(g for g in by_full.values() if len(g) > 1)
+        return groups
+
+    # ── 增量维护 ──
+
+    def moved(self, src: PathLike, dst: PathLike):
+        """文件已从 src 移动到 dst：移动保留大小与 mtime，二者都与旧条目一致时才沿用哈希"""
+        with self._lock:
+            entries = self._table()
+            entry = entries.pop(self._key(src), None)
+            if entry is not None:
+                self._forget(self._key(src))
+        if entry is not None:
+            self._inherit(dst, entry, same_mtime=True)
+
+    def copied(self, src: PathLike, dst: PathLike):
+        """文件已从 src 复制到 dst：源文件条目与其当前大小/mtime 一致时，目标沿用其哈希"""
+        found = self._entry(src)        # 源文件已变化时旧哈希在这里作废
+        if found is None:
+            return
+        with self._lock:
+            entry = list(found[1])
+        self._inherit(dst, entry)
+
+    def removed(self, path: PathLike):
+        """文件已被删除"""
+        key = self._key(path)
+        with self._lock:
+            if self._table().pop(key, None) is not None:
+                self._forget(key)
+
+    def prune(self, root: PathLike, keep: Iterable[PathLike]):
+        """
+        删除 root 下所有不在 keep 中的条目（整棵树扫描后调用）；
+        root 之外的条目（复制/归纳时记录的源文件）逐个检查，已不存在的一并删除
+        """
+        prefix = os.path.join(self._key(root), "")
+        keep_keys = {self._key(p) for p in keep}
+        with self._lock:
+            keys = list(self._table())
+        stale = [k for k in keys if k.startswith(prefix) and k not in keep_keys]
+        stale.extend(k for k in keys if not k.startswith(prefix) and not os.path.lexists(k))
+        with self._lock:
+            entries = self._table()
+            for key in stale:
+                if entries.pop(key, None) is not None:
+                    self._forget(key)
+
+    def _forget(self, key: str):
+        self._dirty.discard(key)
+        self._deleted.add(key)
+
+    def _inherit(self, dst: PathLike, entry: list, same_mtime: bool = False):
+        found = self._entry(dst)
+        if not found or found[1][0] != entry[0] or (same_mtime and found[1][1] != entry[1]):
+            return
+        key, target = found
+        with self._lock:
+            if target[2] is None:
+                target[2] = entry[2]
+            if target[3] is None:
+                target[3] = entry[3]
+            self._dirty.add(key)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._table())
+
+
+class ContentBuckets:
+    """一组候选文件按大小分桶，用于反复查询“是否已有相同内容的文件”"""
+
+    def __init__(self, index: FileHashIndex, paths: Iterable[PathLike] = ()):
+        self.index = index
+        self._by_size: Dict[int, List[Path]] = defaultdict(list)
+        for p in paths:
+            self.add(p)
+
+    def add(self, path: PathLike):
+        size = self.index.size(path)
+        if size is not None:
+            self._by_size[size].append(Path(path))
+
+    def find(self, path: PathLike) -> Optional[Path]:
+        size = self.index.size(path)
+        candidates = self._by_size.get(size) if size is not None else None
+        if not candidates:
+            return None
+        head = self.index.head_hash(path)
+        if not head:
+            return None
+        candidates = [c for c in candidates if self.index.head_hash(c) == head]
+        if not candidates:
+            return None
+        full = self.index.full_hash(path)
+        if not full:
+            return None
+        for c in candidates:
+            if self.index.full_hash(c) == full:
+                return c
+        return None
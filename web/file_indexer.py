@@ -3,26 +3,119 @@
 """
 文件索引与搜索 - 快速定位 Koto 处理过的文件
 支持：全文搜索、语义搜索、内容预览
+
+全文索引使用外部内容 FTS5 表（正文只在 file_index 中存一份），排序用 bm25()，
+摘要/高亮由 snippet()/highlight() 生成。中文支持两种模式：
+- jieba：入库前用 jieba 分词，词间插入零宽空格（unicode61 视为分隔符，显示不变）
+- trigram：SQLite 内置三元组分词，支持任意子串匹配
 """
 
 import os
 import re
 import json
 import sqlite3
-from typing import Dict, List, Any, Optional
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Iterator, List, Any, Optional, Tuple
 from pathlib import Path
 from datetime import datetime
 import hashlib
 
 
+MAX_INDEXED_CHARS = 100000  # 限制内容长度（前100KB）
+WORD_SEPARATOR = '\u200b'     # 零宽空格：jieba 模式下的词边界
+_CJK_RE = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]')
+
+
+def default_tokenize_mode() -> str:
+    try:
+        import jieba  # noqa: F401
+        return "jieba"
+    except ImportError:
+        if sqlite3.sqlite_version_info >= (3, 34, 0):
+            return "trigram"
+        return "unicode61"
+
+
+def segment_text(text: str, tokenize_mode: str) -> str:
+    """按索引模式预处理文本：jieba 模式下在中文词之间插入零宽空格"""
+    if tokenize_mode != "jieba" or not text or not _CJK_RE.search(text):
+        return text
+    import jieba
+    return WORD_SEPARATOR.join(jieba.cut(text.replace(WORD_SEPARATOR, '')))
+
+
+def _read_text_file(file_path: str, tokenize_mode: str = "unicode61") -> Tuple[str, Optional[str], Optional[str]]:
+    """读取文本文件、计算哈希并按索引模式分词（在进程池中执行，须为模块级函数）
+
+    Returns:
+        (file_path, content, content_hash)；读取失败时 content 为 None
+    """
+    try:
+        content = Path(file_path).read_text(encoding='utf-8', errors='ignore')
+    except Exception:
+        try:
+            content = Path(file_path).read_text(encoding='gbk', errors='ignore')
+        except Exception:
+            return file_path, None, None
+    content_hash = hashlib.md5(content.encode('utf-8')).hexdigest()
+    return file_path, segment_text(content[:MAX_INDEXED_CHARS], tokenize_mode), content_hash
+
+
+def build_match_query(query: str, tokenize_mode: str) -> Tuple[str, List[str]]:
+    """
+    把用户查询转换为 FTS5 MATCH 表达式
+    
+    - 保留 AND / OR / NOT 运算符，其余每个词转为带引号的短语（避免语法错误）
+    - jieba 模式：词按同样方式分词，最后一个分词做前缀匹配（"北京"* 可命中 "北京大学"）
+    - trigram 模式：少于 3 个字符的词无法索引，作为 LIKE 条件返回
+    
+    Returns:
+        (match_expr, like_terms)
+    """
+    parts: List[str] = []
+    like_terms: List[str] = []
+    for raw in re.findall(r'"[^"]*"|\S+', query or ""):
+        if raw in ("AND", "OR", "NOT"):
+            if parts and parts[-1] not in ("AND", "OR", "NOT"):
+                parts.append(raw)
+            continue
+        term = raw.strip('"').rstrip('*').strip()
+        if not term:
+            continue
+        if tokenize_mode == "jieba":
+            words = [w for w in segment_text(term, "jieba").split(WORD_SEPARATOR) if w.strip()]
+            words = [t for w in words for t in re.findall(r'\w+', w)]
+            if not words:
+                continue
+            parts.append('"' + ' '.join(w.replace('"', '""') for w in words) + '"*')
+        elif tokenize_mode == "trigram" and len(term) < 3:
+            like_terms.append(term)
+            if parts and parts[-1] in ("AND", "OR", "NOT"):
+                parts.pop()
+        else:
+            parts.append('"' + term.replace('"', '""') + '"')
+    while parts and parts[-1] in ("AND", "OR", "NOT"):
+        parts.pop()
+    return ' '.join(parts), like_terms
+
+
 class FileIndexer:
     """文件索引与搜索引擎"""
     
-    def __init__(self, workspace_dir: str = None, db_path: str = None):
+    # 只索引文本文件
+    TEXT_EXTENSIONS = {'.txt', '.md', '.py', '.js', '.json', '.xml', '.html', '.css',
+                       '.csv', '.log', '.yaml', '.yml', '.ini', '.conf', '.sh', '.bat',
+                       '.c', '.cpp', '.h', '.java', '.go', '.rs', '.swift', '.kt'}
+    BATCH_SIZE = 200             # 每个写事务包含的文件数
+    PARALLEL_MIN_FILES = 64      # 变更文件少于该数量时不启动进程池
+    
+    def __init__(self, workspace_dir: str = None, db_path: str = None, tokenize_mode: str = None):
         """
         Args:
             workspace_dir: 工作目录
             db_path: 索引数据库路径
+            tokenize_mode: 全文分词模式 "jieba" / "trigram" / "unicode61"（默认自动选择）
         """
         if workspace_dir is None:
             workspace_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "workspace")
@@ -34,6 +127,7 @@ class FileIndexer:
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
         
+        self.tokenize_mode = tokenize_mode or default_tokenize_mode()
         self._init_database()
     
     def _init_database(self):
@@ -58,12 +152,20 @@ class FileIndexer:
             )
         """)
         
-        # 全文搜索索引（FTS5）
         cursor.execute("""
-            CREATE VIRTUAL TABLE IF NOT EXISTS file_content_fts 
-            USING fts5(file_path, file_name, content, tokenize='unicode61')
+            CREATE TABLE IF NOT EXISTS index_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
         """)
         
+        # 全文搜索索引（FTS5 外部内容表 + 同步触发器）
+        row = cursor.execute("SELECT value FROM index_meta WHERE key = 'fts_mode'").fetchone()
+        fts_sql = cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'file_content_fts'").fetchone()
+        if not fts_sql or "content='file_index'" not in fts_sql[0] or not row or row[0] != self.tokenize_mode:
+            self._rebuild_fts(conn, migrate=bool(fts_sql))
+        
         # 创建索引
         cursor.execute("""
             CREATE INDEX IF NOT EXISTS idx_file_name ON file_index(file_name)
@@ -75,6 +177,46 @@ class FileIndexer:
         conn.commit()
         conn.close()
     
+    def _rebuild_fts(self, conn: sqlite3.Connection, migrate: bool):
+        """（重新）创建 FTS 表；切换模式或从旧版独立 FTS 表升级时按新模式重建"""
+        cursor = conn.cursor()
+        for trigger in ("file_index_ai", "file_index_ad", "file_index_au"):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        cursor.execute("DROP TABLE IF EXISTS file_content_fts")
+        
+        tokenizer = "trigram" if self.tokenize_mode == "trigram" else "unicode61"
+        cursor.execute(f"""
+            CREATE VIRTUAL TABLE file_content_fts
+            USING fts5(file_name, content, content='file_index', content_rowid='id', tokenize='{tokenizer}')
+        """)
+        
+        if migrate:
+            # 旧数据按当前模式重新分词（jieba 模式插入零宽空格，其他模式去掉）
+            rows = cursor.execute("SELECT id, content FROM file_index").fetchall()
+            updates = [(segment_text((content or '').replace(WORD_SEPARATOR, ''), self.tokenize_mode), rid)
+                       for rid, content in rows]
+            cursor.executemany("UPDATE file_index SET content = ? WHERE id = ?", updates)
+        cursor.execute("INSERT INTO file_content_fts(file_content_fts) VALUES ('rebuild')")
+        
+        cursor.executescript("""
+            CREATE TRIGGER file_index_ai AFTER INSERT ON file_index BEGIN
+                INSERT INTO file_content_fts(rowid, file_name, content)
+                VALUES (new.id, new.file_name, new.content);
+            END;
+            CREATE TRIGGER file_index_ad AFTER DELETE ON file_index BEGIN
+                INSERT INTO file_content_fts(file_content_fts, rowid, file_name, content)
+                VALUES ('delete', old.id, old.file_name, old.content);
+            END;
+            CREATE TRIGGER file_index_au AFTER UPDATE OF file_name, content ON file_index BEGIN
+                INSERT INTO file_content_fts(file_content_fts, rowid, file_name, content)
+                VALUES ('delete', old.id, old.file_name, old.content);
+                INSERT INTO file_content_fts(rowid, file_name, content)
+                VALUES (new.id, new.file_name, new.content);
+            END;
+        """)
+        cursor.execute("INSERT OR REPLACE INTO index_meta (key, value) VALUES ('fts_mode', ?)",
+                       (self.tokenize_mode,))
+    
     def _compute_hash(self, content: str) -> str:
         """计算内容哈希"""
         return hashlib.md5(content.encode('utf-8')).hexdigest()
@@ -96,25 +238,13 @@ class FileIndexer:
             if not path.exists() or not path.is_file():
                 return {"success": False, "error": "文件不存在"}
             
-            # 只索引文本文件
-            text_extensions = {'.txt', '.md', '.py', '.js', '.json', '.xml', '.html', '.css', 
-                             '.csv', '.log', '.yaml', '.yml', '.ini', '.conf', '.sh', '.bat',
-                             '.c', '.cpp', '.h', '.java', '.go', '.rs', '.swift', '.kt'}
-            
-            if path.suffix.lower() not in text_extensions:
+            if path.suffix.lower() not in self.TEXT_EXTENSIONS:
                 return {"success": False, "error": "不支持的文件类型（仅索引文本文件）"}
             
-            # 读取内容
-            try:
-                content = path.read_text(encoding='utf-8', errors='ignore')
-            except:
-                try:
-                    content = path.read_text(encoding='gbk', errors='ignore')
-                except:
-                    return {"success": False, "error": "无法读取文件内容"}
-            
-            # 计算哈希
-            content_hash = self._compute_hash(content)
+            # 读取内容并计算哈希
+            _, content, content_hash = _read_text_file(str(path), self.tokenize_mode)
+            if content is None:
+                return {"success": False, "error": "无法读取文件内容"}
             
             # 检查是否已索引且内容未变
             conn = sqlite3.connect(self.db_path)
@@ -129,30 +259,10 @@ class FileIndexer:
             
             # 插入或更新索引
             file_stat = path.stat()
-            modified_at = datetime.fromtimestamp(file_stat.st_mtime).isoformat()
-            
-            cursor.execute("""
-                INSERT OR REPLACE INTO file_index 
-                (file_path, file_name, file_ext, content, content_hash, file_size, modified_at, tags, metadata)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                str(path.resolve()),
-                path.name,
-                path.suffix.lower(),
-                content[:100000],  # 限制内容长度（前100KB）
-                content_hash,
-                file_stat.st_size,
-                modified_at,
-                json.dumps(tags or [], ensure_ascii=False),
-                json.dumps(metadata or {}, ensure_ascii=False)
-            ))
-            
-            # 更新全文搜索索引
-            cursor.execute("""
-                INSERT OR REPLACE INTO file_content_fts (file_path, file_name, content)
-                VALUES (?, ?, ?)
-            """, (str(path.resolve()), path.name, content[:100000]))
-            
+            self._write_rows(conn, [(
+                str(path.resolve()), content, content_hash, file_stat.st_size,
+                self._format_mtime(file_stat.st_mtime), tags, metadata
+            )])
             conn.commit()
             conn.close()
             
@@ -161,52 +271,199 @@ class FileIndexer:
         except Exception as e:
             return {"success": False, "error": f"索引失败: {str(e)}"}
     
+    @staticmethod
+    def _format_mtime(mtime: float) -> str:
+        return datetime.fromtimestamp(mtime).isoformat()
+    
+    def _write_rows(self, conn: sqlite3.Connection, rows: List[Tuple]):
+        """写入 (file_path, content, content_hash, size, modified_at, tags, metadata) 行，不提交
+        
+        使用 UPSERT 保持行 id 不变，FTS 由触发器同步。
+        """
+        conn.executemany("""
+            INSERT INTO file_index 
+            (file_path, file_name, file_ext, content, content_hash, file_size, modified_at, tags, metadata)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(file_path) DO UPDATE SET
+                file_name = excluded.file_name, file_ext = excluded.file_ext,
+                content = excluded.content, content_hash = excluded.content_hash,
+                file_size = excluded.file_size, modified_at = excluded.modified_at,
+                tags = excluded.tags, metadata = excluded.metadata,
+                indexed_at = CURRENT_TIMESTAMP
+        """, [
+            (fp, os.path.basename(fp), os.path.splitext(fp)[1].lower(), content, content_hash,
+             size, modified_at,
+             json.dumps(tags or [], ensure_ascii=False),
+             json.dumps(metadata or {}, ensure_ascii=False))
+            for fp, content, content_hash, size, modified_at, tags, metadata in rows
+        ])
+    
+    def _scan_files(self, dir_path: Path, recursive: bool,
+                    extensions: Optional[set]) -> Iterator[Tuple[str, int, float]]:
+        """用 os.scandir 遍历目录，产出 (path, size, mtime)，不读取文件内容"""
+        stack = [str(dir_path)]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if recursive:
+                                    stack.append(entry.path)
+                                continue
+                            if not entry.is_file():
+                                continue
+                            ext = os.path.splitext(entry.name)[1].lower()
+                            if ext not in self.TEXT_EXTENSIONS or (extensions and ext not in extensions):
+                                continue
+                            st = entry.stat()
+                            yield entry.path, st.st_size, st.st_mtime
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+    
+    def _extract_many(self, paths: List[str], workers: Optional[int]) -> Iterator[Tuple[str, Optional[str], Optional[str]]]:
+        """读取并哈希一批文件；数量较多时使用进程池"""
+        read = partial(_read_text_file, tokenize_mode=self.tokenize_mode)
+        if workers == 1 or len(paths) < self.PARALLEL_MIN_FILES:
+            for fp in paths:
+                yield read(fp)
+            return
+        
+        done = set()
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                chunksize = max(1, len(paths) // ((workers or os.cpu_count() or 1) * 8))
+                for result in pool.map(read, paths, chunksize=chunksize):
+                    done.add(result[0])
+                    yield result
+        except Exception as e:
+            # 进程池不可用（如受限环境）时退回串行
+            print(f"[FileIndexer] 进程池不可用，改为串行读取: {e}")
+            for fp in paths:
+                if fp not in done:
+                    yield read(fp)
+    
     def index_directory(self, directory: str, recursive: bool = True, 
-                       extensions: List[str] = None) -> Dict[str, Any]:
+                       extensions: List[str] = None,
+                       progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+                       workers: Optional[int] = None,
+                       purge_deleted: bool = True) -> Dict[str, Any]:
         """
-        批量索引目录
+        增量批量索引目录
+        
+        先比较 (mtime, size) 与已存储记录，只读取发生变化的文件；
+        文本提取在进程池中并行，结果通过单个连接分批事务写入。
         
         Args:
             directory: 目录路径
             recursive: 是否递归子目录
             extensions: 文件扩展名过滤（如 ['.py', '.txt']）
+            progress_callback: 进度回调，参数为
+                {"stage", "total", "processed", "indexed", "skipped", "errors", "removed"}
+            workers: 进程池大小（None 为 CPU 数，1 为串行）
+            purge_deleted: 是否清除已删除文件的索引记录
         """
         try:
             dir_path = Path(directory)
             if not dir_path.exists() or not dir_path.is_dir():
                 return {"success": False, "error": "目录不存在"}
+            dir_path = dir_path.resolve()
+            ext_filter = {e.lower() for e in extensions} if extensions else None
             
-            indexed_count = 0
-            skipped_count = 0
-            error_count = 0
+            stats = {"stage": "scan", "total": 0, "processed": 0,
+                     "indexed": 0, "skipped": 0, "errors": 0, "removed": 0}
             
-            # 收集文件
-            if recursive:
-                files = [f for f in dir_path.rglob('*') if f.is_file()]
-            else:
-                files = [f for f in dir_path.glob('*') if f.is_file()]
-            
-            # 扩展名过滤
-            if extensions:
-                files = [f for f in files if f.suffix.lower() in extensions]
-            
-            # 索引每个文件
-            for file_path in files:
-                result = self.index_file(str(file_path))
-                if result["success"]:
-                    if result.get("indexed"):
-                        indexed_count += 1
+            def report(stage: str):
+                stats["stage"] = stage
+                if progress_callback:
+                    try:
+                        progress_callback(dict(stats))
+                    except Exception:
+                        pass
+            
+            conn = sqlite3.connect(self.db_path)
+            try:
+                # 读取该目录下已有记录
+                prefix = os.path.join(str(dir_path), '')
+                like = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+                existing = {
+                    fp: (size, modified_at, content_hash)
+                    for fp, size, modified_at, content_hash in conn.execute(
+                        "SELECT file_path, file_size, modified_at, content_hash FROM file_index "
+                        "WHERE file_path LIKE ? ESCAPE '\\'", (like,))
+                }
+                
+                # 1. 扫描并按 (mtime, size) 比较
+                seen = set()
+                changed: Dict[str, Tuple[int, str]] = {}
+                for fp, size, mtime in self._scan_files(dir_path, recursive, ext_filter):
+                    seen.add(fp)
+                    modified_at = self._format_mtime(mtime)
+                    old = existing.get(fp)
+                    if old and old[0] == size and old[1] == modified_at:
+                        stats["skipped"] += 1
                     else:
-                        skipped_count += 1
-                else:
-                    error_count += 1
+                        changed[fp] = (size, modified_at)
+                stats["total"] = len(seen)
+                stats["processed"] = stats["skipped"]
+                report("scan")
+                
+                # 2. 并行读取变化的文件，分批写入
+                batch: List[Tuple] = []
+                touch: List[Tuple] = []
+                
+                def flush():
+                    if batch:
+                        self._write_rows(conn, batch)
+                    if touch:
+                        conn.executemany(
+                            "UPDATE file_index SET file_size = ?, modified_at = ? WHERE file_path = ?", touch)
+                    conn.commit()
+                    batch.clear()
+                    touch.clear()
+                    report("index")
+                
+                for fp, content, content_hash in self._extract_many(list(changed), workers):
+                    size, modified_at = changed[fp]
+                    stats["processed"] += 1
+                    if content is None:
+                        stats["errors"] += 1
+                    elif fp in existing and existing[fp][2] == content_hash:
+                        # 只有时间戳变化，内容未变
+                        touch.append((size, modified_at, fp))
+                        stats["skipped"] += 1
+                    else:
+                        batch.append((fp, content, content_hash, size, modified_at, None, None))
+                        stats["indexed"] += 1
+                    if len(batch) + len(touch) >= self.BATCH_SIZE:
+                        flush()
+                flush()
+                
+                # 3. 清除已删除文件（非递归时只处理直接子文件）
+                if purge_deleted:
+                    gone = [(fp,) for fp in existing
+                            if fp not in seen
+                            and (recursive or os.path.dirname(fp) == str(dir_path))
+                            and (not ext_filter or os.path.splitext(fp)[1].lower() in ext_filter)
+                            and not os.path.exists(fp)]
+                    if gone:
+                        conn.executemany("DELETE FROM file_index WHERE file_path = ?", gone)
+                        conn.commit()
+                    stats["removed"] = len(gone)
+            finally:
+                conn.close()
             
+            report("done")
             return {
                 "success": True,
-                "total": len(files),
-                "indexed": indexed_count,
-                "skipped": skipped_count,
-                "errors": error_count
+                "total": stats["total"],
+                "indexed": stats["indexed"],
+                "skipped": stats["skipped"],
+                "errors": stats["errors"],
+                "removed": stats["removed"]
             }
             
         except Exception as e:
@@ -230,87 +487,73 @@ class FileIndexer:
             }
         """
         try:
+            match_expr, like_terms = self._build_match_query(query)
+            if not match_expr and not like_terms:
+                return []
+            
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
-            # 使用 FTS5 全文搜索
-            sql = """
-                SELECT 
-                    f.file_path, 
-                    f.file_name, 
-                    f.file_ext,
-                    f.content,
-                    fts.rank
-                FROM file_content_fts fts
-                JOIN file_index f ON fts.file_path = f.file_path
-                WHERE file_content_fts MATCH ?
-            """
-            
-            params = [query]
+            if match_expr:
+                # FTS5：bm25 排序（文件名权重更高），snippet/highlight 由 SQLite 生成
+                sql = """
+                    SELECT 
+                        f.file_path, 
+                        f.file_name, 
+                        f.file_ext,
+                        snippet(file_content_fts, 1, '**', '**', '...', 32),
+                        highlight(file_content_fts, 0, '**', '**'),
+                        bm25(file_content_fts, 5.0, 1.0) AS score
+                    FROM file_content_fts
+                    JOIN file_index f ON f.id = file_content_fts.rowid
+                    WHERE file_content_fts MATCH ?
+                """
+                params: List[Any] = [match_expr]
+            else:
+                # trigram 模式下过短的词无法走 FTS，退回 SQL 子串过滤
+                sql = """
+                    SELECT f.file_path, f.file_name, f.file_ext,
+                           substr(f.content, max(instr(lower(f.content), lower(?)) - 100, 1), 200),
+                           f.file_name, 0 AS score
+                    FROM file_index f WHERE 1 = 1
+                """
+                params = [like_terms[0]]
+            
+            for term in like_terms:
+                sql += " AND f.content LIKE ? ESCAPE '\\'"
+                params.append('%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
             
             if file_types:
                 placeholders = ','.join('?' * len(file_types))
                 sql += f" AND f.file_ext IN ({placeholders})"
                 params.extend(file_types)
             
-            sql += " ORDER BY fts.rank LIMIT ?"
+            sql += " ORDER BY score LIMIT ?"
             params.append(limit)
             
             cursor.execute(sql, params)
             rows = cursor.fetchall()
             conn.close()
             
-            # 生成结果
-            results = []
-            for row in rows:
-                file_path, file_name, file_ext, content, rank = row
-                
-                # 生成匹配摘要（显示关键词上下文）
-                snippet = self._generate_snippet(content, query)
-                
-                results.append({
+            return [
+                {
                     "file_path": file_path,
                     "file_name": file_name,
                     "file_ext": file_ext,
-                    "match_snippet": snippet,
-                    "score": abs(rank)  # FTS5 rank 是负数
-                })
-            
-            return results
+                    "match_snippet": (snippet or "").replace(WORD_SEPARATOR, ''),
+                    "name_highlight": name_highlight,
+                    "score": abs(score)  # bm25 越小越相关
+                }
+                for file_path, file_name, file_ext, snippet, name_highlight, score in rows
+            ]
             
         except Exception as e:
             print(f"[FileIndexer] 搜索失败: {e}")
             return []
     
-    def _generate_snippet(self, content: str, query: str, context_chars: int = 100) -> str:
-        """生成匹配摘要（显示关键词上下文）"""
-        if not content:
-            return ""
-        
-        # 找到第一个匹配位置
-        query_lower = query.lower()
-        content_lower = content.lower()
-        pos = content_lower.find(query_lower)
-        
-        if pos == -1:
-            # 未找到，返回开头
-            return content[:200] + "..."
-        
-        # 提取上下文
-        start = max(0, pos - context_chars)
-        end = min(len(content), pos + len(query) + context_chars)
-        
-        snippet = content[start:end]
-        
-        # 高亮关键词
-        snippet = re.sub(f"({re.escape(query)})", r"**\1**", snippet, flags=re.IGNORECASE)
-        
-        if start > 0:
-            snippet = "..." + snippet
-        if end < len(content):
-            snippet = snippet + "..."
-        
-        return snippet
+    def _build_match_query(self, query: str) -> Tuple[str, List[str]]:
+        """把用户查询转换为 FTS5 MATCH 表达式，见 build_match_query()"""
+        return build_match_query(query, self.tokenize_mode)
     
     def find_by_content(self, content_sample: str, min_similarity: float = 0.5) -> List[Dict[str, Any]]:
         """
@@ -437,7 +680,6 @@ class FileIndexer:
             cursor = conn.cursor()
             
             cursor.execute("DELETE FROM file_index WHERE file_path = ?", (file_path,))
-            cursor.execute("DELETE FROM file_content_fts WHERE file_path = ?", (file_path,))
             
             conn.commit()
             conn.close()
@@ -454,7 +696,7 @@ class FileIndexer:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             cursor.execute("DELETE FROM file_index")
-            cursor.execute("DELETE FROM file_content_fts")
+            cursor.execute("INSERT INTO file_content_fts(file_content_fts) VALUES ('delete-all')")
             conn.commit()
             conn.close()
             
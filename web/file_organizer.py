@@ -10,9 +10,13 @@ import re
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, Optional
-import hashlib
 from difflib import SequenceMatcher
 
+try:
+    from file_hash_index import FileHashIndex
+except ImportError:
+    from web.file_hash_index import FileHashIndex
+
 
 class FileOrganizer:
     """文件归纳管理器"""
@@ -28,6 +32,7 @@ class FileOrganizer:
         self.organize_root.mkdir(parents=True, exist_ok=True)
         
         self.index_file = self.organize_root / "index.json"
+        self.hash_index = FileHashIndex.for_root(self.organize_root)
         self.metadata_template = {
             "created_at": datetime.now().isoformat(),
             "files_count": 0,
@@ -83,9 +88,9 @@ class FileOrganizer:
         dest_path = dest_dir / source_path.name
         
         # ★ 检查目标文件夹里是否已有内容相同的文件
-        source_hash = self._compute_file_hash(source_path)
-        existing_dup = self._find_content_duplicate(dest_dir, source_hash)
+        existing_dup = self._find_content_duplicate(dest_dir, source_path)
         if existing_dup:
+            self.hash_index.flush()
             return {
                 "success": True,
                 "source_file": source_file,
@@ -105,6 +110,8 @@ class FileOrganizer:
             
             # 复制文件（保留原文件）
             shutil.copy2(source_path, dest_path)
+            self.hash_index.copied(source_path, dest_path)
+            self.hash_index.flush()
             
             # 更新索引
             self._update_index(source_file, str(dest_path), safe_folder, metadata)
@@ -181,39 +188,17 @@ class FileOrganizer:
         normalized = re.sub(r"\s+", " ", name.strip())
         return normalized.lower()
     
-    @staticmethod
-    def _compute_file_hash(file_path: Path, chunk_size: int = 8192) -> str:
-        """计算文件的 SHA-256 hash"""
-        h = hashlib.sha256()
-        try:
-            with open(file_path, 'rb') as f:
-                while True:
-                    chunk = f.read(chunk_size)
-                    if not chunk:
-                        break
-                    h.update(chunk)
-        except Exception:
-            return ""
-        return h.hexdigest()
-    
     def _is_same_file(self, file_a: Path, file_b: Path) -> bool:
-        """比较两个文件内容是否相同（先比大小，再比hash）"""
-        try:
-            if file_a.stat().st_size != file_b.stat().st_size:
-                return False
-            return self._compute_file_hash(file_a) == self._compute_file_hash(file_b)
-        except Exception:
-            return False
+        """比较两个文件内容是否相同（先比大小，再比头部hash，最后比完整hash）"""
+        return self.hash_index.same_content(file_a, file_b)
 
-    def _find_content_duplicate(self, dest_dir: Path, source_hash: str) -> Optional[Path]:
-        """检查目标文件夹内是否已有内容相同的文件"""
-        if not dest_dir.exists() or not source_hash:
+    def _find_content_duplicate(self, dest_dir: Path, source_path: Path) -> Optional[Path]:
+        """检查目标文件夹内是否已有内容相同的文件（大小不同的文件不会被读取）"""
+        if not dest_dir.exists():
             return None
-        for existing_file in dest_dir.iterdir():
-            if existing_file.is_file() and not existing_file.name.startswith('_'):
-                if self._compute_file_hash(existing_file) == source_hash:
-                    return existing_file
-        return None
+        candidates = [f for f in dest_dir.iterdir()
+                      if f.is_file() and not f.name.startswith('_')]
+        return self.hash_index.find_duplicate(source_path, candidates)
 
     # 修订后缀模式（用于文件夹名清理，与 FileAnalyzer 保持一致）
     _REVISION_PATTERNS = [
@@ -16,6 +16,11 @@ from behavior_monitor import BehaviorMonitor
 from knowledge_graph import KnowledgeGraph
 from suggestion_engine import SuggestionEngine
 
+try:
+    from sqlite_pool import get_database
+except ImportError:
+    from web.sqlite_pool import get_database
+
 
 class InsightReporter:
     """洞察报告生成器 - 生成周期性分析报告"""
@@ -48,7 +53,7 @@ class InsightReporter:
         """确保数据库和表结构存在"""
         Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
         
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         # 报告表 - 存储生成的报告
@@ -187,16 +192,8 @@ class InsightReporter:
     
     def _get_file_operations_stats(self, start_date: datetime, end_date: datetime) -> Dict:
         """获取文件操作统计"""
-        stats = self.behavior_monitor.get_statistics()
-        
-        # 获取操作类型分布
-        recent_events = self.behavior_monitor.get_recent_events(limit=1000)
-        
-        operation_counts = Counter()
-        for event in recent_events:
-            event_time = datetime.fromisoformat(event["timestamp"])
-            if start_date <= event_time <= end_date:
-                operation_counts[event["event_type"]] += 1
+        # 获取操作类型分布（读汇总表，不受最近事件条数限制）
+        operation_counts = Counter(self.behavior_monitor.get_event_counts(start_date, end_date))
         
         return {
             "total_operations": sum(operation_counts.values()),
@@ -206,8 +203,8 @@ class InsightReporter:
     
     def _get_productivity_analysis(self, start_date: datetime, end_date: datetime) -> Dict:
         """生产力分析"""
-        # 获取文件编辑次数
-        frequent_files = self.behavior_monitor.get_frequently_used_files(limit=50)
+        # 获取报告期内的文件打开/编辑次数
+        frequent_files = self.behavior_monitor.get_file_activity(start_date, end_date, limit=50)
         
         total_edits = sum(f.get("edit_count", 0) for f in frequent_files)
         total_opens = sum(f.get("open_count", 0) for f in frequent_files)
@@ -372,7 +369,7 @@ class InsightReporter:
     
     def _get_trends_comparison(self, report_type: str) -> Dict:
         """趋势对比"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         # 获取历史报告进行对比
@@ -536,7 +533,7 @@ class InsightReporter:
     
     def _save_report(self, report: Dict):
         """保存报告到数据库"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -556,7 +553,7 @@ class InsightReporter:
     
     def _record_trend_data(self, report: Dict):
         """记录趋势数据"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         timestamp = datetime.now().isoformat()
@@ -581,7 +578,7 @@ class InsightReporter:
     
     def get_latest_report(self, report_type: str = REPORT_WEEKLY) -> Optional[Dict]:
         """获取最新报告"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -4,18 +4,23 @@
 本地知识库系统 - 向量化语义搜索 + 全文检索
 支持：PDF、Word、Markdown、TXT 等格式
 使用 Gemini text-embedding-004 实现语义搜索
+向量与文本块存放在 VectorStore（内存映射 float32 + SQLite + IVF 索引）
 """
 
 import os
 import time
 import json
 import hashlib
-import numpy as np
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 from pathlib import Path
 import re
 
+try:
+    from vector_store import VectorStore
+except ImportError:
+    from web.vector_store import VectorStore
+
 try:
     import google.genai as genai  # New SDK
 except ImportError:
@@ -41,6 +46,7 @@ class KnowledgeBase:
         self.index_file = os.path.join(self.kb_dir, "index.json")
         self.chunks_file = os.path.join(self.kb_dir, "chunks.json")
         os.makedirs(self.kb_dir, exist_ok=True)
+        self.store = VectorStore(os.path.join(self.kb_dir, "vector_store"))
         
         # Initialize Gemini API
         api_key = api_key or os.getenv("GEMINI_API_KEY")
@@ -90,41 +96,57 @@ class KnowledgeBase:
                 print(f"[KnowledgeBase] API initialization error: {e}")
         
         # Load data
+        self._migrate_legacy_json()
         self.index = self._load_index()
-        self.chunks = self._load_chunks()
-        self._vector_cache = None  # Lazy load vector cache
     
     def _load_index(self) -> Dict:
         """加载文档索引"""
-        if os.path.exists(self.index_file):
-            try:
-                with open(self.index_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                print(f"[KnowledgeBase] 索引加载失败: {e}")
-        return {"documents": {}, "last_updated": None}
+        documents = self.store.load_documents()
+        last_updated = max((d.get("indexed_at") or "" for d in documents.values()), default=None)
+        return {"documents": documents, "last_updated": last_updated or None}
     
-    def _save_index(self):
-        """保存文档索引"""
+    def _save_document(self, doc_id: str, doc_record: Dict):
+        """保存单个文档记录（只写入变化的部分）"""
+        self.index.setdefault("documents", {})[doc_id] = doc_record
         self.index["last_updated"] = datetime.now().isoformat()
-        with open(self.index_file, 'w', encoding='utf-8') as f:
-            json.dump(self.index, f, ensure_ascii=False, indent=2)
-    
-    def _load_chunks(self) -> Dict:
-        """加载文本块和向量"""
-        if os.path.exists(self.chunks_file):
-            try:
-                with open(self.chunks_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                print(f"[KnowledgeBase] 块文件加载失败: {e}")
-        return {"chunks": {}, "last_updated": None}
+        self.store.save_document(doc_id, doc_record)
     
-    def _save_chunks(self):
-        """保存文本块和向量"""
-        self.chunks["last_updated"] = datetime.now().isoformat()
-        with open(self.chunks_file, 'w', encoding='utf-8') as f:
-            json.dump(self.chunks, f, ensure_ascii=False, indent=2)
+    def _migrate_legacy_json(self):
+        """一次性迁移旧版 index.json / chunks.json 到 VectorStore"""
+        if not os.path.exists(self.chunks_file):
+            return
+        try:
+            with open(self.chunks_file, 'r', encoding='utf-8') as f:
+                legacy_chunks = json.load(f).get("chunks", {})
+            legacy_docs = {}
+            if os.path.exists(self.index_file):
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    legacy_docs = json.load(f).get("documents", {})
+        except Exception as e:
+            print(f"[KnowledgeBase] 旧版数据读取失败，跳过迁移: {e}")
+            return
+        
+        dim = next((len(c["embedding"]) for c in legacy_chunks.values() if c.get("embedding")), 768)
+        items, embeddings = [], []
+        for chunk_id, chunk_data in legacy_chunks.items():
+            items.append({
+                "chunk_id": chunk_id,
+                "doc_id": chunk_data.get("doc_id", ""),
+                "chunk_index": chunk_data.get("chunk_index", 0),
+                "text": chunk_data.get("text", ""),
+                "metadata": chunk_data.get("metadata", {}),
+                "created_at": chunk_data.get("created_at"),
+            })
+            embeddings.append(chunk_data.get("embedding") or [0.0] * dim)
+        for i in range(0, len(items), 1000):
+            self.store.add(items[i:i + 1000], embeddings[i:i + 1000])
+        for doc_id, doc_record in legacy_docs.items():
+            self.store.save_document(doc_id, doc_record)
+        
+        for path in (self.chunks_file, self.index_file):
+            if os.path.exists(path):
+                os.replace(path, path + ".migrated")
+        print(f"[KnowledgeBase] 已迁移 {len(items)} 个文本块、{len(legacy_docs)} 个文档到向量存储")
     
     def _chunk_text(self, text: str) -> List[str]:
         """将文本分块，带有重叠"""
@@ -176,35 +198,9 @@ class KnowledgeBase:
         
         return embeddings
     
-    def _update_vector_cache(self):
-        """从 chunks.json 重建向量缓存 (并归一化)"""
-        vectors = []
-        self._chunk_ids_cache = []  # Parallel list of IDs
-        
-        for chunk_id, chunk_data in self.chunks.get("chunks", {}).items():
-            if "embedding" in chunk_data and chunk_data["embedding"]:
-                vectors.append(chunk_data["embedding"])
-                self._chunk_ids_cache.append(chunk_id)
-        
-        if vectors:
-            matrix = np.array(vectors)
-            # L2 Normalize for Cosine Similarity
-            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
-            # Avoid division by zero
-            norms[norms == 0] = 1e-9
-            self._vector_cache = matrix / norms
-        else:
-            self._vector_cache = np.zeros((0, 768)) # 默认维度
-    
     def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        """语义搜索：查询嵌入 → 余弦相似度 → 返回top-k"""
-        if not self.chunks.get("chunks"):
-            return []
-        
-        if self._vector_cache is None:
-            self._update_vector_cache()
-            
-        if self._vector_cache.shape[0] == 0:
+        """语义搜索：查询嵌入 → 余弦相似度（IVF 近似检索）→ 返回top-k"""
+        if len(self.store) == 0:
             return []
 
         try:
@@ -236,41 +232,20 @@ class KnowledgeBase:
                  print(f"[KB] Embedding error: {embed_err}")
                  return []
             
-            query_vec = np.array(q_vec)
-            # Normalize query vector
-            q_norm = np.linalg.norm(query_vec)
-            if q_norm > 0:
-                query_vec = query_vec / q_norm
-            
-            # Compute Cosine Similarity (Dot product of normalized vectors)
-            similarities = np.dot(self._vector_cache, query_vec)
-            
-            # Get Top-K
-            # Ensure top_k doesn't exceed available chunks
-            k = min(top_k, len(similarities))
-            if k == 0: return []
-            
-            top_indices = np.argsort(similarities)[-k:][::-1]
+            hits = self.store.search(q_vec, top_k=top_k, min_score=0.45)  # Minimum threshold
             
             results = []
-            for idx in top_indices:
-                score = float(similarities[idx])
-                if score < 0.45: continue # Minimum threshold
-                
-                chunk_id = self._chunk_ids_cache[idx]
-                chunk_data = self.chunks["chunks"][chunk_id]
-                doc_id = chunk_data["doc_id"]
+            for hit in hits:
+                doc_id = hit["doc_id"]
                 doc_info = self.index.get("documents", {}).get(doc_id, {})
-                
-                # Fetch metadata
-                meta = chunk_data.get("metadata", {})
+                meta = hit.get("metadata", {})
                 
                 results.append({
-                    "chunk_id": chunk_id,
+                    "chunk_id": hit["chunk_id"],
                     "doc_id": doc_id,
                     "file_name": doc_info.get("file_name", meta.get("file_name", "Unknown")),
-                    "text": chunk_data["text"],
-                    "similarity": score,
+                    "text": hit["text"],
+                    "similarity": hit["similarity"],
                     "metadata": meta
                 })
             
@@ -349,22 +324,13 @@ class KnowledgeBase:
         # 批量嵌入
         embeddings = self._get_embeddings(chunks)
         
-        # 保存块和向量
-        chunk_ids = []
-        for i, (chunk, emb) in enumerate(zip(chunks, embeddings)):
-            chunk_id = f"{content_hash}_{i}"
-            # 兼容旧结构，如果没有 self.chunks["chunks"] 则初始化
-            if "chunks" not in self.chunks: self.chunks["chunks"] = {}
-                
-            self.chunks["chunks"][chunk_id] = {
-                "doc_id": content_hash,
-                "chunk_index": i,
-                "text": chunk,
-                "embedding": emb,
-                "created_at": datetime.now().isoformat(),
-                "metadata": metadata
-            }
-            chunk_ids.append(chunk_id)
+        # 保存块和向量（追加写入）
+        chunk_ids = [f"{content_hash}_{i}" for i in range(len(chunks))]
+        self.store.add([
+            {"chunk_id": chunk_id, "doc_id": content_hash, "chunk_index": i,
+             "text": chunk, "metadata": metadata}
+            for i, (chunk_id, chunk) in enumerate(zip(chunk_ids, chunks))
+        ], embeddings)
         
         # 保存文档记录
         doc_record = {
@@ -380,12 +346,7 @@ class KnowledgeBase:
             "chunk_ids": chunk_ids
         }
         
-        if "documents" not in self.index: self.index["documents"] = {}
-        self.index["documents"][content_hash] = doc_record
-        
-        self._save_index()
-        self._save_chunks()
-        self._vector_cache = None  # 清除缓存
+        self._save_document(content_hash, doc_record)
         
         return {
             "success": True,
@@ -420,18 +381,16 @@ class KnowledgeBase:
         # 批量嵌入
         embeddings = self._get_embeddings(chunks)
         
-        # 保存块和向量
-        chunk_ids = []
-        for i, (chunk, emb) in enumerate(zip(chunks, embeddings)):
-            chunk_id = f"{file_hash}_{i}"
-            self.chunks["chunks"][chunk_id] = {
-                "doc_id": file_hash,
-                "chunk_index": i,
-                "text": chunk,
-                "embedding": emb,
-                "created_at": datetime.now().isoformat()
-            }
-            chunk_ids.append(chunk_id)
+        # 相同内容重新索引：先移除旧块，避免残留多余块
+        if file_hash in self.index["documents"]:
+            self.store.remove_document(file_hash)
+        
+        # 保存块和向量（追加写入）
+        chunk_ids = [f"{file_hash}_{i}" for i in range(len(chunks))]
+        self.store.add([
+            {"chunk_id": chunk_id, "doc_id": file_hash, "chunk_index": i, "text": chunk}
+            for i, (chunk_id, chunk) in enumerate(zip(chunk_ids, chunks))
+        ], embeddings)
         
         # 保存文档记录
         doc_record = {
@@ -447,10 +406,7 @@ class KnowledgeBase:
             "chunk_ids": chunk_ids
         }
         
-        self.index["documents"][file_hash] = doc_record
-        self._save_index()
-        self._save_chunks()
-        self._vector_cache = None  # 清除缓存，下次搜索重建
+        self._save_document(file_hash, doc_record)
         
         return {
             "success": True,
@@ -512,7 +468,7 @@ class KnowledgeBase:
         
         return {
             "total_documents": len(self.index["documents"]),
-            "total_chunks": len(self.chunks["chunks"]),
+            "total_chunks": len(self.store),
             "total_size_mb": round(total_size / 1024 / 1024, 2),
             "file_types": file_types,
             "last_updated": self.index.get("last_updated")
@@ -523,23 +479,14 @@ class KnowledgeBase:
         if doc_id not in self.index["documents"]:
             return {"success": False, "error": "文档不存在"}
         
-        doc = self.index["documents"][doc_id]
-        chunk_ids = doc.get("chunk_ids", [])
-        
-        # 删除块
-        for chunk_id in chunk_ids:
-            self.chunks["chunks"].pop(chunk_id, None)
-        
-        # 删除文档
+        # 删除文档及其块（向量行留作墓碑，由 store.compact() 回收）
+        removed = self.store.remove_document(doc_id)
         del self.index["documents"][doc_id]
-        
-        self._save_index()
-        self._save_chunks()
-        self._vector_cache = None
+        self.index["last_updated"] = datetime.now().isoformat()
         
         return {
             "success": True,
-            "message": f"已删除文档及其 {len(chunk_ids)} 个块"
+            "message": f"已删除文档及其 {removed} 个块"
         }
 
 
@@ -7,34 +7,50 @@
 
 import sqlite3
 import json
-from typing import List, Dict, Set, Tuple
+from typing import List, Dict, Optional, Set, Tuple
 from collections import defaultdict
 from datetime import datetime
 from pathlib import Path
 import math
 
-from concept_extractor import ConceptExtractor
+import numpy as np
+
+try:
+    from sqlite_pool import get_database
+except ImportError:
+    from web.sqlite_pool import get_database
+
+try:
+    from concept_extractor import ConceptExtractor
+    from concept_similarity import ConceptSimilarityIndex
+except ImportError:
+    from web.concept_extractor import ConceptExtractor
+    from web.concept_similarity import ConceptSimilarityIndex
 
 
 class KnowledgeGraph:
     """知识图谱 - 文件关系网络管理器"""
     
-    def __init__(self, db_path: str = "config/knowledge_graph.db"):
+    RELATION_TOP_K = 5           # 每个文件保留的关联文件数
+    RELATION_MIN_SIMILARITY = 0.1
+    
+    def __init__(self, db_path: str = "config/knowledge_graph.db", concepts_db_path: Optional[str] = None):
         """
         初始化知识图谱
         
         Args:
             db_path: 图数据库路径
+            concepts_db_path: 概念数据库路径，默认使用 ConceptExtractor 的默认路径
         """
         self.db_path = db_path
-        self.concept_extractor = ConceptExtractor()
+        self.concept_extractor = ConceptExtractor(concepts_db_path) if concepts_db_path else ConceptExtractor()
         self._ensure_db()
     
     def _ensure_db(self):
         """确保数据库和表结构存在"""
         Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
         
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         # 节点表 - 存储文件和概念节点
@@ -98,7 +114,7 @@ class KnowledgeGraph:
         node_id = f"file:{file_path}"
         label = Path(file_path).name
         
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         current_time = datetime.now().isoformat()
@@ -127,7 +143,7 @@ class KnowledgeGraph:
         """
         node_id = f"concept:{concept}"
         
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         current_time = datetime.now().isoformat()
@@ -155,7 +171,7 @@ class KnowledgeGraph:
             weight: 边的权重
             metadata: 边的元数据
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         current_time = datetime.now().isoformat()
@@ -179,11 +195,15 @@ class KnowledgeGraph:
         """
         print(f"🔨 开始构建知识图谱... ({len(file_paths)} 个文件)")
         
-        for i, file_path in enumerate(file_paths, 1):
+        # 批量分析文件提取概念（分词在进程池中并行）
+        try:
+            results = self.concept_extractor.analyze_files(file_paths)
+        except Exception as e:
+            print(f"  ✗ 批量概念提取失败: {str(e)}")
+            results = [{"error": str(e)}] * len(file_paths)
+        
+        for i, (file_path, result) in enumerate(zip(file_paths, results), 1):
             try:
-                # 分析文件提取概念
-                result = self.concept_extractor.analyze_file(file_path)
-                
                 if "error" in result:
                     continue
                 
@@ -218,56 +238,113 @@ class KnowledgeGraph:
             except Exception as e:
                 print(f"  ✗ 处理文件失败 {file_path}: {str(e)}")
         
-        # 构建文件间关联
-        self._build_file_relations()
+        # 构建文件间关联（非强制重建时只更新受本次文件影响的关联）
+        self._build_file_relations(None if force_rebuild else file_paths)
         
         # 创建快照
         self._create_snapshot()
         
         print(f"✅ 知识图谱构建完成")
     
-    def _build_file_relations(self):
-        """构建文件之间的关联边"""
+    def _build_file_relations(self, changed_files: List[str] = None):
+        """
+        构建文件之间的关联边（relates_to）
+        
+        一次性载入 file_concepts 为稀疏 TF-IDF 矩阵，分块计算所有文件的 top-k 余弦近邻，
+        并在一个事务中批量写入。
+        
+        Args:
+            changed_files: 仅这些文件发生变化时做增量更新；None 表示全量重建
+        """
         print("🔗 构建文件关联...")
         
-        conn = sqlite3.connect(self.db_path)
+        index = ConceptSimilarityIndex.load(self.concept_extractor.db_path)
+        k, min_sim = self.RELATION_TOP_K, self.RELATION_MIN_SIMILARITY
+        
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
-        # 获取所有文件节点
+        # 图中的文件节点 -> 矩阵行号
         cursor.execute("SELECT node_id FROM nodes WHERE node_type = 'file'")
-        file_nodes = [row[0] for row in cursor.fetchall()]
+        sources: Dict[int, str] = {}
+        for (node_id,) in cursor.fetchall():
+            row = index.file_index.get(node_id[len("file:"):])
+            if row is not None:
+                sources[row] = node_id
+        
+        if changed_files is None:
+            rows = sorted(sources)
+        else:
+            rows = sorted(self._affected_relation_rows(cursor, index, sources, changed_files))
         
-        relation_count = 0
+        neighbours = index.top_k(rows, k=k, min_similarity=min_sim)
+        current_time = datetime.now().isoformat()
+        edges = []
+        for row, related in neighbours.items():
+            for col, similarity in related:
+                edges.append((
+                    sources[row], f"file:{index.files[col]}", "relates_to", similarity,
+                    json.dumps({"similarity": similarity,
+                                "shared_concepts": index.shared_concepts(row, col)}),
+                    current_time
+                ))
+        
+        if changed_files is None:
+            cursor.execute("DELETE FROM edges WHERE edge_type = 'relates_to'")
+        else:
+            stale = [(sources[row],) for row in rows]
+            stale += [(f"file:{path}",) for path in changed_files if path not in index.file_index]
+            cursor.executemany("DELETE FROM edges WHERE source_id = ? AND edge_type = 'relates_to'", stale)
+        cursor.executemany("""
+            INSERT OR REPLACE INTO edges (source_id, target_id, edge_type, weight, metadata, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, edges)
+        conn.commit()
+        conn.close()
         
-        for file_node_id in file_nodes:
-            file_path = file_node_id.replace("file:", "")
-            
-            # 查找相关文件
-            related_files = self.concept_extractor.find_related_files(file_path, limit=5)
-            
-            for related in related_files:
-                related_path = related["file_path"]
-                similarity = related["similarity"]
-                
-                if similarity > 0.1:  # 只保留相似度大于0.1的关联
-                    related_node_id = f"file:{related_path}"
-                    
-                    self.add_edge(
-                        file_node_id,
-                        related_node_id,
-                        "relates_to",
-                        weight=similarity,
-                        metadata={
-                            "similarity": similarity,
-                            "shared_concepts": related["shared_concepts"]
-                        }
-                    )
-                    
-                    relation_count += 1
+        print(f"  ✓ 创建了 {len(edges)} 个文件关联（更新 {len(rows)} 个文件）")
+    
+    def _affected_relation_rows(self, cursor, index: ConceptSimilarityIndex,
+                                sources: Dict[int, str], changed_files: List[str]) -> Set[int]:
+        """
+        增量更新时需要重新计算近邻的文件行：
+        - 变化的文件本身
+        - 已有关联指向变化文件的文件（其相似度可能下降）
+        - 与变化文件的新相似度足以进入其 top-k 的文件
+        """
+        k, min_sim = self.RELATION_TOP_K, self.RELATION_MIN_SIMILARITY
+        changed_rows = [index.file_index[p] for p in changed_files if p in index.file_index]
+        affected = {r for r in changed_rows if r in sources}
         
-        conn.close()
+        # 各文件现有关联的条数与最低权重
+        cursor.execute("""
+            SELECT source_id, COUNT(*), MIN(weight) FROM edges
+            WHERE edge_type = 'relates_to' GROUP BY source_id
+        """)
+        existing = {source_id: (count, min_weight) for source_id, count, min_weight in cursor.fetchall()}
         
-        print(f"  ✓ 创建了 {relation_count} 个文件关联")
+        changed_targets = [f"file:{p}" for p in changed_files]
+        for start in range(0, len(changed_targets), 500):
+            chunk = changed_targets[start:start + 500]
+            cursor.execute(f"""
+                SELECT DISTINCT source_id FROM edges
+                WHERE edge_type = 'relates_to' AND target_id IN ({','.join('?' * len(chunk))})
+            """, chunk)
+            for (source_id,) in cursor.fetchall():
+                row = index.file_index.get(source_id[len("file:"):])
+                if row in sources:
+                    affected.add(row)
+        
+        # 相似度对称：变化文件所在行即为其与所有文件的相似度
+        source_rows = np.fromiter(sources.keys(), dtype=np.int64, count=len(sources))
+        thresholds = np.array([
+            existing[sources[r]][1] if existing.get(sources[r], (0, 0))[0] >= k else min_sim
+            for r in source_rows
+        ])
+        for _, dense in index.similarities(changed_rows):
+            hit = (dense[:, source_rows] > thresholds).any(axis=0)
+            affected.update(int(r) for r in source_rows[hit])
+        return affected
     
     def get_graph_data(self, max_nodes: int = 100) -> Dict:
         """
@@ -279,7 +356,7 @@ class KnowledgeGraph:
         Returns:
             D3.js格式的图数据
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         # 获取节点
@@ -361,7 +438,7 @@ class KnowledgeGraph:
         """
         file_node_id = f"file:{file_path}"
         
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         # 检查节点是否存在
@@ -456,7 +533,7 @@ class KnowledgeGraph:
         """
         concept_node_id = f"concept:{concept}"
         
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         # 查找包含该概念的文件
@@ -498,7 +575,7 @@ class KnowledgeGraph:
         """创建图的快照"""
         graph_data = self.get_graph_data(max_nodes=1000)
         
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -526,7 +603,7 @@ class KnowledgeGraph:
     
     def get_statistics(self) -> Dict:
         """获取图统计信息"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         cursor.execute("SELECT COUNT(*) FROM nodes WHERE node_type = 'file'")
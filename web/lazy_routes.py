@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+按 URL 前缀懒加载的功能模块登记表
+
+各功能区（Agent、语音、PPT、并行任务、记忆……）在启动时只登记 URL 前缀和加载函数，
+首个命中前缀的请求到达时才导入模块并注册蓝图/路由，降低进程启动耗时与每个 worker 的常驻内存。
+
+用法:
+    app = LazyFlask(__name__)
+    features = LazyRouteRegistry(app)
+    features.blueprint("voice", "/api/voice", "voice_api_enhanced", "voice_bp")
+    features.add("memory", ("/api/memories", "/api/memory"), lambda app: register_memory_routes(app, ...))
+
+KOTO_LAZY_ROUTES=false 时登记即加载（适合 gunicorn --preload 在 fork 前共享内存）。
+
+多线程服务器上，werkzeug 的 Map.add 会原地修改其他线程正在匹配的路由表，
+因此 LazyFlask 用 RouteGate 把 URL 匹配/构建作为共享段、加载期间的路由注册作为独占段：
+注册一条规则时其余线程暂停匹配，模块导入本身不阻塞其他请求。
+"""
+import importlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional, Tuple
+
+from flask import Flask
+
+_loading = threading.local()
+
+
+def is_loading() -> bool:
+    """当前线程是否正在加载功能模块"""
+    return getattr(_loading, "active", False)
+
+
+class RouteGate:
+    """路由表读写闸门：匹配/构建 URL 可并发，注册路由时独占（等待中的注册优先，避免被请求饿死）"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._waiting = 0
+
+    @contextmanager
+    def shared(self):
+        with self._cond:
+            while self._writing or self._waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._cond:
+            self._waiting += 1
+            try:
+                while self._writing or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+
+class _GatedAdapter:
+    """包装 MapAdapter：match / build 进入闸门共享段，其余属性原样转发"""
+
+    def __init__(self, adapter, gate: RouteGate):
+        self._adapter = adapter
+        self._gate = gate
+
+    def match(self, *args, **kwargs):
+        with self._gate.shared():
+            return self._adapter.match(*args, **kwargs)
+
+    def build(self, *args, **kwargs):
+        with self._gate.shared():
+            return self._adapter.build(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._adapter, name)
+
+
+class LazyFlask(Flask):
+    """
+    Flask 在处理首个请求后禁止再注册路由；懒加载本身就发生在请求到达时，
+    因此只在登记表加载功能模块的线程内放行这项检查，并用 route_gate 隔开注册与并发的路由匹配。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.route_gate = RouteGate()
+
+    def _check_setup_finished(self, f_name: str) -> None:
+        if is_loading():
+            return
+        super()._check_setup_finished(f_name)
+
+    def add_url_rule(self, *args, **kwargs) -> None:
+        if not is_loading():
+            return super().add_url_rule(*args, **kwargs)
+        with self.route_gate.exclusive():
+            return super().add_url_rule(*args, **kwargs)
+
+    def create_url_adapter(self, request):
+        adapter = super().create_url_adapter(request)
+        return _GatedAdapter(adapter, self.route_gate) if adapter is not None else None
+
+
+@dataclass
+class LazyFeature:
+    """一个按需加载的功能区"""
+    name: str
+    prefixes: Tuple[str, ...]
+    loader: Callable[[Flask], None]
+    loaded: bool = False
+    error: Optional[str] = None
+    load_seconds: float = 0.0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def matches(self, path: str) -> bool:
+        return any(path == prefix or path.startswith(prefix.rstrip("/") + "/") for prefix in self.prefixes)
+
+
+class LazyRouteRegistry:
+    """包装 app.wsgi_app：请求路径命中未加载的功能区前缀时，先加载再交给 Flask 路由"""
+
+    def __init__(self, app: Flask, lazy: Optional[bool] = None):
+        self.app = app
+        if lazy is None:
+            lazy = os.environ.get("KOTO_LAZY_ROUTES", "true").lower() != "false"
+        self.lazy = lazy
+        self.features: Dict[str, LazyFeature] = {}
+        self._pending: Tuple[LazyFeature, ...] = ()
+        self._wsgi_app = app.wsgi_app
+        app.wsgi_app = self._dispatch
+
+    # ── 登记 ──
+
+    def add(self, name: str, prefixes, loader: Callable[[Flask], None]) -> LazyFeature:
+        """登记一个功能区：prefixes 为 URL 前缀（字符串或元组），loader(app) 负责导入并注册路由"""
+        if isinstance(prefixes, str):
+            prefixes = (prefixes,)
+        feature = LazyFeature(name, tuple(prefixes), loader)
+        self.features[name] = feature
+        self._pending = self._pending + (feature,)
+        if not self.lazy:
+            self.load(name)
+        return feature
+
+    def blueprint(self, name: str, prefixes, module: str, attr: str, **options) -> LazyFeature:
+        """登记一个蓝图：module 为 web 目录内的模块名时，导入失败再按 web.<module> 导入"""
+        def loader(app: Flask):
+            try:
+                mod = importlib.import_module(module)
+            except ImportError:
+                if module.startswith("web."):
+                    raise
+                mod = importlib.import_module(f"web.{module}")
+            app.register_blueprint(getattr(mod, attr), **options)
+        return self.add(name, prefixes, loader)
+
+    # ── 加载 ──
+
+    def load(self, name: str) -> bool:
+        """加载功能区（每个只尝试一次），返回是否可用"""
+        feature = self.features[name]
+        if feature.loaded:
+            return feature.error is None
+        with feature.lock:
+            if not feature.loaded:
+                start = time.perf_counter()
+                _loading.active = True
+                try:
+                    feature.loader(self.app)
+                    print(f"[LazyRoutes] ✅ {name} 已加载: {', '.join(feature.prefixes)}")
+                except Exception as e:
+                    feature.error = str(e)
+                    print(f"[LazyRoutes] ⚠️ {name} 加载失败: {e}")
+                finally:
+                    _loading.active = False
+                    feature.load_seconds = time.perf_counter() - start
+                    feature.loaded = True
+                    self._pending = tuple(f for f in self._pending if f is not feature)
+        return feature.error is None
+
+    def load_all(self):
+        for name in list(self.features):
+            self.load(name)
+
+    def is_loaded(self, name: str) -> bool:
+        feature = self.features.get(name)
+        return bool(feature and feature.loaded and feature.error is None)
+
+    def status(self) -> Dict[str, dict]:
+        return {
+            name: {
+                "prefixes": list(f.prefixes),
+                "loaded": f.loaded,
+                "error": f.error,
+                "load_ms": round(f.load_seconds * 1000, 1),
+            }
+            for name, f in self.features.items()
+        }
+
+    def _dispatch(self, environ, start_response):
+        pending = self._pending
+        if pending:
+            path = environ.get("PATH_INFO", "")
+            for feature in pending:
+                if feature.matches(path):
+                    self.load(feature.name)
+        return self._wsgi_app(environ, start_response)
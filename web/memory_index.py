@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+记忆检索索引 - 供 EnhancedMemoryManager 使用
+
+- 词法：BM25 倒排表（英文按单词，中文按字二元组），倒排表按需转为 NumPy 数组
+- 语义：字符 n-gram 特征哈希得到的本地嵌入向量（无需调用远程模型），
+  对 BM25 候选集做余弦重排
+- 嵌入向量缓存在记忆文件旁（memory.json -> memory.index.npz），
+  按 (记忆 id, 内容 crc32) 复用，只为新增/修改的记忆重新计算
+
+检索只触及查询词的倒排表和少量候选行，与记忆总数基本无关。
+"""
+
+import os
+import re
+import zlib
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+_LATIN_RE = re.compile(r'[a-z0-9_+#.]+')
+_CJK_RE = re.compile(r'[\u4e00-\u9fff]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """BM25 词项：英文/数字单词（长度 >= 2），中文连续片段的字二元组（单字片段保留单字）"""
+    text = text.lower()
+    terms = [w.strip('.') for w in _LATIN_RE.findall(text)]
+    terms = [w for w in terms if len(w) >= 2]
+    for run in _CJK_RE.findall(text):
+        if len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def embed(text: str, dim: int) -> np.ndarray:
+    """字符 n-gram 特征哈希嵌入（L2 归一化）"""
+    vec = np.zeros(dim, dtype=np.float32)
+    features = tokenize(text)
+    for word in _LATIN_RE.findall(text.lower()):
+        padded = f" {word} "
+        features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    for feature in features:
+        h = zlib.crc32(feature.encode('utf-8'))
+        vec[h % dim] += 1.0 if (h >> 16) & 1 else -1.0
+    norm = float(np.linalg.norm(vec))
+    if norm:
+        vec /= norm
+    return vec
+
+
+class MemoryIndex:
+    """BM25 + 嵌入重排的混合检索索引（按位置追加，删除为墓碑）"""
+
+    EMBED_DIM = 128
+    K1 = 1.2
+    B = 0.75
+    CANDIDATES = 64          # 进入嵌入重排的 BM25 候选数
+    EMBED_WEIGHT = 0.5       # 混合得分中嵌入余弦的权重
+    CHAMPIONS = 256          # 常见词项参与候选生成的冠军表长度
+    COMPACT_RATIO = 0.25     # 墓碑占比超过该值时重建
+
+    def __init__(self, cache_path: Optional[str] = None):
+        self.cache_path = cache_path
+        self._lock = threading.RLock()
+        self._clear()
+
+    def _clear(self):
+        self._ids: List[int] = []
+        self._crcs: List[int] = []
+        self._pos: Dict[int, int] = {}
+        self._alive: List[bool] = []
+        self._dead = 0
+        self._doc_len: List[int] = []
+        self._total_len = 0
+        self._postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        self._arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._doc_len_np: Optional[np.ndarray] = None
+        self._alive_np: Optional[np.ndarray] = None
+        self._emb = np.zeros((0, self.EMBED_DIM), dtype=np.float32)
+
+    # ==================== 构建 ====================
+
+    def build(self, memories: Iterable[Dict]) -> int:
+        """由记忆列表全量构建，复用内容未变的嵌入向量；返回重新计算的向量数"""
+        memories = list(memories)
+        missing = 0
+        with self._lock:
+            cached = self._current_vectors() if self._pos else self._load_cache()
+            self._clear()
+            self._emb = np.zeros((max(16, len(memories)), self.EMBED_DIM), dtype=np.float32)
+            for m in memories:
+                key = (m["id"], zlib.crc32(m["content"].encode('utf-8')))
+                vector = cached.get(key)
+                missing += vector is None
+                self._remove(m["id"])
+                self._append(m, vector)
+        return missing
+
+    def _current_vectors(self) -> Dict[Tuple[int, int], np.ndarray]:
+        return {(self._ids[p], self._crcs[p]): self._emb[p].copy() for p in self._pos.values()}
+
+    def _load_cache(self) -> Dict[Tuple[int, int], np.ndarray]:
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            data = np.load(self.cache_path)
+            if data["embeddings"].shape[1] != self.EMBED_DIM:
+                return {}
+            emb = data["embeddings"].astype(np.float32)
+            return {(int(i), int(c)): emb[k] for k, (i, c) in enumerate(zip(data["ids"], data["crcs"]))}
+        except Exception as e:
+            print(f"[MemoryIndex] 嵌入缓存加载失败，将重新计算: {e}")
+            return {}
+
+    def save_cache(self):
+        """写入嵌入缓存（原子替换）"""
+        if not self.cache_path:
+            return
+        with self._lock:
+            rows = sorted(self._pos.values())
+            ids = np.array([self._ids[p] for p in rows], dtype=np.int64)
+            crcs = np.array([self._crcs[p] for p in rows], dtype=np.int64)
+            emb = self._emb[rows].astype(np.float16)
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+            tmp = self.cache_path + '.tmp.npz'
+            np.savez(tmp, ids=ids, crcs=crcs, embeddings=emb)
+            os.replace(tmp, self.cache_path)
+        except Exception as e:
+            print(f"[MemoryIndex] 嵌入缓存保存失败: {e}")
+
+    def _append(self, memory: Dict, vector: Optional[np.ndarray] = None):
+        content = memory["content"]
+        pos = len(self._ids)
+        self._ids.append(memory["id"])
+        self._pos[memory["id"]] = pos
+        self._alive.append(True)
+        self._crcs.append(zlib.crc32(content.encode('utf-8')))
+
+        terms = tokenize(content)
+        self._doc_len.append(len(terms))
+        self._total_len += len(terms)
+        counts: Dict[str, int] = {}
+        for t in terms:
+            counts[t] = counts.get(t, 0) + 1
+        for t, tf in counts.items():
+            docs, tfs = self._postings.setdefault(t, ([], []))
+            docs.append(pos)
+            tfs.append(tf)
+            self._arrays.pop(t, None)
+        self._doc_len_np = None
+        self._alive_np = None
+
+        if pos >= len(self._emb):
+            grown = np.zeros((max(16, 2 * len(self._emb)), self.EMBED_DIM), dtype=np.float32)
+            grown[:len(self._emb)] = self._emb
+            self._emb = grown
+        self._emb[pos] = vector if vector is not None else embed(content, self.EMBED_DIM)
+
+    def add(self, memory: Dict):
+        with self._lock:
+            if memory["id"] in self._pos:
+                self._remove(memory["id"])
+            self._append(memory)
+
+    def remove(self, memory_id: int):
+        with self._lock:
+            self._remove(memory_id)
+
+    def _remove(self, memory_id: int):
+        pos = self._pos.pop(memory_id, None)
+        if pos is None:
+            return
+        self._alive[pos] = False
+        self._alive_np = None
+        self._dead += 1
+        self._total_len -= self._doc_len[pos]
+
+    def needs_compaction(self) -> bool:
+        return self._dead > self.COMPACT_RATIO * max(1, len(self._ids))
+
+    def __len__(self) -> int:
+        return len(self._pos)
+
+    # ==================== 检索 ====================
+
+    def _posting_arrays(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """(位置, 词频, 冠军位置)；冠军为该词项 BM25 词频分量最高的 CHAMPIONS 个文档，按位置有序"""
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            lists = self._postings.get(term)
+            if lists is None:
+                return None
+            docs = np.array(lists[0], dtype=np.int64)
+            tfs = np.array(lists[1], dtype=np.float32)
+            champions = docs
+            if len(docs) > self.CHAMPIONS:
+                doc_len = self._doc_len_array()[docs]
+                avgdl = max(self._total_len / max(len(self._pos), 1), 1.0)
+                weight = tfs / (tfs + self.K1 * (1 - self.B + self.B * doc_len / avgdl))
+                champions = np.sort(docs[np.argpartition(-weight, self.CHAMPIONS - 1)[:self.CHAMPIONS]])
+            arrays = (docs, tfs, champions)
+            self._arrays[term] = arrays
+        return arrays
+
+    def _doc_len_array(self) -> np.ndarray:
+        if self._doc_len_np is None:
+            self._doc_len_np = np.array(self._doc_len, dtype=np.float32)
+        return self._doc_len_np
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[int, float]]:
+        """返回 [(memory_id, 相关度 0~1), ...]，按相关度降序；无词法命中的记忆不返回"""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            n_live = len(self._pos)
+            if not n_live:
+                return []
+            doc_len = self._doc_len_array()
+            if self._alive_np is None:
+                self._alive_np = np.array(self._alive, dtype=bool)
+            avgdl = max(self._total_len / n_live, 1.0)
+
+            postings = [a for a in (self._posting_arrays(t) for t in terms) if a is not None]
+            if not postings:
+                return []
+            # 候选集：有罕见词项时取其完整倒排表，否则取各常见词项的冠军表，
+            # 使每次查询的工作量与记忆总数无关
+            rare = [a[0] for a in postings if len(a[0]) <= self.CHAMPIONS]
+            docs = np.unique(np.concatenate(rare or [a[2] for a in postings]))
+            docs = docs[self._alive_np[docs]]
+            if not len(docs):
+                return []
+
+            # 对候选集逐词项计分（倒排表按位置有序，二分查找）
+            contrib = np.zeros(len(docs), dtype=np.float32)
+            norm = self.K1 * (1 - self.B + self.B * doc_len[docs] / avgdl)
+            for term_docs, term_tfs, _ in postings:
+                idx = np.searchsorted(term_docs, docs)
+                idx[idx == len(term_docs)] = 0
+                hit = term_docs[idx] == docs
+                if not hit.any():
+                    continue
+                df = len(term_docs)
+                idf = np.log(1.0 + max(n_live - df + 0.5, 0.5) / (df + 0.5))
+                tfs = term_tfs[idx[hit]]
+                contrib[hit] += idf * tfs * (self.K1 + 1) / (tfs + norm[hit])
+
+            if len(docs) > self.CANDIDATES:
+                top = np.argpartition(-contrib, self.CANDIDATES - 1)[:self.CANDIDATES]
+                docs, contrib = docs[top], contrib[top]
+            cosine = self._emb[docs] @ embed(query, self.EMBED_DIM)
+            lexical = contrib / contrib.max()
+            hybrid = (1 - self.EMBED_WEIGHT) * lexical + self.EMBED_WEIGHT * np.clip(cosine, 0.0, 1.0)
+            order = np.argsort(-hybrid, kind='stable')[:limit]
+            return [(self._ids[docs[k]], float(hybrid[k])) for k in order]
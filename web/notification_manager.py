@@ -17,6 +17,11 @@ import asyncio
 from collections import defaultdict
 import threading
 
+try:
+    from sqlite_pool import get_database
+except ImportError:
+    from web.sqlite_pool import get_database
+
 
 class NotificationManager:
     """实时通知管理器"""
@@ -50,7 +55,7 @@ class NotificationManager:
         
     def _init_database(self):
         """初始化数据库"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         # 通知记录表
@@ -106,7 +111,7 @@ class NotificationManager:
     
     def _load_preferences(self):
         """加载用户偏好"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         cursor.execute("SELECT * FROM user_preferences")
@@ -248,7 +253,7 @@ class NotificationManager:
     
     def _get_today_notification_count(self, user_id: str) -> int:
         """获取今日通知数量"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         today = datetime.now().date()
@@ -263,15 +268,8 @@ class NotificationManager:
         return count
     
     def _save_notification(self, user_id: str, notification: Dict) -> int:
-        """保存通知到数据库"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO notifications (
-                user_id, type, priority, title, message, data, metadata
-            ) VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
+        """保存通知到数据库（与并发写入合并到同一事务，等待提交后返回ID）"""
+        row = (
             user_id,
             notification['type'],
             notification['priority'],
@@ -279,13 +277,12 @@ class NotificationManager:
             notification['message'],
             json.dumps(notification.get('data', {})),
             json.dumps(notification.get('config', {}))
-        ))
-        
-        notification_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        
-        return notification_id
+        )
+        return get_database(self.db_path).write(lambda conn: conn.execute("""
+            INSERT INTO notifications (
+                user_id, type, priority, title, message, data, metadata
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, row).lastrowid, wait=True)
     
     def _broadcast_to_user(self, user_id: str, notification: Dict):
         """广播通知到用户的所有连接"""
@@ -305,26 +302,20 @@ class NotificationManager:
                 print(f"发送通知失败: {e}")
     
     def _update_stats(self, user_id: str, notification_type: str, action: str):
-        """更新通知统计"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        today = datetime.now().date()
+        """更新通知统计（写后即返回，由批量写线程合并提交）"""
+        today = datetime.now().date().isoformat()
         column = f"{action}_count"
         
-        cursor.execute(f"""
+        get_database(self.db_path).write(lambda conn: conn.execute(f"""
             INSERT INTO notification_stats (user_id, date, type, {column})
             VALUES (?, ?, ?, 1)
             ON CONFLICT(user_id, date, type) DO UPDATE SET
                 {column} = {column} + 1
-        """, (user_id, today, notification_type))
-        
-        conn.commit()
-        conn.close()
+        """, (user_id, today, notification_type)))
     
     def mark_as_read(self, notification_id: int, user_id: str):
         """标记通知为已读"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -350,7 +341,7 @@ class NotificationManager:
     
     def dismiss_notification(self, notification_id: int, user_id: str):
         """忽略通知"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -375,7 +366,7 @@ class NotificationManager:
     
     def record_action(self, notification_id: int, user_id: str, action: str):
         """记录用户对通知采取的行动"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -400,7 +391,7 @@ class NotificationManager:
     
     def get_unread_notifications(self, user_id: str, limit: int = 50) -> List[Dict]:
         """获取未读通知"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -430,7 +421,7 @@ class NotificationManager:
     
     def get_notification_stats(self, user_id: str, days: int = 7) -> Dict:
         """获取通知统计"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         start_date = (datetime.now() - timedelta(days=days)).date()
@@ -484,7 +475,7 @@ class NotificationManager:
     
     def update_user_preferences(self, user_id: str, preferences: Dict):
         """更新用户偏好"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         enabled_types = ','.join(preferences.get('enabled_types', list(self.NOTIFICATION_TYPES.keys())))
@@ -2,43 +2,206 @@
 # -*- coding: utf-8 -*-
 """
 操作历史与回滚系统 - 文件操作记录、版本管理、撤销恢复
+
+备份采用内容寻址存储：文件按固定大小切块，块以 SHA-256 命名、压缩后只存一份，
+每次备份只记录块清单，反复编辑同一个大文件时只新增变化的块。操作日志为追加写入的
+JSON Lines，并按文件路径建立内存索引。
 """
 
 import os
 import json
 import shutil
-from datetime import datetime
+import hashlib
+import threading
+import zlib
+from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class BackupStore:
+    """内容寻址的分块备份存储（objects/<前两位>/<sha256>）"""
+
+    CHUNK_SIZE = 256 * 1024
+
+    # 对象文件首字节标记编码方式
+    _RAW, _ZLIB, _ZSTD = b"N", b"Z", b"S"
+
+    def __init__(self, root: str, codec: str = "zlib"):
+        self.root = root
+        if codec == "zstd" and zstandard is None:
+            codec = "zlib"
+        self.codec = codec
+        os.makedirs(self.root, exist_ok=True)
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _encode(self, data: bytes) -> bytes:
+        if self.codec == "zstd":
+            packed = self._ZSTD + zstandard.ZstdCompressor().compress(data)
+        elif self.codec == "zlib":
+            packed = self._ZLIB + zlib.compress(data, 6)
+        else:
+            packed = b""
+        if not packed or len(packed) >= len(data) + 1:
+            return self._RAW + data
+        return packed
+
+    def _decode(self, blob: bytes) -> bytes:
+        tag, body = blob[:1], blob[1:]
+        if tag == self._ZLIB:
+            return zlib.decompress(body)
+        if tag == self._ZSTD:
+            if zstandard is None:
+                raise RuntimeError("备份块使用 zstd 压缩，但未安装 zstandard")
+            return zstandard.ZstdDecompressor().decompress(body)
+        return body
+
+    def put_file(self, file_path: str) -> Dict[str, Any]:
+        """切块写入文件，已存在的块直接复用；返回版本清单"""
+        chunks = []
+        whole = hashlib.sha256()
+        size = 0
+        with open(file_path, "rb") as f:
+            while True:
+                data = f.read(self.CHUNK_SIZE)
+                if not data:
+                    break
+                whole.update(data)
+                size += len(data)
+                digest = hashlib.sha256(data).hexdigest()
+                chunks.append(digest)
+                path = self._object_path(digest)
+                if not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    tmp = f"{path}.{threading.get_ident()}.tmp"
+                    with open(tmp, "wb") as out:
+                        out.write(self._encode(data))
+                    os.replace(tmp, path)
+        st = os.stat(file_path)
+        return {
+            "digest": whole.hexdigest(),
+            "size": size,
+            "mtime": st.st_mtime,
+            "chunks": chunks,
+        }
+
+    def restore(self, manifest: Dict[str, Any], dest_path: str):
+        """按清单还原文件（先写临时文件再替换）"""
+        os.makedirs(os.path.dirname(os.path.abspath(dest_path)), exist_ok=True)
+        tmp = f"{dest_path}.restore.tmp"
+        whole = hashlib.sha256()
+        try:
+            with open(tmp, "wb") as out:
+                for digest in manifest["chunks"]:
+                    with open(self._object_path(digest), "rb") as f:
+                        data = self._decode(f.read())
+                    whole.update(data)
+                    out.write(data)
+            if whole.hexdigest() != manifest["digest"]:
+                raise IOError("备份内容校验失败")
+            os.replace(tmp, dest_path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        mtime = manifest.get("mtime")
+        if mtime is not None:
+            os.utime(dest_path, (mtime, mtime))
+
+    def has(self, manifest: Dict[str, Any]) -> bool:
+        return all(os.path.exists(self._object_path(d)) for d in manifest["chunks"])
+
+    def sweep(self, live_chunks: set) -> int:
+        """删除未被任何清单引用的块，返回删除数量"""
+        removed = 0
+        for root, dirs, files in os.walk(self.root):
+            for name in files:
+                if name not in live_chunks:
+                    try:
+                        os.remove(os.path.join(root, name))
+                        removed += 1
+                    except OSError:
+                        pass
+        return removed
+
 
 class OperationHistory:
     """操作历史管理器"""
     
-    def __init__(self, history_dir: str = "workspace/history"):
+    def __init__(self, history_dir: str = "workspace/history", codec: str = "zlib"):
         self.history_dir = history_dir
         self.backup_dir = os.path.join(history_dir, "backups")
-        self.log_file = os.path.join(history_dir, "operations.json")
+        self.log_file = os.path.join(history_dir, "operations.jsonl")
+        self.legacy_log_file = os.path.join(history_dir, "operations.json")
         
         os.makedirs(self.history_dir, exist_ok=True)
         os.makedirs(self.backup_dir, exist_ok=True)
+        self.store = BackupStore(os.path.join(self.backup_dir, "objects"), codec=codec)
+        self._lock = threading.Lock()
         
         # 加载历史记录
         self.operations = self._load_history()
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._by_path: Dict[str, List[Dict[str, Any]]] = {}
+        for op in self.operations:
+            self._index(op)
+    
+    def _index(self, op: Dict[str, Any]):
+        self._by_id[op["id"]] = op
+        self._by_path.setdefault(op["file_path"], []).append(op)
     
     def _load_history(self) -> List[Dict[str, Any]]:
-        """加载历史记录"""
-        if os.path.exists(self.log_file):
+        """加载历史记录（旧版 operations.json 会被迁移为追加日志）"""
+        if not os.path.exists(self.log_file):
+            if not os.path.exists(self.legacy_log_file):
+                return []
             try:
-                with open(self.log_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
+                with open(self.legacy_log_file, 'r', encoding='utf-8') as f:
+                    operations = json.load(f)
+            except Exception:
                 return []
-        return []
+            self._rewrite_log(operations)
+            os.remove(self.legacy_log_file)
+            return operations
+        
+        operations = []
+        by_id = {}
+        with open(self.log_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # 写入中断留下的半行
+                if "event" in record:
+                    # 对已有操作的更新（如回滚标记）
+                    op = by_id.get(record.get("id"))
+                    if op is not None:
+                        op.update(record.get("changes", {}))
+                    continue
+                operations.append(record)
+                by_id[record["id"]] = record
+        return operations
     
-    def _save_history(self):
-        """保存历史记录"""
-        with open(self.log_file, 'w', encoding='utf-8') as f:
-            json.dump(self.operations, f, ensure_ascii=False, indent=2)
+    def _append_log(self, record: Dict[str, Any]):
+        with open(self.log_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    
+    def _rewrite_log(self, operations: List[Dict[str, Any]]):
+        """整体重写日志（迁移与垃圾回收时压缩更新记录）"""
+        tmp = self.log_file + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            for op in operations:
+                f.write(json.dumps(op, ensure_ascii=False) + "\n")
+        os.replace(tmp, self.log_file)
+    
+    def _update_operation(self, operation: Dict[str, Any], event: str, changes: Dict[str, Any]):
+        operation.update(changes)
+        self._append_log({"event": event, "id": operation["id"], "changes": changes})
     
     def record_operation(self, operation_type: str, file_path: str, 
                         details: Optional[Dict] = None) -> str:
@@ -53,47 +216,58 @@ class OperationHistory:
         Returns:
             操作ID
         """
-        # 生成操作ID
-        op_id = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{len(self.operations)}"
-        
-        # 备份原文件（如果存在）
-        backup_path = None
-        if os.path.exists(file_path) and operation_type in ['edit', 'delete', 'move']:
-            backup_path = self._backup_file(file_path, op_id)
-        
-        # 记录操作
-        operation = {
-            "id": op_id,
-            "type": operation_type,
-            "file_path": file_path,
-            "backup_path": backup_path,
-            "timestamp": datetime.now().isoformat(),
-            "details": details or {},
-            "can_rollback": backup_path is not None
-        }
-        
-        self.operations.append(operation)
-        self._save_history()
+        with self._lock:
+            # 生成操作ID
+            op_id = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{len(self.operations)}"
+            
+            # 备份原文件（如果存在）
+            backup = None
+            if os.path.exists(file_path) and operation_type in ['edit', 'delete', 'move']:
+                backup = self._backup_file(file_path, op_id)
+            
+            # 记录操作
+            operation = {
+                "id": op_id,
+                "type": operation_type,
+                "file_path": file_path,
+                "backup_path": None,
+                "backup": backup,
+                "timestamp": datetime.now().isoformat(),
+                "details": details or {},
+                "can_rollback": backup is not None
+            }
+            
+            self.operations.append(operation)
+            self._index(operation)
+            self._append_log(operation)
         
         return op_id
     
-    def _backup_file(self, file_path: str, op_id: str) -> str:
-        """备份文件"""
+    def _backup_file(self, file_path: str, op_id: str) -> Optional[Dict[str, Any]]:
+        """备份文件，返回块清单"""
         if not os.path.exists(file_path):
             return None
         
-        # 生成备份文件名
-        filename = os.path.basename(file_path)
-        backup_filename = f"{op_id}_{filename}"
-        backup_path = os.path.join(self.backup_dir, backup_filename)
-        
         try:
-            shutil.copy2(file_path, backup_path)
-            return backup_path
+            return self.store.put_file(file_path)
         except Exception as e:
             print(f"备份文件失败: {e}")
             return None
     
+    def _has_backup(self, operation: Dict[str, Any]) -> bool:
+        if operation.get("backup"):
+            return self.store.has(operation["backup"])
+        backup_path = operation.get("backup_path")
+        return bool(backup_path) and os.path.exists(backup_path)
+    
+    def _restore_backup(self, operation: Dict[str, Any], dest_path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(dest_path)), exist_ok=True)
+        if operation.get("backup"):
+            self.store.restore(operation["backup"], dest_path)
+        else:
+            # 旧版整文件备份
+            shutil.copy2(operation["backup_path"], dest_path)
+    
     def rollback(self, op_id: str) -> Dict[str, Any]:
         """
         回滚操作
@@ -105,11 +279,7 @@ class OperationHistory:
             回滚结果
         """
         # 查找操作记录
-        operation = None
-        for op in self.operations:
-            if op["id"] == op_id:
-                operation = op
-                break
+        operation = self._by_id.get(op_id)
         
         if not operation:
             return {"success": False, "error": "操作记录不存在"}
@@ -120,7 +290,6 @@ class OperationHistory:
         try:
             op_type = operation["type"]
             file_path = operation["file_path"]
-            backup_path = operation["backup_path"]
             
             if op_type == "create":
                 # 删除创建的文件
@@ -132,10 +301,8 @@ class OperationHistory:
             
             elif op_type in ["edit", "delete"]:
                 # 恢复备份文件
-                if backup_path and os.path.exists(backup_path):
-                    # 确保目标目录存在
-                    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-                    shutil.copy2(backup_path, file_path)
+                if self._has_backup(operation):
+                    self._restore_backup(operation, file_path)
                     action = "已恢复原文件"
                 else:
                     return {"success": False, "error": "备份文件不存在"}
@@ -143,9 +310,8 @@ class OperationHistory:
             elif op_type == "move":
                 # 移动操作的回滚
                 old_path = operation["details"].get("old_path")
-                if old_path and backup_path and os.path.exists(backup_path):
-                    os.makedirs(os.path.dirname(old_path), exist_ok=True)
-                    shutil.copy2(backup_path, old_path)
+                if old_path and self._has_backup(operation):
+                    self._restore_backup(operation, old_path)
                     if os.path.exists(file_path):
                         os.remove(file_path)
                     action = "已恢复到原位置"
@@ -156,9 +322,11 @@ class OperationHistory:
                 return {"success": False, "error": f"不支持的操作类型: {op_type}"}
             
             # 标记为已回滚
-            operation["rolled_back"] = True
-            operation["rollback_time"] = datetime.now().isoformat()
-            self._save_history()
+            with self._lock:
+                self._update_operation(operation, "rollback", {
+                    "rolled_back": True,
+                    "rollback_time": datetime.now().isoformat(),
+                })
             
             return {
                 "success": True,
@@ -183,52 +351,68 @@ class OperationHistory:
         Returns:
             操作记录列表
         """
-        operations = self.operations
-        
         if file_path:
-            operations = [op for op in operations if op["file_path"] == file_path]
+            operations = self._by_path.get(file_path, [])
+        else:
+            operations = self.operations
         
-        # 按时间倒序
-        operations = sorted(operations, key=lambda x: x["timestamp"], reverse=True)
-        
-        return operations[:limit]
+        # 按时间倒序（日志按记录顺序追加）
+        return operations[::-1][:limit]
     
     def get_operation(self, op_id: str) -> Optional[Dict[str, Any]]:
         """获取特定操作记录"""
-        for op in self.operations:
-            if op["id"] == op_id:
-                return op
-        return None
+        return self._by_id.get(op_id)
     
-    def cleanup_old_backups(self, days: int = 30):
-        """清理旧备份"""
-        from datetime import timedelta
+    def collect_garbage(self, max_age_days: Optional[int] = 30, keep_last: int = 0) -> Dict[str, Any]:
+        """
+        按保留策略回收备份
+        
+        超过 max_age_days 的备份被丢弃，但每个文件最近 keep_last 个备份始终保留；
+        随后删除不再被任何备份引用的块，并压缩操作日志。
         
-        cutoff_date = datetime.now() - timedelta(days=days)
+        Args:
+            max_age_days: 备份保留天数（None 表示不按时间淘汰）
+            keep_last: 每个文件至少保留的最近备份数
+        """
+        cutoff = datetime.now() - timedelta(days=max_age_days) if max_age_days is not None else None
         
         removed_count = 0
-        for operation in self.operations:
-            op_time = datetime.fromisoformat(operation["timestamp"])
+        with self._lock:
+            for ops in self._by_path.values():
+                with_backup = [op for op in ops if op.get("backup") or op.get("backup_path")]
+                protected = {id(op) for op in with_backup[-keep_last:]} if keep_last > 0 else set()
+                for op in with_backup:
+                    if cutoff is None or id(op) in protected:
+                        continue
+                    if datetime.fromisoformat(op["timestamp"]) >= cutoff:
+                        continue
+                    backup_path = op.get("backup_path")
+                    if backup_path and os.path.exists(backup_path):
+                        try:
+                            os.remove(backup_path)
+                        except Exception as e:
+                            print(f"删除备份失败: {e}")
+                            continue
+                    op["backup"] = None
+                    op["backup_path"] = None
+                    op["can_rollback"] = False
+                    removed_count += 1
             
-            if op_time < cutoff_date:
-                backup_path = operation.get("backup_path")
-                if backup_path and os.path.exists(backup_path):
-                    try:
-                        os.remove(backup_path)
-                        operation["backup_path"] = None
-                        operation["can_rollback"] = False
-                        removed_count += 1
-                    except Exception as e:
-                        print(f"删除备份失败: {e}")
-        
-        if removed_count > 0:
-            self._save_history()
+            live_chunks = {d for op in self.operations if op.get("backup")
+                           for d in op["backup"]["chunks"]}
+            removed_chunks = self.store.sweep(live_chunks)
+            self._rewrite_log(self.operations)
         
         return {
             "success": True,
-            "removed_count": removed_count
+            "removed_count": removed_count,
+            "removed_chunks": removed_chunks
         }
     
+    def cleanup_old_backups(self, days: int = 30):
+        """清理旧备份（保留策略见 collect_garbage）"""
+        return self.collect_garbage(max_age_days=days)
+    
     def get_statistics(self) -> Dict[str, Any]:
         """获取统计信息"""
         total = len(self.operations)
@@ -236,6 +420,7 @@ class OperationHistory:
         by_type = {}
         can_rollback = 0
         rolled_back = 0
+        logical_size = 0
         
         for op in self.operations:
             op_type = op["type"]
@@ -246,13 +431,17 @@ class OperationHistory:
             
             if op.get("rolled_back"):
                 rolled_back += 1
+            
+            if op.get("backup"):
+                logical_size += op["backup"]["size"]
         
         return {
             "total_operations": total,
             "by_type": by_type,
             "can_rollback": can_rollback,
             "rolled_back": rolled_back,
-            "backup_size": self._get_backup_size()
+            "backup_size": self._get_backup_size(),
+            "backup_logical_size": logical_size
         }
     
     def _get_backup_size(self) -> int:
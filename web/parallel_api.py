@@ -13,11 +13,20 @@ from flask import Blueprint, request, jsonify
 from typing import Dict, Any
 import logging
 
-from .parallel_executor import (
-    TaskType, Priority, submit_task, get_queue_manager,
-    get_resource_manager, get_task_monitor, cancel_task,
-    get_task_status, get_session_tasks
-)
+try:
+    from parallel_executor import (
+        TaskType, Priority, submit_task, get_queue_manager,
+        get_resource_manager, get_task_monitor, cancel_task,
+        get_task_status, get_session_tasks
+    )
+    from task_dispatcher import get_scheduler
+except ImportError:
+    from web.parallel_executor import (
+        TaskType, Priority, submit_task, get_queue_manager,
+        get_resource_manager, get_task_monitor, cancel_task,
+        get_task_status, get_session_tasks
+    )
+    from web.task_dispatcher import get_scheduler
 
 logger = logging.getLogger(__name__)
 
@@ -179,8 +188,12 @@ def get_queue_status():
             "total_tasks": 10,
             "pending": 3,
             "running": 2,
+            "finished_last_minute": 42,
+            "queue_wait": {"HIGH": {"count": 5, "p50": 0.01, "p95": 0.05, ...}, ...},
+            "run_time": {"HIGH": {...}, ...},
             ...
         },
+        "workers": {"max_workers": 5, "busy_workers": 2, ...},
         "tasks": [
             {
                 "id": "task_xxx",
@@ -219,6 +232,7 @@ def get_queue_status():
         return jsonify({
             'success': True,
             'queue_stats': stats,
+            'workers': get_scheduler().get_stats(),
             'tasks': tasks,
         })
         
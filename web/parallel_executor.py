@@ -11,7 +11,7 @@ Features:
   - 资源感知调度（内存、CPU、API配额）
   - 异常自动重试（指数退避、熔断器）
   - 任务快照恢复
-  - 实时监控和进度追踪
+  - 实时监控和进度追踪（任务状态表 + 排队/执行耗时直方图）
   - 线程安全的操作
 """
 
@@ -21,11 +21,12 @@ import queue
 import uuid
 import traceback
 import psutil
+from bisect import bisect_left
 from enum import Enum
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any, Callable, Tuple, Set
 from dataclasses import dataclass, field
-from collections import defaultdict
+from collections import OrderedDict, defaultdict, deque
 import logging
 import json
 
@@ -160,6 +161,130 @@ class Task:
         }
 
 
+# ============================================================================
+# 任务状态表与耗时直方图
+# ============================================================================
+
+class LatencyHistogram:
+    """对数分桶的耗时直方图（秒），用于统计排队等待与执行耗时"""
+
+    BOUNDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        """记录一次耗时"""
+        seconds = max(0.0, seconds)
+        self.counts[bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """分位数估计：返回第 q 分位所在桶的上界（溢出桶返回最大值）"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(self.BOUNDS[i], self.max) if i < len(self.BOUNDS) else self.max
+        return self.max
+
+    def snapshot(self) -> Dict:
+        """转换为JSON序列化的字典"""
+        buckets = {f"le_{b:g}": n for b, n in zip(self.BOUNDS, self.counts)}
+        buckets["le_inf"] = self.counts[-1]
+        return {
+            'count': self.count,
+            'avg': self.sum / self.count if self.count else 0.0,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': buckets,
+        }
+
+
+class TaskStatusStore:
+    """
+    任务状态表
+
+    记录排队中、运行中和已结束的任务，出队后的任务仍可查询。
+    已结束（完成/失败/取消）的任务保留 ttl 秒后淘汰，数量超过 max_finished 时
+    提前淘汰最早结束的任务。
+    """
+
+    FINISHED = (TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED)
+
+    def __init__(self, ttl: float = 3600.0, max_finished: int = 5000):
+        self.ttl = ttl
+        self.max_finished = max_finished
+
+        self._tasks: Dict[str, Task] = {}
+        self._sessions: Dict[str, List[str]] = defaultdict(list)
+        self._finished: "OrderedDict[str, float]" = OrderedDict()  # 任务ID -> 结束时间（按结束先后）
+        self.lock = threading.RLock()
+
+    def put(self, task: Task):
+        """登记任务（重新提交的重试任务回到活动状态）"""
+        with self.lock:
+            if task.id not in self._tasks:
+                self._tasks[task.id] = task
+                self._sessions[task.session_id].append(task.id)
+            self._finished.pop(task.id, None)
+
+    def finish(self, task: Task):
+        """任务已结束：开始 TTL 计时"""
+        with self.lock:
+            if task.id not in self._tasks:
+                return
+            self._finished.pop(task.id, None)
+            self._finished[task.id] = time.time()
+            self.evict_expired()
+
+    def evict_expired(self):
+        """淘汰过期（或超出数量上限）的已结束任务"""
+        with self.lock:
+            deadline = time.time() - self.ttl
+            while self._finished:
+                task_id, finished_at = next(iter(self._finished.items()))
+                if finished_at > deadline and len(self._finished) <= self.max_finished:
+                    break
+                self._finished.popitem(last=False)
+                task = self._tasks.pop(task_id)
+                ids = self._sessions.get(task.session_id)
+                if ids is not None:
+                    ids.remove(task_id)
+                    if not ids:
+                        del self._sessions[task.session_id]
+
+    def get(self, task_id: str) -> Optional[Task]:
+        with self.lock:
+            return self._tasks.get(task_id)
+
+    def session(self, session_id: str) -> List[Task]:
+        """会话的所有任务（按提交顺序）"""
+        with self.lock:
+            return [self._tasks[tid] for tid in self._sessions.get(session_id, [])]
+
+    def counts(self) -> Dict[str, int]:
+        """按状态计数"""
+        with self.lock:
+            counts: Dict[str, int] = defaultdict(int)
+            for task in self._tasks.values():
+                counts[task.status.value] += 1
+            return counts
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+
 # ============================================================================
 # 优先级队列管理
 # ============================================================================
@@ -175,9 +300,12 @@ class TaskQueueManager:
     - LOW 队列（后台任务）
     
     防止饿死：round-robin 在 NORMAL 和 LOW 队列间轮换
+
+    任务出队后仍保留在状态表中（运行中、已结束的任务均可查询），
+    并按优先级统计排队等待与执行耗时。
     """
 
-    def __init__(self, max_queue_size: int = 500):
+    def __init__(self, max_queue_size: int = 500, status_ttl: float = 3600.0):
         self.max_queue_size = max_queue_size
         
         self.queues = {
@@ -187,11 +315,16 @@ class TaskQueueManager:
             Priority.LOW: queue.PriorityQueue(),
         }
         
-        # 任务ID -> Task 的索引
+        # 排队中的任务ID -> Task（出队或取消时移除）
         self.tasks: Dict[str, Task] = {}
         
-        # 会话ID -> [Task IDs]
-        self.session_tasks: Dict[str, List[str]] = defaultdict(list)
+        # 任务状态表：排队、运行中与已结束的任务
+        self.store = TaskStatusStore(ttl=status_ttl)
+        
+        # 按优先级的耗时直方图，以及最近结束时间（用于吞吐量）
+        self.queue_wait = {p: LatencyHistogram() for p in Priority}
+        self.run_time = {p: LatencyHistogram() for p in Priority}
+        self._finished_at = deque(maxlen=10000)
         
         # 锁
         self.lock = threading.RLock()
@@ -202,21 +335,21 @@ class TaskQueueManager:
     
     def submit(self, task: Task) -> str:
         """
-        提交任务到队列
+        提交任务到队列（重试任务以同一对象重新提交）
         
         Returns: task.id
         """
         with self.lock:
             # 检查队列大小
-            total_size = sum(q.qsize() for q in self.queues.values())
+            total_size = len(self.tasks)
             if total_size >= self.max_queue_size:
                 raise RuntimeError(f"Task queue is full ({total_size}/{self.max_queue_size})")
             
             # 记录任务
             self.tasks[task.id] = task
-            self.session_tasks[task.session_id].append(task.id)
+            self.store.put(task)
             
-            # 放入相应的队列（使用时间戳确保 FIFO 顺序）
+            # 放入相应的队列（使用时间戳确保 FIFO 顺序，出队时据此统计排队等待）
             priority_value = task.priority.value
             timestamp = time.time()
             self.queues[task.priority].put((priority_value, timestamp, task.id))
@@ -228,6 +361,32 @@ class TaskQueueManager:
             
             return task.id
 
+    def _pop(self, priority: Priority) -> Optional[Task]:
+        """从指定优先级队列取出一个任务（跳过已取消的条目）"""
+        q = self.queues[priority]
+        while not q.empty():
+            _, enqueued_at, task_id = q.get_nowait()
+            task = self.tasks.pop(task_id, None)
+            if task is None:
+                continue
+            self.queue_wait[priority].observe(time.time() - enqueued_at)
+            return task
+        return None
+
+    def _pop_next(self) -> Optional[Task]:
+        # 检查 CRITICAL、HIGH 队列
+        task = self._pop(Priority.CRITICAL) or self._pop(Priority.HIGH)
+        if task is not None:
+            return task
+        
+        # NORMAL 和 LOW 轮换（3:1比例，NORMAL 更多）
+        self._rr_counter += 1
+        if self._rr_counter % 4 == 0:  # 每4次选1次LOW
+            task = self._pop(Priority.LOW)
+        
+        # 优先 NORMAL；如果 NORMAL 也空了，再试 LOW
+        return task or self._pop(Priority.NORMAL) or self._pop(Priority.LOW)
+
     def get_next(self, timeout: float = 1.0) -> Optional[Task]:
         """
         获取下一个可执行的任务（遵循优先级）
@@ -237,83 +396,77 @@ class TaskQueueManager:
         2. HIGH（如果有）
         3. NORMAL 和 LOW 轮换（防止饿死）
         
+        所有队列都空时最多等待 timeout 秒。
+        
         Returns: Task or None
         """
         with self.not_empty:
-            # 检查 CRITICAL 队列
-            if not self.queues[Priority.CRITICAL].empty():
-                _, _, task_id = self.queues[Priority.CRITICAL].get_nowait()
-                return self.tasks.pop(task_id)
-            
-            # 检查 HIGH 队列
-            if not self.queues[Priority.HIGH].empty():
-                _, _, task_id = self.queues[Priority.HIGH].get_nowait()
-                return self.tasks.pop(task_id)
-            
-            # NORMAL 和 LOW 轮换（3:1比例，NORMAL 更多）
-            self._rr_counter += 1
-            if self._rr_counter % 4 == 0:  # 每4次选1次LOW
-                if not self.queues[Priority.LOW].empty():
-                    _, _, task_id = self.queues[Priority.LOW].get_nowait()
-                    return self.tasks.pop(task_id)
-            
-            # 优先 NORMAL
-            if not self.queues[Priority.NORMAL].empty():
-                _, _, task_id = self.queues[Priority.NORMAL].get_nowait()
-                return self.tasks.pop(task_id)
-            
-            # 如果 NORMAL 也空了，再试 LOW
-            if not self.queues[Priority.LOW].empty():
-                _, _, task_id = self.queues[Priority.LOW].get_nowait()
-                return self.tasks.pop(task_id)
-            
-            # 所有队列都空，等待
-            try:
+            task = self._pop_next()
+            if task is None:
                 self.not_empty.wait(timeout=timeout)
-            except:
-                pass
-            
-            return None
+                task = self._pop_next()
+            return task
+
+    def wake_all(self):
+        """唤醒所有等待 get_next 的线程（停止工作线程时使用）"""
+        with self.not_empty:
+            self.not_empty.notify_all()
+
+    def task_done(self, task: Task):
+        """任务结束（完成/失败/取消）：记录执行耗时，状态表开始 TTL 计时"""
+        with self.lock:
+            if task.started_at is not None:
+                self.run_time[task.priority].observe(task.elapsed_time)
+            self._finished_at.append(time.time())
+            self.store.finish(task)
 
     def cancel(self, task_id: str) -> bool:
-        """取消任务"""
+        """取消任务（排队中的任务直接结束，运行中的任务通过 abort_event 通知执行函数）"""
         with self.lock:
-            if task_id not in self.tasks:
+            task = self.store.get(task_id)
+            if task is None or task.status in TaskStatusStore.FINISHED:
                 return False
             
-            task = self.tasks[task_id]
-            task.status = TaskStatus.CANCELLED
-            task.abort_event.set()
-            
-            # 从会话列表中移除
-            if task.session_id in self.session_tasks:
-                self.session_tasks[task.session_id].remove(task_id)
+            task.abort()
+            if self.tasks.pop(task_id, None) is not None:
+                self.store.finish(task)
             
             logger.info(f"[QUEUE] Task cancelled: {task_id}")
             return True
 
     def get_task(self, task_id: str) -> Optional[Task]:
-        """获取任务对象（不移除）"""
-        with self.lock:
-            return self.tasks.get(task_id)
+        """获取任务对象（排队、运行中或未过期的已结束任务）"""
+        return self.store.get(task_id)
 
     def get_session_tasks(self, session_id: str) -> List[Task]:
         """获取会话的所有任务"""
-        with self.lock:
-            return [self.tasks[tid] for tid in self.session_tasks.get(session_id, [])
-                    if tid in self.tasks]
+        return self.store.session(session_id)
 
     def get_stats(self) -> Dict:
         """获取队列统计信息"""
         with self.lock:
+            self.store.evict_expired()
+            counts = self.store.counts()
+            queued = defaultdict(int)
+            for task in self.tasks.values():
+                queued[task.priority] += 1
+            cutoff = time.time() - 60
             return {
-                'total_tasks': len(self.tasks),
-                'pending': sum(1 for t in self.tasks.values() if t.status == TaskStatus.PENDING),
-                'running': sum(1 for t in self.tasks.values() if t.status == TaskStatus.RUNNING),
-                'critical': self.queues[Priority.CRITICAL].qsize(),
-                'high': self.queues[Priority.HIGH].qsize(),
-                'normal': self.queues[Priority.NORMAL].qsize(),
-                'low': self.queues[Priority.LOW].qsize(),
+                'total_tasks': len(self.store),
+                'queued': len(self.tasks),
+                'pending': counts[TaskStatus.PENDING.value],
+                'running': counts[TaskStatus.RUNNING.value],
+                'retrying': counts[TaskStatus.RETRYING.value],
+                'completed': counts[TaskStatus.COMPLETED.value],
+                'failed': counts[TaskStatus.FAILED.value],
+                'cancelled': counts[TaskStatus.CANCELLED.value],
+                'critical': queued[Priority.CRITICAL],
+                'high': queued[Priority.HIGH],
+                'normal': queued[Priority.NORMAL],
+                'low': queued[Priority.LOW],
+                'finished_last_minute': sum(1 for t in self._finished_at if t >= cutoff),
+                'queue_wait': {p.name: h.snapshot() for p, h in self.queue_wait.items()},
+                'run_time': {p.name: h.snapshot() for p, h in self.run_time.items()},
             }
 
 
@@ -342,7 +495,8 @@ class ResourceManager:
         self.api_call_tokens = self.api_calls_per_second
         self.last_api_token_refill = time.time()
         
-        self.lock = threading.Lock()
+        # acquire() 持锁调用 can_start_task()，需可重入
+        self.lock = threading.RLock()
 
     def get_memory_usage_mb(self) -> float:
         """获取当前内存使用（MB）"""
@@ -6,17 +6,25 @@
 2. 智能评分算法（紧急度 + 重要度 - 打扰成本）
 3. 触发器组合（定期 + 事件 + 阈值 + 模式）
 4. 自适应学习（根据用户反馈调整触发阈值）
+5. 事件驱动评估（触发器声明依赖的输入信号，只重新评估输入变化过的触发器）
 """
 
+import heapq
 import json
 import sqlite3
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from collections import defaultdict, deque
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 from dataclasses import dataclass
 from enum import Enum
 import threading
 import time
 
+try:
+    from sqlite_pool import get_database
+except ImportError:
+    from web.sqlite_pool import get_database
+
 
 class TriggerType(Enum):
     """触发器类型"""
@@ -36,6 +44,14 @@ class InteractionType(Enum):
     ALERT = "alert"                 # 警告
 
 
+# 触发器依赖的输入信号（可细化为 "信号:子类型"，如 "behavior:file_edit"）
+SIGNAL_BEHAVIOR = "behavior"        # 行为事件
+SIGNAL_CONTEXT = "context"          # 工作场景变化
+SIGNAL_SUGGESTIONS = "suggestions"  # 智能建议增减
+SIGNAL_FILES = "files"              # 文件整理/变更
+SIGNAL_TIME = "time"                # 时钟（每个整点通知一次）
+
+
 @dataclass
 class TriggerCondition:
     """触发条件"""
@@ -47,6 +63,7 @@ class TriggerCondition:
     enabled: bool = True
     description: str = ""
     threshold_value: Optional[float] = None
+    signals: Tuple[str, ...] = ()   # 依赖的输入信号，为空时任何信号变化都重新评估
 
 
 @dataclass
@@ -66,6 +83,9 @@ class InteractionDecision:
 class ProactiveTriggerSystem:
     """主动交互触发系统"""
     
+    RECENT_TRIGGER_WINDOW_HOURS = 24    # 内存中保留的每用户触发记录时长
+    SIGNAL_DEBOUNCE_SECONDS = 1.0       # 监控循环被信号唤醒后合并短时间内的后续信号
+    
     def __init__(
         self,
         db_path: str = "config/proactive_triggers.db",
@@ -99,14 +119,31 @@ class ProactiveTriggerSystem:
         self.running = False
         self.check_thread = None
         
+        # 事件驱动评估：信号 -> 依赖它的触发器，用户 -> 待重新评估的触发器
+        self._signal_index: Dict[str, Set[str]] = defaultdict(set)
+        self._undeclared: Set[str] = set()
+        self._dirty: Dict[str, Set[str]] = {}
+        self._known_users: Set[str] = set()
+        self._deferred: List[Tuple[float, str, str]] = []   # 冷却结束后再评估 (时间, 用户, 触发器)
+        self._deferred_at: Dict[Tuple[str, str], float] = {}   # (用户, 触发器) -> 最早唤醒时间，堆中每对只保留一个有效条目
+        self._clock_hour: Optional[str] = None
+        self._state_lock = threading.Lock()
+        self._signal_event = threading.Event()
+        
+        # 每个用户最近的触发时间（内存计数；trigger_history 由批量写线程持久化，启动时据此恢复）
+        self._recent_triggers: Dict[str, deque] = defaultdict(deque)
+        # 触发器有效性统计（内存缓存，反馈时更新）
+        self._effectiveness: Dict[str, Dict] = {}
+        
         self._init_database()
         self._register_builtin_triggers()
         self._load_trigger_configs()
         self._load_trigger_params()
+        self._load_runtime_state()
     
     def _init_database(self):
         """初始化数据库"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         # 触发历史
@@ -124,7 +161,8 @@ class ProactiveTriggerSystem:
                 final_score REAL,
                 reason TEXT,
                 user_feedback TEXT,
-                feedback_at TIMESTAMP
+                feedback_at TIMESTAMP,
+                user_id TEXT DEFAULT 'default'
             )
         """)
         
@@ -156,6 +194,11 @@ class ProactiveTriggerSystem:
         columns = [row[1] for row in cursor.fetchall()]
         if 'threshold_value' not in columns:
             cursor.execute("ALTER TABLE trigger_config ADD COLUMN threshold_value REAL")
+        cursor.execute("PRAGMA table_info(trigger_history)")
+        columns = [row[1] for row in cursor.fetchall()]
+        if 'user_id' not in columns:
+            cursor.execute("ALTER TABLE trigger_history ADD COLUMN user_id TEXT DEFAULT 'default'")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_trigger_history_time ON trigger_history(triggered_at)")
         
         # 用户反馈统计
         cursor.execute("""
@@ -184,7 +227,8 @@ class ProactiveTriggerSystem:
             condition_func=self._check_pending_suggestions,
             priority=5,
             cooldown_minutes=120,
-            description="定期检查未处理的智能建议"
+            description="定期检查未处理的智能建议",
+            signals=(SIGNAL_SUGGESTIONS, SIGNAL_TIME)
         ))
         self.trigger_params["periodic_check_suggestions"] = {
             "check_interval_hours": 2,
@@ -198,7 +242,8 @@ class ProactiveTriggerSystem:
             condition_func=self._check_context_switch,
             priority=6,
             cooldown_minutes=30,
-            description="检测到工作场景切换"
+            description="检测到工作场景切换",
+            signals=(SIGNAL_CONTEXT,)
         ))
         self.trigger_params["event_context_switch"] = {
             "context_change_timeout_minutes": 30
@@ -211,7 +256,8 @@ class ProactiveTriggerSystem:
             condition_func=self._check_work_duration,
             priority=8,
             cooldown_minutes=60,
-            description="连续工作时间超过阈值"
+            description="连续工作时间超过阈值",
+            signals=(SIGNAL_BEHAVIOR,)
         ))
         self.trigger_params["threshold_work_too_long"] = {
             "work_duration_hours": 2,
@@ -226,7 +272,8 @@ class ProactiveTriggerSystem:
             condition_func=self._check_edit_frequency,
             priority=7,
             cooldown_minutes=180,
-            description="文件编辑次数过多，建议备份"
+            description="文件编辑次数过多，建议备份",
+            signals=(f"{SIGNAL_BEHAVIOR}:file_edit",)
         ))
         self.trigger_params["threshold_edit_count"] = {
             "edit_count_threshold": 10,
@@ -240,7 +287,8 @@ class ProactiveTriggerSystem:
             condition_func=self._check_search_pattern,
             priority=6,
             cooldown_minutes=90,
-            description="检测到重复搜索模式"
+            description="检测到重复搜索模式",
+            signals=(f"{SIGNAL_BEHAVIOR}:file_search",)
         ))
         self.trigger_params["pattern_repeated_search"] = {
             "search_threshold": 3,
@@ -254,7 +302,8 @@ class ProactiveTriggerSystem:
             condition_func=self._check_efficiency_pattern,
             priority=7,
             cooldown_minutes=120,
-            description="检测到工作效率下降"
+            description="检测到工作效率下降",
+            signals=(SIGNAL_BEHAVIOR,)
         ))
         self.trigger_params["pattern_efficiency_drop"] = {
             "efficiency_threshold": 0.7,
@@ -268,7 +317,8 @@ class ProactiveTriggerSystem:
             condition_func=self._check_file_risk,
             priority=10,
             cooldown_minutes=15,
-            description="检测到文件丢失风险"
+            description="检测到文件丢失风险",
+            signals=(SIGNAL_FILES, f"{SIGNAL_BEHAVIOR}:file_delete")
         ))
         self.trigger_params["emergency_file_loss_risk"] = {
             "file_backup_timeout_hours": 24,
@@ -282,7 +332,8 @@ class ProactiveTriggerSystem:
             condition_func=self._check_morning_time,
             priority=3,
             cooldown_minutes=720,  # 12小时
-            description="早晨问候"
+            description="早晨问候",
+            signals=(SIGNAL_TIME,)
         ))
         self.trigger_params["periodic_morning_greeting"] = {
             "morning_start_hour": 6,
@@ -296,7 +347,8 @@ class ProactiveTriggerSystem:
             condition_func=self._check_return_from_break,
             priority=5,
             cooldown_minutes=240,
-            description="长时间无活动后回归"
+            description="长时间无活动后回归",
+            signals=(SIGNAL_BEHAVIOR, SIGNAL_TIME)
         ))
         self.trigger_params["event_return_after_break"] = {
             "break_timeout_hours": 4
@@ -309,7 +361,8 @@ class ProactiveTriggerSystem:
             condition_func=self._check_unorganized_files,
             priority=4,
             cooldown_minutes=360,
-            description="杂乱文件数量超过阈值"
+            description="杂乱文件数量超过阈值",
+            signals=(SIGNAL_FILES, SIGNAL_SUGGESTIONS)
         ))
         self.trigger_params["threshold_unorganized_files"] = {
             "organization_suggestion_threshold": 2
@@ -318,9 +371,10 @@ class ProactiveTriggerSystem:
     def register_trigger(self, trigger: TriggerCondition):
         """注册触发条件"""
         self.triggers[trigger.trigger_id] = trigger
+        self._index_trigger(trigger)
         
         # 保存到数据库
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -352,7 +406,7 @@ class ProactiveTriggerSystem:
 
     def _load_trigger_configs(self):
         """从数据库加载触发器配置并应用"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -369,9 +423,35 @@ class ProactiveTriggerSystem:
                 trigger.enabled = bool(row['enabled'])
                 trigger.threshold_value = row['threshold_value']
     
+    def _load_runtime_state(self):
+        """从数据库恢复内存中的每用户最近触发记录与有效性统计"""
+        conn = get_database(self.db_path).connect()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        
+        # triggered_at 为 SQLite CURRENT_TIMESTAMP（UTC）
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=self.RECENT_TRIGGER_WINDOW_HOURS)
+        cursor.execute("""
+            SELECT user_id, triggered_at FROM trigger_history
+            WHERE triggered_at >= ?
+            ORDER BY triggered_at
+        """, (cutoff.strftime("%Y-%m-%d %H:%M:%S"),))
+        for row in cursor.fetchall():
+            try:
+                triggered_at = datetime.strptime(row['triggered_at'][:19], "%Y-%m-%d %H:%M:%S")
+            except (TypeError, ValueError):
+                continue
+            self._recent_triggers[row['user_id'] or 'default'].append(
+                triggered_at.replace(tzinfo=timezone.utc).timestamp()
+            )
+        
+        cursor.execute("SELECT * FROM trigger_effectiveness")
+        self._effectiveness = {row['trigger_id']: dict(row) for row in cursor.fetchall()}
+        conn.close()
+    
     def _load_trigger_params(self):
         """从数据库加载触发器参数配置"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -388,7 +468,7 @@ class ProactiveTriggerSystem:
     
     def _save_trigger_params(self, trigger_id: str, params: Dict):
         """保存触发器参数到数据库"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -418,6 +498,7 @@ class ProactiveTriggerSystem:
         
         # 保存到数据库
         self._save_trigger_params(trigger_id, updated_params)
+        self._invalidate_trigger(trigger_id)
         
         return True
 
@@ -459,7 +540,7 @@ class ProactiveTriggerSystem:
         if threshold_value is not None:
             trigger.threshold_value = float(threshold_value)
         
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         cursor.execute("""
             UPDATE trigger_config
@@ -475,6 +556,7 @@ class ProactiveTriggerSystem:
         ))
         conn.commit()
         conn.close()
+        self._invalidate_trigger(trigger_id)
         
         return True
     
@@ -497,8 +579,117 @@ class ProactiveTriggerSystem:
         
         return True
     
+    # ==================== 事件驱动评估 ====================
+    
+    def _index_trigger(self, trigger: TriggerCondition):
+        """按声明的输入信号建立索引（重复注册时先移除旧索引）"""
+        for trigger_ids in self._signal_index.values():
+            trigger_ids.discard(trigger.trigger_id)
+        self._undeclared.discard(trigger.trigger_id)
+        if trigger.signals:
+            for signal in trigger.signals:
+                self._signal_index[signal].add(trigger.trigger_id)
+        else:
+            self._undeclared.add(trigger.trigger_id)
+        self._invalidate_trigger(trigger.trigger_id)
+    
+    def _mark_dirty(self, user_id: str, trigger_ids: Iterable[str]):
+        """标记用户待重新评估的触发器，首次出现的用户评估全部触发器（调用方持有 _state_lock）"""
+        if user_id not in self._known_users:
+            self._known_users.add(user_id)
+            trigger_ids = self.triggers.keys()
+        self._dirty.setdefault(user_id, set()).update(trigger_ids)
+    
+    def _invalidate_trigger(self, trigger_id: str):
+        """触发器配置或参数变化后，所有用户都需重新评估它"""
+        with self._state_lock:
+            for user_id in self._known_users:
+                self._dirty.setdefault(user_id, set()).add(trigger_id)
+    
+    def notify_signal(self, signal: str, user_id: Optional[str] = None, detail: Optional[str] = None):
+        """
+        通知某个输入信号已变化，依赖它的触发器在下次评估时重新检查
+        
+        Args:
+            signal: 信号名（SIGNAL_*）
+            user_id: 用户ID，None 表示所有已知用户（如建议、文件变化）
+            detail: 子类型（如行为事件类型），同时通知 "信号:子类型" 的依赖者
+        """
+        trigger_ids = self._signal_index.get(signal, set()) | self._undeclared
+        if detail:
+            trigger_ids = trigger_ids | self._signal_index.get(f"{signal}:{detail}", set())
+        with self._state_lock:
+            for uid in (list(self._known_users) if user_id is None else [user_id]):
+                self._mark_dirty(uid, trigger_ids)
+        self._signal_event.set()
+    
+    def _advance_clock(self):
+        """整点通知时间信号，并唤醒冷却已结束的触发器"""
+        now = datetime.now()
+        hour = now.strftime("%Y%m%d%H")
+        if hour != self._clock_hour:
+            first_tick = self._clock_hour is None
+            self._clock_hour = hour
+            if not first_tick:
+                self.notify_signal(SIGNAL_TIME)
+        
+        timestamp = now.timestamp()
+        with self._state_lock:
+            while self._deferred and self._deferred[0][0] <= timestamp:
+                _, user_id, trigger_id = heapq.heappop(self._deferred)
+                wake_at = self._deferred_at.get((user_id, trigger_id))
+                if wake_at is None or wake_at > timestamp:
+                    continue                    # 已被更早的唤醒取代
+                del self._deferred_at[(user_id, trigger_id)]
+                self._dirty.setdefault(user_id, set()).add(trigger_id)
+    
+    def evaluate_changed(self, user_id: str = "default") -> Optional[InteractionDecision]:
+        """
+        只评估该用户输入信号变化过的触发器（首次评估的用户评估全部）
+        
+        条件成立但未被选中的触发器保留到下次评估；被选中或处于冷却中的
+        触发器在冷却结束后再评估，与定期全量评估的结果一致。
+        """
+        self._advance_clock()
+        with self._state_lock:
+            if user_id not in self._known_users:
+                self._mark_dirty(user_id, ())
+            pending = self._dirty.pop(user_id, None)
+        if not pending:
+            return None
+        
+        decision, ready, cooling = self._evaluate(user_id, pending)
+        chosen = decision.content.get('trigger_id') if decision else None
+        now = time.time()
+        with self._state_lock:
+            rearm = [trigger_id for trigger_id in ready if trigger_id != chosen]
+            if rearm:
+                self._dirty.setdefault(user_id, set()).update(rearm)
+            if chosen:
+                cooling.append((now + self.triggers[chosen].cooldown_minutes * 60, chosen))
+            for wake_at, trigger_id in cooling:
+                # 冷却期内每个事件都会再评估一次，同一对已排队且不更晚时不重复入堆
+                key = (user_id, trigger_id)
+                if key in self._deferred_at and self._deferred_at[key] <= wake_at:
+                    continue
+                self._deferred_at[key] = wake_at
+                heapq.heappush(self._deferred, (wake_at, user_id, trigger_id))
+        return decision
+    
+    def evaluate_all_changed(self) -> Dict[str, InteractionDecision]:
+        """评估所有有信号变化的用户，开销与变化的信号数成正比，与用户总数无关"""
+        self._advance_clock()
+        with self._state_lock:
+            user_ids = list(self._dirty)
+        decisions = {}
+        for user_id in user_ids:
+            decision = self.evaluate_changed(user_id)
+            if decision:
+                decisions[user_id] = decision
+        return decisions
+    
     def evaluate_interaction_need(
-        self, user_id: str = "default"
+        self, user_id: str = "default", trigger_ids: Optional[Iterable[str]] = None
     ) -> Optional[InteractionDecision]:
         """
         评估是否需要主动交互
@@ -507,13 +698,34 @@ class ProactiveTriggerSystem:
         final_score = (urgency * 0.4 + importance * 0.4) - (disturbance_cost * 0.2)
         
         如果 final_score >= threshold，则触发交互
+        
+        Args:
+            user_id: 用户ID
+            trigger_ids: 只评估这些触发器，None 时评估全部（增量评估见 evaluate_changed）
         """
+        return self._evaluate(user_id, trigger_ids)[0]
+    
+    def _evaluate(
+        self, user_id: str, trigger_ids: Optional[Iterable[str]] = None
+    ) -> Tuple[Optional[InteractionDecision], List[str], List[Tuple[float, str]]]:
+        """评估触发器，返回 (最佳决策, 条件成立的触发器, [(冷却结束时间, 冷却中的触发器)])"""
         best_decision = None
         best_score = -1.0
+        ready: List[str] = []
+        cooling: List[Tuple[float, str]] = []
         
-        # 遍历所有触发器
-        for trigger_id, trigger in self.triggers.items():
+        # 按注册顺序遍历（分数相同时先注册的优先）
+        if trigger_ids is None:
+            selected = list(self.triggers.items())
+        else:
+            trigger_ids = set(trigger_ids)
+            selected = [(tid, t) for tid, t in self.triggers.items() if tid in trigger_ids]
+        
+        for trigger_id, trigger in selected:
             if not self.should_trigger(trigger_id):
+                if trigger.enabled and trigger_id in self.last_trigger_times:
+                    cooldown = timedelta(minutes=trigger.cooldown_minutes)
+                    cooling.append(((self.last_trigger_times[trigger_id] + cooldown).timestamp(), trigger_id))
                 continue
             
             # 执行触发条件检查
@@ -559,6 +771,9 @@ class ProactiveTriggerSystem:
                     final_score=final_score
                 )
                 
+                if decision.should_interact:
+                    ready.append(trigger_id)
+                
                 # 保留最高分的决策
                 if decision.should_interact and final_score > best_score:
                     best_score = final_score
@@ -572,9 +787,9 @@ class ProactiveTriggerSystem:
         
         # 记录决策
         if best_decision:
-            self._record_trigger(best_decision)
+            self._record_trigger(best_decision, user_id)
         
-        return best_decision
+        return best_decision, ready, cooling
     
     def _calculate_disturbance_cost(
         self, user_id: str, trigger: TriggerCondition
@@ -687,11 +902,8 @@ class ProactiveTriggerSystem:
         
         # 其他交互类型类似...
     
-    def _record_trigger(self, decision: InteractionDecision):
-        """记录触发历史"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+    def _record_trigger(self, decision: InteractionDecision, user_id: str = "default"):
+        """记录触发历史（内存计数立即更新；数据库写后即返回，由批量写线程合并提交）"""
         trigger_id = decision.content.get('trigger_id', 'unknown')
         trigger_type = decision.content.get('trigger_type')
         if not trigger_type and trigger_id in self.triggers:
@@ -699,12 +911,7 @@ class ProactiveTriggerSystem:
         if not trigger_type:
             trigger_type = 'unknown'
         
-        cursor.execute("""
-            INSERT INTO trigger_history
-            (trigger_id, trigger_type, decision_made, interaction_type,
-             urgency_score, importance_score, disturbance_cost, final_score, reason)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
+        row = (
             trigger_id,
             trigger_type,
             int(decision.should_interact),
@@ -713,17 +920,23 @@ class ProactiveTriggerSystem:
             decision.importance_score,
             decision.disturbance_cost,
             decision.final_score,
-            decision.reason
-        ))
-        
-        conn.commit()
-        conn.close()
+            decision.reason,
+            user_id
+        )
+        with self._state_lock:
+            self._recent_triggers[user_id].append(time.time())
+        get_database(self.db_path).write(lambda conn: conn.execute("""
+            INSERT INTO trigger_history
+            (trigger_id, trigger_type, decision_made, interaction_type,
+             urgency_score, importance_score, disturbance_cost, final_score, reason, user_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, row))
     
     def record_user_feedback(
         self, trigger_id: str, feedback: str, response_time_seconds: int
     ):
         """记录用户反馈（用于自适应学习）"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         # 更新最近触发记录的反馈
@@ -761,7 +974,13 @@ class ProactiveTriggerSystem:
         ))
         
         conn.commit()
+        conn.row_factory = sqlite3.Row
+        row = conn.execute(
+            "SELECT * FROM trigger_effectiveness WHERE trigger_id = ?", (trigger_id,)
+        ).fetchone()
         conn.close()
+        if row:
+            self._effectiveness[trigger_id] = dict(row)
         
         # 自适应调整阈值
         self._adapt_trigger_threshold(trigger_id, feedback)
@@ -788,37 +1007,26 @@ class ProactiveTriggerSystem:
                 )
     
     def _get_recent_trigger_count(self, user_id: str, hours: int = 1) -> int:
-        """获取最近的触发次数"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cutoff_time = datetime.now() - timedelta(hours=hours)
-        
-        cursor.execute("""
-            SELECT COUNT(*) FROM trigger_history
-            WHERE triggered_at >= ?
-        """, (cutoff_time.isoformat(),))
-        
-        count = cursor.fetchone()[0]
-        conn.close()
-        
+        """获取该用户最近的触发次数（内存计数）"""
+        now = time.time()
+        cutoff = now - hours * 3600
+        with self._state_lock:
+            recent = self._recent_triggers.get(user_id)
+            if not recent:
+                return 0
+            expire = now - self.RECENT_TRIGGER_WINDOW_HOURS * 3600
+            while recent and recent[0] < expire:
+                recent.popleft()
+            count = 0
+            for triggered_at in reversed(recent):
+                if triggered_at < cutoff:
+                    break
+                count += 1
         return count
     
     def _get_trigger_effectiveness(self, trigger_id: str) -> Optional[Dict]:
-        """获取触发器有效性统计"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT * FROM trigger_effectiveness
-            WHERE trigger_id = ?
-        """, (trigger_id,))
-        
-        row = cursor.fetchone()
-        conn.close()
-        
-        return dict(row) if row else None
+        """获取触发器有效性统计（内存缓存）"""
+        return self._effectiveness.get(trigger_id)
     
     # ==================== 具体触发条件检查函数 ====================
     
@@ -1103,19 +1311,26 @@ class ProactiveTriggerSystem:
     def stop_monitoring(self):
         """停止监控"""
         self.running = False
+        self._signal_event.set()
         if self.check_thread:
             self.check_thread.join(timeout=5)
         print("🛑 主动交互触发系统已停止")
     
     def _monitoring_loop(self, interval: int, user_id: str):
-        """监控循环"""
+        """监控循环：有信号变化时（最长等待 interval 秒）只评估输入变化过的用户与触发器"""
+        with self._state_lock:
+            self._mark_dirty(user_id, self.triggers.keys())
+        
         while self.running:
+            self._signal_event.clear()
             try:
                 # 评估是否需要交互
-                decision = self.evaluate_interaction_need(user_id)
-                
-                if decision and decision.should_interact:
+                for uid, decision in self.evaluate_all_changed().items():
+                    if not decision.should_interact:
+                        continue
+                    
                     print(f"\n🔔 触发主动交互:")
+                    print(f"  用户: {uid}")
                     print(f"  类型: {decision.interaction_type.value}")
                     print(f"  优先级: {decision.priority}")
                     print(f"  原因: {decision.reason}")
@@ -1123,17 +1338,18 @@ class ProactiveTriggerSystem:
                     print(f"  (紧急:{decision.urgency_score:.2f} + 重要:{decision.importance_score:.2f} - 打扰:{decision.disturbance_cost:.2f})")
                     
                     # 执行交互
-                    self.execute_interaction(decision, user_id)
+                    self.execute_interaction(decision, uid)
                 
             except Exception as e:
                 print(f"监控循环出错: {e}")
             
-            # 等待下一次检查
-            time.sleep(interval)
+            # 等待信号变化或下一次检查（时钟与冷却到期），被唤醒后合并短时间内的后续信号
+            if self._signal_event.wait(interval) and self.running:
+                time.sleep(self.SIGNAL_DEBOUNCE_SECONDS)
     
     def get_trigger_statistics(self, days: int = 7) -> Dict:
         """获取触发统计"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         start_date = (datetime.now() - timedelta(days=days)).date()
@@ -11,16 +11,26 @@ This module provides:
 4. Adaptive throttling based on load
 5. Fair access scheduling and prioritization
 6. Rate limit headers and responses
+7. Pluggable limiter state backends (sharded in-process, or SQLite shared by
+   all worker processes) holding a fixed-size state per key
 """
 
+import heapq
+import math
+import os
 import time
 import threading
-from collections import defaultdict, deque
+from collections import deque
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple, Callable
 from dataclasses import dataclass, field
 from enum import Enum
 
+try:
+    from web.sqlite_pool import get_database
+except ImportError:
+    from sqlite_pool import get_database
+
 
 class RateLimitStrategy(Enum):
     """Rate limiting strategies"""
@@ -209,161 +219,427 @@ class AdaptiveThrottler:
             }
 
 
+# ==================== Limiter state backends ====================
+#
+# A backend stores one small tuple of floats per key and applies an update
+# function to it atomically. Update functions have the signature
+#     fn(state: Optional[tuple], now: float) -> (new_state, expires_at, result)
+# where state is None for unknown or expired keys. A key past expires_at is
+# indistinguishable from a fresh one, so evicting it never changes a decision.
+
+StateUpdate = Callable[[Optional[tuple], float], Tuple[Optional[tuple], float, object]]
+
+
+class _Shard:
+    __slots__ = ("lock", "data", "ops")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data: Dict[str, Tuple[tuple, float]] = {}
+        self.ops = 0
+
+
+class MemoryBackend:
+    """In-process backend: keys are spread over independently locked shards"""
+
+    SWEEP_EVERY = 1024      # Operations per shard between expired-key sweeps
+
+    def __init__(self, shards: int = 64, max_keys: int = 100000):
+        """
+        Args:
+            shards: Number of lock shards
+            max_keys: Upper bound on tracked keys; beyond it the keys closest
+                to expiry are dropped first
+        """
+        self._shards = [_Shard() for _ in range(shards)]
+        self._shard_count = shards
+        self._shard_cap = max(1, max_keys // shards)
+
+    def _shard(self, key: str) -> _Shard:
+        return self._shards[hash(key) % self._shard_count]
+
+    def update(self, key: str, fn: StateUpdate):
+        """Apply fn to the key's state under the shard lock"""
+        shard = self._shard(key)
+        with shard.lock:
+            now = time.time()
+            entry = shard.data.get(key)
+            state = entry[0] if entry is not None and entry[1] > now else None
+            new_state, expires_at, result = fn(state, now)
+            if new_state is None:
+                shard.data.pop(key, None)
+            else:
+                shard.data[key] = (new_state, expires_at)
+            shard.ops += 1
+            if shard.ops >= self.SWEEP_EVERY or len(shard.data) > self._shard_cap:
+                shard.ops = 0
+                self._sweep(shard, now)
+        return result
+
+    def get(self, key: str) -> Optional[tuple]:
+        shard = self._shard(key)
+        with shard.lock:
+            entry = shard.data.get(key)
+            return entry[0] if entry is not None and entry[1] > time.time() else None
+
+    def _sweep(self, shard: _Shard, now: float):
+        """Drop expired keys, then the soonest-expiring ones if still over capacity"""
+        expired = [key for key, (_, expires_at) in shard.data.items() if expires_at <= now]
+        for key in expired:
+            del shard.data[key]
+        overflow = len(shard.data) - self._shard_cap
+        if overflow > 0:
+            for key in heapq.nsmallest(overflow, shard.data, key=lambda k: shard.data[k][1]):
+                del shard.data[key]
+
+    def __len__(self) -> int:
+        return sum(len(shard.data) for shard in self._shards)
+
+
+class SQLiteBackend:
+    """
+    Backend shared by every process opening the same database file
+    (e.g. all `gunicorn -w N` workers), so they enforce one quota together.
+    Each update is a short BEGIN IMMEDIATE transaction on a pooled connection.
+    """
+
+    SWEEP_EVERY = 1024      # Operations per process between expired-row sweeps
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._ops = 0
+        get_database(db_path).write(lambda conn: conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_limit_state (
+                key TEXT PRIMARY KEY,
+                a REAL, b REAL, c REAL,
+                expires_at REAL NOT NULL
+            )
+        """), wait=True)
+
+    def update(self, key: str, fn: StateUpdate):
+        conn = get_database(self.db_path).connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            row = conn.execute(
+                "SELECT a, b, c, expires_at FROM rate_limit_state WHERE key = ?", (key,)
+            ).fetchone()
+            state = None
+            if row is not None and row[3] > now:
+                state = tuple(v for v in row[:3] if v is not None)
+            new_state, expires_at, result = fn(state, now)
+            if new_state is None:
+                conn.execute("DELETE FROM rate_limit_state WHERE key = ?", (key,))
+            elif new_state != state or row is None or row[3] != expires_at:
+                values = tuple(new_state) + (None,) * (3 - len(new_state))
+                conn.execute(
+                    "INSERT OR REPLACE INTO rate_limit_state (key, a, b, c, expires_at) VALUES (?, ?, ?, ?, ?)",
+                    (key,) + values + (expires_at,)
+                )
+            self._ops += 1
+            if self._ops % self.SWEEP_EVERY == 0:
+                conn.execute("DELETE FROM rate_limit_state WHERE expires_at <= ?", (now,))
+            conn.commit()
+        finally:
+            conn.close()
+        return result
+
+    def get(self, key: str) -> Optional[tuple]:
+        conn = get_database(self.db_path).connect()
+        try:
+            row = conn.execute(
+                "SELECT a, b, c FROM rate_limit_state WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        finally:
+            conn.close()
+        return tuple(v for v in row if v is not None) if row else None
+
+    def __len__(self) -> int:
+        conn = get_database(self.db_path).connect()
+        try:
+            return conn.execute(
+                "SELECT COUNT(*) FROM rate_limit_state WHERE expires_at > ?", (time.time(),)
+            ).fetchone()[0]
+        finally:
+            conn.close()
+
+
+_backend_instance = None
+_backend_lock = threading.Lock()
+
+
+def _shared_backend_selected() -> bool:
+    return os.environ.get("KOTO_RATE_LIMIT_BACKEND", "memory").lower() == "sqlite"
+
+
+def get_rate_limit_backend():
+    """
+    Process-wide limiter backend
+
+    KOTO_RATE_LIMIT_BACKEND selects "memory" (default) or "sqlite"; the SQLite
+    store at KOTO_RATE_LIMIT_DB is shared by all workers on the host.
+    """
+    global _backend_instance
+    with _backend_lock:
+        if _backend_instance is None:
+            if _shared_backend_selected():
+                _backend_instance = SQLiteBackend(os.environ.get("KOTO_RATE_LIMIT_DB", "config/rate_limits.db"))
+            else:
+                _backend_instance = MemoryBackend()
+        return _backend_instance
+
+
+# ==================== State update functions ====================
+
+def gcra(limit: RateLimit, cost: int = 1) -> StateUpdate:
+    """
+    Generic cell rate algorithm: the same decisions as a token bucket holding
+    burst_size (default requests_per_period) tokens, stored as a single
+    theoretical arrival time.
+    """
+    interval = limit.period_seconds / limit.requests_per_period
+    capacity = interval * (limit.burst_size or limit.requests_per_period)
+
+    def update(state, now):
+        tat = max(state[0], now) if state else now
+        new_tat = tat + interval * cost
+        if new_tat - now > capacity + 1e-9:
+            return state, tat, (False, new_tat - now - capacity, 0)
+        remaining = int((capacity - (new_tat - now)) / interval + 1e-6)
+        return (new_tat,), new_tat, (True, 0.0, remaining)
+
+    return update
+
+
+def gcra_refund(limit: RateLimit, cost: int = 1) -> StateUpdate:
+    """Give back a consumption made by gcra() whose request was rejected elsewhere"""
+    interval = limit.period_seconds / limit.requests_per_period
+
+    def update(state, now):
+        if not state:
+            return None, now, None
+        tat = state[0] - interval * cost
+        return ((tat,), tat, None) if tat > now else (None, now, None)
+
+    return update
+
+
+def sliding_window(requests_limit: float, window_seconds: float, cost: int = 1) -> StateUpdate:
+    """
+    Sliding-window counter: the previous fixed window's count, weighted by its
+    overlap with the sliding window, plus the current window's count.
+    Pass requests_limit=math.inf to only count.
+    """
+    def update(state, now):
+        start = now - now % window_seconds
+        previous = current = 0.0
+        if state:
+            window_start, prev_count, curr_count = state
+            if window_start == start:
+                previous, current = prev_count, curr_count
+            elif window_start == start - window_seconds:
+                previous = curr_count
+        estimated = previous * (1 - (now - start) / window_seconds) + current
+        if estimated + cost > requests_limit:
+            # Wait until the previous window's weight has decayed enough (or the window rolls over)
+            spare = requests_limit - current - cost
+            if previous > 0 and spare >= 0:
+                retry = start + window_seconds * (1 - spare / previous) - now
+            else:
+                retry = start + window_seconds - now
+            return state, (start + 2 * window_seconds if state else now), (False, max(retry, 0.0), estimated)
+        current += cost
+        return (start, previous, current), start + 2 * window_seconds, (True, 0.0, estimated + cost)
+
+    return update
+
+
+class DailyQuota:
+    """Calendar-day (local time) request quota per key, counted in a backend"""
+
+    def __init__(self, limit: int, backend=None, namespace: str = "daily"):
+        self.limit = limit
+        self.backend = backend if backend is not None else get_rate_limit_backend()
+        self.namespace = namespace
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    @staticmethod
+    def _today() -> Tuple[float, float]:
+        today = datetime.now().date()
+        return float(today.toordinal()), datetime.combine(today + timedelta(days=1), datetime.min.time()).timestamp()
+
+    def consume(self, key: str, limit: Optional[int] = None) -> Tuple[bool, int]:
+        """Atomically count one request if under the limit; returns (allowed, used_today)"""
+        limit = self.limit if limit is None else limit
+        day, midnight = self._today()
+
+        def update(state, now):
+            used = int(state[1]) if state and state[0] == day else 0
+            if used >= limit:
+                return (day, float(used)), midnight, (False, used)
+            return (day, float(used + 1)), midnight, (True, used + 1)
+
+        return self.backend.update(self._key(key), update)
+
+    def used(self, key: str) -> int:
+        state = self.backend.get(self._key(key))
+        day, _ = self._today()
+        return int(state[1]) if state and state[0] == day else 0
+
+
+# ==================== Rate limiter ====================
+
 class RateLimiter:
-    """Main rate limiter managing user and endpoint limits"""
-    
-    def __init__(self, default_limit: RateLimit = None):
+    """
+    Main rate limiter managing user and endpoint limits
+
+    Limits are enforced with GCRA (user and endpoint) and a sliding-window
+    counter (user+endpoint quotas); each key keeps a fixed-size state in the
+    backend, and idle keys expire from it on their own.
+
+    Without an explicit backend, KOTO_RATE_LIMIT_BACKEND=sqlite puts the state
+    in the shared get_rate_limit_backend() store so all workers enforce one
+    limit; otherwise each limiter keeps its own in-memory state.
+    """
+
+    ENDPOINT_MULTIPLIER = 10    # Default endpoint limit relative to the user limit
+
+    def __init__(self, default_limit: RateLimit = None, backend=None):
         self.default_limit = default_limit or RateLimit(100, 60)
-        
-        # Per-user limiters
-        self.user_limiters: Dict[str, TokenBucket] = defaultdict(
-            lambda: TokenBucket(
-                self.default_limit.requests_per_period,
-                self.default_limit.tokens_per_second
-            )
-        )
-        
-        # Per-endpoint limiters
-        self.endpoint_limiters: Dict[str, TokenBucket] = defaultdict(
-            lambda: TokenBucket(
-                self.default_limit.requests_per_period * 10,  # Higher limit for endpoints
-                self.default_limit.tokens_per_second * 10
-            )
+        if backend is None:
+            backend = get_rate_limit_backend() if _shared_backend_selected() else MemoryBackend()
+        self.backend = backend
+
+        # Custom limits (written rarely; read without locking)
+        self.user_limits: Dict[str, RateLimit] = {}
+        self.endpoint_limits: Dict[str, RateLimit] = {}
+        self.endpoint_default = RateLimit(
+            self.default_limit.requests_per_period * self.ENDPOINT_MULTIPLIER,
+            self.default_limit.period_seconds
         )
-        
+
         # Per-user-endpoint custom quotas
         self.custom_quotas: Dict[Tuple[str, str], RateLimit] = {}
-        
-        # Request history for analytics
-        self.request_history: Dict[str, deque] = defaultdict(
-            lambda: deque(maxlen=10000)
-        )
-        
+
         self.lock = threading.Lock()
-    
+
     def set_user_limit(self, user_id: str, limit: RateLimit):
         """Set custom limit for user"""
-        bucket = TokenBucket(limit.requests_per_period, limit.tokens_per_second)
-        self.user_limiters[user_id] = bucket
-    
+        with self.lock:
+            self.user_limits = {**self.user_limits, user_id: limit}
+
     def set_endpoint_limit(self, endpoint: str, limit: RateLimit):
         """Set custom limit for endpoint"""
-        bucket = TokenBucket(limit.requests_per_period, limit.tokens_per_second)
-        self.endpoint_limiters[endpoint] = bucket
-    
+        with self.lock:
+            self.endpoint_limits = {**self.endpoint_limits, endpoint: limit}
+
     def set_quota(self, user_id: str, endpoint: str, limit: RateLimit):
         """Set custom quota for user+endpoint combination"""
         with self.lock:
-            self.custom_quotas[(user_id, endpoint)] = limit
-    
+            self.custom_quotas = {**self.custom_quotas, (user_id, endpoint): limit}
+
+    def _user_limit(self, user_id: str) -> RateLimit:
+        return self.user_limits.get(user_id, self.default_limit)
+
+    def _endpoint_limit(self, endpoint: str) -> RateLimit:
+        return self.endpoint_limits.get(endpoint, self.endpoint_default)
+
     def check_rate_limit(self, user_id: str, endpoint: str) -> RateLimitResponse:
         """Check if request is allowed"""
         current_time = time.time()
-        
-        # Check user limit
-        user_bucket = self.user_limiters[user_id]
-        user_allowed, user_wait = user_bucket.try_consume(1)
-        
-        # Check endpoint limit
-        endpoint_bucket = self.endpoint_limiters[endpoint]
-        endpoint_allowed, endpoint_wait = endpoint_bucket.try_consume(1)
-        
-        # Check custom quota
-        quota_allowed = True
-        quota_wait = 0.0
-        
-        with self.lock:
-            if (user_id, endpoint) in self.custom_quotas:
-                # Use sliding window for custom quotas
-                key = (user_id, endpoint)
-                if key not in self.request_history:
-                    self.request_history[key] = deque()
-                
-                quota = self.custom_quotas[key]
-                limit = quota.requests_per_period
-                window = quota.period_seconds
-                
-                # Remove old requests
-                cutoff = current_time - window
-                while self.request_history[key] and self.request_history[key][0] < cutoff:
-                    self.request_history[key].popleft()
-                
-                quota_allowed = len(self.request_history[key]) < limit
-                
-                if quota_allowed:
-                    self.request_history[key].append(current_time)
-                else:
-                    if self.request_history[key]:
-                        oldest = self.request_history[key][0]
-                        quota_wait = (oldest + window) - current_time
-        
-        # Track request
-        with self.lock:
-            key = f"{user_id}:{endpoint}"
-            self.request_history[key].append(current_time)
-        
+        user_limit = self._user_limit(user_id)
+        endpoint_limit = self._endpoint_limit(endpoint)
+        quota = self.custom_quotas.get((user_id, endpoint))
+
+        # A request rejected by a later check gives back what earlier checks consumed
+        user_allowed, user_wait, remaining = self.backend.update(f"user:{user_id}", gcra(user_limit))
+        endpoint_allowed, endpoint_wait = True, 0.0
+        if user_allowed:
+            endpoint_allowed, endpoint_wait, _ = self.backend.update(f"endpoint:{endpoint}", gcra(endpoint_limit))
+            if not endpoint_allowed:
+                self.backend.update(f"user:{user_id}", gcra_refund(user_limit))
+
+        quota_allowed, quota_wait = True, 0.0
+        if user_allowed and endpoint_allowed and quota is not None:
+            quota_allowed, quota_wait, _ = self.backend.update(
+                f"quota:{user_id}:{endpoint}", sliding_window(quota.requests_per_period, quota.period_seconds)
+            )
+            if not quota_allowed:
+                self.backend.update(f"user:{user_id}", gcra_refund(user_limit))
+                self.backend.update(f"endpoint:{endpoint}", gcra_refund(endpoint_limit))
+
         # Determine if request is allowed
         allowed = user_allowed and endpoint_allowed and quota_allowed
-        
+
         if not allowed:
             wait_time = max(user_wait, endpoint_wait, quota_wait)
             reset_time = current_time + wait_time
-            
+
             return RateLimitResponse(
                 allowed=False,
                 retry_after_seconds=wait_time,
                 reset_timestamp=reset_time,
                 error_message=f"Rate limit exceeded. Retry after {wait_time:.1f}s"
             )
-        
-        # Calculate remaining
-        user_status = user_bucket.get_status()
-        remaining = int(user_status["available_tokens"])
-        limit = user_status["capacity"]
-        
+
+        # Track request (fixed-size counter per user+endpoint for usage reports)
+        self.backend.update(
+            f"usage:{user_id}:{endpoint}", sliding_window(math.inf, self.default_limit.period_seconds)
+        )
+
         return RateLimitResponse(
             allowed=True,
             requests_remaining=remaining,
-            requests_limit=limit,
+            requests_limit=user_limit.burst_size or user_limit.requests_per_period,
             reset_timestamp=current_time + self.default_limit.period_seconds
         )
-    
+
+    def _available(self, key: str, limit: RateLimit) -> float:
+        """Tokens currently available for a GCRA key"""
+        interval = limit.period_seconds / limit.requests_per_period
+        capacity = limit.burst_size or limit.requests_per_period
+        state = self.backend.get(key)
+        if not state:
+            return float(capacity)
+        return max(0.0, capacity - max(0.0, state[0] - time.time()) / interval)
+
     def get_user_usage(self, user_id: str, endpoint: Optional[str] = None) -> Dict[str, QuotaUsage]:
         """Get usage statistics for user"""
         usage = {}
-        
-        current_time = time.time()
-        
+
         # User overall usage
-        user_bucket = self.user_limiters[user_id]
-        user_status = user_bucket.get_status()
-        used = user_status["capacity"] - int(user_status["available_tokens"])
-        
+        user_limit = self._user_limit(user_id)
+        capacity = user_limit.burst_size or user_limit.requests_per_period
+        used = capacity - int(self._available(f"user:{user_id}", user_limit))
+
         usage["overall"] = QuotaUsage(
             user_id=user_id,
             endpoint="*",
             requests_made=used,
-            requests_limit=int(user_status["capacity"]),
+            requests_limit=capacity,
             reset_time=(datetime.now() + timedelta(seconds=self.default_limit.period_seconds)).isoformat(),
-            percentage_used=(used / user_status["capacity"] * 100) if user_status["capacity"] > 0 else 0
+            percentage_used=(used / capacity * 100) if capacity > 0 else 0
         )
-        
+
         # Per-endpoint usage
         if endpoint:
-            key = f"{user_id}:{endpoint}"
-            history = self.request_history.get(key, deque())
-            cutoff = current_time - self.default_limit.period_seconds
-            requests_in_window = sum(1 for t in history if t > cutoff)
-            
+            counted = self.backend.update(
+                f"usage:{user_id}:{endpoint}",
+                sliding_window(math.inf, self.default_limit.period_seconds, cost=0)
+            )
+            requests_in_window = int(round(counted[2]))
+
             usage[endpoint] = QuotaUsage(
                 user_id=user_id,
                 endpoint=endpoint,
                 requests_made=requests_in_window,
-                requests_limit=int(self.user_limiters[user_id].capacity),
+                requests_limit=capacity,
                 reset_time=(datetime.now() + timedelta(seconds=self.default_limit.period_seconds)).isoformat(),
-                percentage_used=(requests_in_window / self.user_limiters[user_id].capacity * 100)
+                percentage_used=(requests_in_window / capacity * 100)
             )
-        
+
         return usage
 
 
@@ -2,77 +2,113 @@
 # -*- coding: utf-8 -*-
 """
 本地提醒管理器
-- 持久化到 workspace/reminders/reminders.json
+- 持久化到 workspace/reminders/reminders.db（旧版 reminders.json 首次启动时迁移）
+- 通过共享定时服务（timer_service）按时触发，不再每条提醒一个线程
 - 通过 win10toast 在 Windows 右下角发送系统通知
 - 支持一次性提醒，重启后自动恢复未来的提醒
 """
 import json
 import os
-import threading
+import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 
 try:
     from web.windows_notifier import show_toast
+    from web.sqlite_pool import get_database
+    from web.timer_service import TimerJob, TimerService, get_timer_service
 except ImportError:
     from windows_notifier import show_toast
+    from sqlite_pool import get_database
+    from timer_service import TimerJob, TimerService, get_timer_service
 
 
 class ReminderManager:
-    def __init__(self):
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        project_root = os.path.dirname(script_dir)
-        self.reminders_dir = os.path.join(project_root, 'workspace', 'reminders')
+    TIMER_KIND = "reminder"
+    EXPIRE_AFTER = 60          # 超过触发时间这么多秒（如关机期间）不再弹出，标记为已过期
+
+    def __init__(self, reminders_dir: Optional[str] = None, timer_service: Optional[TimerService] = None):
+        if reminders_dir is None:
+            script_dir = os.path.dirname(os.path.abspath(__file__))
+            project_root = os.path.dirname(script_dir)
+            reminders_dir = os.path.join(project_root, 'workspace', 'reminders')
+        self.reminders_dir = reminders_dir
         os.makedirs(self.reminders_dir, exist_ok=True)
         self.reminders_file = os.path.join(self.reminders_dir, 'reminders.json')
+        self.db_path = os.path.join(self.reminders_dir, 'reminders.db')
 
         self.reminders: Dict[str, Dict] = {}
-        self.timers: Dict[str, threading.Timer] = {}
+        self.timer_service = timer_service or get_timer_service()
         self._load()
+        self.timer_service.register_handler(self.TIMER_KIND, self._on_timer)
         self._restore_pending()
 
     def _load(self):
-        if os.path.exists(self.reminders_file):
-            try:
-                with open(self.reminders_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.reminders = data if isinstance(data, dict) else {}
-                print(f"[提醒] 已加载 {len(self.reminders)} 条提醒")
-            except Exception as e:
-                print(f"[提醒] 加载失败: {e}")
-
-    def _save(self):
         try:
-            with open(self.reminders_file, 'w', encoding='utf-8') as f:
-                json.dump(self.reminders, f, ensure_ascii=False, indent=2)
+            db = get_database(self.db_path)
+            db.write(lambda conn: conn.execute(
+                "CREATE TABLE IF NOT EXISTS reminders (id TEXT PRIMARY KEY, data TEXT NOT NULL)"), wait=True)
+            conn = db.connect()
+            try:
+                rows = conn.execute("SELECT data FROM reminders").fetchall()
+            finally:
+                conn.close()
+            self.reminders = {r['id']: r for r in (json.loads(row[0]) for row in rows)}
+            if not self.reminders and os.path.exists(self.reminders_file):
+                self._migrate_json()
+            print(f"[提醒] 已加载 {len(self.reminders)} 条提醒")
         except Exception as e:
-            print(f"[提醒] 保存失败: {e}")
-
-    def _schedule_timer(self, reminder_id: str, delay: float):
-        if delay <= 0:
-            delay = 0.5
-
-        def _fire():
-            reminder = self.reminders.get(reminder_id)
-            if not reminder:
-                return
-            title = reminder.get('title', '提醒')
-            message = reminder.get('message', '')
-            icon = reminder.get('icon')
-            show_toast(title, message, duration=6, icon_path=icon)
-            reminder['status'] = 'sent'
-            reminder['sent_at'] = datetime.now().isoformat()
-            self._save()
-
-        timer = threading.Timer(delay, _fire)
-        timer.daemon = True
-        timer.start()
-        self.timers[reminder_id] = timer
+            print(f"[提醒] 加载失败: {e}")
+
+    def _migrate_json(self):
+        """把旧版 reminders.json 导入数据库，原文件改名保留"""
+        with open(self.reminders_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            return
+        self.reminders = data
+        for reminder in data.values():
+            self._save(reminder)
+        get_database(self.db_path).flush()
+        os.replace(self.reminders_file, self.reminders_file + '.migrated')
+
+    def _save(self, reminder: Dict):
+        """写入单条提醒（后台批量提交）"""
+        row = (reminder['id'], json.dumps(reminder, ensure_ascii=False))
+        future = get_database(self.db_path).write(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO reminders (id, data) VALUES (?, ?)", row))
+        future.add_done_callback(self._report_save_error)
+
+    @staticmethod
+    def _report_save_error(future):
+        if future.exception() is not None:
+            print(f"[提醒] 保存失败: {future.exception()}")
+
+    def _schedule_timer(self, reminder_id: str, remind_at: datetime):
+        self.timer_service.schedule(reminder_id, self.TIMER_KIND, remind_at,
+                                    payload={'reminder_id': reminder_id})
+
+    def _on_timer(self, job: TimerJob):
+        reminder = self.reminders.get(job.payload.get('reminder_id'))
+        if not reminder or reminder.get('status') != 'scheduled':
+            return
+        if time.time() - job.fire_at > self.EXPIRE_AFTER:
+            # 过期很久，标记已过期
+            reminder['status'] = 'expired'
+            self._save(reminder)
+            return
+        title = reminder.get('title', '提醒')
+        message = reminder.get('message', '')
+        icon = reminder.get('icon')
+        show_toast(title, message, duration=6, icon_path=icon)
+        reminder['status'] = 'sent'
+        reminder['sent_at'] = datetime.now().isoformat()
+        self._save(reminder)
 
     def _restore_pending(self):
-        now = datetime.now()
+        """定时服务中没有对应作业的待发提醒（如旧版迁移而来）重新调度"""
         for rid, reminder in self.reminders.items():
-            if reminder.get('status') == 'sent':
+            if reminder.get('status') not in (None, 'scheduled') or self.timer_service.get_job(rid):
                 continue
             ts = reminder.get('time')
             if not ts:
@@ -81,14 +117,10 @@ class ReminderManager:
                 remind_at = datetime.fromisoformat(ts)
             except Exception:
                 continue
-            delay = (remind_at - now).total_seconds()
-            if delay < -60:
-                # 过期很久，标记已过期
-                reminder['status'] = 'expired'
-            else:
+            if reminder.get('status') is None:
                 reminder['status'] = 'scheduled'
-                self._schedule_timer(rid, delay)
-        self._save()
+                self._save(reminder)
+            self._schedule_timer(rid, remind_at)
 
     def add_reminder(self, title: str, message: str, remind_at: datetime, icon: Optional[str] = None) -> str:
         reminder_id = f"reminder_{remind_at.strftime('%Y%m%d_%H%M%S_%f')}"
@@ -100,9 +132,8 @@ class ReminderManager:
             'status': 'scheduled',
             'icon': icon,
         }
-        self._save()
-        delay = (remind_at - datetime.now()).total_seconds()
-        self._schedule_timer(reminder_id, delay)
+        self._save(self.reminders[reminder_id])
+        self._schedule_timer(reminder_id, remind_at)
         print(f"[提醒] 已创建提醒: {title} at {remind_at}")
         return reminder_id
 
@@ -111,15 +142,10 @@ class ReminderManager:
         return self.add_reminder(title, message, remind_at, icon)
 
     def cancel_reminder(self, reminder_id: str) -> bool:
-        if reminder_id in self.timers:
-            try:
-                self.timers[reminder_id].cancel()
-            except Exception:
-                pass
-            self.timers.pop(reminder_id, None)
+        self.timer_service.cancel(reminder_id)
         if reminder_id in self.reminders:
             self.reminders[reminder_id]['status'] = 'cancelled'
-            self._save()
+            self._save(self.reminders[reminder_id])
             return True
         return False
 
@@ -130,7 +156,9 @@ class ReminderManager:
         expired = [rid for rid, r in self.reminders.items() if r.get('status') in ('sent', 'expired')]
         for rid in expired:
             self.reminders.pop(rid, None)
-        self._save()
+        if expired:
+            get_database(self.db_path).write(lambda conn: conn.executemany(
+                "DELETE FROM reminders WHERE id = ?", [(rid,) for rid in expired]))
         return len(expired)
 
 
@@ -5,24 +5,33 @@
 支持全局搜索、文件搜索、聊天记录搜索、笔记搜索
 """
 import os
-import json
-import re
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict
 from datetime import datetime
 
+try:
+    from search_index import SearchIndex
+except ImportError:
+    from web.search_index import SearchIndex
+
 
 class SearchEngine:
-    """智能搜索引擎"""
+    """智能搜索引擎（查询走 SearchIndex 倒排索引，不再扫描磁盘）"""
+    
+    SOURCES = ('files', 'chats', 'notes', 'clipboard')
     
-    def __init__(self):
+    def __init__(self, index: SearchIndex = None):
         script_dir = os.path.dirname(os.path.abspath(__file__))
         self.project_root = os.path.dirname(script_dir)
         self.workspace_root = os.path.join(self.project_root, 'workspace')
         self.chats_root = os.path.join(self.project_root, 'chats')
+        self.index = index or SearchIndex(self.workspace_root, self.chats_root)
+        self._executor = ThreadPoolExecutor(max_workers=len(self.SOURCES),
+                                            thread_name_prefix="search")
     
     def search_all(self, query: str, max_results: int = 50) -> Dict[str, List]:
         """
-        全局搜索
+        全局搜索：四个数据源并发查询，并按相关度合并
         
         Args:
             query: 搜索关键词
@@ -33,78 +42,46 @@ class SearchEngine:
                 'files': [...],
                 'chats': [...],
                 'notes': [...],
-                'clipboard': [...]
+                'clipboard': [...],
+                'ranked': [...]   # 跨类别按 score 合并的前 max_results 条，带 'source'
             }
         """
-        results = {
-            'files': self.search_files(query, max_results),
-            'chats': self.search_chats(query, max_results),
-            'notes': self.search_notes(query, max_results),
-            'clipboard': self.search_clipboard(query, max_results)
+        self.index.ensure_fresh()
+        searchers = {
+            'files': self.search_files,
+            'chats': self.search_chats,
+            'notes': self.search_notes,
+            'clipboard': self.search_clipboard,
         }
+        futures = {source: self._executor.submit(fn, query, max_results)
+                   for source, fn in searchers.items()}
+        results: Dict[str, List] = {}
+        for source, future in futures.items():
+            try:
+                results[source] = future.result()
+            except Exception as e:
+                print(f"[搜索] {source} 搜索失败: {e}")
+                results[source] = []
+        
+        merged = [dict(item, source=source) for source in self.SOURCES for item in results[source]]
+        merged.sort(key=lambda x: x.get('score', 0), reverse=True)
+        results['ranked'] = merged[:max_results]
         
-        total = sum(len(v) for v in results.values())
+        total = sum(len(results[s]) for s in self.SOURCES)
         print(f"[搜索] 全局搜索完成: '{query}' 找到 {total} 个结果")
         
         return results
     
     def search_files(self, query: str, max_results: int = 20) -> List[Dict]:
         """
-        搜索文件内容
+        搜索文件名与文件内容
         
         Args:
             query: 搜索关键词
             max_results: 最大结果数
         """
-        results = []
-        query_lower = query.lower()
-        
-        # 搜索 workspace 目录
-        for root, dirs, files in os.walk(self.workspace_root):
-            for file in files:
-                if len(results) >= max_results:
-                    break
-                
-                file_path = os.path.join(root, file)
-                
-                # 文件名匹配
-                if query_lower in file.lower():
-                    results.append({
-                        'type': 'filename',
-                        'path': file_path,
-                        'name': file,
-                        'match': file
-                    })
-                    continue
-                
-                # 文件内容匹配 (只搜索文本文件)
-                if file.endswith(('.txt', '.md', '.py', '.json', '.csv')):
-                    try:
-                        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                            content = f.read()
-                            
-                            if query_lower in content.lower():
-                                # 找到匹配的行
-                                lines = content.split('\n')
-                                match_lines = [
-                                    (i+1, line) for i, line in enumerate(lines)
-                                    if query_lower in line.lower()
-                                ]
-                                
-                                if match_lines:
-                                    line_num, match_line = match_lines[0]
-                                    
-                                    results.append({
-                                        'type': 'content',
-                                        'path': file_path,
-                                        'name': file,
-                                        'line': line_num,
-                                        'match': match_line.strip()[:100]
-                                    })
-                    except:
-                        pass
-        
-        return results
+        self.index.ensure_fresh()
+        return self.index.search_files(query, max_results)
     
     def search_chats(self, query: str, max_results: int = 20) -> List[Dict]:
         """
@@ -114,105 +91,43 @@ class SearchEngine:
             query: 搜索关键词
             max_results: 最大结果数
         """
-        results = []
-        query_lower = query.lower()
-        
-        if not os.path.exists(self.chats_root):
-            return results
-        
-        for file in os.listdir(self.chats_root):
-            if not file.endswith('.json'):
-                continue
-            
-            file_path = os.path.join(self.chats_root, file)
-            
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    chat_data = json.load(f)
-                    
-                    messages = chat_data.get('messages', [])
-                    
-                    for msg in messages:
-                        if len(results) >= max_results:
-                            break
-                        
-                        content = msg.get('content', '')
-                        role = msg.get('role', 'user')
-                        timestamp = msg.get('timestamp', '')
-                        
-                        if query_lower in content.lower():
-                            results.append({
-                                'type': 'chat',
-                                'file': file,
-                                'role': role,
-                                'content': content[:200] + '...' if len(content) > 200 else content,
-                                'timestamp': timestamp,
-                                'match': self._extract_match_context(content, query, 100)
-                            })
-            except:
-                pass
-        
-        # 按时间倒序
-        results.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
-        
-        return results
+        self.index.ensure_fresh()
+        return [
+            {
+                'type': 'chat',
+                'file': row['chat_file'],
+                'role': row['role'],
+                'content': self._truncate(row['content']),
+                'timestamp': row['timestamp'],
+                'match': row['match'],
+                'score': row['score']
+            }
+            for row in self.index.search('chats', query, max_results)
+        ]
     
     def search_notes(self, query: str, max_results: int = 20) -> List[Dict]:
         """
-        搜索笔记
+        搜索笔记（标题、内容、标签、分类）
         
         Args:
             query: 搜索关键词
             max_results: 最大结果数
         """
-        results = []
-        query_lower = query.lower()
-        
-        notes_dir = os.path.join(self.workspace_root, 'notes')
-        
-        if not os.path.exists(notes_dir):
-            return results
-        
-        # 搜索笔记索引
-        index_file = os.path.join(notes_dir, 'notes_index.json')
-        
-        if os.path.exists(index_file):
-            try:
-                with open(index_file, 'r', encoding='utf-8') as f:
-                    notes_index = json.load(f)
-                    
-                    for note_id, note_data in notes_index.items():
-                        if len(results) >= max_results:
-                            break
-                        
-                        title = note_data.get('title', '')
-                        content = note_data.get('content', '')
-                        tags = note_data.get('tags', [])
-                        category = note_data.get('category', '')
-                        
-                        # 匹配标题、内容、标签、分类
-                        if (query_lower in title.lower() or
-                            query_lower in content.lower() or
-                            query_lower in ' '.join(tags).lower() or
-                            query_lower in category.lower()):
-                            
-                            results.append({
-                                'type': 'note',
-                                'id': note_id,
-                                'title': title,
-                                'category': category,
-                                'tags': tags,
-                                'content': content[:200] + '...' if len(content) > 200 else content,
-                                'created_at': note_data.get('created_at', ''),
-                                'match': self._extract_match_context(content, query, 100)
-                            })
-            except:
-                pass
-        
-        # 按创建时间倒序
-        results.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-        
-        return results
+        self.index.ensure_fresh()
+        return [
+            {
+                'type': 'note',
+                'id': row['note_id'],
+                'title': row['title'],
+                'category': row['category'],
+                'tags': row['tags'].split() if row['tags'] else [],
+                'content': self._truncate(row['content']),
+                'created_at': row['created_at'],
+                'match': row['match'],
+                'score': row['score']
+            }
+            for row in self.index.search('notes', query, max_results)
+        ]
     
     def search_clipboard(self, query: str, max_results: int = 20) -> List[Dict]:
         """
@@ -222,73 +137,23 @@ class SearchEngine:
             query: 搜索关键词
             max_results: 最大结果数
         """
-        results = []
-        query_lower = query.lower()
-        
-        clipboard_file = os.path.join(self.workspace_root, 'clipboard', 'history.json')
-        
-        if not os.path.exists(clipboard_file):
-            return results
-        
-        try:
-            with open(clipboard_file, 'r', encoding='utf-8') as f:
-                clipboard_history = json.load(f)
-                
-                for item in clipboard_history:
-                    if len(results) >= max_results:
-                        break
-                    
-                    content = item.get('content', '')
-                    content_type = item.get('type', 'text')
-                    timestamp = item.get('timestamp', '')
-                    
-                    if query_lower in content.lower():
-                        results.append({
-                            'type': 'clipboard',
-                            'content': content[:200] + '...' if len(content) > 200 else content,
-                            'content_type': content_type,
-                            'timestamp': timestamp,
-                            'match': self._extract_match_context(content, query, 100)
-                        })
-        except:
-            pass
-        
-        # 按时间倒序
-        results.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
-        
-        return results
+        self.index.ensure_fresh()
+        return [
+            {
+                'type': 'clipboard',
+                'content': self._truncate(row['content']),
+                'content_type': row['content_type'],
+                'timestamp': row['timestamp'],
+                'match': row['match'],
+                'score': row['score']
+            }
+            for row in self.index.search('clipboard', query, max_results)
+        ]
     
-    def _extract_match_context(self, text: str, query: str, context_length: int = 100) -> str:
-        """
-        提取匹配上下文
-        
-        Args:
-            text: 原文本
-            query: 关键词
-            context_length: 上下文长度
-        """
-        query_lower = query.lower()
-        text_lower = text.lower()
-        
-        # 找到第一个匹配位置
-        index = text_lower.find(query_lower)
-        
-        if index == -1:
-            return text[:context_length]
-        
-        # 计算上下文范围
-        start = max(0, index - context_length // 2)
-        end = min(len(text), index + len(query) + context_length // 2)
-        
-        context = text[start:end]
-        
-        # 添加省略号
-        if start > 0:
-            context = '...' + context
-        if end < len(text):
-            context = context + '...'
-        
-        return context
+    @staticmethod
+    def _truncate(text: str, length: int = 200) -> str:
+        text = text or ''
+        return text[:length] + '...' if len(text) > length else text
     
     def search_by_date_range(
         self,
@@ -368,4 +233,5 @@ def get_search_engine() -> SearchEngine:
     global _search_engine
     if _search_engine is None:
         _search_engine = SearchEngine()
+        _search_engine.index.start_background_refresh()
     return _search_engine
@@ -0,0 +1,469 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+统一搜索索引 - 文件 / 聊天记录 / 笔记 / 剪贴板的持久化倒排索引
+
+所有数据源共用一个 SQLite 数据库：
+- 文件内容：复用 FileIndexer 的 file_index 表（增量、按 (mtime, size) 检测变化）
+- 文件名：file_names 表（包含非文本文件）
+- 聊天记录（JSONL 会话日志或旧版 JSON）/ 笔记 / 剪贴板：各自一张表 + 外部内容 FTS5 表
+
+source_state 记录每个源文件的 (mtime, size)，refresh() 只重新解析变化的文件；
+可由后台线程定期执行 mtime 扫描，查询时不再遍历磁盘。
+"""
+
+import os
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    from chat_store import LOG_SUFFIX, read_messages
+    from file_indexer import (FileIndexer, WORD_SEPARATOR, build_match_query,
+                              default_tokenize_mode, segment_text)
+except ImportError:
+    from web.chat_store import LOG_SUFFIX, read_messages
+    from web.file_indexer import (FileIndexer, WORD_SEPARATOR, build_match_query,
+                                  default_tokenize_mode, segment_text)
+
+
+# 各数据源的表结构：(内容表, FTS 表, 可搜索列, 排序列, 摘要列)
+_SOURCE_TABLES = {
+    'chats': ('chat_messages', 'chat_messages_fts', ('content',), 'timestamp', 'content'),
+    'notes': ('note_entries', 'note_entries_fts', ('title', 'content', 'tags', 'category'),
+              'created_at', 'content'),
+    'clipboard': ('clipboard_entries', 'clipboard_entries_fts', ('content',), 'timestamp', 'content'),
+    'file_names': ('file_names', 'file_names_fts', ('name',), 'name', 'name'),
+}
+
+_NOTE_INDEX_FILES = ('notes_index.json', '_index.json')
+
+
+def _escape_like(term: str) -> str:
+    return '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def _message_text(msg: Dict[str, Any]) -> str:
+    """兼容 {"content": str} 与 {"parts": [...]} 两种消息格式"""
+    content = msg.get('content')
+    if isinstance(content, str):
+        return content
+    parts = msg.get('parts') or []
+    return '\n'.join(p if isinstance(p, str) else p.get('text', '')
+                     for p in parts if isinstance(p, (str, dict)))
+
+
+class SearchIndex:
+    """文件、聊天、笔记、剪贴板的统一增量索引"""
+
+    REFRESH_INTERVAL = 60        # 后台 mtime 扫描间隔（秒）
+
+    def __init__(self, workspace_root: str, chats_root: str,
+                 db_path: str = None, tokenize_mode: str = None):
+        """
+        Args:
+            workspace_root: 工作目录（文件、notes、clipboard 所在位置）
+            chats_root: 聊天记录目录
+            db_path: 索引数据库路径（默认 workspace/_index/search_index.db）
+            tokenize_mode: 全文分词模式，见 FileIndexer
+        """
+        self.workspace_root = workspace_root
+        self.chats_root = chats_root
+        self.notes_dir = os.path.join(workspace_root, 'notes')
+        self.clipboard_file = os.path.join(workspace_root, 'clipboard', 'history.json')
+
+        if db_path is None:
+            db_path = os.path.join(workspace_root, '_index', 'search_index.db')
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.tokenize_mode = tokenize_mode or default_tokenize_mode()
+        # 文件内容索引与本索引共用同一数据库
+        self.file_indexer = FileIndexer(workspace_root, db_path=str(self.db_path),
+                                        tokenize_mode=self.tokenize_mode)
+
+        self.last_refresh: Optional[float] = None
+        self._refresh_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._init_database()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_database(self):
+        """初始化各数据源的表；分词模式变化时重建并强制重新索引"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+
+        row = cursor.execute("SELECT value FROM index_meta WHERE key = 'search_fts_mode'").fetchone()
+        if not row or row[0] != self.tokenize_mode:
+            for table, fts, _, _, _ in _SOURCE_TABLES.values():
+                cursor.execute(f"DROP TABLE IF EXISTS {fts}")
+                cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            cursor.execute("DROP TABLE IF EXISTS source_state")
+
+        cursor.executescript("""
+            CREATE TABLE IF NOT EXISTS source_state (
+                source TEXT NOT NULL,
+                key TEXT NOT NULL,
+                mtime REAL,
+                size INTEGER,
+                PRIMARY KEY (source, key)
+            );
+            CREATE TABLE IF NOT EXISTS chat_messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_file TEXT NOT NULL,
+                seq INTEGER,
+                role TEXT,
+                timestamp TEXT,
+                content TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_chat_messages_file ON chat_messages(chat_file);
+            CREATE TABLE IF NOT EXISTS note_entries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                origin TEXT NOT NULL,
+                note_id TEXT,
+                title TEXT,
+                content TEXT,
+                tags TEXT,
+                category TEXT,
+                created_at TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_note_entries_origin ON note_entries(origin);
+            CREATE TABLE IF NOT EXISTS clipboard_entries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                seq INTEGER,
+                content TEXT,
+                content_type TEXT,
+                timestamp TEXT
+            );
+            CREATE TABLE IF NOT EXISTS file_names (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT UNIQUE NOT NULL,
+                name TEXT NOT NULL
+            );
+        """)
+
+        tokenizer = "trigram" if self.tokenize_mode == "trigram" else "unicode61"
+        for table, fts, columns, _, _ in _SOURCE_TABLES.values():
+            cols = ', '.join(columns)
+            new_cols = ', '.join(f'new.{c}' for c in columns)
+            old_cols = ', '.join(f'old.{c}' for c in columns)
+            cursor.executescript(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS {fts}
+                USING fts5({cols}, content='{table}', content_rowid='id', tokenize='{tokenizer}');
+                CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON {table} BEGIN
+                    INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols});
+                END;
+                CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON {table} BEGIN
+                    INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+                END;
+            """)
+
+        cursor.execute("INSERT OR REPLACE INTO index_meta (key, value) VALUES ('search_fts_mode', ?)",
+                       (self.tokenize_mode,))
+        conn.commit()
+        conn.close()
+
+    # ==================== 增量刷新 ====================
+
+    def refresh(self, sources: Tuple[str, ...] = ('files', 'chats', 'notes', 'clipboard'),
+                workers: Optional[int] = None) -> Dict[str, Any]:
+        """
+        按 mtime 扫描各数据源，只重新解析发生变化的文件
+
+        Returns:
+            {source: 变化的条目数}
+        """
+        stats: Dict[str, Any] = {}
+        with self._refresh_lock:
+            conn = self._connect()
+            try:
+                if 'files' in sources:
+                    stats['files'] = self._refresh_files(conn, workers)
+                if 'chats' in sources:
+                    stats['chats'] = self._refresh_chats(conn)
+                if 'notes' in sources:
+                    stats['notes'] = self._refresh_notes(conn)
+                if 'clipboard' in sources:
+                    stats['clipboard'] = self._refresh_clipboard(conn)
+            finally:
+                conn.close()
+            self.last_refresh = time.time()
+        return stats
+
+    def ensure_fresh(self):
+        """首次查询前同步构建索引；之后由后台线程保持更新"""
+        if self.last_refresh is None:
+            self.refresh()
+
+    def start_background_refresh(self, interval: float = None):
+        """启动后台 mtime 扫描线程（守护线程）"""
+        if self._thread and self._thread.is_alive():
+            return
+        interval = interval or self.REFRESH_INTERVAL
+        self._stop_event.clear()
+
+        def _loop():
+            while not self._stop_event.is_set():
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"[SearchIndex] 后台刷新失败: {e}")
+                self._stop_event.wait(interval)
+
+        self._thread = threading.Thread(target=_loop, name="SearchIndexRefresh", daemon=True)
+        self._thread.start()
+
+    def stop_background_refresh(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _load_state(self, conn: sqlite3.Connection, source: str) -> Dict[str, Tuple[float, int]]:
+        return {row['key']: (row['mtime'], row['size']) for row in conn.execute(
+            "SELECT key, mtime, size FROM source_state WHERE source = ?", (source,))}
+
+    def _save_state(self, conn: sqlite3.Connection, source: str, key: str, st: Optional[os.stat_result]):
+        if st is None:
+            conn.execute("DELETE FROM source_state WHERE source = ? AND key = ?", (source, key))
+        else:
+            conn.execute("INSERT OR REPLACE INTO source_state (source, key, mtime, size) VALUES (?, ?, ?, ?)",
+                         (source, key, st.st_mtime, st.st_size))
+
+    @staticmethod
+    def _load_json(path: str) -> Any:
+        try:
+            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                return json.load(f)
+        except Exception:
+            return None
+
+    def _segment(self, text: Any) -> str:
+        return segment_text(text if isinstance(text, str) else str(text or ''), self.tokenize_mode)
+
+    def _refresh_files(self, conn: sqlite3.Connection, workers: Optional[int]) -> int:
+        """文件内容交给 FileIndexer 增量索引；文件名（含非文本文件）单独维护"""
+        if not os.path.isdir(self.workspace_root):
+            return 0
+        result = self.file_indexer.index_directory(self.workspace_root, workers=workers)
+        changed = result.get('indexed', 0) + result.get('removed', 0)
+
+        existing = {row['path'] for row in conn.execute("SELECT path FROM file_names")}
+        seen = set()
+        added = []
+        index_dir = str(self.db_path.parent)
+        for path, name in self._scan_names(self.workspace_root, skip=index_dir):
+            seen.add(path)
+            if path not in existing:
+                added.append((path, self._segment(name)))
+        gone = [(p,) for p in existing - seen]
+        if added:
+            conn.executemany("INSERT OR IGNORE INTO file_names (path, name) VALUES (?, ?)", added)
+        if gone:
+            conn.executemany("DELETE FROM file_names WHERE path = ?", gone)
+        conn.commit()
+        return changed + len(added) + len(gone)
+
+    @staticmethod
+    def _scan_names(root: str, skip: str) -> Iterator[Tuple[str, str]]:
+        """用 os.scandir 列出所有文件名（不 stat、不读取内容）"""
+        stack = [root]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if entry.path != skip:
+                                    stack.append(entry.path)
+                            elif entry.is_file():
+                                yield str(Path(entry.path).resolve()), entry.name
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+
+    def _refresh_chats(self, conn: sqlite3.Connection) -> int:
+        """重新解析 mtime/size 变化的聊天文件"""
+        state = self._load_state(conn, 'chats')
+        seen = set()
+        changed = 0
+        if os.path.isdir(self.chats_root):
+            with os.scandir(self.chats_root) as it:
+                for entry in it:
+                    if not entry.name.endswith(('.json', LOG_SUFFIX)) or not entry.is_file():
+                        continue
+                    seen.add(entry.name)
+                    st = entry.stat()
+                    if state.get(entry.name) == (st.st_mtime, st.st_size):
+                        continue
+                    if entry.name.endswith(LOG_SUFFIX):
+                        messages, _ = read_messages(entry.path)
+                    else:
+                        data = self._load_json(entry.path)
+                        if data is None:
+                            continue
+                        messages = data.get('messages', []) if isinstance(data, dict) else data
+                    conn.execute("DELETE FROM chat_messages WHERE chat_file = ?", (entry.name,))
+                    conn.executemany(
+                        "INSERT INTO chat_messages (chat_file, seq, role, timestamp, content) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        [(entry.name, i, msg.get('role', 'user'), msg.get('timestamp', ''),
+                          self._segment(_message_text(msg)))
+                         for i, msg in enumerate(messages or []) if isinstance(msg, dict)])
+                    self._save_state(conn, 'chats', entry.name, st)
+                    conn.commit()
+                    changed += 1
+        for name in set(state) - seen:
+            conn.execute("DELETE FROM chat_messages WHERE chat_file = ?", (name,))
+            self._save_state(conn, 'chats', name, None)
+            changed += 1
+        conn.commit()
+        return changed
+
+    def _refresh_notes(self, conn: sqlite3.Connection) -> int:
+        """笔记索引文件（dict 或 list 格式）变化时整体替换该文件的条目"""
+        state = self._load_state(conn, 'notes')
+        changed = 0
+        for name in _NOTE_INDEX_FILES:
+            path = os.path.join(self.notes_dir, name)
+            st = os.stat(path) if os.path.isfile(path) else None
+            if st is not None and state.get(name) == (st.st_mtime, st.st_size):
+                continue
+            if st is None and name not in state:
+                continue
+            data = self._load_json(path) if st is not None else None
+            if st is not None and data is None:
+                continue
+            if isinstance(data, dict):
+                notes = [dict(note, id=note_id) for note_id, note in data.items() if isinstance(note, dict)]
+            else:
+                notes = [note for note in (data or []) if isinstance(note, dict)]
+            conn.execute("DELETE FROM note_entries WHERE origin = ?", (name,))
+            conn.executemany(
+                "INSERT INTO note_entries (origin, note_id, title, content, tags, category, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(name, str(note.get('id', '')), self._segment(note.get('title', '')),
+                  self._segment(note.get('content', '')),
+                  self._segment(' '.join(str(t) for t in note.get('tags') or [])),
+                  self._segment(note.get('category', '')), note.get('created_at', ''))
+                 for note in notes])
+            self._save_state(conn, 'notes', name, st)
+            conn.commit()
+            changed += 1
+        return changed
+
+    def _refresh_clipboard(self, conn: sqlite3.Connection) -> int:
+        """剪贴板历史文件变化时整体替换（历史条数有上限）"""
+        state = self._load_state(conn, 'clipboard')
+        key = 'history.json'
+        st = os.stat(self.clipboard_file) if os.path.isfile(self.clipboard_file) else None
+        if st is not None and state.get(key) == (st.st_mtime, st.st_size):
+            return 0
+        if st is None and key not in state:
+            return 0
+        history = self._load_json(self.clipboard_file) if st is not None else []
+        if history is None:
+            return 0
+        conn.execute("DELETE FROM clipboard_entries")
+        conn.executemany(
+            "INSERT INTO clipboard_entries (seq, content, content_type, timestamp) VALUES (?, ?, ?, ?)",
+            [(i, self._segment(item.get('content', '')), item.get('type', 'text'), item.get('timestamp', ''))
+             for i, item in enumerate(history) if isinstance(item, dict)])
+        self._save_state(conn, 'clipboard', key, st)
+        conn.commit()
+        return 1
+
+    # ==================== 查询 ====================
+
+    def search_files(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """文件名命中在前，其后是 FileIndexer 的全文命中"""
+        results = []
+        seen = set()
+        for row in self.search('file_names', query, limit):
+            seen.add(row['path'])
+            results.append({
+                'type': 'filename',
+                'path': row['path'],
+                'name': row['name'],
+                'match': row['name'],
+                'score': row['score'],
+            })
+        if len(results) < limit:
+            for hit in self.file_indexer.search(query, limit=limit):
+                if hit['file_path'] in seen:
+                    continue
+                results.append({
+                    'type': 'content',
+                    'path': hit['file_path'],
+                    'name': hit['file_name'],
+                    'match': hit['match_snippet'][:200],
+                    'score': hit['score'],
+                })
+                if len(results) >= limit:
+                    break
+        return results
+
+    def search(self, source: str, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        在 chats / notes / clipboard / file_names 中搜索
+
+        查询为空时按时间倒序列出最近的条目。
+
+        Returns:
+            行字典列表，额外包含 "match"（摘要）与 "score"（bm25 绝对值，越大越相关）
+        """
+        table, fts, columns, order_col, snippet_col = _SOURCE_TABLES[source]
+        match_expr, like_terms = build_match_query(query, self.tokenize_mode)
+        if (query or '').strip() and not match_expr and not like_terms:
+            return []
+
+        snippet_idx = columns.index(snippet_col)
+        if match_expr:
+            sql = f"""
+                SELECT t.*, snippet({fts}, {snippet_idx}, '**', '**', '...', 32) AS snippet_text,
+                       bm25({fts}) AS score
+                FROM {fts} JOIN {table} t ON t.id = {fts}.rowid
+                WHERE {fts} MATCH ?
+            """
+            params: List[Any] = [match_expr]
+        else:
+            sql = f"SELECT t.*, substr(t.{snippet_col}, 1, 200) AS snippet_text, 0 AS score FROM {table} t WHERE 1 = 1"
+            params = []
+
+        for term in like_terms:
+            sql += " AND (" + " OR ".join(f"t.{c} LIKE ? ESCAPE '\\'" for c in columns) + ")"
+            params.extend([_escape_like(term)] * len(columns))
+
+        sql += " ORDER BY score" if match_expr else f" ORDER BY t.{order_col} DESC"
+        sql += " LIMIT ?"
+        params.append(limit)
+
+        try:
+            conn = self._connect()
+            try:
+                rows = conn.execute(sql, params).fetchall()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"[SearchIndex] 搜索失败 ({source}): {e}")
+            return []
+
+        results = []
+        for row in rows:
+            item = {k: (row[k].replace(WORD_SEPARATOR, '') if isinstance(row[k], str) else row[k])
+                    for k in row.keys()}
+            item['match'] = item.pop('snippet_text') or ''
+            item['score'] = abs(item['score'] or 0)
+            results.append(item)
+        return results
@@ -0,0 +1,335 @@
+"""
+共享 SQLite 存储层 - 连接池、WAL 与批量写入
+
+各模块不再每次调用都 sqlite3.connect()：
+1. 每个数据库文件对应一个 SQLiteDatabase（进程内共享），每个线程复用自己的连接，
+   连接上的预编译语句缓存随之复用
+2. 连接统一设置 WAL、synchronous=NORMAL、busy_timeout 等参数，读写互不阻塞
+3. write() 把小的写操作交给后台写线程，多个写操作合并到一个事务提交
+
+用法:
+    db = get_database("config/user_behavior.db")
+    conn = db.connect()          # 与 sqlite3 连接用法一致，close() 归还到池
+    db.write(lambda conn: conn.execute("INSERT ..."))           # 写后即返回
+    row_id = db.write(insert_fn, wait=True)                     # 等待所在批次提交
+"""
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",
+)
+BUSY_TIMEOUT = 5.0
+CACHED_STATEMENTS = 256
+
+
+class PooledConnection:
+    """
+    借出的连接代理，接口与 sqlite3.Connection 一致
+
+    row_factory 只作用于本次借出（通过游标设置），不会影响同线程的其他使用者；
+    close() 会回滚未提交的修改（与关闭真实连接的效果相同）并归还连接。
+    """
+
+    def __init__(self, db: "SQLiteDatabase", raw: sqlite3.Connection, generation: int):
+        self._db = db
+        self._raw = raw
+        self._generation = generation
+        self.row_factory = None
+
+    def cursor(self) -> sqlite3.Cursor:
+        cursor = self._raw.cursor()
+        cursor.row_factory = self.row_factory
+        return cursor
+
+    def execute(self, sql: str, parameters=()) -> sqlite3.Cursor:
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql: str, seq) -> sqlite3.Cursor:
+        return self.cursor().executemany(sql, seq)
+
+    def executescript(self, script: str) -> sqlite3.Cursor:
+        return self.cursor().executescript(script)
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def close(self):
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._db._release(raw, self._generation)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # 与 sqlite3.Connection 相同：提交或回滚，但不关闭
+        if exc_type is None:
+            self._raw.commit()
+        else:
+            self._raw.rollback()
+        return False
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get("_raw")
+        if raw is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return getattr(raw, name)
+
+
+class SQLiteDatabase:
+    """单个数据库文件的连接池与批量写线程"""
+
+    BATCH_SIZE = 500          # 一个写事务最多合并的操作数
+    MAX_IDLE_PER_THREAD = 4
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._wal_ready = False
+        # 数据库文件被删除或替换后旧连接全部作废：按代号区分，空闲连接统一登记以便关闭
+        self._file_key = None
+        self._generation = 0
+        self._idle: set = set()
+
+        self._queue: deque = deque()
+        self._cond = threading.Condition()
+        self._pending = 0          # 已入队但尚未提交的写操作数
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        self._writer_conn: Optional[sqlite3.Connection] = None
+        self._writer_generation = 0
+
+        self.stats = {"connections": 0, "batches": 0, "writes": 0}
+
+    # ── 连接池 ──
+
+    def _stat_key(self):
+        try:
+            st = os.stat(self.db_path)
+        except OSError:
+            return None
+        return st.st_dev, st.st_ino
+
+    def _check_file(self):
+        """数据库文件不存在或已被替换时作废全部旧连接（调用方持有 self._lock）"""
+        if self.db_path == ":memory:" or (self._file_key and self._stat_key() == self._file_key):
+            return
+        self._generation += 1
+        self._file_key = None
+        self._wal_ready = False
+        for raw in self._idle:
+            raw.close()
+        self._idle.clear()
+        # 写线程正在执行批次时由它在批次结束后自行关闭
+        if self._writer_lock.acquire(blocking=False):
+            try:
+                self._close_writer_conn()
+            finally:
+                self._writer_lock.release()
+
+    def _close_writer_conn(self):
+        if self._writer_conn is not None:
+            self._writer_conn.close()
+            self._writer_conn = None
+
+    def _open(self, autocommit: bool = False) -> sqlite3.Connection:
+        if self.db_path != ":memory:":
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        # 连接只被借出它的线程使用；关闭可能发生在作废时的其他线程
+        raw = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT,
+                              cached_statements=CACHED_STATEMENTS, check_same_thread=False,
+                              isolation_level=None if autocommit else "")
+        with self._lock:
+            if not self._wal_ready and self.db_path != ":memory:":
+                raw.execute("PRAGMA journal_mode=WAL")
+                self._wal_ready = True
+                self._file_key = self._stat_key()
+            self.stats["connections"] += 1
+        for pragma in PRAGMAS:
+            raw.execute(pragma)
+        return raw
+
+    def connect(self) -> PooledConnection:
+        """借出当前线程的连接（嵌套借出时另开一个），等待尚未提交的批量写完成"""
+        if self._pending:
+            self.flush()
+        idle: List[sqlite3.Connection] = getattr(self._local, "idle", None)
+        if idle is None:
+            idle = self._local.idle = []
+        raw = None
+        with self._lock:
+            self._check_file()
+            generation = self._generation
+            while idle:
+                candidate = idle.pop()
+                if candidate in self._idle:
+                    self._idle.discard(candidate)
+                    raw = candidate
+                    break
+        if raw is None:
+            raw = self._open()
+        return PooledConnection(self, raw, generation)
+
+    def _release(self, raw: sqlite3.Connection, generation: int):
+        if raw.in_transaction:
+            raw.rollback()
+        idle = getattr(self._local, "idle", None)
+        if idle is None:
+            idle = self._local.idle = []
+        with self._lock:
+            if generation == self._generation and len(idle) < self.MAX_IDLE_PER_THREAD:
+                idle.append(raw)
+                self._idle.add(raw)
+                return
+        raw.close()
+
+    def close_idle(self):
+        """关闭所有空闲连接（数据库文件将被外部删除或移动前调用）"""
+        with self._lock:
+            self._file_key = None
+            self._check_file()
+
+    # ── 批量写 ──
+
+    def write(self, fn: Callable[[sqlite3.Connection], Any], wait: bool = False) -> Any:
+        """
+        提交一个写操作 fn(conn)，由后台写线程与其他写操作合并到同一事务
+
+        Args:
+            fn: 在写线程上执行的函数，参数为连接，返回值作为结果
+            wait: True 时阻塞到所在事务提交，返回 fn 的结果（出错则抛出）
+        """
+        future: Future = Future()
+        with self._cond:
+            self._queue.append((fn, future))
+            self._pending += 1
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._writer_loop, daemon=True,
+                                                name=f"sqlite-writer:{os.path.basename(self.db_path)}")
+                self._writer.start()
+            self._cond.notify_all()
+        return future.result() if wait else future
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待所有已入队的写操作提交"""
+        if threading.current_thread() is self._writer:
+            return False
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _writer_loop(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.BATCH_SIZE))]
+            # 任何异常都不能结束写线程，否则 _pending 不归零，之后的 connect()/flush() 永远等待
+            try:
+                self._run_batch(batch)
+            except BaseException as e:
+                self._fail_batch(batch, e)
+                if not isinstance(e, Exception):
+                    raise
+            finally:
+                self._fail_batch(batch, RuntimeError("SQLite 批量写未完成"))
+                with self._cond:
+                    self._pending -= len(batch)
+                    self._cond.notify_all()
+
+    @staticmethod
+    def _fail_batch(batch, error: BaseException):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def _run_batch(self, batch):
+        with self._lock:
+            self._check_file()
+            generation = self._generation
+        with self._writer_lock:
+            if self._writer_generation != generation:
+                self._close_writer_conn()
+                self._writer_generation = generation
+            self._run_batch_locked(batch)
+            if self._generation != generation:
+                self._close_writer_conn()
+
+    def _run_batch_locked(self, batch):
+        results = []
+        try:
+            if self._writer_conn is None:
+                self._writer_conn = self._open(autocommit=True)
+            conn = self._writer_conn
+            conn.execute("BEGIN IMMEDIATE")
+            for fn, future in batch:
+                # 每个操作一个保存点，单个失败不影响同批其他操作
+                conn.execute("SAVEPOINT write_item")
+                try:
+                    results.append((future, fn(conn), None))
+                    conn.execute("RELEASE write_item")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write_item")
+                    conn.execute("RELEASE write_item")
+                    results.append((future, None, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            try:
+                if self._writer_conn is not None and self._writer_conn.in_transaction:
+                    self._writer_conn.execute("ROLLBACK")
+            except Exception:
+                # 回滚失败时连接状态不可信，关闭后下个批次重新打开
+                self._close_writer_conn()
+            self._fail_batch(batch, e)
+            return
+        self.stats["batches"] += 1
+        self.stats["writes"] += len(batch)
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+_databases: Dict[str, SQLiteDatabase] = {}
+_databases_lock = threading.Lock()
+
+
+def get_database(db_path: str) -> SQLiteDatabase:
+    """获取数据库文件对应的共享实例"""
+    key = db_path if db_path == ":memory:" else os.path.abspath(db_path)
+    with _databases_lock:
+        db = _databases.get(key)
+        if db is None:
+            db = _databases[key] = SQLiteDatabase(key)
+        return db
+
+
+def flush_all(timeout: Optional[float] = 5.0):
+    """提交所有数据库尚未写入的批量写（进程退出时自动调用）"""
+    with _databases_lock:
+        databases = list(_databases.values())
+    for db in databases:
+        db.flush(timeout)
+
+
+atexit.register(flush_all)
@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+启动性能分析：统计每个模块的导入耗时（自身 / 含子模块）、进程常驻内存与首个请求前的耗时
+
+启用方式:
+  KOTO_PROFILE_STARTUP=1 python server.py       # web/app.py 导入完成及首个请求到达时各打印一次报告
+  python web/startup_profiler.py web.app --first-request /api/ping
+"""
+import argparse
+import importlib
+import importlib.machinery
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+ENV_FLAG = "KOTO_PROFILE_STARTUP"
+
+
+@dataclass
+class ImportRecord:
+    """一次模块导入的耗时（秒）"""
+    name: str
+    cumulative: float        # 含其间导入的子模块
+    self_time: float         # 扣除子模块导入后的自身执行时间
+    depth: int
+
+
+class _TimedLoader:
+    """包装真实 loader，只在 create_module / exec_module 上计时，其他属性原样转发"""
+
+    def __init__(self, loader, profiler: "_ImportProfiler"):
+        self._loader = loader
+        self._profiler = profiler
+
+    def create_module(self, spec):
+        create = getattr(self._loader, "create_module", None)
+        if create is None:
+            return None
+        if isinstance(self._loader, importlib.machinery.ExtensionFileLoader):
+            # 扩展模块主要在 create_module 中初始化，计入同名模块
+            return self._profiler.timed(spec.name, create, spec)
+        return create(spec)
+
+    def exec_module(self, module):
+        self._profiler.timed(module.__name__, self._loader.exec_module, module)
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+class _ImportProfiler:
+    """插在 sys.meta_path 最前面的查找器：委托其余查找器定位模块，再给 loader 套上计时"""
+
+    def __init__(self):
+        self.records: List[ImportRecord] = []
+        self.marks: List[tuple] = []
+        self.started = time.perf_counter()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def find_spec(self, fullname, path=None, target=None):
+        if getattr(self._local, "finding", False):
+            return None
+        self._local.finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._local.finding = False
+        if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = _TimedLoader(spec.loader, self)
+        return spec
+
+    def timed(self, name, fn, arg):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(0.0)             # 子模块导入耗时累加到栈顶
+        start = time.perf_counter()
+        try:
+            return fn(arg)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            with self._lock:
+                self.records.append(ImportRecord(name, elapsed, elapsed - children, len(stack)))
+
+
+_profiler: Optional[_ImportProfiler] = None
+
+
+def enable() -> bool:
+    """开始记录之后发生的模块导入（重复调用无副作用；disable 之后再调用时继续记录到同一份数据）"""
+    global _profiler
+    if _profiler is None:
+        _profiler = _ImportProfiler()
+    if _profiler not in sys.meta_path:
+        sys.meta_path.insert(0, _profiler)
+    return True
+
+
+def enable_from_env() -> bool:
+    """KOTO_PROFILE_STARTUP 为真时启用"""
+    if os.environ.get(ENV_FLAG, "").lower() in ("1", "true", "yes"):
+        return enable()
+    return False
+
+
+def disable():
+    """停止记录（已记录的数据保留，reset 清除）"""
+    if _profiler is not None and _profiler in sys.meta_path:
+        sys.meta_path.remove(_profiler)
+
+
+def reset():
+    """停止记录并丢弃已记录的数据"""
+    global _profiler
+    disable()
+    _profiler = None
+
+
+def is_enabled() -> bool:
+    return _profiler is not None and _profiler in sys.meta_path
+
+
+def records() -> List[ImportRecord]:
+    return list(_profiler.records) if _profiler else []
+
+
+def memory_rss_mb() -> Optional[float]:
+    """当前进程常驻内存（MB），无法获取时返回 None"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 / 1024
+    except Exception:
+        return None
+
+
+def mark(label: str) -> Optional[float]:
+    """记录一个启动里程碑（距离启用分析时的秒数与当时内存）"""
+    if _profiler is None:
+        return None
+    elapsed = time.perf_counter() - _profiler.started
+    _profiler.marks.append((label, elapsed, memory_rss_mb()))
+    return elapsed
+
+
+def summarize_modules(items: List[ImportRecord]) -> List[ImportRecord]:
+    """合并同一模块的多条记录（扩展模块的创建与执行），按自身耗时降序"""
+    merged: Dict[str, ImportRecord] = {}
+    for record in items:
+        current = merged.get(record.name)
+        if current is None:
+            merged[record.name] = ImportRecord(record.name, record.cumulative, record.self_time, record.depth)
+        else:
+            current.cumulative += record.cumulative
+            current.self_time += record.self_time
+    return sorted(merged.values(), key=lambda r: r.self_time, reverse=True)
+
+
+def summarize_packages(items: List[ImportRecord]) -> Dict[str, float]:
+    """按顶层包汇总自身导入耗时"""
+    totals: Dict[str, float] = {}
+    for record in items:
+        package = record.name.split(".", 1)[0]
+        totals[package] = totals.get(package, 0.0) + record.self_time
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+def report(top: int = 20, stream=None) -> str:
+    """生成报告文本并打印：里程碑、最耗时的顶层包和模块"""
+    items = records()
+    modules = summarize_modules(items)
+    lines = ["=" * 72, f"[STARTUP] 导入模块 {len(modules)} 个，"
+             f"总耗时 {sum(r.self_time for r in items) * 1000:.0f}ms"]
+    for label, elapsed, rss in (_profiler.marks if _profiler else []):
+        memory = f"，内存 {rss:.0f}MB" if rss is not None else ""
+        lines.append(f"[STARTUP] {label}: {elapsed * 1000:.0f}ms{memory}")
+    lines.append(f"{'顶层包':<40}{'自身ms':>10}")
+    for package, seconds in list(summarize_packages(items).items())[:top]:
+        lines.append(f"{package:<40}{seconds * 1000:>10.1f}")
+    lines.append(f"{'模块':<40}{'自身ms':>10}{'累计ms':>10}")
+    for record in modules[:top]:
+        lines.append(f"{record.name[:39]:<40}{record.self_time * 1000:>10.1f}{record.cumulative * 1000:>10.1f}")
+    lines.append("=" * 72)
+    text = "\n".join(lines)
+    print(text, file=stream or sys.stdout, flush=True)
+    return text
+
+
+def install_first_request_hook(app, top: int = 20):
+    """在 Flask 应用上记录首个请求到达的时间，并打印完整报告（只执行一次）"""
+    done = []
+
+    @app.before_request
+    def _startup_first_request():
+        if not done:
+            done.append(True)
+            mark(f"首个请求 {_request_path()}")
+            report(top)
+
+
+def _request_path() -> str:
+    try:
+        from flask import request
+        return request.path
+    except Exception:
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分析模块导入耗时")
+    parser.add_argument("module", help="要导入的模块，例如 web.app")
+    parser.add_argument("--top", type=int, default=25, help="显示耗时最高的条目数")
+    parser.add_argument("--first-request", metavar="PATH",
+                        help="导入后用模块内的 Flask app 发起一次 GET 请求，统计首个请求耗时")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    enable()
+    module = importlib.import_module(args.module)
+    mark(f"导入 {args.module}")
+    if args.first_request and getattr(module, "app", None) is not None:
+        module.app.test_client().get(args.first_request)
+        mark(f"首个请求 {args.first_request}")
+    disable()
+    report(args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,11 @@ from collections import Counter, defaultdict
 from behavior_monitor import BehaviorMonitor
 from knowledge_graph import KnowledgeGraph
 
+try:
+    from sqlite_pool import get_database
+except ImportError:
+    from web.sqlite_pool import get_database
+
 
 class SuggestionEngine:
     """智能建议引擎 - 主动分析并生成建议"""
@@ -64,7 +69,7 @@ class SuggestionEngine:
         """确保数据库和表结构存在"""
         Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
         
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         # 建议表 - 存储生成的建议
@@ -492,7 +497,7 @@ class SuggestionEngine:
     
     def _save_suggestion(self, suggestion: Dict) -> int:
         """保存建议到数据库"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -517,21 +522,16 @@ class SuggestionEngine:
         return suggestion_id
     
     def _log_rule_execution(self, rule_name: str, triggered: bool, suggestions_count: int):
-        """记录规则执行历史"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
+        """记录规则执行历史（写后即返回，由批量写线程合并提交）"""
+        row = (rule_name, triggered, suggestions_count, datetime.now().isoformat())
+        get_database(self.db_path).write(lambda conn: conn.execute("""
             INSERT INTO rule_history (rule_name, triggered, suggestions_generated, execution_time)
             VALUES (?, ?, ?, ?)
-        """, (rule_name, triggered, suggestions_count, datetime.now().isoformat()))
-        
-        conn.commit()
-        conn.close()
+        """, row))
     
     def get_pending_suggestions(self, limit: int = 10) -> List[Dict]:
         """获取待处理的建议"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -566,7 +566,7 @@ class SuggestionEngine:
     
     def dismiss_suggestion(self, suggestion_id: int, feedback: Optional[str] = None):
         """拒绝建议"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -586,7 +586,7 @@ class SuggestionEngine:
     
     def apply_suggestion(self, suggestion_id: int, feedback: Optional[str] = None):
         """应用建议"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -606,7 +606,7 @@ class SuggestionEngine:
     
     def get_statistics(self) -> Dict:
         """获取建议引擎统计信息"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_database(self.db_path).connect()
         cursor = conn.cursor()
         
         cursor.execute("SELECT COUNT(*) FROM suggestions")
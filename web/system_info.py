@@ -11,14 +11,17 @@ Features:
   - Python 环境信息
   - 网络状态
   - 智能缓存和更新机制
+  - 后台遥测采样：请求线程直接读取最新快照，不再临时采样
 """
 
 import os
 import sys
 import time
 import platform
+import threading
 import psutil
 import socket
+from collections import deque
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, Any, Optional
@@ -78,33 +81,24 @@ class SystemInfoCollector:
         """设置缓存数据"""
         self.cache[key] = (data, time.time())
     
+    def _sampled(self, key: str) -> Optional[Any]:
+        """后台采样器最新快照中的数据（采样器尚未产出快照或快照已过期时返回 None）"""
+        sampler = get_telemetry_sampler()
+        sampler.start()
+        snapshot = sampler.latest()
+        return snapshot.get(key) if snapshot else None
+    
     def get_cpu_info(self) -> Dict[str, Any]:
         """获取 CPU 信息"""
         cached = self._get_cached('cpu_info', ttl=2)
         if cached:
             return cached
+        sampled = self._sampled('cpu')
+        if sampled is not None:
+            return sampled
         
         try:
-            cpu_percent = psutil.cpu_percent(interval=0.1)
-            cpu_count = psutil.cpu_count(logical=False)
-            cpu_count_logical = psutil.cpu_count(logical=True)
-            
-            # 尝试获取 CPU 型号
-            cpu_model = platform.processor() or "Unknown"
-            
-            # 尝试获取 CPU 频率
-            cpu_freq = psutil.cpu_freq()
-            freq_mhz = cpu_freq.current if cpu_freq else 0
-            
-            info = {
-                'usage_percent': cpu_percent,
-                'physical_cores': cpu_count,
-                'logical_cores': cpu_count_logical,
-                'model': cpu_model,
-                'frequency_mhz': round(freq_mhz, 1),
-                'load_average': os.getloadavg() if hasattr(os, 'getloadavg') else (0, 0, 0)
-            }
-            
+            info = self._read_cpu_info(interval=0.1)
             self._set_cached('cpu_info', info)
             return info
             
@@ -120,26 +114,39 @@ class SystemInfoCollector:
                 'error': str(e)
             }
     
+    def _read_cpu_info(self, interval: Optional[float]) -> Dict[str, Any]:
+        """读取 CPU 信息（interval=None 时统计自上次调用以来的使用率，不阻塞）"""
+        cpu_percent = psutil.cpu_percent(interval=interval)
+        cpu_count = psutil.cpu_count(logical=False)
+        cpu_count_logical = psutil.cpu_count(logical=True)
+        
+        # 尝试获取 CPU 型号
+        cpu_model = platform.processor() or "Unknown"
+        
+        # 尝试获取 CPU 频率
+        cpu_freq = psutil.cpu_freq()
+        freq_mhz = cpu_freq.current if cpu_freq else 0
+        
+        return {
+            'usage_percent': cpu_percent,
+            'physical_cores': cpu_count,
+            'logical_cores': cpu_count_logical,
+            'model': cpu_model,
+            'frequency_mhz': round(freq_mhz, 1),
+            'load_average': os.getloadavg() if hasattr(os, 'getloadavg') else (0, 0, 0)
+        }
+    
     def get_memory_info(self) -> Dict[str, Any]:
         """获取内存信息"""
         cached = self._get_cached('memory_info', ttl=2)
         if cached:
             return cached
+        sampled = self._sampled('memory')
+        if sampled is not None:
+            return sampled
         
         try:
-            memory = psutil.virtual_memory()
-            swap = psutil.swap_memory()
-            
-            info = {
-                'total_gb': round(memory.total / (1024**3), 2),
-                'used_gb': round(memory.used / (1024**3), 2),
-                'available_gb': round(memory.available / (1024**3), 2),
-                'percent': memory.percent,
-                'swap_total_gb': round(swap.total / (1024**3), 2),
-                'swap_used_gb': round(swap.used / (1024**3), 2),
-                'swap_percent': swap.percent
-            }
-            
+            info = self._read_memory_info()
             self._set_cached('memory_info', info)
             return info
             
@@ -153,49 +160,31 @@ class SystemInfoCollector:
                 'error': str(e)
             }
     
+    def _read_memory_info(self) -> Dict[str, Any]:
+        memory = psutil.virtual_memory()
+        swap = psutil.swap_memory()
+        
+        return {
+            'total_gb': round(memory.total / (1024**3), 2),
+            'used_gb': round(memory.used / (1024**3), 2),
+            'available_gb': round(memory.available / (1024**3), 2),
+            'percent': memory.percent,
+            'swap_total_gb': round(swap.total / (1024**3), 2),
+            'swap_used_gb': round(swap.used / (1024**3), 2),
+            'swap_percent': swap.percent
+        }
+    
     def get_disk_info(self) -> Dict[str, Any]:
         """获取磁盘信息"""
         cached = self._get_cached('disk_info', ttl=10)
         if cached:
             return cached
+        sampled = self._sampled('disk')
+        if sampled is not None:
+            return sampled
         
         try:
-            disks: Dict[str, Any] = {}
-            
-            # 获取所有磁盘分区
-            partitions = psutil.disk_partitions()
-            
-            for partition in partitions:
-                # 跳过系统分区
-                if partition.fstype == '' or 'loop' in partition.device:
-                    continue
-                
-                try:
-                    usage = psutil.disk_usage(partition.mountpoint)
-                    drive_letter = partition.device.split('\\')[0] if '\\' in partition.device else partition.device
-                    
-                    disks[drive_letter] = {
-                        'mount': partition.mountpoint,
-                        'fstype': partition.fstype,
-                        'total_gb': round(usage.total / (1024**3), 2),
-                        'used_gb': round(usage.used / (1024**3), 2),
-                        'free_gb': round(usage.free / (1024**3), 2),
-                        'percent': usage.percent
-                    }
-                except (OSError, PermissionError):
-                    continue
-            
-            # 计算总计
-            total_gb = sum(d.get('total_gb', 0) for d in disks.values())
-            free_gb = sum(d.get('free_gb', 0) for d in disks.values())
-            
-            info = {
-                'drives': disks,
-                'total_gb': round(total_gb, 2),
-                'free_gb': round(free_gb, 2),
-                'percent_full': round(100 - (free_gb / total_gb * 100) if total_gb > 0 else 0, 1)
-            }
-            
+            info = self._read_disk_info()
             self._set_cached('disk_info', info)
             return info
             
@@ -208,47 +197,54 @@ class SystemInfoCollector:
                 'error': str(e)
             }
     
+    def _read_disk_info(self) -> Dict[str, Any]:
+        disks: Dict[str, Any] = {}
+        
+        # 获取所有磁盘分区
+        partitions = psutil.disk_partitions()
+        
+        for partition in partitions:
+            # 跳过系统分区
+            if partition.fstype == '' or 'loop' in partition.device:
+                continue
+            
+            try:
+                usage = psutil.disk_usage(partition.mountpoint)
+                drive_letter = partition.device.split('\\')[0] if '\\' in partition.device else partition.device
+                
+                disks[drive_letter] = {
+                    'mount': partition.mountpoint,
+                    'fstype': partition.fstype,
+                    'total_gb': round(usage.total / (1024**3), 2),
+                    'used_gb': round(usage.used / (1024**3), 2),
+                    'free_gb': round(usage.free / (1024**3), 2),
+                    'percent': usage.percent
+                }
+            except (OSError, PermissionError):
+                continue
+        
+        # 计算总计
+        total_gb = sum(d.get('total_gb', 0) for d in disks.values())
+        free_gb = sum(d.get('free_gb', 0) for d in disks.values())
+        
+        return {
+            'drives': disks,
+            'total_gb': round(total_gb, 2),
+            'free_gb': round(free_gb, 2),
+            'percent_full': round(100 - (free_gb / total_gb * 100) if total_gb > 0 else 0, 1)
+        }
+    
     def get_network_info(self) -> Dict[str, Any]:
         """获取网络信息"""
         cached = self._get_cached('network_info', ttl=5)
         if cached:
             return cached
+        sampled = self._sampled('network')
+        if sampled is not None:
+            return sampled
         
         try:
-            info = {
-                'hostname': socket.gethostname(),
-                'interfaces': {}
-            }
-            
-            # 获取所有网络接口
-            if_addrs = psutil.net_if_addrs()
-            
-            for interface_name, interface_addrs in if_addrs.items():
-                info['interfaces'][interface_name] = {
-                    'ipv4': None,
-                    'ipv6': None,
-                    'mac': None
-                }
-                
-                for addr in interface_addrs:
-                    if addr.family == socket.AF_INET:
-                        info['interfaces'][interface_name]['ipv4'] = addr.address
-                    elif addr.family == socket.AF_INET6:
-                        info['interfaces'][interface_name]['ipv6'] = addr.address
-                    elif addr.family == psutil.AF_LINK:
-                        info['interfaces'][interface_name]['mac'] = addr.address
-            
-            # 获取网络连接统计
-            if_stats = psutil.net_if_stats()
-            info['connection_status'] = {
-                name: {
-                    'is_up': stats.isup,
-                    'speed': stats.speed,
-                    'mtu': stats.mtu
-                }
-                for name, stats in if_stats.items()
-            }
-            
+            info = self._read_network_info()
             self._set_cached('network_info', info)
             return info
             
@@ -260,36 +256,53 @@ class SystemInfoCollector:
                 'error': str(e)
             }
     
+    def _read_network_info(self) -> Dict[str, Any]:
+        info = {
+            'hostname': socket.gethostname(),
+            'interfaces': {}
+        }
+        
+        # 获取所有网络接口
+        if_addrs = psutil.net_if_addrs()
+        
+        for interface_name, interface_addrs in if_addrs.items():
+            info['interfaces'][interface_name] = {
+                'ipv4': None,
+                'ipv6': None,
+                'mac': None
+            }
+            
+            for addr in interface_addrs:
+                if addr.family == socket.AF_INET:
+                    info['interfaces'][interface_name]['ipv4'] = addr.address
+                elif addr.family == socket.AF_INET6:
+                    info['interfaces'][interface_name]['ipv6'] = addr.address
+                elif addr.family == psutil.AF_LINK:
+                    info['interfaces'][interface_name]['mac'] = addr.address
+        
+        # 获取网络连接统计
+        if_stats = psutil.net_if_stats()
+        info['connection_status'] = {
+            name: {
+                'is_up': stats.isup,
+                'speed': stats.speed,
+                'mtu': stats.mtu
+            }
+            for name, stats in if_stats.items()
+        }
+        return info
+    
     def get_running_processes(self, top_n: int = 10) -> Dict[str, Any]:
         """获取运行中的进程（按内存占用排序）"""
         cached = self._get_cached('running_processes', ttl=3)
         if cached:
             return cached
+        sampled = self._sampled('processes')
+        if sampled is not None:
+            return dict(sampled, top_processes=sampled['top_processes'][:top_n])
         
         try:
-            processes = []
-            
-            for proc in psutil.process_iter(['pid', 'name', 'memory_percent', 'cpu_percent']):
-                try:
-                    pinfo = proc.as_dict(attrs=['pid', 'name', 'memory_percent', 'cpu_percent'])
-                    processes.append(pinfo)
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    continue
-            
-            # 按内存占用排序
-            processes = sorted(processes, key=lambda x: x.get('memory_percent', 0), reverse=True)
-            
-            info = {
-                'total_processes': len(psutil.pids()),
-                'top_processes': processes[:top_n],
-                'key_processes': {
-                    'python': [p for p in processes if 'python' in p['name'].lower()][:3],
-                    'koto': [p for p in processes if 'koto' in p['name'].lower()],
-                    'vscode': [p for p in processes if 'code' in p['name'].lower()],
-                    'browser': [p for p in processes if any(x in p['name'].lower() for x in ['chrome', 'firefox', 'edge'])][:2]
-                }
-            }
-            
+            info = self._read_processes(top_n)
             self._set_cached('running_processes', info)
             return info
             
@@ -301,6 +314,34 @@ class SystemInfoCollector:
                 'error': str(e)
             }
     
+    def _read_processes(self, top_n: int) -> Dict[str, Any]:
+        processes = []
+        
+        for proc in psutil.process_iter(['pid', 'name', 'memory_percent', 'cpu_percent', 'memory_info']):
+            try:
+                pinfo = dict(proc.info)
+                memory_info = pinfo.pop('memory_info', None)
+                pinfo['memory_mb'] = round(memory_info.rss / (1024**2), 1) if memory_info else 0
+                pinfo['name'] = pinfo.get('name') or ''
+                pinfo['memory_percent'] = pinfo.get('memory_percent') or 0
+                processes.append(pinfo)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        
+        # 按内存占用排序
+        processes = sorted(processes, key=lambda x: x.get('memory_percent', 0), reverse=True)
+        
+        return {
+            'total_processes': len(psutil.pids()),
+            'top_processes': processes[:top_n],
+            'key_processes': {
+                'python': [p for p in processes if 'python' in p['name'].lower()][:3],
+                'koto': [p for p in processes if 'koto' in p['name'].lower()],
+                'vscode': [p for p in processes if 'code' in p['name'].lower()],
+                'browser': [p for p in processes if any(x in p['name'].lower() for x in ['chrome', 'firefox', 'edge'])][:2]
+            }
+        }
+    
     def get_python_environment(self) -> Dict[str, Any]:
         """获取 Python 环境信息"""
         cached = self._get_cached('python_environment', ttl=30)
@@ -544,6 +585,179 @@ def get_system_info_collector() -> SystemInfoCollector:
     return _collector_instance
 
 
+class TelemetrySampler:
+    """
+    后台系统遥测采样器
+    
+    按固定周期在后台线程采集 CPU、内存、磁盘、网络流量和进程快照，
+    保存在定长环形缓冲区中：
+    - latest() 常数时间返回最新快照，SystemInfoCollector 的 get_* 直接读取
+    - window()/series() 返回最近一段时间的快照或指标序列，
+      供系统事件监控和趋势分析使用，无需再次采样
+    
+    采样周期与缓冲区长度可通过 KOTO_TELEMETRY_INTERVAL（秒）、
+    KOTO_TELEMETRY_HISTORY（快照数）配置。
+    """
+    
+    SNAPSHOT_TOP_N = 30     # 快照中保留的进程数（list_running_apps 最多取 30 个）
+    SLOW_EVERY = 6          # 磁盘分区、网卡地址变化慢，每隔几次采样刷新一次
+    
+    def __init__(self, collector: SystemInfoCollector, interval: float = 5.0, history: int = 720):
+        """
+        Args:
+            collector: 提供具体读取方法的收集器
+            interval: 采样周期（秒）
+            history: 环形缓冲区保留的快照数
+        """
+        self.collector = collector
+        self.interval = interval
+        self._buffer: deque = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._ticks = 0
+    
+    def start(self) -> None:
+        """启动后台采样线程（已在运行时直接返回）"""
+        if self.is_running():
+            return
+        with self._lock:
+            if self.is_running():
+                return
+            self._stop.clear()
+            # 建立 CPU 使用率的统计起点，之后每次采样统计一个周期内的平均值
+            psutil.cpu_percent(interval=None)
+            self._thread = threading.Thread(target=self._run, daemon=True, name="telemetry-sampler")
+            self._thread.start()
+    
+    def stop(self) -> None:
+        """停止后台采样线程"""
+        self._stop.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=1)
+    
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and not self._stop.is_set()
+    
+    def _run(self) -> None:
+        # 首个快照不等满一个周期，但 CPU 统计至少需要一小段时间
+        self._stop.wait(min(self.interval, 0.5))
+        while not self._stop.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"[SystemInfo] Warning: Telemetry sampling failed: {e}")
+            self._stop.wait(self.interval)
+    
+    def sample(self) -> Dict[str, Any]:
+        """采集一次快照并追加到环形缓冲区"""
+        collector = self.collector
+        previous = self._buffer[-1] if self._buffer else {}
+        slow = not previous or self._ticks % self.SLOW_EVERY == 0
+        self._ticks += 1
+        
+        readers = {
+            'cpu': lambda: collector._read_cpu_info(interval=None),
+            'memory': collector._read_memory_info,
+            'processes': lambda: collector._read_processes(self.SNAPSHOT_TOP_N),
+            'net_io': lambda: self._read_net_io(previous),
+        }
+        if slow:
+            readers['disk'] = collector._read_disk_info
+            readers['network'] = collector._read_network_info
+        
+        snapshot: Dict[str, Any] = {'timestamp': time.time()}
+        for key, read in readers.items():
+            try:
+                snapshot[key] = read()
+            except Exception as e:
+                print(f"[SystemInfo] Warning: Failed to sample {key}: {e}")
+        # 本次未刷新或读取失败的部分沿用上一个快照
+        for key in ('disk', 'network'):
+            if key not in snapshot and key in previous:
+                snapshot[key] = previous[key]
+        
+        with self._lock:
+            self._buffer.append(snapshot)
+        return snapshot
+    
+    @staticmethod
+    def _read_net_io(previous: Dict[str, Any]) -> Dict[str, Any]:
+        counters = psutil.net_io_counters()
+        now = time.time()
+        info = {
+            'bytes_sent': counters.bytes_sent,
+            'bytes_recv': counters.bytes_recv,
+            'sent_per_sec': 0.0,
+            'recv_per_sec': 0.0,
+        }
+        last = previous.get('net_io')
+        elapsed = now - previous.get('timestamp', now)
+        if last and elapsed > 0:
+            info['sent_per_sec'] = round(max(0, counters.bytes_sent - last['bytes_sent']) / elapsed, 1)
+            info['recv_per_sec'] = round(max(0, counters.bytes_recv - last['bytes_recv']) / elapsed, 1)
+        return info
+    
+    def latest(self, max_age: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        最新快照
+        
+        Args:
+            max_age: 快照最大允许年龄（秒），默认 3 个采样周期；过期返回 None
+        """
+        try:
+            snapshot = self._buffer[-1]
+        except IndexError:
+            return None
+        max_age = self.interval * 3 if max_age is None else max_age
+        return snapshot if time.time() - snapshot['timestamp'] <= max_age else None
+    
+    def window(self, seconds: float) -> List[Dict[str, Any]]:
+        """最近 seconds 秒内的快照（按时间从早到晚）"""
+        cutoff = time.time() - seconds
+        snapshots = []
+        with self._lock:
+            for snapshot in reversed(self._buffer):
+                if snapshot['timestamp'] < cutoff:
+                    break
+                snapshots.append(snapshot)
+        snapshots.reverse()
+        return snapshots
+    
+    def series(self, metric: str, seconds: float) -> List[float]:
+        """
+        最近 seconds 秒内某个指标的取值序列
+        
+        Args:
+            metric: '分组.字段'，如 'cpu.usage_percent'、'memory.percent'、'net_io.recv_per_sec'
+        """
+        group, field = metric.split('.', 1)
+        values = []
+        for snapshot in self.window(seconds):
+            value = snapshot.get(group, {}).get(field)
+            if isinstance(value, (int, float)):
+                values.append(value)
+        return values
+
+
+_sampler_instance: Optional[TelemetrySampler] = None
+_sampler_lock = threading.Lock()
+
+
+def get_telemetry_sampler() -> TelemetrySampler:
+    """获取后台遥测采样器的单例（不会自动启动，调用 start() 启动）"""
+    global _sampler_instance
+    if _sampler_instance is None:
+        with _sampler_lock:
+            if _sampler_instance is None:
+                _sampler_instance = TelemetrySampler(
+                    get_system_info_collector(),
+                    interval=float(os.environ.get("KOTO_TELEMETRY_INTERVAL", "5")),
+                    history=int(os.environ.get("KOTO_TELEMETRY_HISTORY", "720")),
+                )
+    return _sampler_instance
+
+
 # 便利函数
 def get_system_info() -> Dict[str, Any]:
     """获取完整的系统信息"""
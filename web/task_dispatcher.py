@@ -3,24 +3,32 @@
 🎯 Koto 任务调度器与执行引擎
 
 负责：
-1. 从队列获取任务
+1. 工作线程池从优先级队列获取任务
 2. 检查资源可用性
 3. 分配资源并执行
-4. 处理错误和重试
+4. 处理错误和重试（按任务类型熔断）
 5. 记录监控数据
 """
 
+import os
 import threading
 import time
 import logging
-from typing import Optional, Callable, Any
+from typing import Optional, Callable, Any, Dict, List
 from datetime import datetime
 
-from .parallel_executor import (
-    Task, TaskStatus, TaskType, Priority,
-    get_queue_manager, get_resource_manager, get_task_monitor,
-    RetryPolicy, CircuitBreaker
-)
+try:
+    from parallel_executor import (
+        Task, TaskStatus, TaskType, Priority,
+        get_queue_manager, get_resource_manager, get_task_monitor,
+        RetryPolicy, CircuitBreaker
+    )
+except ImportError:
+    from web.parallel_executor import (
+        Task, TaskStatus, TaskType, Priority,
+        get_queue_manager, get_resource_manager, get_task_monitor,
+        RetryPolicy, CircuitBreaker
+    )
 
 logger = logging.getLogger(__name__)
 
@@ -41,82 +49,99 @@ class TaskExecutor:
     5. 释放资源
     """
 
-    def __init__(self, task: Task, execute_fn: Callable[[Task], Any]):
+    RESOURCE_WAIT_SECONDS = 30    # 等待资源的最长时间
+    RESOURCE_POLL_MAX = 1.0       # 资源轮询间隔上限（从 50ms 开始倍增）
+
+    def __init__(self, task: Task, execute_fn: Callable[[Task], Any],
+                 circuit_breaker: Optional[CircuitBreaker] = None):
         """
         Args:
             task: 要执行的任务
             execute_fn: 执行函数 (task) -> result
+            circuit_breaker: 同类任务共用的熔断器（不传则为本任务单独创建）
         """
         self.task = task
         self.execute_fn = execute_fn
         self.retry_policy = RetryPolicy(max_retries=task.max_retries)
-        self.circuit_breaker = CircuitBreaker()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+
+    def _finish(self, status: TaskStatus, error: Optional[str] = None):
+        """任务最终结束：写入状态并通知队列与监控"""
+        self.task.status = status
+        self.task.completed_at = datetime.now()
+        if error is not None:
+            self.task.error = error
+        get_queue_manager().task_done(self.task)
+        if status == TaskStatus.COMPLETED:
+            get_task_monitor().record_task_complete(self.task)
+        elif status == TaskStatus.FAILED:
+            get_task_monitor().record_task_failed(self.task)
+
+    def _acquire_resources(self) -> bool:
+        """在 RESOURCE_WAIT_SECONDS 内反复尝试获取资源（任务被取消时放弃）"""
+        resource_mgr = get_resource_manager()
+        deadline = time.time() + self.RESOURCE_WAIT_SECONDS
+        delay = 0.05
+        while not self.task.is_aborted:
+            resource_mgr.refill_api_tokens()
+            if resource_mgr.acquire(self.task):
+                return True
+            if time.time() >= deadline:
+                return False
+            time.sleep(delay)
+            delay = min(delay * 2, self.RESOURCE_POLL_MAX)
+        return False
 
     def execute(self) -> bool:
         """
         执行任务
         
-        Returns: True if successful, False if failed permanently
+        Returns: True if successful, False if failed (重试时任务会延迟后重新入队)
         """
         resource_mgr = get_resource_manager()
-        monitor = get_task_monitor()
 
         try:
+            if self.task.is_aborted:
+                self._finish(TaskStatus.CANCELLED)
+                return False
+
             # 检查熔断器
             if not self.circuit_breaker.can_execute():
                 logger.warning(f"[EXECUTOR] Circuit breaker OPEN for task {self.task.id}")
-                self.task.status = TaskStatus.FAILED
-                self.task.error = "Circuit breaker is open"
-                monitor.record_task_failed(self.task)
+                self._finish(TaskStatus.FAILED, "Circuit breaker is open")
                 return False
 
-            # 等待资源可用
-            max_wait = 30  # 最多等待30秒
-            waited = 0
-            while waited < max_wait:
-                can_acquire, reason = resource_mgr.can_start_task(self.task)
-                if can_acquire:
-                    break
-                
-                logger.info(f"[EXECUTOR] Waiting for resources: {reason}")
-                time.sleep(1)
-                waited += 1
-            
-            if waited >= max_wait:
+            # 等待并获取资源
+            if not self._acquire_resources():
+                if self.task.is_aborted:
+                    self._finish(TaskStatus.CANCELLED)
+                    return False
                 logger.warning(f"[EXECUTOR] Task {self.task.id} timeout waiting for resources")
-                self.task.status = TaskStatus.FAILED
-                self.task.error = "Timeout waiting for resources"
-                monitor.record_task_failed(self.task)
-                return False
-
-            # 获取资源
-            if not resource_mgr.acquire(self.task):
-                logger.error(f"[EXECUTOR] Failed to acquire resources for {self.task.id}")
-                self.task.status = TaskStatus.FAILED
-                self.task.error = "Failed to acquire resources"
-                monitor.record_task_failed(self.task)
+                self._finish(TaskStatus.FAILED, "Timeout waiting for resources")
                 return False
 
             try:
                 # 执行任务
                 self.task.status = TaskStatus.RUNNING
                 self.task.started_at = datetime.now()
+                self.task.completed_at = None
                 
                 logger.info(f"[EXECUTOR] Starting task {self.task.id} (type={self.task.type.value})")
                 
                 result = self.execute_fn(self.task)
                 
+                if self.task.is_aborted:
+                    logger.info(f"[EXECUTOR] Task {self.task.id} cancelled while running")
+                    self._finish(TaskStatus.CANCELLED)
+                    return False
+                
                 # 成功
-                self.task.status = TaskStatus.COMPLETED
                 self.task.result = result
-                self.task.completed_at = datetime.now()
+                self.circuit_breaker.record_success()
+                self._finish(TaskStatus.COMPLETED)
                 
                 logger.info(f"[EXECUTOR] Task {self.task.id} completed in {self.task.elapsed_time:.2f}s")
                 
-                # 记录成功
-                self.circuit_breaker.record_success()
-                monitor.record_task_complete(self.task)
-                
                 # 调用回调
                 if self.task.on_complete:
                     try:
@@ -130,10 +155,10 @@ class TaskExecutor:
                 logger.error(f"[EXECUTOR] Task {self.task.id} execution error: {e}")
                 logger.error(f"[EXECUTOR] Traceback: {__import__('traceback').format_exc()}")
 
+                self.circuit_breaker.record_failure()
+
                 # 判断是否应该重试
-                should_retry = self.retry_policy.should_retry(self.task, e)
-                
-                if should_retry:
+                if not self.task.is_aborted and self.retry_policy.should_retry(self.task, e):
                     self.task.retry_count += 1
                     delay = self.retry_policy.get_retry_delay(self.task.retry_count)
                     
@@ -142,37 +167,25 @@ class TaskExecutor:
                     self.task.status = TaskStatus.RETRYING
                     self.task.error = str(e)
                     
-                    # 记录失败（但不是最终失败）
-                    self.circuit_breaker.record_failure()
-                    
-                    # 在延迟后重新入队
-                    if delay > 0:
-                        time.sleep(delay)
-                    
-                    queue_mgr = get_queue_manager()
-                    queue_mgr.submit(self.task)  # 重新提交
+                    # 延迟后重新入队（定时器线程，不占用工作线程）
+                    timer = threading.Timer(delay, self._resubmit)
+                    timer.daemon = True
+                    timer.start()
                     
                     return False  # 表示此执行失败，但任务会重试
 
-                else:
-                    # 致命错误或超过重试次数
-                    self.task.status = TaskStatus.FAILED
-                    self.task.completed_at = datetime.now()
-                    self.task.error = str(e)
-                    
-                    logger.error(f"[EXECUTOR] Task {self.task.id} failed permanently: {e}")
-                    
-                    self.circuit_breaker.record_failure()
-                    monitor.record_task_failed(self.task)
-                    
-                    # 调用错误回调
-                    if self.task.on_error:
-                        try:
-                            self.task.on_error(e)
-                        except Exception as callback_err:
-                            logger.error(f"[EXECUTOR] Error in on_error callback: {callback_err}")
-                    
-                    return False
+                # 致命错误或超过重试次数
+                logger.error(f"[EXECUTOR] Task {self.task.id} failed permanently: {e}")
+                self._finish(TaskStatus.FAILED, str(e))
+                
+                # 调用错误回调
+                if self.task.on_error:
+                    try:
+                        self.task.on_error(e)
+                    except Exception as callback_err:
+                        logger.error(f"[EXECUTOR] Error in on_error callback: {callback_err}")
+                
+                return False
 
             finally:
                 # 释放资源
@@ -181,12 +194,19 @@ class TaskExecutor:
 
         except Exception as e:
             logger.error(f"[EXECUTOR] Unexpected error in execute(): {e}")
-            self.task.status = TaskStatus.FAILED
-            self.task.error = f"Unexpected error: {str(e)}"
-            monitor = get_task_monitor()
-            monitor.record_task_failed(self.task)
+            self._finish(TaskStatus.FAILED, f"Unexpected error: {str(e)}")
             return False
 
+    def _resubmit(self):
+        if self.task.is_aborted:
+            self._finish(TaskStatus.CANCELLED)
+            return
+        try:
+            get_queue_manager().submit(self.task)
+        except Exception as e:
+            logger.error(f"[EXECUTOR] Failed to resubmit task {self.task.id}: {e}")
+            self._finish(TaskStatus.FAILED, f"Retry resubmission failed: {e}")
+
 
 # ============================================================================
 # 任务调度器
@@ -196,30 +216,33 @@ class TaskScheduler:
     """
     中央任务调度器
     
-    运行在后台线程中，不断地：
-    1. 从队列取任务
-    2. 检查资源
-    3. 创建执行器
-    4. 在线程池中执行
+    启动 max_workers 个工作线程，每个线程不断地：
+    1. 从优先级队列取任务
+    2. 等待并获取资源（ResourceManager.acquire/release）
+    3. 执行任务，失败时按 RetryPolicy 延迟重试
+    4. 结束后写入任务状态表与耗时统计
     
     支持：
     - 优先级调度
     - 资源感知
-    - 动态并发控制
+    - 按任务类型熔断（同类任务共用一个 CircuitBreaker）
     """
 
     def __init__(self, max_workers: int = 5):
-        self.max_workers = max_workers
+        self.max_workers = max(1, max_workers)
         self.queue_mgr = get_queue_manager()
         self.resource_mgr = get_resource_manager()
         self.monitor = get_task_monitor()
         
         self.running = False
-        self.scheduler_thread = None
+        self.workers: List[threading.Thread] = []
         self.lock = threading.Lock()
         
-        # 任务执行函数映射
+        # 任务执行函数映射、每种任务类型的熔断器
         self.executors: dict = {}
+        self.breakers: Dict[TaskType, CircuitBreaker] = {}
+        
+        self._busy = 0
 
     def register_executor(self, task_type: TaskType, execute_fn: Callable):
         """注册任务类型的执行函数"""
@@ -227,40 +250,50 @@ class TaskScheduler:
         logger.info(f"[SCHEDULER] Registered executor for {task_type.value}")
 
     def start(self):
-        """启动调度器"""
+        """启动调度器（工作线程池）"""
         with self.lock:
             if self.running:
                 logger.warning("[SCHEDULER] Scheduler already running")
                 return
             
             self.running = True
-            self.scheduler_thread = threading.Thread(
-                target=self._scheduler_loop,
-                name="TaskScheduler",
-                daemon=False
-            )
-            self.scheduler_thread.start()
-            logger.info("[SCHEDULER] Started")
+            self.workers = [
+                threading.Thread(
+                    target=self._worker_loop,
+                    name=f"TaskWorker-{i}",
+                    daemon=True
+                )
+                for i in range(self.max_workers)
+            ]
+            for worker in self.workers:
+                worker.start()
+            logger.info(f"[SCHEDULER] Started with {self.max_workers} workers")
 
     def stop(self):
-        """停止调度器"""
+        """停止调度器（等待正在执行的任务结束）"""
         with self.lock:
             self.running = False
+            workers, self.workers = self.workers, []
         
-        if self.scheduler_thread:
-            self.scheduler_thread.join(timeout=10)
+        self.queue_mgr.wake_all()
+        for worker in workers:
+            worker.join(timeout=10)
         
         logger.info("[SCHEDULER] Stopped")
 
-    def _scheduler_loop(self):
-        """调度器主循环"""
-        logger.info("[SCHEDULER] Loop started")
+    def _breaker(self, task_type: TaskType) -> CircuitBreaker:
+        with self.lock:
+            breaker = self.breakers.get(task_type)
+            if breaker is None:
+                breaker = self.breakers[task_type] = CircuitBreaker()
+            return breaker
+
+    def _worker_loop(self):
+        """工作线程主循环"""
+        logger.info(f"[SCHEDULER] {threading.current_thread().name} started")
         
         while self.running:
             try:
-                # 定期补充API令牌
-                self.resource_mgr.refill_api_tokens()
-                
                 # 尝试获取任务
                 task = self.queue_mgr.get_next(timeout=1.0)
                 
@@ -268,36 +301,42 @@ class TaskScheduler:
                     # 没有任务，继续等待
                     continue
                 
-                # 检查任务是否被取消
-                if task.status == TaskStatus.CANCELLED:
-                    logger.info(f"[SCHEDULER] Skipping cancelled task {task.id}")
-                    continue
-                
                 # 检查是否有对应的执行函数
                 execute_fn = self.executors.get(task.type)
-                if execute_fn is None:
+                if execute_fn is None and not task.is_aborted:
                     logger.error(f"[SCHEDULER] No executor for task type {task.type.value}")
                     task.status = TaskStatus.FAILED
                     task.error = f"No executor for {task.type.value}"
+                    task.completed_at = datetime.now()
+                    self.queue_mgr.task_done(task)
                     self.monitor.record_task_failed(task)
                     continue
                 
-                # 创建执行器并执行
-                executor = TaskExecutor(task, execute_fn)
-                executor.execute()
+                # 创建执行器并执行（被取消的任务由执行器直接结束）
+                with self.lock:
+                    self._busy += 1
+                try:
+                    TaskExecutor(task, execute_fn, self._breaker(task.type)).execute()
+                finally:
+                    with self.lock:
+                        self._busy -= 1
                 
             except Exception as e:
-                logger.error(f"[SCHEDULER] Error in scheduler loop: {e}")
+                logger.error(f"[SCHEDULER] Error in worker loop: {e}")
                 time.sleep(1)  # 避免紧密循环
         
-        logger.info("[SCHEDULER] Loop ended")
+        logger.info(f"[SCHEDULER] {threading.current_thread().name} ended")
 
     def get_stats(self) -> dict:
         """获取调度器统计"""
-        return {
-            'running': self.running,
-            'max_workers': self.max_workers,
-        }
+        with self.lock:
+            return {
+                'running': self.running,
+                'max_workers': self.max_workers,
+                'alive_workers': sum(1 for w in self.workers if w.is_alive()),
+                'busy_workers': self._busy,
+                'circuit_breakers': {t.value: b.state for t, b in self.breakers.items()},
+            }
 
 
 # ============================================================================
@@ -308,10 +347,10 @@ _global_scheduler = None
 
 
 def get_scheduler() -> TaskScheduler:
-    """获取全局调度器"""
+    """获取全局调度器（工作线程数可通过 KOTO_TASK_WORKERS 配置）"""
     global _global_scheduler
     if _global_scheduler is None:
-        _global_scheduler = TaskScheduler(max_workers=5)
+        _global_scheduler = TaskScheduler(max_workers=int(os.environ.get("KOTO_TASK_WORKERS", "5")))
     return _global_scheduler
 
 
@@ -3,16 +3,21 @@
 """
 任务调度系统
 支持定时任务、条件触发、任务队列
+定时任务由共享定时服务（timer_service）触发，不再单独开调度线程轮询
 """
 import os
 import json
 import threading
 import time
-import schedule  # pip install schedule
 from datetime import datetime
 from typing import Callable, List, Dict, Any
 from enum import Enum
 
+try:
+    from web.timer_service import TimerJob, get_timer_service, next_fire_time
+except ImportError:
+    from timer_service import TimerJob, get_timer_service, next_fire_time
+
 
 class TaskStatus(Enum):
     """任务状态"""
@@ -114,13 +119,18 @@ class Task:
 class TaskScheduler:
     """任务调度器"""
     
-    def __init__(self):
+    TIMER_KIND = "scheduled_task"
+    
+    def __init__(self, timer_service=None):
         self.tasks: Dict[str, Task] = {}
         self.task_queue: List[Task] = []
         self.running = False
-        self._scheduler_thread = None
         self._worker_thread = None
         
+        # 定时任务的动作是进程内函数，只在内存中调度（重启后由注册方重新注册）
+        self.timer_service = timer_service or get_timer_service()
+        self.timer_service.register_handler(self.TIMER_KIND, self._on_timer)
+        
         # 持久化文件
         script_dir = os.path.dirname(os.path.abspath(__file__))
         project_root = os.path.dirname(script_dir)
@@ -189,15 +199,15 @@ class TaskScheduler:
             args: 函数参数
             kwargs: 函数关键字参数
         """
-        task_id = f"scheduled_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        task_id = f"scheduled_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
         
-        # 注册到 schedule 库
-        if schedule_type == "daily":
-            schedule.every().day.at(time_str).do(action, *args, **(kwargs or {}))
-        elif schedule_type == "weekly":
-            schedule.every().week.at(time_str).do(action, *args, **(kwargs or {}))
-        elif schedule_type == "hourly":
-            schedule.every().hour.do(action, *args, **(kwargs or {}))
+        # 注册到共享定时服务
+        if schedule_type in ("daily", "weekly", "hourly"):
+            repeat = {"type": schedule_type, "time": time_str}
+            self.timer_service.schedule(
+                task_id, self.TIMER_KIND, next_fire_time(repeat, datetime.now()),
+                payload={"task_id": task_id}, repeat=repeat, persist=False
+            )
         
         task = Task(
             task_id=task_id,
@@ -220,6 +230,7 @@ class TaskScheduler:
         if task_id in self.tasks:
             task = self.tasks[task_id]
             task.mark_cancelled()
+            self.timer_service.cancel(task_id)
             
             # 从队列中移除
             self.task_queue = [t for t in self.task_queue if t.task_id != task_id]
@@ -255,13 +266,14 @@ class TaskScheduler:
             
             time.sleep(0.5)
     
-    def _scheduler_loop(self):
-        """调度线程，处理定时任务"""
-        print("[调度器] 调度线程已启动")
-        
-        while self.running:
-            schedule.run_pending()
-            time.sleep(1)
+    def _on_timer(self, job: TimerJob):
+        """定时服务回调：执行到期的定时任务（调度器未启动时跳过）"""
+        task = self.tasks.get(job.payload.get("task_id"))
+        if task is None or task.is_cancelled() or not self.running:
+            return
+        print(f"[调度器] 执行定时任务: {task.name}")
+        task.execute()
+        self._save_tasks()
     
     def start(self):
         """启动调度器"""
@@ -275,10 +287,6 @@ class TaskScheduler:
         self._worker_thread = threading.Thread(target=self._worker_loop, daemon=True)
         self._worker_thread.start()
         
-        # 启动调度线程
-        self._scheduler_thread = threading.Thread(target=self._scheduler_loop, daemon=True)
-        self._scheduler_thread.start()
-        
         print("[调度器] 已启动")
     
     def stop(self):
@@ -287,8 +295,6 @@ class TaskScheduler:
         
         if self._worker_thread:
             self._worker_thread.join(timeout=2)
-        if self._scheduler_thread:
-            self._scheduler_thread.join(timeout=2)
         
         print("[调度器] 已停止")
     
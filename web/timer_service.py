@@ -0,0 +1,338 @@
+"""
+共享定时服务 - 单线程最小堆定时器与 SQLite 持久化
+
+提醒、日程提醒、定时任务、自动归纳不再各自开线程或轮询，统一交给这里调度：
+1. 待触发作业按触发时间放在最小堆里，一个线程等待堆顶到期（无到期作业时不醒来）
+2. 取消只从作业表中移除，堆中残留的旧条目弹出时跳过，残留过多时整体重建
+3. 到期作业交给小线程池执行处理函数，慢的处理函数（如通知弹窗）不影响其他作业准时触发
+4. persist=True 的作业写入 SQLite（批量写线程合并提交），重启后由同类型的处理函数接管
+
+用法:
+    service = get_timer_service()
+    service.register_handler("reminder", on_reminder)          # on_reminder(job)
+    service.schedule("reminder_1", "reminder", fire_at=datetime(...), payload={...})
+    service.schedule("catalog", "auto_catalog", fire_at, repeat={"type": "daily", "time": "02:00"})
+    service.cancel("reminder_1")
+"""
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Union
+
+try:
+    from web.sqlite_pool import get_database
+except ImportError:
+    from sqlite_pool import get_database
+
+
+def next_fire_time(repeat: Dict, after: datetime) -> datetime:
+    """
+    重复作业在 after 之后的下一次触发时间
+
+    repeat 取值:
+        {"type": "daily", "time": "HH:MM"}
+        {"type": "weekly", "time": "HH:MM", "weekday": 0-6}   # 缺省为 after 当天的星期
+        {"type": "hourly"}
+        {"type": "interval", "seconds": N}
+    """
+    kind = repeat.get("type")
+    if kind == "interval":
+        return after + timedelta(seconds=float(repeat["seconds"]))
+    if kind == "hourly":
+        return after + timedelta(hours=1)
+    if kind not in ("daily", "weekly"):
+        raise ValueError(f"不支持的重复类型: {kind}")
+
+    hour, minute = (int(part) for part in repeat.get("time", "00:00").split(":")[:2])
+    candidate = after.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    step = timedelta(days=1)
+    if kind == "weekly":
+        step = timedelta(days=7)
+        weekday = repeat.get("weekday", after.weekday())
+        candidate += timedelta(days=(weekday - candidate.weekday()) % 7)
+    while candidate <= after:
+        candidate += step
+    return candidate
+
+
+@dataclass
+class TimerJob:
+    """一个待触发的作业"""
+    job_id: str
+    kind: str
+    fire_at: float                      # 触发时间（epoch 秒）
+    payload: Dict = field(default_factory=dict)
+    repeat: Optional[Dict] = None
+    persist: bool = True
+    seq: int = 0                        # 与堆条目对应，被替换或取消后旧条目失效
+
+
+class TimerService:
+    """单线程定时器：最小堆 + 条件变量等待，作业表支持 O(1) 取消"""
+
+    MAX_WAIT = 60.0          # 最长等待，系统时间被调整后也能及时重新计算
+    WORKERS = 4              # 执行处理函数的线程数
+    COMPACT_MIN = 256        # 堆中失效条目超过此数且超过有效作业数时重建堆
+
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        Args:
+            db_path: 持久化作业的 SQLite 文件，None 时所有作业只保存在内存中
+        """
+        self.db_path = db_path
+        self._heap: List[tuple] = []
+        self._jobs: Dict[str, TimerJob] = {}
+        self._handlers: Dict[str, Callable[[TimerJob], None]] = {}
+        self._orphans: Dict[str, List[TimerJob]] = defaultdict(list)   # 到期时尚无处理函数
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._running = False
+
+        self.stats = {"scheduled": 0, "cancelled": 0, "fired": 0, "max_lateness": 0.0}
+        if db_path:
+            self._load()
+
+    # ── 持久化 ──
+
+    def _load(self):
+        """建表并把上次退出时未触发的作业放回堆中"""
+        db = get_database(self.db_path)
+        db.write(lambda conn: conn.execute(
+            "CREATE TABLE IF NOT EXISTS timer_jobs ("
+            "job_id TEXT PRIMARY KEY, kind TEXT NOT NULL, fire_at REAL NOT NULL, "
+            "payload TEXT, repeat TEXT)"), wait=True)
+        conn = db.connect()
+        try:
+            rows = conn.execute("SELECT job_id, kind, fire_at, payload, repeat FROM timer_jobs").fetchall()
+        finally:
+            conn.close()
+
+        with self._cond:
+            for job_id, kind, fire_at, payload, repeat in rows:
+                job = TimerJob(job_id, kind, fire_at, json.loads(payload) if payload else {},
+                               json.loads(repeat) if repeat else None, True, next(self._seq))
+                self._jobs[job_id] = job
+                self._heap.append((job.fire_at, job.seq, job_id))
+            heapq.heapify(self._heap)
+        if rows:
+            print(f"[定时] 已恢复 {len(rows)} 个待触发作业")
+
+    def _persist(self, job: TimerJob):
+        if not self.db_path:
+            return
+        row = (job.job_id, job.kind, job.fire_at, json.dumps(job.payload, ensure_ascii=False),
+               json.dumps(job.repeat) if job.repeat else None)
+        get_database(self.db_path).write(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO timer_jobs (job_id, kind, fire_at, payload, repeat) "
+            "VALUES (?, ?, ?, ?, ?)", row))
+
+    def _unpersist(self, job_id: str, fire_at: Optional[float] = None):
+        """删除持久化的作业；给定 fire_at 时只删除该次触发（期间被重新调度的同名作业保留）"""
+        if not self.db_path:
+            return
+        if fire_at is None:
+            sql, params = "DELETE FROM timer_jobs WHERE job_id = ?", (job_id,)
+        else:
+            sql, params = "DELETE FROM timer_jobs WHERE job_id = ? AND fire_at = ?", (job_id, fire_at)
+        get_database(self.db_path).write(lambda conn: conn.execute(sql, params))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待作业表的修改写入数据库"""
+        return get_database(self.db_path).flush(timeout) if self.db_path else True
+
+    # ── 调度接口 ──
+
+    def register_handler(self, kind: str, handler: Callable[[TimerJob], None]):
+        """注册某类作业的处理函数，之前因没有处理函数而搁置的到期作业立即执行"""
+        with self._cond:
+            self._handlers[kind] = handler
+            orphans = self._orphans.pop(kind, [])
+            self._ensure_thread()
+        for job in orphans:
+            if job.persist and not job.repeat:
+                self._unpersist(job.job_id, job.fire_at)
+            self._dispatch(job, handler)
+
+    def schedule(self, job_id: str, kind: str, fire_at: Union[datetime, float],
+                 payload: Optional[Dict] = None, repeat: Optional[Dict] = None,
+                 persist: bool = True) -> str:
+        """
+        调度作业，同名作业已存在时替换
+
+        Args:
+            job_id: 作业 ID（用于取消）
+            kind: 作业类型，对应 register_handler 注册的处理函数
+            fire_at: 首次触发时间（datetime 或 epoch 秒），已过去时立即触发
+            payload: 传给处理函数的数据（持久化时需可 JSON 序列化）
+            repeat: 重复规则，见 next_fire_time；None 为一次性作业
+            persist: 是否写入数据库，重启后继续调度
+        """
+        if isinstance(fire_at, datetime):
+            fire_at = fire_at.timestamp()
+        persist = persist and bool(self.db_path)
+        with self._cond:
+            job = TimerJob(job_id, kind, float(fire_at), payload or {}, repeat, persist, next(self._seq))
+            previous = self._jobs.get(job_id)
+            self._jobs[job_id] = job
+            heapq.heappush(self._heap, (job.fire_at, job.seq, job_id))
+            self.stats["scheduled"] += 1
+            self._ensure_thread()
+            if self._heap[0][1] == job.seq:
+                self._cond.notify()
+            # 在锁内入队写操作，保证与触发/取消时的删除按调用顺序提交
+            if persist:
+                self._persist(job)
+            elif previous is not None and previous.persist:
+                self._unpersist(job_id)
+        return job_id
+
+    def cancel(self, job_id: str) -> bool:
+        """取消作业（堆中的条目留待弹出时跳过）"""
+        with self._cond:
+            job = self._jobs.pop(job_id, None)
+            if job is None:
+                return False
+            self.stats["cancelled"] += 1
+            if len(self._heap) > self.COMPACT_MIN and len(self._heap) > 2 * len(self._jobs):
+                self._heap = [(j.fire_at, j.seq, j.job_id) for j in self._jobs.values()]
+                heapq.heapify(self._heap)
+            if job.persist:
+                self._unpersist(job_id)
+        return True
+
+    def get_job(self, job_id: str) -> Optional[TimerJob]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self, kind: Optional[str] = None) -> List[TimerJob]:
+        """按触发时间列出待触发作业"""
+        with self._cond:
+            jobs = [job for job in self._jobs.values() if kind is None or job.kind == kind]
+        return sorted(jobs, key=lambda job: job.fire_at)
+
+    # ── 调度线程 ──
+
+    def _ensure_thread(self):
+        """按需启动调度线程（调用方持有 self._cond）"""
+        if self._thread is None or not self._thread.is_alive():
+            self._running = True
+            self._thread = threading.Thread(target=self._run, daemon=True, name="timer-service")
+            self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        """停止调度线程，未触发的作业保留（可再次 schedule/register_handler 重新启动）"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self.flush(timeout)
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._running:
+                        return
+                    now = time.time()
+                    due = self._pop_due(now)
+                    if due is not None:
+                        break
+                    timeout = self._heap[0][0] - now if self._heap else self.MAX_WAIT
+                    self._cond.wait(min(timeout, self.MAX_WAIT))
+                job, following = due
+                handler = self._handlers.get(job.kind)
+                if handler is None:
+                    self._orphans[job.kind].append(job)
+                lateness = now - job.fire_at
+                if lateness > self.stats["max_lateness"]:
+                    self.stats["max_lateness"] = lateness
+                try:
+                    if following is not None and following.persist:
+                        self._persist(following)
+                    elif job.persist and handler is not None:
+                        self._unpersist(job.job_id, job.fire_at)
+                except Exception as e:
+                    # 写库失败只影响重启后的恢复，调度线程继续运行
+                    print(f"[定时] 作业 {job.job_id} 持久化失败: {e}")
+            if handler is not None:
+                try:
+                    self._dispatch(job, handler)
+                except Exception as e:
+                    print(f"[定时] 作业 {job.job_id} 提交执行失败: {e}")
+
+    def _pop_due(self, now: float):
+        """弹出一个到期作业，重复作业同时排入下一次；返回 (作业, 下一次的作业) 或 None"""
+        while self._heap:
+            fire_at, seq, job_id = self._heap[0]
+            job = self._jobs.get(job_id)
+            if job is None or job.seq != seq:
+                heapq.heappop(self._heap)           # 已取消或已被替换
+                continue
+            if fire_at > now:
+                return None
+            heapq.heappop(self._heap)
+            if job.repeat:
+                # 停机期间错过的多次触发只补一次
+                try:
+                    next_at = next_fire_time(job.repeat, datetime.fromtimestamp(max(fire_at, now))).timestamp()
+                except Exception as e:
+                    # 重复规则无效（如数据库中的旧数据）：本次照常触发，之后按一次性作业删除
+                    print(f"[定时] 作业 {job_id} 重复规则无效，不再重复: {e}")
+                    del self._jobs[job_id]
+                    return replace(job, repeat=None), None
+                following = TimerJob(job.job_id, job.kind, next_at, job.payload, job.repeat,
+                                     job.persist, next(self._seq))
+                self._jobs[job_id] = following
+                heapq.heappush(self._heap, (next_at, following.seq, job_id))
+                return job, following
+            del self._jobs[job_id]
+            return job, None
+        return None
+
+    def _dispatch(self, job: TimerJob, handler: Callable[[TimerJob], None]):
+        with self._cond:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.WORKERS, thread_name_prefix="timer-job")
+            executor = self._executor
+            self.stats["fired"] += 1
+        executor.submit(self._call, handler, job)
+
+    @staticmethod
+    def _call(handler: Callable[[TimerJob], None], job: TimerJob):
+        try:
+            handler(job)
+        except Exception as e:
+            print(f"[定时] 作业 {job.job_id} 执行失败: {e}")
+
+
+_timer_service: Optional[TimerService] = None
+_timer_service_lock = threading.Lock()
+
+
+def get_timer_service() -> TimerService:
+    """获取全局定时服务（作业持久化到 workspace/scheduler/timer_jobs.db）"""
+    global _timer_service
+    with _timer_service_lock:
+        if _timer_service is None:
+            script_dir = os.path.dirname(os.path.abspath(__file__))
+            project_root = os.path.dirname(script_dir)
+            _timer_service = TimerService(os.path.join(project_root, 'workspace', 'scheduler', 'timer_jobs.db'))
+        return _timer_service
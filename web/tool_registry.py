@@ -972,7 +972,7 @@ class ToolRegistry:
             search_engine = _lazy_import("search_engine")
             results = search_engine.search_all(query, max_results=max_results)
             
-            total = sum(len(v) for v in results.values()) if isinstance(results, dict) else 0
+            total = sum(len(v) for k, v in results.items() if k != 'ranked') if isinstance(results, dict) else 0
             
             return {
                 "success": True,
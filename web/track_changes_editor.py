@@ -22,6 +22,11 @@ import shutil
 import tempfile
 import os
 
+try:
+    from docx_text_index import DocumentTextIndex
+except ImportError:
+    from web.docx_text_index import DocumentTextIndex
+
 
 class TrackChangesEditor:
     """Word Track Changes 修订编辑器（改进版）"""
@@ -722,6 +727,11 @@ class TrackChangesEditor:
             print(f"[Hybrid] ✏️  精确修改: {len(track_changes_items)} 条（Track Changes）")
             print(f"[Hybrid] 💬 方向建议: {len(comment_items)} 条（Comments）")
             
+            # 整篇文档只建一次文本索引，两类标注共用；应用修订时随 run 拆分增量更新
+            index = DocumentTextIndex.for_document(
+                doc, [item['original'] for item in track_changes_items + comment_items]
+            )
+            
             # 先应用 Track Changes
             tracked_success = 0
             tracked_failed = 0
@@ -742,7 +752,8 @@ class TrackChangesEditor:
                         doc, 
                         item['original'],
                         item['modified'],
-                        item['reason']
+                        item['reason'],
+                        index=index
                     )
                     
                     if success:
@@ -777,7 +788,8 @@ class TrackChangesEditor:
                         comments_el,
                         item['original'],
                         item['modified'],
-                        item['reason']
+                        item['reason'],
+                        index=index
                     )
                     
                     if success:
@@ -853,61 +865,35 @@ class TrackChangesEditor:
         doc: Document,
         original_text: str,
         modified_text: str,
-        reason: str = ""
+        reason: str = "",
+        index: DocumentTextIndex = None
     ) -> bool:
-        """应用单个修订标记（保留格式版）"""
+        """
+        应用单个修订标记（保留格式版）
+
+        index: 整篇文档共用的文本索引；拆分 run 后在此刷新该段落
+        """
         try:
             from copy import deepcopy
             
-            # 收集所有段落（正文 + 表格）
-            all_paragraphs = list(doc.paragraphs)
-            for table in doc.tables:
-                for row in table.rows:
-                    for cell in row.cells:
-                        all_paragraphs.extend(cell.paragraphs)
+            # 未传入索引时为本次调用构建（正文 + 表格）
+            if index is None:
+                index = DocumentTextIndex.for_document(doc, [original_text])
             
-            for para in all_paragraphs:
-                if original_text not in para.text:
-                    continue
-                    
-                # 找到匹配的段落
-                # 1. 映射 run
-                run_map = []
-                current_pos = 0
-                full_text_parts = []
-                for i, run in enumerate(para.runs):
-                    text = run.text
-                    run_map.append({
-                        "start": current_pos,
-                        "end": current_pos + len(text),
-                        "run": run,
-                        "index": i
-                    })
-                    full_text_parts.append(text)
-                    current_pos += len(text)
-                
-                full_text = "".join(full_text_parts)
-                start_idx = full_text.find(original_text)
-                if start_idx == -1:
-                    continue
+            hit = index.find(original_text)
+            if hit is not None:
+                para_idx, start_idx = hit
+                para = index.paragraphs[para_idx]
                 end_idx = start_idx + len(original_text)
                 
-                # 2. 找到涉及的 runs
-                target_runs = []
-                start_run_info = None
-                end_run_info = None
-                
-                for info in run_map:
-                    # 如果 run 与 [start_idx, end_idx] 有交集
-                    if max(start_idx, info["start"]) < min(end_idx, info["end"]):
-                        target_runs.append(info)
-                        if info["start"] <= start_idx < info["end"]:
-                            start_run_info = info
-                        if info["start"] < end_idx <= info["end"]:
-                            end_run_info = info
-                
-                if not target_runs:
-                    continue
+                # 1. 二分定位首尾 run；中间只移动有文本的 run（与原逻辑一致）
+                runs = index.runs(para_idx)
+                first, last = index.locate(para_idx, start_idx, end_idx)
+                target_runs = [{
+                    "start": index.run_start(para_idx, i),
+                    "run": runs[i],
+                    "index": i
+                } for i in range(first, last + 1) if i in (first, last) or runs[i].text]
 
                 # 3. 准备修改
                 runs_to_move = []
@@ -1054,6 +1040,7 @@ class TrackChangesEditor:
                 
                 parent.insert(base_idx + 2, ins_el)
                 
+                index.refresh(para_idx)
                 return True
                 
             return False
@@ -1164,87 +1151,72 @@ class TrackChangesEditor:
         comments_el,
         original_text: str,
         suggestion_text: str,
-        reason: str = ""
+        reason: str = "",
+        index: DocumentTextIndex = None
     ) -> bool:
-        """应用单个批注（内部方法）"""
+        """应用单个批注（内部方法，只在正文段落中查找）"""
         try:
-            for para in doc.paragraphs:
-                if original_text in para.text:
-                    self.change_id += 1
-                    comment_id = str(self.change_id)
-                    
-                    # 构建批注内容
-                    comment_content = suggestion_text
-                    if reason:
-                        comment_content = f"{suggestion_text}\n\n原因：{reason}"
-                    
-                    # 创建批注元素
-                    comment_xml = f'''
-                    <w:comment w:id="{comment_id}" w:author="{self.author}" w:date="{datetime.now().isoformat()}" xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">
-                        <w:p>
-                            <w:pPr>
-                                <w:pStyle w:val="CommentText"/>
-                            </w:pPr>
-                            <w:r>
-                                <w:t>{self._esc(comment_content)}</w:t>
-                            </w:r>
-                        </w:p>
-                    </w:comment>
-                    '''
-                    comments_el.append(parse_xml(comment_xml))
-                    
-                    # 在段落中标记批注范围
-                    pos = para.text.index(original_text)
-                    
-                    # 分割 runs
-                    accumulated = 0
-                    start_run_idx = -1
-                    start_offset = 0
-                    end_run_idx = -1
-                    end_offset = 0
-                    
-                    for idx, run in enumerate(para.runs):
-                        run_len = len(run.text)
-                        
-                        if start_run_idx == -1 and accumulated + run_len > pos:
-                            start_run_idx = idx
-                            start_offset = pos - accumulated
-                        
-                        if accumulated + run_len >= pos + len(original_text):
-                            end_run_idx = idx
-                            end_offset = pos + len(original_text) - accumulated
-                            break
-                        
-                        accumulated += run_len
-                    
-                    if start_run_idx >= 0:
-                        # 在起始位置插入 commentRangeStart
-                        start_marker = parse_xml(
-                            f'<w:commentRangeStart w:id="{comment_id}" xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"/>'
-                        )
-                        para.runs[start_run_idx]._element.addprevious(start_marker)
-                        
-                        # 在结束位置插入 commentRangeEnd
-                        if end_run_idx >= 0:
-                            end_marker = parse_xml(
-                                f'<w:commentRangeEnd w:id="{comment_id}" xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"/>'
-                            )
-                            para.runs[end_run_idx]._element.addnext(end_marker)
-                            
-                            # 插入 comment reference
-                            ref_run_xml = f'''
-                            <w:r xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">
-                                <w:rPr>
-                                    <w:rStyle w:val="CommentReference"/>
-                                </w:rPr>
-                                <w:commentReference w:id="{comment_id}"/>
-                            </w:r>
-                            '''
-                            para._element.append(parse_xml(ref_run_xml))
-                            
-                            return True
+            if index is None:
+                index = DocumentTextIndex.for_document(doc, [original_text], include_tables=False)
             
-            return False
+            hit = index.find(original_text, stop=index.body_count)
+            if hit is None:
+                return False
+            para_idx, pos = hit
+            para = index.paragraphs[para_idx]
+            runs = index.runs(para_idx)
+            
+            self.change_id += 1
+            comment_id = str(self.change_id)
+            
+            # 构建批注内容
+            comment_content = suggestion_text
+            if reason:
+                comment_content = f"{suggestion_text}\n\n原因：{reason}"
+            
+            # 创建批注元素
+            comment_xml = f'''
+            <w:comment w:id="{comment_id}" w:author="{self.author}" w:date="{datetime.now().isoformat()}" xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">
+                <w:p>
+                    <w:pPr>
+                        <w:pStyle w:val="CommentText"/>
+                    </w:pPr>
+                    <w:r>
+                        <w:t>{self._esc(comment_content)}</w:t>
+                    </w:r>
+                </w:p>
+            </w:comment>
+            '''
+            comments_el.append(parse_xml(comment_xml))
+            
+            # 在段落中标记批注范围：二分定位首尾 run
+            start_run_idx, end_run_idx = index.locate(para_idx, pos, pos + len(original_text))
+            
+            # 在起始位置插入 commentRangeStart
+            start_marker = parse_xml(
+                f'<w:commentRangeStart w:id="{comment_id}" xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"/>'
+            )
+            runs[start_run_idx]._element.addprevious(start_marker)
+            
+            # 在结束位置插入 commentRangeEnd
+            end_marker = parse_xml(
+                f'<w:commentRangeEnd w:id="{comment_id}" xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"/>'
+            )
+            runs[end_run_idx]._element.addnext(end_marker)
+            
+            # 插入 comment reference
+            ref_run_xml = f'''
+            <w:r xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">
+                <w:rPr>
+                    <w:rStyle w:val="CommentReference"/>
+                </w:rPr>
+                <w:commentReference w:id="{comment_id}"/>
+            </w:r>
+            '''
+            para._element.append(parse_xml(ref_run_xml))
+            index.refresh(para_idx)
+            
+            return True
             
         except Exception as e:
             print(f"[Comment] 单条批注失败: {e}")
@@ -0,0 +1,429 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+持久化向量存储 - 供 KnowledgeBase 使用
+- 向量：float32，追加写入 vectors.f32，通过 np.memmap 映射读取
+- 文本/元数据：SQLite (WAL)
+- 可选 IVF 近似最近邻索引（纯 NumPy k-means），新增向量增量归入最近的簇
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+class VectorStore:
+    """追加写入的内存映射向量库 + SQLite 元数据 + IVF 索引"""
+
+    ANN_MIN_ROWS = 4096       # 少于该行数时直接暴力检索
+    ANN_RETRAIN_FACTOR = 4    # 行数增长到训练时的 N 倍后重新训练簇中心
+    ANN_NPROBE = 8            # 每次查询探测的簇数量
+    KMEANS_ITERS = 10
+    KMEANS_SAMPLE = 20000
+
+    def __init__(self, store_dir: str, dim: Optional[int] = None):
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+        self.db_path = os.path.join(store_dir, "store.db")
+        self.vectors_path = os.path.join(store_dir, "vectors.f32")
+        self.centroids_path = os.path.join(store_dir, "ivf_centroids.npy")
+        self._lock = threading.RLock()
+
+        self._init_database()
+        self.dim = dim or 0
+        self._generation = -1        # 写入代数，用于感知其他实例/进程的写入
+        self._rows = 0               # 已提交的向量行数
+        self._mmap = None            # np.memmap (rows, dim)
+        self._live = np.zeros(0, dtype=bool)
+        self._centroids = None       # (nlist, dim) 或 None
+        self._lists: Dict[int, np.ndarray] = {}
+        self._trained_rows = 0
+        self._load()
+
+    # ==================== 存储层 ====================
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_database(self):
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                row INTEGER PRIMARY KEY,
+                chunk_id TEXT UNIQUE NOT NULL,
+                doc_id TEXT NOT NULL,
+                chunk_index INTEGER,
+                text TEXT,
+                metadata TEXT,
+                created_at TEXT,
+                cluster INTEGER DEFAULT -1
+            );
+            CREATE INDEX IF NOT EXISTS idx_chunks_doc ON chunks(doc_id);
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_id TEXT PRIMARY KEY,
+                record TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+        conn.commit()
+        conn.close()
+
+    @staticmethod
+    def _get_meta_int(conn: sqlite3.Connection, key: str) -> int:
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return int(row[0]) if row else 0
+
+    @staticmethod
+    def _set_meta(conn: sqlite3.Connection, key: str, value: Any):
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _bump_generation(self, conn: sqlite3.Connection):
+        self._generation = self._get_meta_int(conn, "generation") + 1
+        self._set_meta(conn, "generation", self._generation)
+
+    def _refresh_if_stale(self, conn: sqlite3.Connection):
+        if self._get_meta_int(conn, "generation") != self._generation:
+            self._load()
+
+    def _load(self):
+        """从磁盘加载：行数以 SQLite 为准，未提交的尾部向量会被忽略（下次写入时截断）"""
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute("SELECT row, cluster FROM chunks ORDER BY row").fetchall()
+            self.dim = self.dim or self._get_meta_int(conn, "dim")
+            self._generation = self._get_meta_int(conn, "generation")
+            self._trained_rows = self._get_meta_int(conn, "ann_trained_rows")
+            conn.close()
+            self._mmap = None
+
+            self._rows = (rows[-1][0] + 1) if rows else 0
+            self._live = np.zeros(self._rows, dtype=bool)
+            clusters = np.full(self._rows, -1, dtype=np.int32)
+            for row, cluster in rows:
+                self._live[row] = True
+                clusters[row] = cluster if cluster is not None else -1
+            self._remap()
+
+            self._centroids = None
+            self._lists = {}
+            if os.path.exists(self.centroids_path):
+                try:
+                    self._centroids = np.load(self.centroids_path)
+                except Exception as e:
+                    print(f"[VectorStore] 簇中心加载失败，将重新训练: {e}")
+            if self._centroids is not None:
+                live_rows = np.nonzero(self._live)[0]
+                if len(live_rows) and (clusters[live_rows] < 0).any():
+                    # 簇分配不完整（例如异常退出），整体重建
+                    self._centroids = None
+                else:
+                    self._rebuild_lists(live_rows, clusters[live_rows])
+
+    def _remap(self):
+        if self._rows and self.dim:
+            self._mmap = np.memmap(self.vectors_path, dtype='<f4', mode='r',
+                                   shape=(self._rows, self.dim))
+        else:
+            self._mmap = None
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).astype('<f4')
+
+    # ==================== 文档记录 ====================
+
+    def load_documents(self) -> Dict[str, Dict]:
+        conn = self._connect()
+        rows = conn.execute("SELECT doc_id, record FROM documents").fetchall()
+        conn.close()
+        return {doc_id: json.loads(record) for doc_id, record in rows}
+
+    def save_document(self, doc_id: str, record: Dict):
+        conn = self._connect()
+        conn.execute("INSERT OR REPLACE INTO documents (doc_id, record) VALUES (?, ?)",
+                     (doc_id, json.dumps(record, ensure_ascii=False)))
+        conn.commit()
+        conn.close()
+
+    # ==================== 写入 ====================
+
+    def add(self, items: List[Dict[str, Any]], embeddings: Iterable[Iterable[float]]) -> List[int]:
+        """
+        追加一批文本块及其向量，只写入新增部分
+
+        Args:
+            items: [{"chunk_id", "doc_id", "chunk_index", "text", "metadata"}]
+            embeddings: 与 items 一一对应的向量
+
+        Returns:
+            新行号列表
+        """
+        if not items:
+            return []
+        matrix = np.asarray(list(embeddings), dtype=np.float32)
+        if matrix.ndim != 2 or matrix.shape[0] != len(items):
+            raise ValueError("embeddings 与 items 数量不一致")
+
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                self._refresh_if_stale(conn)
+                if not self.dim:
+                    self.dim = int(matrix.shape[1])
+                    self._set_meta(conn, "dim", self.dim)
+                elif matrix.shape[1] != self.dim:
+                    raise ValueError(f"向量维度 {matrix.shape[1]} 与存储维度 {self.dim} 不一致")
+
+                # 同一 chunk_id 重复写入时，旧向量行成为墓碑
+                ids = [it["chunk_id"] for it in items]
+                stale = conn.execute(
+                    f"SELECT row FROM chunks WHERE chunk_id IN ({','.join('?' * len(ids))})",
+                    ids).fetchall()
+                if stale:
+                    conn.executemany("DELETE FROM chunks WHERE row = ?", stale)
+
+                vectors = self._normalize(matrix)
+                clusters = self._assign(vectors) if self._centroids is not None else np.full(len(items), -1)
+                start = self._rows
+                # 先写向量再提交元数据：崩溃时多出的尾部向量会在下次写入时被截断
+                with open(self.vectors_path, 'ab') as f:
+                    if f.tell() > start * self.dim * 4:
+                        f.truncate(start * self.dim * 4)
+                    f.write(vectors.tobytes())
+
+                now = datetime.now().isoformat()
+                conn.executemany("""
+                    INSERT INTO chunks (row, chunk_id, doc_id, chunk_index, text, metadata, created_at, cluster)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, [
+                    (start + i, it["chunk_id"], it["doc_id"], it.get("chunk_index", i), it.get("text", ""),
+                     json.dumps(it.get("metadata") or {}, ensure_ascii=False),
+                     it.get("created_at") or now, int(clusters[i]))
+                    for i, it in enumerate(items)
+                ])
+                self._bump_generation(conn)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
+
+            new_rows = np.arange(start, start + len(items))
+            self._rows = start + len(items)
+            self._live = np.concatenate([self._live, np.ones(len(items), dtype=bool)])
+            for (row,) in stale:
+                self._live[row] = False
+            self._remap()
+
+            if self._centroids is not None:
+                for cid in np.unique(clusters):
+                    members = new_rows[clusters == cid]
+                    prev = self._lists.get(int(cid))
+                    self._lists[int(cid)] = members if prev is None else np.concatenate([prev, members])
+                if stale:
+                    self._drop_from_lists({r for (r,) in stale})
+            self._maybe_train()
+            return new_rows.tolist()
+
+    def remove_document(self, doc_id: str) -> int:
+        """删除文档：元数据行删除，向量行作为墓碑保留直到 compact()"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            self._refresh_if_stale(conn)
+            rows = conn.execute("SELECT row FROM chunks WHERE doc_id = ?", (doc_id,)).fetchall()
+            conn.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+            conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+            self._bump_generation(conn)
+            conn.commit()
+            conn.close()
+            removed = {r for (r,) in rows}
+            for r in removed:
+                self._live[r] = False
+            self._drop_from_lists(removed)
+            return len(removed)
+
+    def _drop_from_lists(self, removed: set):
+        if not removed or not self._lists:
+            return
+        removed_arr = np.fromiter(removed, dtype=np.int64)
+        for cid, members in self._lists.items():
+            self._lists[cid] = members[~np.isin(members, removed_arr)]
+
+    def compact(self):
+        """重写向量文件，回收已删除行占用的空间"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            self._refresh_if_stale(conn)
+            live_rows = np.nonzero(self._live)[0]
+            if len(live_rows) == self._rows:
+                # 没有墓碑行，只需截掉尾部已删除/未提交的向量
+                if self.dim and os.path.exists(self.vectors_path):
+                    with open(self.vectors_path, 'r+b') as f:
+                        f.truncate(self._rows * self.dim * 4)
+                conn.rollback()
+                conn.close()
+                return
+            tmp_path = self.vectors_path + ".tmp"
+            if self._mmap is not None and len(live_rows):
+                np.asarray(self._mmap[live_rows], dtype='<f4').tofile(tmp_path)
+            else:
+                open(tmp_path, 'wb').close()
+            self._mmap = None
+
+            conn.execute("UPDATE chunks SET row = -row - 1")
+            conn.executemany("UPDATE chunks SET row = ? WHERE row = ?",
+                             [(new, -int(old) - 1) for new, old in enumerate(live_rows)])
+            self._bump_generation(conn)
+            os.replace(tmp_path, self.vectors_path)
+            conn.commit()
+            conn.close()
+            self._load()
+
+    # ==================== IVF 索引 ====================
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self._centroids.T, axis=1).astype(np.int32)
+
+    def _rebuild_lists(self, rows: np.ndarray, clusters: np.ndarray):
+        self._lists = {}
+        if not len(rows):
+            return
+        order = np.argsort(clusters, kind='stable')
+        rows, clusters = rows[order], clusters[order]
+        uniq, starts = np.unique(clusters, return_index=True)
+        bounds = list(starts[1:]) + [len(rows)]
+        for cid, s, e in zip(uniq, starts, bounds):
+            self._lists[int(cid)] = rows[s:e]
+
+    def _maybe_train(self):
+        live = int(self._live.sum())
+        if live < self.ANN_MIN_ROWS:
+            return
+        if self._centroids is not None and live < self._trained_rows * self.ANN_RETRAIN_FACTOR:
+            return
+        self.train_index()
+
+    def train_index(self, nlist: Optional[int] = None):
+        """用球面 k-means 训练 IVF 簇中心，并重新分配所有行"""
+        with self._lock:
+            live_rows = np.nonzero(self._live)[0]
+            if self._mmap is None or not len(live_rows):
+                return
+            nlist = nlist or max(1, int(np.sqrt(len(live_rows))))
+            nlist = min(nlist, len(live_rows))
+            rng = np.random.default_rng(0)
+            sample_rows = live_rows
+            if len(sample_rows) > self.KMEANS_SAMPLE:
+                sample_rows = np.sort(rng.choice(live_rows, self.KMEANS_SAMPLE, replace=False))
+            sample = np.asarray(self._mmap[sample_rows])
+
+            centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+            for _ in range(self.KMEANS_ITERS):
+                assign = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assign, sample)
+                counts = np.bincount(assign, minlength=nlist)
+                empty = counts == 0
+                sums[empty] = centroids[empty]
+                centroids = self._normalize(sums)
+            self._centroids = centroids
+
+            clusters = np.empty(len(live_rows), dtype=np.int32)
+            step = 65536
+            for s in range(0, len(live_rows), step):
+                block = np.asarray(self._mmap[live_rows[s:s + step]])
+                clusters[s:s + step] = self._assign(block)
+
+            np.save(self.centroids_path, centroids)
+            conn = self._connect()
+            conn.executemany("UPDATE chunks SET cluster = ? WHERE row = ?",
+                             zip(clusters.tolist(), live_rows.tolist()))
+            self._trained_rows = len(live_rows)
+            self._set_meta(conn, "ann_trained_rows", self._trained_rows)
+            self._bump_generation(conn)
+            conn.commit()
+            conn.close()
+            self._rebuild_lists(live_rows, clusters)
+
+    # ==================== 查询 ====================
+
+    def __len__(self) -> int:
+        return int(self._live.sum())
+
+    def search(self, query_vec: Iterable[float], top_k: int = 5,
+               min_score: float = -1.0, exact: bool = False) -> List[Dict[str, Any]]:
+        """余弦相似度检索；数据量大且已训练 IVF 时只扫描最近的 nprobe 个簇"""
+        with self._lock:
+            conn = self._connect()
+            self._refresh_if_stale(conn)
+            conn.close()
+            if self._mmap is None or top_k <= 0:
+                return []
+            q = np.asarray(query_vec, dtype=np.float32).reshape(-1)
+            if q.shape[0] != self.dim:
+                return []
+            q_norm = np.linalg.norm(q)
+            if q_norm > 0:
+                q = q / q_norm
+
+            if self._centroids is not None and not exact:
+                probe = np.argsort(self._centroids @ q)[-self.ANN_NPROBE:]
+                lists = [self._lists[int(c)] for c in probe if int(c) in self._lists]
+                candidates = np.sort(np.concatenate(lists)) if lists else np.zeros(0, dtype=np.int64)
+            else:
+                candidates = np.nonzero(self._live)[0]
+            if not len(candidates):
+                return []
+
+            scores = np.asarray(self._mmap[candidates]) @ q
+            k = min(top_k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            hits: List[Tuple[int, float]] = [(int(candidates[i]), float(scores[i]))
+                                             for i in top if scores[i] >= min_score]
+
+        return self._fetch(hits)
+
+    def _fetch(self, hits: List[Tuple[int, float]]) -> List[Dict[str, Any]]:
+        if not hits:
+            return []
+        conn = self._connect()
+        placeholders = ','.join('?' * len(hits))
+        rows = conn.execute(f"""
+            SELECT row, chunk_id, doc_id, chunk_index, text, metadata, created_at
+            FROM chunks WHERE row IN ({placeholders})
+        """, [r for r, _ in hits]).fetchall()
+        conn.close()
+        by_row = {r[0]: r for r in rows}
+        results = []
+        for row, score in hits:
+            rec = by_row.get(row)
+            if not rec:
+                continue
+            results.append({
+                "chunk_id": rec[1],
+                "doc_id": rec[2],
+                "chunk_index": rec[3],
+                "text": rec[4],
+                "metadata": json.loads(rec[5] or "{}"),
+                "created_at": rec[6],
+                "similarity": score,
+            })
+        return results